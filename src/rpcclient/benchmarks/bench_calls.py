@@ -0,0 +1,55 @@
+"""
+Measure the client-side overhead of remote calls, through call() and through a bound RemoteFunction.
+
+Runs offline: the client is never connected, and every call is answered with the same reply right away, so only the
+encoding of the arguments and the decoding of the return value are measured:
+
+    python benchmarks/bench_calls.py [--count 100000]
+"""
+
+import argparse
+import asyncio
+import ctypes
+import time
+from collections.abc import Awaitable, Callable
+
+from rpcclient.clients.linux.client import LinuxClient
+from rpcclient.protos.rpc_api_pb2 import ReplyCall
+
+
+FUNCTION_ADDRESS = 0x100000000
+BUFFER_ADDRESS = 0x200000000
+
+
+async def measure(name: str, count: int, call: Callable[[], Awaitable[object]]) -> None:
+    start = time.perf_counter()
+    for _ in range(count):
+        await call()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16} {elapsed:8.3f}s {elapsed / count * 1e9:8.0f}ns/call")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=100_000, help="number of calls per measurement")
+    args = parser.parse_args()
+
+    # calls are answered locally, with the return value of a successful read()
+    client = LinuxClient(None)  # pyright: ignore[reportArgumentType]
+    reply = ReplyCall(return_value=0x100)
+
+    async def rpc_call(msg_id: int, **kwargs: object) -> ReplyCall:
+        return reply
+
+    client.rpc_call = rpc_call  # pyright: ignore[reportAttributeAccessIssue]
+
+    function = client.symbol(FUNCTION_ADDRESS)
+    buffer = client.symbol(BUFFER_ADDRESS)
+    read = function.bind([ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t], ctypes.c_ssize_t)
+
+    await measure("call()", args.count, lambda: function(3, buffer, 0x100))
+    await measure("RemoteFunction", args.count, lambda: read(3, buffer, 0x100))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
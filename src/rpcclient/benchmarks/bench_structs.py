@@ -0,0 +1,78 @@
+"""
+Measure the parse throughput of the structs parsed on hot paths, interpreted and compiled.
+
+Runs offline, parsing zeroed buffers:
+
+    python benchmarks/bench_structs.py [--count 10000]
+"""
+
+import argparse
+import time
+
+from construct import Construct, SizeofError
+
+from rpcclient.clients.darwin import structs as darwin_structs
+from rpcclient.clients.linux import structs as linux_structs
+from rpcclient.core.structs import generic
+from rpcclient.core.structs.generic import compiled
+
+
+HOT_STRUCTS = {
+    "stat64": darwin_structs.stat64,
+    "statfs64": darwin_structs.statfs64,
+    "utsname (darwin)": darwin_structs.utsname,
+    "utsname (linux)": linux_structs.utsname,
+    "dirent (linux)": linux_structs.dirent,
+    "timeval": generic.timeval,
+    "sockaddr": generic.sockaddr,
+    "sockaddr_in": generic.sockaddr_in,
+    "sockaddr_in6": generic.sockaddr_in6,
+    "sockaddr_un": generic.sockaddr_un,
+    "pollfd": darwin_structs.pollfd,
+    "proc_taskallinfo": darwin_structs.proc_taskallinfo,
+    "task_vm_info": darwin_structs.task_vm_info_data_t,
+    "proc_fdinfo": darwin_structs.proc_fdinfo,
+    "vnode_fdinfowithpath": darwin_structs.vnode_fdinfowithpath,
+    "socket_fdinfo": darwin_structs.socket_fdinfo,
+    "pipe_info": darwin_structs.pipe_info,
+    "pshm_fdinfo": darwin_structs.pshm_fdinfo,
+    "ipc_info_name_t": darwin_structs.ipc_info_name_t,
+    "dyld_image_info_t": darwin_structs.dyld_image_info_t,
+}
+# buffer size of the variably sized structs, as peeked by DarwinProcess.fds()
+VARIABLE_STRUCT_SIZE = 8196
+
+
+def throughput(struct: Construct, data: bytes, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        struct.parse(data)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10_000, help="number of parses per measurement")
+    args = parser.parse_args()
+
+    print(f"{'struct':<22} {'size':>5} {'compile':>9} {'interpreted':>13} {'compiled':>13} {'speedup':>8}")
+    for name, struct in HOT_STRUCTS.items():
+        try:
+            data = bytes(struct.sizeof())
+        except SizeofError:
+            data = bytes(VARIABLE_STRUCT_SIZE)
+        start = time.perf_counter()
+        fast = compiled(struct)
+        compile_time = time.perf_counter() - start
+        assert fast is not struct, f"{name} isn't compilable"
+        assert fast.parse(data) == struct.parse(data)
+        interpreted_rate = throughput(struct, data, args.count)
+        compiled_rate = throughput(fast, data, args.count)
+        print(
+            f"{name:<22} {len(data):>5} {compile_time * 1e3:7.1f}ms {interpreted_rate:9.0f}op/s "
+            f"{compiled_rate:9.0f}op/s {compiled_rate / interpreted_rate:7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Measure the construction time and memory footprint of symbols.
+
+Runs offline, the symbols being created for a client which is never connected:
+
+    python benchmarks/bench_symbols.py [--count 1000000]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from rpcclient.clients.linux.client import LinuxClient
+from rpcclient.core.symbol import Symbol
+
+
+BASE_ADDRESS = 0x100000000
+
+
+def measure(name: str, count: int, create: Callable[[int], list[Symbol]]) -> None:
+    # timed and traced separately, tracing slowing allocations down
+    gc.collect()
+    start = time.perf_counter()
+    symbols = create(count)
+    elapsed = time.perf_counter() - start
+    del symbols
+
+    gc.collect()
+    tracemalloc.start()
+    symbols = create(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(symbols) == count
+    print(
+        f"{name:<12} {elapsed:8.3f}s {elapsed / count * 1e9:8.0f}ns/symbol "
+        f"{size / 2**20:8.1f}MiB {size / count:6.0f}B/symbol"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1_000_000, help="number of symbols created per measurement")
+    args = parser.parse_args()
+
+    # creating symbols needs no connection
+    client = LinuxClient(None)  # pyright: ignore[reportArgumentType]
+    base = client.symbol(BASE_ADDRESS)
+
+    measure("symbol()", args.count, lambda count: [client.symbol(BASE_ADDRESS + i * 8) for i in range(count)])
+    measure("arithmetic", args.count, lambda count: [base + i * 8 for i in range(count)])
+    # symbols created directly hold their client in an instance dict, as every symbol used to
+    measure("unbound", args.count, lambda count: [Symbol(BASE_ADDRESS + i * 8, client) for i in range(count)])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import logging
 from collections.abc import Awaitable, Callable
+from functools import partial
 
 from rpcclient.clients.ios.client import IosClient
 from rpcclient.clients.linux.client import LinuxClient
@@ -39,12 +40,21 @@ class ClientManager:
 
         self._clients: Registry[int, ClientType] = Registry(notifier=self.notifier)
 
-    async def create(self, mode: str = "tcp", internal: bool = False, **kwargs) -> ClientType:
+    async def create(
+        self,
+        mode: str = "tcp",
+        internal: bool = False,
+        reconnect: bool = False,
+        heartbeat_interval: float | None = None,
+        **kwargs,
+    ) -> ClientType:
         """
         Create a client via transport `mode`, resolve platform, store, and emit CREATED.
 
         :param mode: Transport mode, e.g. "tcp" or "protocol" (default: "tcp")
         :param internal: If True, supply the CREATED event with the internal flag (default: False)
+        :param reconnect: If True, transparently reconnect to a new worker when the connection dies (default: False)
+        :param heartbeat_interval: If set, probe the connection after this many idle seconds (default: None)
         """
         transport_factory = self.transport_factory.get(mode)
         if transport_factory is None:
@@ -70,9 +80,14 @@ class ClientManager:
         # path flows through here — CLI connect and interactive `mgr.create` alike.
         await client.get_progname()
         await client.get_pid()
+        client.reconnect_factory = partial(transport_factory, **kwargs)
+        client.auto_reconnect = reconnect
         client.notifier.register(ClientEvent.TERMINATED, self._on_client_terminated)
         client.notifier.register(ClientEvent.CREATED, self._on_client_created)
+        client.notifier.register(ClientEvent.RECONNECTED, self._on_client_reconnected)
         self.add(client, internal=internal)
+        if heartbeat_interval is not None:
+            client.start_heartbeat(heartbeat_interval)
 
         return client
 
@@ -129,3 +144,8 @@ class ClientManager:
     def _on_client_created(self, client: ClientType) -> None:
         """Internal: Add a client when if created by another client."""
         self.add(client)
+
+    def _on_client_reconnected(self, old_cid: int, client: ClientType) -> None:
+        """Internal: re-key a client whose worker (and therefore ID) was replaced."""
+        self.remove(old_cid)
+        self.add(client)
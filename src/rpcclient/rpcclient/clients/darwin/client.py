@@ -4,8 +4,9 @@ import plistlib
 from collections import namedtuple
 from dataclasses import dataclass
 from functools import partial
-from typing import cast
+from typing import ClassVar, cast
 from typing_extensions import Self
+from uuid import UUID
 
 from construct import Container
 from IPython.core.getipython import get_ipython
@@ -38,7 +39,9 @@ from rpcclient.clients.darwin.subsystems.xpc import Xpc
 from rpcclient.clients.darwin.symbol import DarwinSymbol
 from rpcclient.core.client import CoreClient, RemoteCallArg
 from rpcclient.core.structs.consts import RTLD_GLOBAL, RTLD_NOW
+from rpcclient.core.structs.generic import compiled
 from rpcclient.core.subsystems.decorator import subsystem
+from rpcclient.core.symbol_cache import SymbolCacheScope
 from rpcclient.core.symbols_jar import LazySymbol
 from rpcclient.exceptions import CfSerializationError, MissingLibraryError
 from rpcclient.protocol.rpc_bridge import RpcBridge
@@ -85,6 +88,18 @@ class DyldImage:
 
 
 class DarwinClient(CoreClient[DarwinSymbolT_co]):
+    # resolved in a single roundtrip once CoreFoundation is loaded
+    PREFETCHED_SYMBOLS: ClassVar[tuple[str, ...]] = (
+        "CFNullGetTypeID",
+        "kCFBooleanTrue",
+        "mach_absolute_time",
+        "mach_task_self",
+        "objc_autoreleasePoolPop",
+        "objc_autoreleasePoolPush",
+        "objc_getClass",
+        "objc_msgSend",
+        "sel_getUid",
+    )
     loaded_objc_classes: list
     _NSPropertyListSerialization: DarwinSymbolT_co
     _CFNullTypeID: object
@@ -94,7 +109,7 @@ class DarwinClient(CoreClient[DarwinSymbolT_co]):
         self._objc_class_cache: dict[str, objective_c_class.Class[DarwinSymbolT_co]] = {}
 
     def symbol(self, symbol: int) -> DarwinSymbolT_co:
-        return cast(DarwinSymbolT_co, DarwinSymbol(symbol, self))
+        return cast(DarwinSymbolT_co, DarwinSymbol.bound_to(self)(symbol, self))
 
     @classmethod
     async def create(cls, bridge: RpcBridge) -> Self:
@@ -108,11 +123,35 @@ class DarwinClient(CoreClient[DarwinSymbolT_co]):
         ):
             raise MissingLibraryError("failed to load CoreFoundation")
 
+        await self.load_symbol_cache()
         self.loaded_objc_classes = []
+        await self._init_objc_globals()
+
+        return self
+
+    async def _init_objc_globals(self) -> None:
+        await self.symbols.prefetch(self.PREFETCHED_SYMBOLS)
         self._NSPropertyListSerialization = await self.symbols.objc_getClass("NSPropertyListSerialization")
         self._CFNullTypeID = await self.symbols.CFNullGetTypeID()
 
-        return self
+    async def symbol_cache_scope(self) -> SymbolCacheScope | None:
+        """the dyld shared cache, identified by its UUID and the address it's mapped at"""
+        await self.symbols.prefetch(("_dyld_get_shared_cache_uuid", "_dyld_get_shared_cache_range"))
+        async with self.safe_malloc(24) as buf:
+            if not (await self.symbols._dyld_get_shared_cache_uuid(buf)).c_bool:
+                return None
+            start = int(await self.symbols._dyld_get_shared_cache_range(buf + 16))
+            raw = await buf.peek(24)
+        if start == 0:
+            return None
+        uuid = UUID(bytes=raw[:16])
+        end = start + int.from_bytes(raw[16:], "little")
+        return SymbolCacheScope(key=f"{uuid}-{start:x}", start=start, end=end)
+
+    async def _restore_state(self) -> None:
+        await super()._restore_state()
+        self._objc_class_cache.clear()
+        await self._init_objc_globals()
 
     @subsystem
     def biome(self) -> Biome[DarwinSymbolT_co]:
@@ -201,7 +240,7 @@ class DarwinClient(CoreClient[DarwinSymbolT_co]):
     async def get_uname(self) -> Container:
         async with self.safe_calloc(utsname.sizeof()) as uname:
             assert await self.symbols.uname(uname) == 0
-            return await uname.parse(utsname)
+            return await uname.parse(compiled(utsname))
 
     async def is_idevice(self) -> bool:
         return (await self.get_uname()).machine.startswith("i")
@@ -244,7 +283,7 @@ class DarwinClient(CoreClient[DarwinSymbolT_co]):
         async with self.safe_malloc(count) as buf:
             await self.symbols.CFDataGetBytes(objc_data, 0, count, buf)
             result = plistlib.loads(await buf.peek(count))
-        await objc_data.objc_call("release")
+        await self.defer_release(self.symbols.objc_release, objc_data)
         return result
 
     async def cf(self, o: CfSerializable) -> DarwinSymbolT_co:
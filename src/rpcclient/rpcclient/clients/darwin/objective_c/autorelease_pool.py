@@ -67,19 +67,18 @@ class AutoreleasePool(UserList[DarwinSymbolT], ClientBound["DarwinClient[DarwinS
         page_sym = await find_page_for_address(self.address)
         page = await page_sym.parse(AutoreleasePoolPageData(self._client))
         next_address = self.address + 8
-        while (await next_address.getindex(0)).c_int64 not in [
-            0,
-            0xA3A3A3A3,
-            0xA3A3A3A3A3A3A3A3,
-        ] or next_address == page.next:
-            if next_address == page.next:
-                if page.child == 0:
-                    break
-                next_address = page.child + SIZEOF_PAGE_DATA
-                page = AutoreleasePoolPageData(self._client).parse_stream(page.child)
-                continue
-            self.append(await next_address.getindex(0) & self._mask)
-            next_address += 8
+        while True:
+            # the entries up to the page's next free slot, in a single peek
+            for entry in await next_address.as_array("P", int(page.next - next_address) // 8).tolist():
+                if entry.c_int64 in (0, 0xA3A3A3A3, 0xA3A3A3A3A3A3A3A3):
+                    self.end = next_address
+                    return
+                self.append(entry & self._mask)
+                next_address += 8
+            if page.child == 0:
+                break
+            next_address = page.child + SIZEOF_PAGE_DATA
+            page = await page.child.parse(AutoreleasePoolPageData(self._client))
         self.end = next_address
 
     def __repr__(self) -> str:
@@ -36,6 +36,7 @@ from construct import (
 from rpcclient.core.structs.consts import AF_INET, AF_INET6, AF_UNIX
 from rpcclient.core.structs.generic import (
     UNIX_PATH_MAX,
+    CStringFrom,
     gid_t,
     in_addr,
     long,
@@ -352,9 +353,9 @@ proc_bsdinfo = Struct(
     "pbi_svgid" / gid_t,
     "rfu_1" / Int32ul,  # reserved
     "_pbi_comm" / Bytes(MAXCOMLEN),
-    "pbi_comm" / Computed(lambda x: x._pbi_comm.split(b"\x00", 1)[0].decode()),
+    "pbi_comm" / CStringFrom("_pbi_comm"),
     "_pbi_name" / Bytes(2 * MAXCOMLEN),  # empty if no name is registered
-    "pbi_name" / Computed(lambda x: x._pbi_name.split(b"\x00", 1)[0].decode()),
+    "pbi_name" / CStringFrom("_pbi_name"),
     "pbi_nfiles" / Int32ul,
     "pbi_pgid" / Int32ul,
     "pbi_pjobc" / Int32ul,
@@ -440,7 +441,7 @@ vnode_info = Struct(
 vnode_info_path = Struct(
     "vip_vi" / vnode_info,
     "_vip_path" / Bytes(MAXPATHLEN),
-    "vip_path" / Computed(lambda x: x._vip_path.split(b"\x00", 1)[0].decode()),
+    "vip_path" / CStringFrom("_vip_path"),
 )
 
 vnode_fdinfowithpath = Struct(
@@ -532,7 +533,7 @@ sockaddr_un_raw = Struct(
     "sun_len" / Int8ul,
     "sun_family" / Default(Int8ul, AF_UNIX),
     "_sun_path" / Bytes(UNIX_PATH_MAX),
-    "sun_path" / Computed(lambda x: x._sun_path.split(b"\x00", 1)[0].decode()),
+    "sun_path" / CStringFrom("_sun_path"),
 )
 
 un_sockinfo = Struct(
@@ -647,7 +648,7 @@ pshm_info = Struct(
     "pshm_stat" / vinfo_stat,
     "pshm_mappaddr" / uint64_t,
     "_pshm_name" / Bytes(MAXPATHLEN),
-    "pshm_name" / Computed(lambda x: x._pshm_name.split(b"\x00", 1)[0].decode()),
+    "pshm_name" / CStringFrom("_pshm_name"),
 )
 
 pshm_fdinfo = Struct(
@@ -905,6 +906,7 @@ LOAD_COMMAND_TYPE = Enum(
 
 FAT_MAGIC = 0xCAFEBABE
 FAT_CIGAM = 0xBEBAFECA
+MH_MAGIC_64 = 0xFEEDFACF
 
 cpu_type_t = Int32ul
 cpu_subtype_t = Int32ul
@@ -923,6 +925,11 @@ segment_command_t = Struct(
     "flags" / Int32ul,
 )
 
+linkedit_data_command_t = Struct(
+    "dataoff" / Int32ul,  # file offset of data in __LINKEDIT segment
+    "datasize" / Int32ul,  # file size of data in __LINKEDIT segment
+)
+
 uuid_command_t = Struct("uuid" / Array(16, Int8ul))
 
 build_tool_version = Struct("tool" / Int32ul, "version" / Int32ul)
@@ -962,6 +969,7 @@ load_command_t = Struct(
             LOAD_COMMAND_TYPE.LC_SEGMENT_64: segment_command_t,
             LOAD_COMMAND_TYPE.LC_ENCRYPTION_INFO_64: encryption_info_command_64,
             LOAD_COMMAND_TYPE.LC_ENCRYPTION_INFO: encryption_info_command,
+            LOAD_COMMAND_TYPE.LC_CODE_SIGNATURE: linkedit_data_command_t,
         },
         Bytes(this.cmdsize - (this._data_offset - this._start)),
     ),
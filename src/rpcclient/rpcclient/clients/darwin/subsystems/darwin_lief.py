@@ -4,9 +4,19 @@ from pathlib import PurePath
 from typing import TYPE_CHECKING, Generic
 
 import lief
+from construct import Int32ul
 
 from rpcclient.clients.darwin._types import DarwinSymbolT_co
 from rpcclient.clients.darwin.consts import kSecCodeMagicEntitlement
+from rpcclient.clients.darwin.structs import (
+    FAT_CIGAM,
+    FAT_MAGIC,
+    LOAD_COMMAND_TYPE,
+    MH_MAGIC_64,
+    fat_header,
+    mach_header_t,
+)
+from rpcclient.core.mapped_file import MappedFile
 from rpcclient.core.subsystems.lief import Lief
 from rpcclient.exceptions import NoEntitlementsError
 
@@ -17,17 +27,8 @@ if TYPE_CHECKING:
 
 class DarwinLief(Lief["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbolT_co]):
     async def get_entitlements(self, path: str | PurePath) -> dict:
-        async with await self._client.fs.open(path, "r") as f:
-            buf = await f.read()
-
-        parsed = lief.parse(buf)
-
-        if not isinstance(parsed, lief.MachO.Binary):
-            raise TypeError(f"{str(path)!r} is not a Mach-O binary")
-
-        code_signature = buf[
-            parsed.code_signature.data_offset : parsed.code_signature.data_offset + parsed.code_signature.data_size
-        ]
+        async with await self._client.fs.mmap(path) as mapped:
+            code_signature = await self._get_code_signature(mapped, path)
 
         ent_magic = struct.pack(">I", kSecCodeMagicEntitlement)
         ent_magic_offset = code_signature.find(ent_magic)
@@ -39,3 +40,27 @@ class DarwinLief(Lief["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbolT_c
         end_plist_magic = b"</plist>"
         ent_buf = ent_buf[: ent_buf.find(end_plist_magic) + len(end_plist_magic)]
         return plistlib.loads(ent_buf)
+
+    async def _get_code_signature(self, mapped: MappedFile, path: str | PurePath) -> bytes:
+        """read the code signature blob, parsing only the Mach-O headers instead of the whole binary"""
+        offset = 0
+        magic = await mapped.parse(Int32ul)
+        if magic in (FAT_CIGAM, FAT_MAGIC):
+            offset = (await mapped.parse(fat_header)).archs[0].offset
+            magic = await mapped.parse(Int32ul, offset)
+
+        if magic != MH_MAGIC_64:
+            # leave other formats to lief, which needs the whole binary
+            buf = await mapped.read(0, len(mapped))
+            parsed = lief.parse(buf)
+            if not isinstance(parsed, lief.MachO.Binary):
+                raise TypeError(f"{str(path)!r} is not a Mach-O binary")
+            return buf[
+                parsed.code_signature.data_offset : parsed.code_signature.data_offset + parsed.code_signature.data_size
+            ]
+
+        header = await mapped.parse(mach_header_t, offset)
+        for load_command in header.load_commands:
+            if load_command.cmd == LOAD_COMMAND_TYPE.LC_CODE_SIGNATURE:
+                return await mapped.read(offset + load_command.data.dataoff, load_command.data.datasize)
+        raise NoEntitlementsError()
@@ -190,7 +190,7 @@ class KnowledgeStoreContext(Allocated["DarwinClient[DarwinSymbolT_co]"], Generic
                 await query.objc_call("setEventStreams:", arr)
                 return await self._execute_query(query)
         finally:
-            await query.objc_call("release")
+            await self._client.defer_release(self._client.symbols.objc_release, query)
 
     async def _execute_query(self: "KnowledgeStoreContext[DarwinSymbolT]", query: DarwinSymbolT) -> DarwinSymbolT:
         """Run *query* through the concrete :pyattr:`knowledge_store` implementation.
@@ -5,6 +5,7 @@ from construct import Container
 
 from rpcclient.clients.darwin._types import DarwinSymbolT_co
 from rpcclient.clients.darwin.structs import stat64, statfs64
+from rpcclient.core.structs.generic import compiled
 from rpcclient.core.subsystems.fs import Fs
 
 
@@ -19,15 +20,15 @@ async def do_stat(client: "DarwinClient[DarwinSymbol]", stat_name: str, filename
         err = await client.symbols[stat_name].call(filename, buf)
         if err != 0:
             await client.raise_errno_exception(f"failed to stat(): {filename}")
-        return await buf.parse(stat64)
+        return await buf.parse(compiled(stat64))
 
 
 class DarwinFs(Fs["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbolT_co]):
-    async def stat(self, path: str | PurePath) -> Container:
+    async def _stat(self, path: str | PurePath) -> Container:
         """Return stat64 info for a remote path."""
         return await do_stat(self._client, "stat64", path)
 
-    async def lstat(self, path: str | PurePath) -> Container:
+    async def _lstat(self, path: str | PurePath) -> Container:
         """Return lstat64 info for a remote path (does not follow symlinks)."""
         return await do_stat(self._client, "lstat64", path)
 
@@ -72,9 +73,13 @@ class DarwinFs(Fs["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbolT_co]):
         async with self._client.safe_malloc(statfs64.sizeof()) as buf:
             if await self._client.symbols.statfs64(path, buf) != 0:
                 await self._client.raise_errno_exception(f"statfs failed for: {path}")
-            return await buf.parse(statfs64)
+            return await buf.parse(compiled(statfs64))
 
     async def chflags(self, path: str | PurePath, flags: int = 0) -> None:
         """Set BSD file flags on a remote path."""
-        if (await self._client.symbols.chflags(path, flags)) != 0:
+        try:
+            err = await self._client.symbols.chflags(path, flags)
+        finally:
+            self.invalidate_metadata(path)
+        if err != 0:
             await self._client.raise_errno_exception(f"chflags failed for: {path}")
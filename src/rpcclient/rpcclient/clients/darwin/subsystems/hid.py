@@ -290,7 +290,7 @@ class Hid(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbolT_c
         try:
             yield client
         finally:
-            await self._client.symbols.CFRelease(client)
+            await self._client.defer_release(self._client.symbols.CFRelease, client)
 
     async def dispatch(self, event):
         async with self.create_hid_client() as hid_client:
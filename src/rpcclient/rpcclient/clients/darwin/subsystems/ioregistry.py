@@ -70,7 +70,7 @@ class IOService(Allocated["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
         ).py(typ)
 
     async def _deallocate(self) -> None:
-        await self._client.symbols.IOObjectRelease(self._service)
+        await self._client.defer_release(self._client.symbols.IOObjectRelease, self._service)
 
     def __repr__(self):
         return f"<{self.__class__.__name__} NAME:{self.name}>"
@@ -80,7 +80,7 @@ from rpcclient.clients.darwin.structs import (
 from rpcclient.clients.darwin.symbol import DarwinSymbol
 from rpcclient.core._types import ClientBound
 from rpcclient.core.structs.consts import SEEK_SET, SIGKILL, SIGTERM
-from rpcclient.core.structs.generic import Dl_info
+from rpcclient.core.structs.generic import Dl_info, compiled
 from rpcclient.core.subsystems.processes import Processes
 from rpcclient.core.subsystems.sysctl import CTL, KERN
 from rpcclient.core.symbol import AbstractSymbol
@@ -634,12 +634,12 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
                 raise BadReturnValueError("task_info(TASK_DYLD_INFO) failed")
             dyld_info_data = await dyld_info.parse(task_dyld_info_data_t)
 
-        all_image_infos = all_image_infos_t.parse(
+        all_image_infos = compiled(all_image_infos_t).parse(
             await self.peek(dyld_info_data.all_image_info_addr, dyld_info_data.all_image_info_size)
         )
 
         buf = await self.peek(all_image_infos.infoArray, all_image_infos.infoArrayCount * dyld_image_info_t.sizeof())
-        for image in Array(all_image_infos.infoArrayCount, dyld_image_info_t).parse(buf):
+        for image in Array(all_image_infos.infoArrayCount, compiled(dyld_image_info_t)).parse(buf):
             path = await self.peek_str(image.imageFilePath)
             result.append(Image(address=self.get_process_symbol(image.imageLoadAddress), path=path))
         return result
@@ -657,9 +657,7 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
             if await self._client.symbols.task_threads(await type(self).task_read(self), threads, count):
                 raise BadReturnValueError("task_threads() failed")
 
-            for tid in Array((await count.getindex(0)).c_uint32, Int32ul).parse(
-                await (await threads.getindex(0)).peek(await count.getindex(0) * 4)
-            ):
+            for tid in await (await threads.getindex(0)).as_array("I", (await count.getindex(0)).c_uint32).tolist():
                 result.append(self._thread_class(self._client, tid))
 
         return result
@@ -723,7 +721,8 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
                 if not size:
                     raise BadReturnValueError("proc_pidinfo(PROC_PIDLISTFDS) failed")
 
-                for fd in Array(size // proc_fdinfo.sizeof(), proc_fdinfo).parse(await fdinfo_buf.peek(size)):
+                fdinfo = Array(size // proc_fdinfo.sizeof(), compiled(proc_fdinfo)).parse(await fdinfo_buf.peek(size))
+                for fd in fdinfo:
                     if fd.proc_fdtype == PROX_FDTYPE_VNODE:
                         # file
                         vs = await self._client.symbols.proc_pidfdinfo(
@@ -741,7 +740,9 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
                         result.append(
                             FdStruct(
                                 fd=fd,
-                                struct=vnode_fdinfowithpath.parse(await vi_buf.peek(vnode_fdinfowithpath.sizeof())),
+                                struct=compiled(vnode_fdinfowithpath).parse(
+                                    await vi_buf.peek(vnode_fdinfowithpath.sizeof())
+                                ),
                             )
                         )
 
@@ -761,7 +762,7 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
                                 f"proc_pidinfo(PROC_PIDFDSOCKETINFO) failed ({await self._client.get_last_error()})"
                             )
 
-                        result.append(FdStruct(fd=fd, struct=socket_fdinfo.parse(await vi_buf.peek(vi_size))))
+                        result.append(FdStruct(fd=fd, struct=compiled(socket_fdinfo).parse(await vi_buf.peek(vi_size))))
 
                     elif fd.proc_fdtype == PROX_FDTYPE_PIPE:
                         # pipe
@@ -776,7 +777,9 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
                                 f"proc_pidinfo(PROC_PIDFDPIPEINFO) failed ({await self._client.get_last_error()})"
                             )
 
-                        result.append(FdStruct(fd=fd, struct=pipe_info.parse(await vi_buf.peek(pipe_info.sizeof()))))
+                        result.append(
+                            FdStruct(fd=fd, struct=compiled(pipe_info).parse(await vi_buf.peek(pipe_info.sizeof())))
+                        )
 
                     elif fd.proc_fdtype == PROX_FDTYPE_PSHM:
                         vs = await self._client.symbols.proc_pidfdinfo(
@@ -790,7 +793,7 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
                             )
 
                         result.append(
-                            FdStruct(fd=fd, struct=pshm_fdinfo.parse(await vi_buf.peek(pshm_fdinfo.sizeof())))
+                            FdStruct(fd=fd, struct=compiled(pshm_fdinfo).parse(await vi_buf.peek(pshm_fdinfo.sizeof())))
                         )
 
             return result
@@ -802,7 +805,7 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
                 self.pid, PROC_PIDTASKALLINFO, 0, pti, proc_taskallinfo.sizeof()
             ):
                 raise BadReturnValueError("proc_pidinfo(PROC_PIDTASKALLINFO) failed")
-            return await pti.parse(proc_taskallinfo)
+            return await pti.parse(compiled(proc_taskallinfo))
 
     async def task_vm_info(self) -> Container:
         """get TASK_VM_INFO via task_info."""
@@ -813,7 +816,7 @@ class Process(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbo
             await count.setindex(0, TASK_VM_INFO_COUNT)
             if await self._client.symbols.task_info(await type(self).task_read(self), TASK_VM_INFO, vm_info, count):
                 raise BadReturnValueError("task_info(TASK_VM_INFO) failed")
-            return await vm_info.parse(task_vm_info_data_t)
+            return await vm_info.parse(compiled(task_vm_info_data_t))
 
     async def backtraces(self) -> list[Backtrace]:
         """Collect backtraces for all threads in the process."""
@@ -1268,14 +1271,8 @@ class DarwinProcesses(Processes["DarwinClient[DarwinSymbolT_co]"], Generic[Darwi
         n = await self._client.symbols.proc_listallpids(0, 0)
         pid_buf_size = pid_t.sizeof() * n
         async with self._client.safe_malloc(pid_buf_size) as pid_buf:
-            pid_buf.item_size = pid_t.sizeof()
             n = await self._client.symbols.proc_listallpids(pid_buf, pid_buf_size)
-
-            result = []
-            for i in range(n):
-                pid = int(await pid_buf.getindex(i))
-                result.append(Process(self._client, pid))
-            return result
+            return [Process(self._client, pid) for pid in await pid_buf.as_array("i", int(n)).tolist()]
 
     async def disable_watchdog(self) -> None:
         """Continuously kill watchdogd to keep it disabled."""
@@ -1372,7 +1369,7 @@ class DarwinProcesses(Processes["DarwinClient[DarwinSymbolT_co]"], Generic[Darwi
             # swap my current instances port to be last to collect all threads and exception port info
             my_task_position = None
             task_count = await p_task_count.getindex(0)
-            tasks = list(struct.unpack(f"<{int(task_count)}I", await (await p_tasks.getindex(0)).peek(task_count * 4)))
+            tasks = await (await p_tasks.getindex(0)).as_array("I", int(task_count)).tolist()
 
             for i in range(task_count):
                 if await self._client.symbols.mach_task_is_self(tasks[i]):
@@ -1452,7 +1449,7 @@ class DarwinProcesses(Processes["DarwinClient[DarwinSymbolT_co]"], Generic[Darwi
                         )
                         == 0
                     ):
-                        thread_id = (await th_info.parse(thread_identifier_info)).thread_id
+                        thread_id = await th_info.as_struct(thread_identifier_info).thread_id
                         thread_ids.append(thread_id)
 
                     await self._client.symbols.mach_port_deallocate(mach_task_self, thread_port)
@@ -1466,7 +1463,7 @@ class DarwinProcesses(Processes["DarwinClient[DarwinSymbolT_co]"], Generic[Darwi
             )
 
             count = (await p_count.getindex(0)).c_uint32
-            table_struct = Array(count, ipc_info_name_t)
+            table_struct = Array(count, compiled(ipc_info_name_t))
 
             parsed_table = await (await p_table.getindex(0)).parse(table_struct)
 
@@ -119,7 +119,7 @@ class SCPreference(Allocated["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSy
 
     async def _deallocate(self) -> None:
         """free the preference object"""
-        await self._client.symbols.CFRelease(self._ref)
+        await self._client.defer_release(self._client.symbols.CFRelease, self._ref)
 
     async def _commit(self) -> None:
         """commit all changes"""
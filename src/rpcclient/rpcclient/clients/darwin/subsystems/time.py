@@ -4,6 +4,7 @@ from typing import TYPE_CHECKING, Generic
 from rpcclient.clients.darwin._types import DarwinSymbolT_co
 from rpcclient.clients.darwin.structs import timeval
 from rpcclient.core._types import ClientBound
+from rpcclient.core.structs.generic import compiled
 
 
 if TYPE_CHECKING:
@@ -22,7 +23,7 @@ class Time(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbolT_
         """get current time"""
         async with self._client.safe_calloc(timeval.sizeof()) as current:
             await self._client.symbols.gettimeofday(current, 0)
-            time_of_day = await current.parse(timeval)
+            time_of_day = await current.parse(compiled(timeval))
         return datetime.fromtimestamp(time_of_day.tv_sec + (time_of_day.tv_usec / (10**6)))
 
     async def set_current(self, new_time: datetime) -> None:
@@ -41,5 +42,5 @@ class Time(ClientBound["DarwinClient[DarwinSymbolT_co]"], Generic[DarwinSymbolT_
         return bool(await self._client.symbols.TMIsAutomaticTimeZoneEnabled())
 
     async def boot_time(self) -> datetime:
-        timestamp = timeval.parse(await self._client.sysctl.get_by_name("kern.boottime")).tv_sec
+        timestamp = compiled(timeval).parse(await self._client.sysctl.get_by_name("kern.boottime")).tv_sec
         return datetime.fromtimestamp(timestamp)
@@ -1,4 +1,6 @@
-from construct import Bytes, Computed, Int8ul, Int16ul, Int32ul, Int64ul, PaddedString, Padding, Struct
+from construct import Bytes, Int8ul, Int16ul, Int32ul, Int64ul, PaddedString, Padding, Struct
+
+from rpcclient.core.structs.generic import CStringFrom
 
 
 _UTSNAME_LENGTH = 65
@@ -20,5 +22,5 @@ dirent = Struct(
     "d_reclen" / Int16ul,
     "d_type" / Int8ul,
     "_d_name_bytes" / Bytes(_D_NAME_LENGTH),
-    "d_name" / Computed(lambda x: x._d_name_bytes.split(b"\x00", 1)[0].decode()),
+    "d_name" / CStringFrom("_d_name_bytes"),
 )
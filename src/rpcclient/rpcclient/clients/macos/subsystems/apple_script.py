@@ -28,7 +28,7 @@ class AppleScript(ClientBound["MacosClient[DarwinSymbolT_co]"], Generic[DarwinSy
             await apple_script.objc_call("executeAndReturnError:", error)
             if await error.getindex(0):
                 raise RpcAppleScriptError((await (await error.getindex(0)).objc_call("description")).py())
-            await apple_script.objc_call("release")
+            await self._client.defer_release(self._client.symbols.objc_release, apple_script)
 
     async def say(self, message: str, voice: str | None = None) -> None:
         script = f'say "{message}"'
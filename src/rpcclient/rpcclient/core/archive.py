@@ -0,0 +1,214 @@
+import bz2
+import gzip
+import lzma
+import os
+import stat
+import tarfile
+from collections.abc import Callable
+from pathlib import Path
+from typing import IO
+from typing_extensions import Buffer
+
+from rpcclient.exceptions import ArchiveError
+
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+ENCODING = "utf-8"
+ERRORS = "surrogateescape"
+# directories are created writable by their owner until their content is extracted
+OWNER_RWX = stat.S_IRWXU
+# extracted files are created rather than opened, never through a symlink
+CREATE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0)
+
+
+def open_archive(path: str | os.PathLike[str]) -> IO[bytes]:
+    """open a local tar archive for reading, decompressing it on the fly if it's gzip, bzip2 or xz compressed"""
+    with open(path, "rb") as f:
+        magic = f.read(6)
+    if magic.startswith(b"\x1f\x8b"):
+        return gzip.open(path, "rb")
+    if magic.startswith(b"BZh"):
+        return bz2.open(path, "rb")
+    if magic.startswith(b"\xfd7zXZ\x00"):
+        return lzma.open(path, "rb")
+    return open(path, "rb")
+
+
+def _parse_pax(data: bytes) -> dict[str, str]:
+    records = {}
+    pos = 0
+    while pos < len(data):
+        length, _, rest = data[pos:].partition(b" ")
+        if not length.isdigit() or int(length) == 0:
+            raise ArchiveError("malformed pax header")
+        key, _, value = rest[: int(length) - len(length) - 2].partition(b"=")
+        records[key.decode(ENCODING, ERRORS)] = value.decode(ENCODING, ERRORS)
+        pos += int(length)
+    return records
+
+
+class TarExtractor:
+    """
+    Extract a tar stream fed chunk by chunk, such as the one of CoreClient.archive_read_stream().
+
+    Directories, regular files, symlinks and hard links are extracted along with their modes and modification times.
+    GNU long names and pax headers are supported, and other entries are skipped. Entries escaping the destination,
+    by their names or through symlinks the destination or the archive itself holds, are refused.
+    """
+
+    def __init__(
+        self, root: str | os.PathLike[str], force: bool = True, on_data: Callable[[int], object] | None = None
+    ) -> None:
+        """
+        :param root: directory to extract into
+        :param force: overwrite existing files. otherwise they are skipped
+        :param on_data: called with the size of every piece of file content extracted
+        """
+        self.root = Path(root)
+        self._real_root = os.path.realpath(self.root)
+        self.files = 0
+        self.skipped = 0
+        self.bytes = 0
+        self._force = force
+        self._on_data = on_data
+        self._header = bytearray()
+        self._remaining = 0
+        self._padding = 0
+        self._file: IO[bytes] | None = None
+        self._file_entry: tuple[Path, tarfile.TarInfo] | None = None
+        self._extended: bytearray | None = None
+        self._extended_type = b""
+        self._overrides: dict[str, str] = {}
+        self._dirs: list[tuple[Path, tarfile.TarInfo]] = []
+        self._end = False
+
+    def feed(self, data: Buffer) -> None:
+        view = memoryview(data).cast("B")
+        while view and not self._end:
+            if self._remaining:
+                n = min(self._remaining, len(view))
+                if self._file is not None:
+                    self._file.write(view[:n])
+                    self.bytes += n
+                    if self._on_data is not None:
+                        self._on_data(n)
+                elif self._extended is not None:
+                    self._extended += view[:n]
+                self._remaining -= n
+                view = view[n:]
+            elif self._padding:
+                n = min(self._padding, len(view))
+                self._padding -= n
+                view = view[n:]
+            else:
+                n = BLOCK_SIZE - len(self._header)
+                self._header += view[:n]
+                view = view[n:]
+                if len(self._header) < BLOCK_SIZE:
+                    break
+                block = bytes(self._header)
+                self._header.clear()
+                self._start_entry(block)
+            if not self._remaining and not self._padding:
+                self._end_entry()
+
+    def close(self) -> None:
+        """apply the modes and times of the extracted directories, once their content is"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._header or self._remaining or self._padding:
+            raise ArchiveError("the archive is truncated")
+        for path, info in reversed(self._dirs):
+            os.chmod(path, info.mode)
+            os.utime(path, (info.mtime, info.mtime))
+
+    def abort(self) -> None:
+        """stop extracting after a failure, removing the file whose extraction was cut short"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._file_entry is not None:
+            self._file_entry[0].unlink(missing_ok=True)
+            self._file_entry = None
+
+    def _path(self, name: str) -> Path:
+        parts = [part for part in name.split("/") if part not in ("", ".")]
+        if ".." in parts:
+            raise ArchiveError(f"refusing to extract outside of the destination: {name}")
+        # earlier entries may have created symlinks, which mkdir() and open() would follow out of the destination
+        parent = self.root
+        for part in parts[:-1]:
+            parent = parent / part
+            if parent.is_symlink():
+                raise ArchiveError(f"refusing to extract through a symlink: {name}")
+        real_parent = os.path.realpath(parent)
+        if os.path.commonpath([self._real_root, real_parent]) != self._real_root:
+            raise ArchiveError(f"refusing to extract outside of the destination: {name}")
+        return self.root.joinpath(*parts)
+
+    def _start_entry(self, block: bytes) -> None:
+        try:
+            info = tarfile.TarInfo.frombuf(block, ENCODING, ERRORS)
+        except tarfile.EOFHeaderError:
+            self._end = True
+            return
+        except tarfile.HeaderError as e:
+            raise ArchiveError(f"invalid tar header: {e}") from e
+
+        overrides, self._overrides = self._overrides, {}
+        if "size" in overrides:
+            info.size = int(overrides["size"])
+        self._remaining = info.size
+        self._padding = -info.size % BLOCK_SIZE
+        if info.type in (tarfile.GNUTYPE_LONGNAME, tarfile.GNUTYPE_LONGLINK, tarfile.XHDTYPE):
+            self._extended = bytearray()
+            self._extended_type = info.type
+            return
+        if info.type == tarfile.XGLTYPE or not (info.isdir() or info.isreg() or info.issym() or info.islnk()):
+            return
+
+        info.name = overrides.get("path", info.name)
+        info.linkname = overrides.get("linkpath", info.linkname)
+        if "mtime" in overrides:
+            info.mtime = int(float(overrides["mtime"]))
+        path = self._path(info.name)
+        if info.isdir():
+            if path.is_symlink():
+                raise ArchiveError(f"refusing to extract through a symlink: {info.name}")
+            path.mkdir(OWNER_RWX, parents=True, exist_ok=True)
+            self._dirs.append((path, info))
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if os.path.lexists(path):
+            if not self._force:
+                self.skipped += 1
+                return
+            path.unlink()
+        self.files += 1
+        if info.issym():
+            os.symlink(info.linkname, path)
+        elif info.islnk():
+            os.link(self._path(info.linkname), path, follow_symlinks=False)
+        else:
+            self._file = os.fdopen(os.open(path, CREATE_FLAGS, 0o600), "wb")
+            self._file_entry = (path, info)
+
+    def _end_entry(self) -> None:
+        if self._file is not None and self._file_entry is not None:
+            self._file.close()
+            path, info = self._file_entry
+            os.chmod(path, info.mode)
+            os.utime(path, (info.mtime, info.mtime))
+            self._file = None
+            self._file_entry = None
+        if self._extended is not None:
+            data = bytes(self._extended)
+            self._extended = None
+            if self._extended_type == tarfile.GNUTYPE_LONGNAME:
+                self._overrides["path"] = data.rstrip(b"\0").decode(ENCODING, ERRORS)
+            elif self._extended_type == tarfile.GNUTYPE_LONGLINK:
+                self._overrides["linkpath"] = data.rstrip(b"\0").decode(ENCODING, ERRORS)
+            else:
+                self._overrides.update(_parse_pax(data))
@@ -66,13 +66,16 @@ class CaptureFD(Allocated["CoreClient[SymbolT_co]"], Generic[SymbolT_co]):
         """Read the bytes captured from `fd` so far."""
         data = b""
         if self._socket_pair is not None:
-            async with self._client.safe_malloc(READ_SIZE) as buff:
+            async with (
+                self._client.safe_malloc(READ_SIZE) as buff,
+                self._client.safe_malloc(pollfd.sizeof()) as pfds,
+            ):
+                # poll() only ever writes revents, so the pollfd is set once for all the reads
+                await pfds.poke(pollfd.build({"fd": self._socket_pair[1], "events": POLLIN, "revents": 0}))
                 read = READ_SIZE
                 while read == READ_SIZE:
-                    async with self._client.safe_malloc(pollfd.sizeof()) as pfds:
-                        await pfds.poke(pollfd.build({"fd": self._socket_pair[1], "events": POLLIN, "revents": 0}))
-                        if await self._client.symbols.poll(pfds, 1, 0) != 1:
-                            return data
+                    if await self._client.symbols.poll(pfds, 1, 0) != 1:
+                        return data
                     read = (await self._client.symbols.read(self._socket_pair[1], buff, READ_SIZE)).c_int32
                     if read == -1:
                         await self._client.raise_errno_exception("read fd failed")
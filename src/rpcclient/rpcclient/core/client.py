@@ -5,8 +5,9 @@ import dataclasses
 import logging
 import os
 import sys
-from collections.abc import AsyncGenerator, Callable, Coroutine, Iterable
-from contextlib import asynccontextmanager
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable, Coroutine, Generator, Iterable, Sequence
+from contextlib import asynccontextmanager, contextmanager, suppress
 from enum import Enum, auto
 from functools import cached_property, wraps
 from pathlib import Path, PurePath
@@ -31,6 +32,9 @@ from construct import Container
 
 from rpcclient.clients.darwin.consts import BLOCK_IS_GLOBAL
 from rpcclient.core.capture_fd import CaptureFD
+from rpcclient.core.memory_cache import DEFAULT_MEMORY_CACHE_MAX_BYTES, DEFAULT_MEMORY_CACHE_PAGE_SIZE, MemoryCache
+from rpcclient.core.release_queue import NO_VA_LIST, REQ_CALL_MULTI, ReleaseQueue
+from rpcclient.core.remote_function import ArgumentEncoder, RemoteFunction
 from rpcclient.core.structs.consts import (
     EAGAIN,
     ECONNREFUSED,
@@ -43,14 +47,15 @@ from rpcclient.core.structs.consts import (
     EPIPE,
     RTLD_NEXT,
 )
-from rpcclient.core.structs.generic import block_descriptor, block_literal
+from rpcclient.core.structs.generic import Dl_info, block_descriptor, block_literal
 from rpcclient.core.subsystems.decorator import subsystem
-from rpcclient.core.subsystems.fs import Fs
+from rpcclient.core.subsystems.fs import DEFAULT_WATCH_POLL_TIMEOUT, FILE_CHUNK_SIZE, FileEvent, FileEventType, Fs
 from rpcclient.core.subsystems.lief import Lief
 from rpcclient.core.subsystems.network import Network
 from rpcclient.core.subsystems.processes import Processes
 from rpcclient.core.subsystems.sysctl import Sysctl
 from rpcclient.core.symbol import Symbol
+from rpcclient.core.symbol_cache import CachedSymbol, SymbolCache, SymbolCacheScope
 from rpcclient.core.symbols_jar import (
     LazySymbol,
     SymbolsJar,
@@ -61,6 +66,7 @@ from rpcclient.event_notifier import EventNotifier
 from rpcclient.exceptions import (
     ArgumentError,
     BadReturnValueError,
+    FailedToConnectError,
     RpcBrokenPipeError,
     RpcConnectionRefusedError,
     RpcFileExistsError,
@@ -70,11 +76,12 @@ from rpcclient.exceptions import (
     RpcNotEmptyError,
     RpcPermissionError,
     RpcResourceTemporarilyUnavailableError,
+    ServerDiedError,
     ServerResponseError,
     SpawnError,
 )
 from rpcclient.protocol.rpc_bridge import RpcBridge
-from rpcclient.protos.rpc_api_pb2 import Argument, MsgId
+from rpcclient.protos.rpc_api_pb2 import Argument, ListDirStat, MsgId, RequestCall, TreeOperation, WalkFilter
 from rpcclient.protos.rpc_pb2 import ProtocolConstants
 
 
@@ -98,6 +105,7 @@ class SpawnResult(NamedTuple):
 
 INVALID_PID = 0xFFFFFFFF
 CHUNK_SIZE = 1024
+DEFAULT_HEARTBEAT_INTERVAL = 5.0
 
 USAGE = """
 Welcome to the rpcclient interactive shell! You interactive shell for controlling the remote rpcserver.
@@ -134,13 +142,43 @@ class ProtocolDirent:
     d_inode: int
     d_type: int
     d_name: str
-    lstat: ProtocolDitentStat
-    stat: ProtocolDitentStat
+    lstat: ProtocolDitentStat | None
+    stat: ProtocolDitentStat | None
+
+
+@dataclasses.dataclass
+class ProtocolWalkDir:
+    path: str
+    errno: int
+    entries: list[ProtocolDirent]
+
+
+@dataclasses.dataclass
+class DiskUsage:
+    path: str
+    size: int  # sum of the apparent sizes, in bytes
+    blocks: int  # sum of the allocated 512-byte blocks
+    files: int  # number of non-directories
+    dirs: int  # number of directories, this one included
+    errors: int  # number of entries which could not be read
+
+    @property
+    def disk_usage(self) -> int:
+        """allocated size, in bytes"""
+        return self.blocks * 512
+
+
+@dataclasses.dataclass
+class TreeOperationResult:
+    count: int  # number of paths operated on
+    failed: int  # number of paths which could not be read or operated on
+    failures: list[tuple[str, int]]  # path and errno of the first failures
 
 
 class ClientEvent(Enum):
     CREATED = auto()
     TERMINATED = auto()
+    RECONNECTED = auto()
 
 
 SelfT = TypeVar("SelfT")
@@ -170,6 +208,9 @@ def null_pointer_guard(
     return wrapper
 
 
+# looked up once, protobuf enum attributes being slow to get on the call hot path
+REQ_CALL = MsgId.REQ_CALL
+
 RemoteCallArg: TypeAlias = LazySymbol | float | str | int | bytes | Enum | PurePath
 
 
@@ -178,6 +219,9 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
 
     DEFAULT_ARGV: ClassVar[list[str]] = ["/bin/sh"]
     DEFAULT_ENVP: ClassVar[list[str]] = []
+    # when set, the addresses of the symbols resolved in the images of symbol_cache_scope() are persisted into it, and
+    # loaded by the next clients of the same images. set it on the class to share it among all clients
+    symbol_cache: SymbolCache | None = None
 
     def __init__(self, bridge: RpcBridge, dlsym_global_handle: int = RTLD_NEXT) -> None:
         self._bridge: RpcBridge = bridge
@@ -189,6 +233,21 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
         self.pre_rpc_call_hooks: list[Callable[[], Coroutine[Any, Any, object]]] = []
         self._protocol_lock: asyncio.Lock = asyncio.Lock()
 
+        # reconnect support: how to dial a new worker, and the state to restore on it
+        self.reconnect_factory: Callable[[], Awaitable[RpcBridge]] | None = None
+        self.auto_reconnect: bool = False
+        self._reconnect_lock: asyncio.Lock = asyncio.Lock()
+        self._loaded_libraries: dict[str, int] = {}
+        self._heartbeat_task: asyncio.Task | None = None
+        self._symbol_cache_scope: SymbolCacheScope | None = None
+        self._cached_symbols: dict[str, CachedSymbol] = {}
+        # Symbol subclasses bound to this client, see Symbol.bound_to()
+        self._bound_symbol_types: dict[type, type] = {}
+        # read caches of the active memory_cache() scopes, the innermost last
+        self._memory_caches: list[MemoryCache] = []
+        # releases of remote resources deferred to be made in batches, see defer_release()
+        self.release_queue: ReleaseQueue = ReleaseQueue(self)
+
     @asynccontextmanager
     async def _acquire_protocol_lock(self) -> AsyncGenerator[None]:
         async with self._protocol_lock:
@@ -204,7 +263,9 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
 
     @classmethod
     async def create(cls, bridge: RpcBridge) -> Self:
-        return cls(bridge)
+        self = cls(bridge)
+        await self.load_symbol_cache()
+        return self
 
     @subsystem
     @abc.abstractmethod
@@ -291,17 +352,157 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
             if hooks:
                 self.pre_rpc_call_hooks[:0] = hooks
 
+        bridge = self._bridge
         try:
-            return await self._bridge.rpc_call(msg_id, **kwargs)
-        except ConnectionError:
-            self.notifier.notify(ClientEvent.TERMINATED, self.id)
+            if self.release_queue:
+                return await self._rpc_call_with_releases(bridge, msg_id, kwargs)
+            return await bridge.rpc_call(msg_id, **kwargs)
+        except (ConnectionError, ServerDiedError):
+            await self._on_connection_lost(bridge)
             raise
         except ServerResponseError:
             raise
 
+    async def _rpc_call_with_releases(self, bridge: RpcBridge, msg_id: int, kwargs: dict[str, Any]) -> Any:
+        """make a request in the same roundtrip as the deferred releases, which are served first"""
+        calls = self.release_queue.take()
+        try:
+            released, reply = await bridge.rpc_call_pipelined([(REQ_CALL_MULTI, {"calls": calls}), (msg_id, kwargs)])
+        finally:
+            self._invalidate_memory_caches_on_call()
+        if isinstance(released, ServerResponseError):
+            self._logger.warning(f"failed to make {len(calls)} deferred releases: {released}")
+        if isinstance(reply, ServerResponseError):
+            raise reply
+        return reply
+
+    async def ping(self) -> float:
+        """Send a keepalive probe and return the round-trip time in seconds."""
+        start = time.monotonic()
+        await self.rpc_call(MsgId.REQ_PING)
+        return time.monotonic() - start
+
+    def start_heartbeat(self, interval: float = DEFAULT_HEARTBEAT_INTERVAL, timeout: float | None = None) -> None:
+        """
+        Probe the connection whenever it has been idle for `interval` seconds.
+
+        A probe that isn't answered within `timeout` seconds (defaults to `interval`) marks the peer as dead. The
+        client then either reconnects (see `auto_reconnect`) or fires `ClientEvent.TERMINATED`.
+        Must be called from within the event loop driving this client.
+
+        :param interval: idle time in seconds before a probe is sent
+        :param timeout: time in seconds to wait for the probe's reply
+        """
+        self.stop_heartbeat()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(
+            self._heartbeat(interval, interval if timeout is None else timeout)
+        )
+
+    def stop_heartbeat(self) -> None:
+        """Stop the heartbeat started by `start_heartbeat`, if any."""
+        task, self._heartbeat_task = self._heartbeat_task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _heartbeat(self, interval: float, timeout: float) -> None:
+        while True:
+            sock = self._bridge.sock
+            idle = time.monotonic() - sock.last_activity
+            if idle < interval:
+                await asyncio.sleep(interval - idle)
+                continue
+            if sock.busy or self._protocol_lock.locked():
+                # a request (or pty session) owns the socket; its own failure will surface the dead peer
+                await asyncio.sleep(interval)
+                continue
+
+            bridge = self._bridge
+            try:
+                await asyncio.wait_for(bridge.rpc_call(MsgId.REQ_PING), timeout)
+            except (asyncio.TimeoutError, ConnectionError, ServerDiedError) as e:
+                self._logger.warning(f"heartbeat failed for client {self.id}")
+                if isinstance(e, asyncio.TimeoutError):
+                    # the reply to the abandoned ping may still arrive, and would be taken for another request's
+                    with suppress(Exception):
+                        bridge.close()
+                if not await self._on_connection_lost(bridge):
+                    return
+
+    async def _on_connection_lost(self, bridge: RpcBridge) -> bool:
+        """
+        Handle a dead connection: reconnect if configured to, otherwise announce termination.
+
+        :param bridge: the bridge the failure was observed on
+        :return: whether the client is usable again
+        """
+        if self._reconnect_lock.locked():
+            # the failure happened while restoring state on a fresh connection; let the reconnect itself fail
+            return False
+        if self.auto_reconnect and self.reconnect_factory is not None:
+            try:
+                await self._reconnect(bridge)
+            except Exception:
+                self._logger.exception(f"failed to reconnect client {self.id}")
+            else:
+                return True
+        self.stop_heartbeat()
+        self.notifier.notify(ClientEvent.TERMINATED, self.id)
+        return False
+
+    async def reconnect(self) -> None:
+        """
+        Replace the current connection with a new worker and restore client-side state on it.
+
+        Previously loaded libraries are re-opened and cached symbols are revalidated. Remote memory (allocations,
+        objects, file descriptors) belonged to the old worker and is gone. Fires `ClientEvent.RECONNECTED` with the
+        old client ID and this client.
+        """
+        await self._reconnect(self._bridge)
+
+    async def connect_sibling(self) -> Self:
+        """
+        Connect an additional worker of the same server, through the transport this client was created with.
+
+        Each worker serves its own connection, so requests sent over siblings are served in parallel. The caller owns
+        the returned client and should close() it.
+        """
+        if self.reconnect_factory is None:
+            raise FailedToConnectError("client was not created with a transport to dial additional workers with")
+        sibling = await type(self).create(bridge=await self.reconnect_factory())
+        sibling.reconnect_factory = self.reconnect_factory
+        return sibling
+
+    async def _reconnect(self, stale: RpcBridge) -> None:
+        if self.reconnect_factory is None:
+            raise ServerDiedError("client has no reconnect factory")
+        async with self._reconnect_lock:
+            if self._bridge is not stale:
+                # another task already replaced this connection
+                return
+            old_id = self.id
+            with suppress(Exception):
+                stale.close()
+            self._bridge = await self.reconnect_factory()
+            self._cached_pid = None
+            self.invalidate_memory_caches()
+            self.release_queue.clear()
+            await self._restore_state()
+        self._logger.info(f"client {old_id} reconnected as {self.id}")
+        self.notifier.notify(ClientEvent.RECONNECTED, old_id, self)
+
+    async def _restore_state(self) -> None:
+        """Rebuild client-side caches on a freshly connected worker."""
+        for filename, mode in list(self._loaded_libraries.items()):
+            await self.dlopen(filename, mode)
+        await self.symbols.revalidate()
+
     async def dlopen(self, filename: str, mode: int) -> SymbolT_co:
         """Load a shared library on the remote host and return its handle."""
-        return self.symbol((await self.rpc_call(MsgId.REQ_DLOPEN, filename=filename, mode=mode)).handle)
+        handle = self.symbol((await self.rpc_call(MsgId.REQ_DLOPEN, filename=filename, mode=mode)).handle)
+        if handle:
+            # remembered so a reconnect can load it again
+            self._loaded_libraries[filename] = mode
+        return handle
 
     async def dlclose(self, lib: int) -> int:
         """Close a previously opened remote library handle."""
@@ -314,6 +515,94 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
         """
         return (await self.rpc_call(MsgId.REQ_DLSYM, handle=ctypes.c_uint64(lib).value, symbol_name=symbol_name)).ptr
 
+    async def dlsym_multi(self, lib: int, symbol_names: Iterable[str]) -> list[int]:
+        """Resolve several symbol names in a remote library handle in a single roundtrip.
+
+        :return: the address of every name, in order, 0 for the absent ones
+        """
+        symbol_names = list(symbol_names)
+        if not symbol_names:
+            return []
+        ret = await self.rpc_call(MsgId.REQ_DLSYM_MULTI, handle=ctypes.c_uint64(lib).value, symbol_names=symbol_names)
+        return list(ret.ptrs)
+
+    async def symbol_cache_scope(self) -> SymbolCacheScope | None:
+        """images whose symbol addresses only depend on their identity, None if there are none"""
+        return None
+
+    async def load_symbol_cache(self) -> int:
+        """
+        Populate the symbols jar from symbol_cache, sparing the resolution of the symbols cached by previous clients.
+
+        Symbols whose image isn't loaded by this process are left out, the images being checked in a single
+        REQ_CALL_MULTI.
+
+        :return: number of symbols loaded
+        """
+        if self.symbol_cache is None:
+            return 0
+        self._symbol_cache_scope = await self.symbol_cache_scope()
+        if self._symbol_cache_scope is None:
+            return 0
+        cached = self.symbol_cache.load(self._symbol_cache_scope.key)
+        images = list({symbol.image for symbol in cached.values()})
+        loaded = {image for image, base in zip(images, await self._image_bases(images), strict=True) if base == image}
+        # e.g. symbols of frameworks another process loaded, which are absent here
+        self._cached_symbols = {name: symbol for name, symbol in cached.items() if symbol.image in loaded}
+        for name, symbol in self._cached_symbols.items():
+            if name not in self.symbols:
+                self.symbols[name] = symbol.address
+        return len(self._cached_symbols)
+
+    async def save_symbol_cache(self) -> None:
+        """Persist the resolved symbols within the images of symbol_cache_scope() into symbol_cache, with their images."""
+        scope = self._symbol_cache_scope
+        if self.symbol_cache is None or scope is None:
+            return
+        resolved = {name: int(self.symbols[name]) for name in self.symbols}
+        new = {
+            name: address
+            for name, address in resolved.items()
+            if address in scope and (name not in self._cached_symbols or self._cached_symbols[name].address != address)
+        }
+        images = await self._image_bases(list(new.values()))
+        symbols = {
+            name: CachedSymbol(address, image)
+            for (name, address), image in zip(new.items(), images, strict=True)
+            if image
+        }
+        self.symbol_cache.store(scope.key, symbols)
+        self._cached_symbols.update(symbols)
+
+    async def _image_bases(self, addresses: Sequence[int]) -> list[int]:
+        """
+        Look up the loaded images containing addresses with dladdr(), in a single REQ_CALL_MULTI.
+
+        :return: the base address of the image of every address, in order, 0 for the ones in no loaded image
+        """
+        if not addresses:
+            return []
+        dl_info_size = Dl_info(self).sizeof()
+        pointer_size = dl_info_size // 4
+        dladdr = int(await self.symbols.dladdr.resolve())
+        async with self.safe_malloc(dl_info_size * len(addresses)) as infos:
+            calls = [
+                RequestCall(
+                    address=dladdr,
+                    va_list_index=NO_VA_LIST,
+                    argv=await self._encode_arguments([address, infos + index * dl_info_size]),
+                )
+                for index, address in enumerate(addresses)
+            ]
+            found = (await self.rpc_call(REQ_CALL_MULTI, calls=calls)).return_values
+            raw = await infos.peek(dl_info_size * len(addresses))
+        byteorder = "little" if self._endianness == "<" else "big"
+        # dli_fbase follows dli_fname
+        return [
+            int.from_bytes(raw[offset + pointer_size : offset + 2 * pointer_size], byteorder) if ok else 0
+            for ok, offset in zip(found, range(0, len(raw), dl_info_size), strict=True)
+        ]
+
     @null_pointer_guard
     async def call(
         self,
@@ -325,15 +614,60 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
         va_list_index: int | None = None,
     ) -> float | SymbolT_co | Any:
         """call a remote function and retrieve its return value as a Symbol object"""
-        if va_list_index is None:
-            va_list_index = 0xFFFF
+        ret = await self._call(address, await self._encode_arguments(argv), va_list_index)
+        if ret.HasField("arm_registers"):
+            d0 = ret.arm_registers.d0
+            if return_float32:
+                return ctypes.c_float(d0).value
+            if return_float64:
+                return d0
+            if return_raw:
+                return ret.arm_registers
+            return self.symbol(ret.arm_registers.x0)
+        return self.symbol(ret.return_value)
+
+    async def function(
+        self,
+        symbol: str | int,
+        argtypes: Sequence[type[ctypes._SimpleCData] | None] = (),
+        restype: type[ctypes._SimpleCData] | None = ctypes.c_void_p,
+        va_list_index: int | None = None,
+    ) -> RemoteFunction[SymbolT_co]:
+        """
+        Get a remote function of a known signature, whose calls skip the per-argument dispatch of call().
+
+            strlen = await client.function("strlen", [ctypes.c_char_p], ctypes.c_size_t)
+            length = await strlen("hello")
 
+        :param symbol: name or address of the function, resolved once
+        :param argtypes: ctypes types of the fixed arguments: integers, c_void_p, c_char_p or c_double
+        :param restype: ctypes type of the return value: an integer, c_void_p, c_char_p, c_double, c_float, or None
+        :param va_list_index: index of the first variadic argument
+        """
+        address = await self.symbols[symbol].resolve() if isinstance(symbol, str) else self.symbol(symbol)
+        return address.bind(argtypes, restype, va_list_index)
+
+    async def _encode_arguments(
+        self, argv: Iterable[RemoteCallArg], encoders: Sequence[ArgumentEncoder] | None = None
+    ) -> list[Argument]:
+        """
+        Encode call arguments, resolving lazy symbols.
+
+        :param argv: arguments
+        :param encoders: encoders of the arguments, by position, or None to pick them by type
+        """
         args: list[Argument] = []
-        for arg in argv:
+        for index, arg in enumerate(argv):
             if isinstance(arg, LazySymbol):
                 arg = int(await arg.resolve())
 
-            if isinstance(arg, float):
+            if encoders is not None:
+                try:
+                    args.append(encoders[index](arg.value if isinstance(arg, Enum) else arg))
+                except TypeError as e:
+                    message = f"Can't serialize object of type {type(arg).__name__} as argument {index}"
+                    raise ArgumentError(message) from e
+            elif isinstance(arg, float):
                 args.append(Argument(v_double=arg))
             elif isinstance(arg, str):
                 args.append(Argument(v_str=arg))
@@ -348,22 +682,43 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
             else:
                 assert_never(arg)
                 raise ArgumentError(f"Can't serialize object of type {type(arg).__name__}")
+        return args
 
-        ret = await self.rpc_call(MsgId.REQ_CALL, address=address, va_list_index=va_list_index, argv=args)
-        if ret.HasField("arm_registers"):
-            d0 = ret.arm_registers.d0
-            if return_float32:
-                return ctypes.c_float(d0).value
-            if return_float64:
-                return d0
-            if return_raw:
-                return ret.arm_registers
-            return self.symbol(ret.arm_registers.x0)
-        return self.symbol(ret.return_value)
+    @null_pointer_guard
+    async def _call(self, address: int, argv: list[Argument], va_list_index: int | None = None) -> Any:
+        """call a remote function with encoded arguments and retrieve the raw reply"""
+        if va_list_index is None:
+            va_list_index = 0xFFFF
+        try:
+            return await self.rpc_call(REQ_CALL, address=address, va_list_index=va_list_index, argv=argv)
+        finally:
+            self._invalidate_memory_caches_on_call()
+
+    async def defer_release(self, function: LazySymbol | int, *args: RemoteCallArg) -> None:
+        """
+        Call a function releasing a remote resource later, along with the other deferred releases, e.g.:
+
+            await client.defer_release(client.symbols.free, ptr)
+
+        The call is sent along with the next request of the client and served right before it, or on its own once the
+        client has been idle for a while, so it costs no roundtrip of its own. Its return value is discarded. See
+        `release_queue` for the limits.
+
+        :param function: function releasing the resource
+        :param args: arguments of the function
+        """
+        if isinstance(function, LazySymbol):
+            function = await function.resolve()
+        await self.release_queue.defer(int(function), await self._encode_arguments(args))
 
     @null_pointer_guard
     async def peek(self, address: int, size: int) -> bytes:
-        """peek data at the given address"""
+        """peek data at the given address, through the innermost memory_cache() scope if any"""
+        if self._memory_caches:
+            return await self._memory_caches[-1].peek(self._peek, address, size)
+        return await self._peek(address, size)
+
+    async def _peek(self, address: int, size: int) -> bytes:
         try:
             return (await self.rpc_call(MsgId.REQ_PEEK, address=address, size=size)).data
         except ServerResponseError as e:
@@ -376,6 +731,54 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
             return await self.rpc_call(MsgId.REQ_POKE, address=address, data=data)
         except ServerResponseError as e:
             raise ArgumentError() from e
+        finally:
+            self.invalidate_memory_caches(address, len(data))
+
+    def _invalidate_memory_caches_on_call(self) -> None:
+        # after the call rather than before, so pages peeked by other tasks meanwhile are dropped too
+        for cache in self._memory_caches:
+            if cache.invalidate_on_call:
+                cache.clear()
+
+    @contextmanager
+    def memory_cache(
+        self,
+        page_size: int = DEFAULT_MEMORY_CACHE_PAGE_SIZE,
+        max_bytes: int = DEFAULT_MEMORY_CACHE_MAX_BYTES,
+        invalidate_on_call: bool = True,
+    ) -> Generator[MemoryCache]:
+        """
+        Serve the peeks made within the context from a read cache, sparing a roundtrip per read of the same memory.
+
+        The cache applies to every peek made through this client while active, e.g. by other tasks. Only the pages
+        poked through this client are invalidated, along with all of them on every call if invalidate_on_call is set:
+        scope it to memory nothing else writes to meanwhile, or invalidate it explicitly.
+
+        :param page_size: number of bytes fetched per page, a power of 2 no larger than the remote page size
+        :param max_bytes: maximal number of bytes cached, the least recently used pages being evicted beyond it
+        :param invalidate_on_call: drop the whole cache after every call, since the called function may write to memory
+        :return: the cache, counting its hits and misses
+        """
+        cache = MemoryCache(page_size=page_size, max_bytes=max_bytes, invalidate_on_call=invalidate_on_call)
+        self._memory_caches.append(cache)
+        try:
+            yield cache
+        finally:
+            self._memory_caches.remove(cache)
+            cache.clear()
+
+    def invalidate_memory_caches(self, address: int | None = None, size: int = 0) -> None:
+        """
+        Drop the pages overlapping a range from the active memory caches, e.g. once written to by other means.
+
+        :param address: address the range starts at, None to drop every page
+        :param size: size of the range
+        """
+        for cache in self._memory_caches:
+            if address is None:
+                cache.clear()
+            else:
+                cache.invalidate(address, size)
 
     async def get_dummy_block(self) -> SymbolT_co:
         """Get an address for a stub block containing nothing"""
@@ -398,57 +801,434 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
 
         return block
 
-    async def listdir(self, path: str | PurePath) -> list[ProtocolDirent]:
-        """get an address for a stub block containing nothing"""
+    async def listdir(
+        self, path: str | PurePath, stat_mode: ListDirStat.ValueType = ListDirStat.LIST_DIR_STAT_BOTH
+    ) -> list[ProtocolDirent]:
+        """
+        List a remote directory in a single roundtrip.
+
+        :param path: directory to list
+        :param stat_mode: which stat information to collect for each entry:
+            LIST_DIR_STAT_BOTH - lstat and stat, LIST_DIR_STAT_LSTAT - lstat only,
+            LIST_DIR_STAT_NONE - names, types and inodes only (stat fields are set to None)
+        """
         entries: list[ProtocolDirent] = []
         try:
-            ret = await self.rpc_call(MsgId.REQ_LIST_DIR, path=str(path))
+            ret = await self.rpc_call(MsgId.REQ_LIST_DIR, path=str(path), stat_mode=stat_mode)
         except ServerResponseError:
             await self.raise_errno_exception(f"failed to listdir: {path}")
 
         for entry in ret.dir_entries:
-            lstat = ProtocolDitentStat(
-                errno=entry.lstat.errno1,
-                st_blocks=entry.lstat.st_blocks,
-                st_blksize=entry.lstat.st_blksize,
-                st_atime=entry.lstat.st_atime1,
-                st_ctime=entry.lstat.st_ctime1,
-                st_mtime=entry.lstat.st_mtime1,
-                st_nlink=entry.lstat.st_nlink,
-                st_mode=entry.lstat.st_mode,
-                st_rdev=entry.lstat.st_rdev,
-                st_size=entry.lstat.st_size,
-                st_dev=entry.lstat.st_dev,
-                st_gid=entry.lstat.st_gid,
-                st_ino=entry.lstat.st_ino,
-                st_uid=entry.lstat.st_uid,
+            entries.append(self._dirent(entry, stat_mode))
+        return entries
+
+    async def walk(
+        self,
+        path: str | PurePath,
+        max_depth: int | None = None,
+        follow_symlinks: bool = False,
+        xdev: bool = False,
+        include: Iterable[str] = (),
+        exclude: Iterable[str] = (),
+        stat_mode: ListDirStat.ValueType = ListDirStat.LIST_DIR_STAT_BOTH,
+        batch_size: int | None = None,
+        prune: set[str] | None = None,
+        walk_filter: WalkFilter | None = None,
+    ) -> AsyncGenerator[ProtocolWalkDir]:
+        """
+        Walk a remote tree server-side, yielding its directories in os.walk() topdown order.
+
+        The entries are streamed in batches, each costing a single roundtrip, instead of a listdir per directory.
+
+        :param path: root of the walk
+        :param max_depth: deepest level to list, the root's entries being at depth 1. None for unlimited
+        :param follow_symlinks: descend into symlinks to directories
+        :param xdev: don't descend into directories on other devices than the root
+        :param include: fnmatch patterns a non-directory entry name must match to be listed
+        :param exclude: fnmatch patterns of entry names to skip, and not to descend into
+        :param stat_mode: which stat information to collect for each entry, see listdir()
+        :param batch_size: maximal number of entries per roundtrip, or None for the server's default
+        :param prune: directory paths not to descend into. It may be filled while iterating, and is drained on every
+            roundtrip
+        :param walk_filter: predicates evaluated server-side, reporting only the matching entries and only the
+            directories holding some. Directories are still descended into regardless
+        """
+        request: dict[str, Any] = {
+            "path": str(path),
+            "max_depth": max_depth or 0,
+            "follow_symlinks": follow_symlinks,
+            "xdev": xdev,
+            "include": list(include),
+            "exclude": list(exclude),
+            "stat_mode": stat_mode,
+            "batch_size": batch_size or 0,
+            "filter": walk_filter,
+        }
+        try:
+            ret = await self.rpc_call(MsgId.REQ_WALK, **request)
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to walk: {path}")
+
+        current: ProtocolWalkDir | None = None
+        try:
+            while True:
+                for walk_dir in ret.dirs:
+                    entries = [self._dirent(entry, stat_mode) for entry in walk_dir.entries]
+                    if current is not None and current.path == walk_dir.path:
+                        # a directory larger than a batch is continued in the next one
+                        current.entries.extend(entries)
+                        current.errno = current.errno or walk_dir.errno1
+                        continue
+                    if current is not None:
+                        yield current
+                    current = ProtocolWalkDir(path=walk_dir.path, errno=walk_dir.errno1, entries=entries)
+                if ret.done:
+                    break
+                pruned = list(prune) if prune else []
+                if prune:
+                    prune.clear()
+                ret = await self.rpc_call(MsgId.REQ_WALK, handle=ret.handle, prune=pruned)
+            if current is not None:
+                yield current
+        finally:
+            if not ret.done:
+                with suppress(ConnectionError, ServerDiedError, ServerResponseError):
+                    await self.rpc_call(MsgId.REQ_WALK, handle=ret.handle, close=True)
+
+    async def file_read(self, fd: int, size: int, offset: int | None = None) -> bytes:
+        """
+        Read from a remote fd in a single roundtrip, without going through a remote buffer.
+
+        :param fd: file descriptor to read from
+        :param size: number of bytes to read. less are returned on EOF, or when a file other than a regular one
+            (e.g. a pipe or a socket) has less available
+        :param offset: pread() at the given offset instead of reading from the current position
+        """
+        data, _eof = await self.file_read_chunk(fd, size, offset)
+        return data
+
+    async def file_read_chunk(self, fd: int, size: int, offset: int | None = None) -> tuple[bytes, bool]:
+        """
+        file_read(), also telling whether EOF was reached.
+
+        :param fd: file descriptor to read from
+        :param size: number of bytes to read
+        :param offset: pread() at the given offset instead of reading from the current position
+        :return: the data read, and whether EOF was reached
+        """
+        try:
+            ret = await self.rpc_call(
+                MsgId.REQ_FILE_READ, fd=fd, size=size, use_offset=offset is not None, offset=offset or 0
             )
-            stat = ProtocolDitentStat(
-                errno=entry.stat.errno1,
-                st_blocks=entry.stat.st_blocks,
-                st_blksize=entry.stat.st_blksize,
-                st_atime=entry.stat.st_atime1,
-                st_ctime=entry.stat.st_ctime1,
-                st_mtime=entry.stat.st_mtime1,
-                st_nlink=entry.stat.st_nlink,
-                st_mode=entry.stat.st_mode,
-                st_rdev=entry.stat.st_rdev,
-                st_size=entry.stat.st_size,
-                st_dev=entry.stat.st_dev,
-                st_gid=entry.stat.st_gid,
-                st_ino=entry.stat.st_ino,
-                st_uid=entry.stat.st_uid,
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to read fd: {fd}")
+        return ret.data, ret.eof
+
+    async def file_write(self, fd: int, data: Buffer, offset: int | None = None) -> int:
+        """
+        Write the whole buffer to a remote fd in a single roundtrip.
+
+        :param fd: file descriptor to write to
+        :param data: data to write
+        :param offset: pwrite() at the given offset instead of writing at the current position
+        :return: number of bytes written
+        """
+        try:
+            ret = await self.rpc_call(
+                MsgId.REQ_FILE_WRITE, fd=fd, data=bytes(data), use_offset=offset is not None, offset=offset or 0
             )
-            entries.append(
-                ProtocolDirent(
-                    d_inode=entry.lstat.st_ino,
-                    d_type=entry.d_type,
-                    d_name=entry.d_name,
-                    lstat=lstat,
-                    stat=stat,
-                )
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to write fd: {fd}")
+        return ret.size
+
+    async def file_read_stream(self, path: str | PurePath, chunk_size: int = FILE_CHUNK_SIZE) -> AsyncGenerator[bytes]:
+        """
+        Stream a whole remote file. The file is opened by the first request and closed by the last one, so a file
+        smaller than chunk_size costs a single roundtrip.
+
+        :param path: file to read
+        :param chunk_size: number of bytes read per roundtrip
+        """
+        try:
+            ret = await self.rpc_call(MsgId.REQ_FILE_READ, path=str(path), size=chunk_size, close=True)
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to read: {path}")
+
+        fd = ret.fd
+        closed = ret.eof
+        try:
+            while True:
+                if ret.data:
+                    yield ret.data
+                if ret.eof:
+                    break
+                try:
+                    ret = await self.rpc_call(MsgId.REQ_FILE_READ, fd=fd, size=chunk_size, close=True)
+                except ServerResponseError:
+                    # the server closes the fd on failure
+                    closed = True
+                    await self.raise_errno_exception(f"failed to read: {path}")
+                closed = ret.eof
+        finally:
+            if not closed:
+                with suppress(ConnectionError, ServerDiedError):
+                    await self.defer_release(self.symbols.close, fd)
+
+    async def file_write_stream(
+        self,
+        path: str | PurePath,
+        chunks: Iterable[Buffer],
+        access: int = 0o777,
+        on_written: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Write a whole remote file from the given chunks, one roundtrip each. The file is created (or truncated) by
+        the first request and closed by the last one.
+
+        :param path: file to write
+        :param chunks: data to write, read one chunk ahead of the one being written
+        :param access: mode to create the file with
+        :param on_written: called with the size of each chunk once its write is acknowledged
+        :return: number of bytes written
+        """
+        fd: int | None = None
+        total = 0
+        chunks = iter(chunks)
+        chunk: Buffer | None = next(chunks, b"")
+        try:
+            while chunk is not None:
+                next_chunk = next(chunks, None)
+                target = {"path": str(path), "access": access} if fd is None else {"fd": fd}
+                try:
+                    ret = await self.rpc_call(
+                        MsgId.REQ_FILE_WRITE, data=bytes(chunk), close=next_chunk is None, **target
+                    )
+                except ServerResponseError:
+                    await self.raise_errno_exception(f"failed to write: {path}")
+                fd = ret.fd
+                total += ret.size
+                if on_written is not None:
+                    on_written(ret.size)
+                chunk = next_chunk
+        except BaseException:
+            # the server closes the fd on failure only when it opened it or was asked to close it
+            if fd is not None and chunk is not None and next_chunk is not None:
+                with suppress(ConnectionError, ServerDiedError):
+                    await self.defer_release(self.symbols.close, fd)
+            raise
+        return total
+
+    async def archive_read_stream(
+        self, path: str | PurePath, chunk_size: int = FILE_CHUNK_SIZE
+    ) -> AsyncGenerator[bytes]:
+        """
+        Stream a GNU tar archive of a remote tree, generated server-side. The entries are named relative to the
+        parent of path, and the stream costs a roundtrip per chunk_size bytes, regardless of the number of files.
+        The links of a file after its first one are emitted as hard links to it.
+
+        :param path: root of the tree. it is followed if it's a symlink
+        :param chunk_size: number of bytes read per roundtrip
+        """
+        try:
+            ret = await self.rpc_call(MsgId.REQ_ARCHIVE_READ, path=str(path), size=chunk_size)
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to archive: {path}")
+
+        handle = ret.handle
+        done = ret.eof
+        try:
+            while True:
+                if ret.data:
+                    yield ret.data
+                if ret.eof:
+                    break
+                try:
+                    ret = await self.rpc_call(MsgId.REQ_ARCHIVE_READ, handle=handle, size=chunk_size)
+                except ServerResponseError:
+                    # the server releases the archive on failure
+                    done = True
+                    await self.raise_errno_exception(f"failed to archive: {path}")
+                done = ret.eof
+        finally:
+            if not done:
+                with suppress(ConnectionError, ServerDiedError, ServerResponseError):
+                    await self.rpc_call(MsgId.REQ_ARCHIVE_READ, handle=handle, close=True)
+
+    async def archive_write_stream(self, path: str | PurePath, chunks: Iterable[Buffer]) -> None:
+        """
+        Extract a tar archive into a remote directory, server-side, from the given chunks, one roundtrip each.
+
+        :param path: directory to extract into, created if missing
+        :param chunks: the archive's data, in GNU or POSIX tar format
+        """
+        handle = 0
+        chunks = iter(chunks)
+        chunk: Buffer | None = next(chunks, b"")
+        try:
+            while chunk is not None:
+                next_chunk = next(chunks, None)
+                target = {"path": str(path)} if handle == 0 else {"handle": handle}
+                try:
+                    ret = await self.rpc_call(
+                        MsgId.REQ_ARCHIVE_WRITE, data=bytes(chunk), close=next_chunk is None, **target
+                    )
+                except ServerResponseError:
+                    # the server releases the extraction on failure
+                    handle = 0
+                    await self.raise_errno_exception(f"failed to extract archive into: {path}")
+                handle = ret.handle
+                chunk = next_chunk
+        except BaseException:
+            if handle != 0 and chunk is not None:
+                # applies whatever was extracted so far, and releases the extraction
+                with suppress(ConnectionError, ServerDiedError, ServerResponseError):
+                    await self.rpc_call(MsgId.REQ_ARCHIVE_WRITE, handle=handle, close=True)
+            raise
+
+    async def file_hash(
+        self, file: int | str | PurePath, offset: int = 0, size: int = 0, block_size: int = 0
+    ) -> list[bytes]:
+        """
+        Compute SHA-256 digests over a range of a remote file, without transferring its content.
+
+        :param file: fd or path of the file to hash. an fd's position is left untouched
+        :param offset: offset the range starts at
+        :param size: size of the range. 0 hashes up to EOF
+        :param block_size: compute a digest for each block of the range (the last one possibly shorter), instead of a
+            single digest for the whole range
+        :return: the digests
+        """
+        target = {"fd": file} if isinstance(file, int) else {"path": str(file)}
+        try:
+            ret = await self.rpc_call(MsgId.REQ_FILE_HASH, offset=offset, size=size, block_size=block_size, **target)
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to hash: {file}")
+        return list(ret.digests)
+
+    async def du(self, path: str | PurePath, depth: int | None = 0, xdev: bool = False) -> list[DiskUsage]:
+        """
+        Aggregate the disk usage of a remote tree server-side, in a single roundtrip and a single pass over it.
+
+        Hard links are counted once, and symlinks aren't followed below the root.
+
+        :param path: root of the tree
+        :param depth: deepest level of the directories reported, the root's subdirectories being at depth 1. None
+            reports every directory
+        :param xdev: skip directories on other devices than the root
+        :return: the usage of the reported directories, every one after its subdirectories and the root last
+        """
+        try:
+            ret = await self.rpc_call(MsgId.REQ_DU, path=str(path), depth=depth or 0, all=depth is None, xdev=xdev)
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to du: {path}")
+        return [
+            DiskUsage(
+                path=entry.path,
+                size=entry.size,
+                blocks=entry.blocks,
+                files=entry.files,
+                dirs=entry.dirs,
+                errors=entry.errors,
             )
-        return entries
+            for entry in ret.entries
+        ]
+
+    async def tree_operation(
+        self, path: str | PurePath, operation: TreeOperation, mode: int = 0, uid: int = -1, gid: int = -1
+    ) -> TreeOperationResult:
+        """
+        Apply chmod, chown or removal to every path of a remote tree in a single roundtrip.
+
+        Directories are operated on after their content. Symlinks aren't followed below the root, and aren't chmod-ed.
+        The paths which cannot be read or operated on don't stop the operation, and are reported instead.
+
+        :param path: root of the tree
+        :param operation: TreeOperation to apply
+        :param mode: mode to chmod to
+        :param uid: uid to chown to, -1 to leave it unchanged
+        :param gid: gid to chown to, -1 to leave it unchanged
+        """
+        try:
+            ret = await self.rpc_call(
+                MsgId.REQ_TREE_OPERATION, path=str(path), operation=operation, mode=mode, uid=uid, gid=gid
+            )
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to operate on tree: {path}")
+        return TreeOperationResult(
+            count=ret.count,
+            failed=ret.failed,
+            failures=[(failure.path, failure.errno1) for failure in ret.failures],
+        )
+
+    async def watch(
+        self,
+        paths: Iterable[str | PurePath],
+        recursive: bool = False,
+        poll_timeout: float = DEFAULT_WATCH_POLL_TIMEOUT,
+    ) -> AsyncGenerator[FileEvent]:
+        """
+        Watch remote paths for changes server-side, backed by inotify on Linux and kqueue on Darwin.
+
+        The events are queued by the kernel and fetched by long polls: every roundtrip returns as soon as there are
+        events, or once poll_timeout elapsed. Other calls of the client wait for the current roundtrip to return.
+
+        :param paths: paths to watch
+        :param recursive: also watch the subdirectories of the directories, including those created later
+        :param poll_timeout: seconds every roundtrip waits for events
+        """
+        watched = [str(path) for path in paths]
+        try:
+            ret = await self.rpc_call(MsgId.REQ_WATCH, paths=watched, recursive=recursive)
+        except ServerResponseError:
+            await self.raise_errno_exception(f"failed to watch: {watched}")
+
+        handle = ret.handle
+        try:
+            while True:
+                try:
+                    ret = await self.rpc_call(MsgId.REQ_WATCH, handle=handle, timeout_ms=int(poll_timeout * 1000))
+                except ServerResponseError:
+                    await self.raise_errno_exception(f"failed to read the events of: {watched}")
+                for event in ret.events:
+                    yield FileEvent(
+                        kind=FileEventType(event.type),
+                        path=event.path,
+                        dest=event.dest or None,
+                        is_dir=event.is_dir,
+                    )
+        finally:
+            with suppress(ConnectionError, ServerDiedError, ServerResponseError):
+                await self.rpc_call(MsgId.REQ_WATCH, handle=handle, close=True)
+
+    def _dirent(self, entry, stat_mode: ListDirStat.ValueType) -> ProtocolDirent:
+        lstat = self._dirent_stat(entry.lstat) if entry.HasField("lstat") else None
+        if entry.HasField("stat"):
+            stat = self._dirent_stat(entry.stat)
+        elif stat_mode == ListDirStat.LIST_DIR_STAT_BOTH:
+            # the server omits stat for anything but symlinks, where it is identical to lstat
+            stat = lstat
+        else:
+            stat = None
+        return ProtocolDirent(d_inode=entry.d_ino, d_type=entry.d_type, d_name=entry.d_name, lstat=lstat, stat=stat)
+
+    @staticmethod
+    def _dirent_stat(entry_stat) -> ProtocolDitentStat:
+        return ProtocolDitentStat(
+            errno=entry_stat.errno1,
+            st_blocks=entry_stat.st_blocks,
+            st_blksize=entry_stat.st_blksize,
+            st_atime=entry_stat.st_atime1,
+            st_ctime=entry_stat.st_ctime1,
+            st_mtime=entry_stat.st_mtime1,
+            st_nlink=entry_stat.st_nlink,
+            st_mode=entry_stat.st_mode,
+            st_rdev=entry_stat.st_rdev,
+            st_size=entry_stat.st_size,
+            st_dev=entry_stat.st_dev,
+            st_gid=entry_stat.st_gid,
+            st_ino=entry_stat.st_ino,
+            st_uid=entry_stat.st_uid,
+        )
 
     async def spawn(
         self,
@@ -506,22 +1286,19 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
     async def set_errno(self, value: int) -> None:
         await self.symbols.errno.setindex(0, value)
 
-    async def get_last_error(self) -> str:
-        """get info about the last occurred error"""
-        if not (errno := await self.get_errno()):
+    async def get_last_error(self, errno: int | None = None) -> str:
+        """get info about the last occurred error, or about the given errno"""
+        if errno is None:
+            errno = await self.get_errno()
+        if not errno:
             return ""
         err_str_ptr = await self.symbols.strerror(errno)
         err_str = await err_str_ptr.peek_str()
         return f"[{errno}] {err_str}"
 
     async def environ(self) -> list[str]:
-        result = []
         environ = await self.symbols.environ.getindex(0)
-        i = 0
-        while var_ptr := await environ.getindex(i):
-            result.append(await var_ptr.peek_str())
-            i += 1
-        return result
+        return [await var_ptr.peek_str() for var_ptr in await environ.as_array("P").tolist()]
 
     async def setenv(self, name: str, value: str) -> None:
         """set process environment variable"""
@@ -563,12 +1340,16 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
             yield symbol
         finally:
             if symbol:
-                await self.symbols.free(symbol)
+                await self.defer_release(self.symbols.free, symbol)
 
     async def close(self) -> None:
+        self.stop_heartbeat()
         try:
+            # the images of the symbols to persist are looked up through the connection
+            await self.save_symbol_cache()
             await self.rpc_call(MsgId.REQ_CLOSE_CLIENT)
         finally:
+            self.release_queue.clear()
             self.notifier.notify(ClientEvent.TERMINATED, self.id)
             self._bridge.close()
 
@@ -641,8 +1422,10 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
         self._old_settings = termios.tcgetattr(fd)  # pyright: ignore[reportPossiblyUnboundVariable]
         tty.setraw(fd)  # pyright: ignore[reportPossiblyUnboundVariable]
 
-    async def raise_errno_exception(self, message: str):
-        message += f" ({await self.get_last_error()})"
+    async def raise_errno_exception(self, message: str, errno: int | None = None):
+        if errno is None:
+            errno = await self.get_errno()
+        message += f" ({await self.get_last_error(errno)})"
         exceptions = {
             EPERM: RpcPermissionError,
             ENOENT: RpcFileNotFoundError,
@@ -654,7 +1437,7 @@ class CoreClient(Generic[SymbolT_co], abc.ABC):
             EAGAIN: RpcResourceTemporarilyUnavailableError,
             ECONNREFUSED: RpcConnectionRefusedError,
         }
-        exception = exceptions.get(await self.get_errno())
+        exception = exceptions.get(errno)
         if exception:
             raise exception(message)
         raise BadReturnValueError(message)
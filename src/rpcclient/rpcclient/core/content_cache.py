@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+from typing import IO, TYPE_CHECKING
+
+from rpcclient.exceptions import TransferVerificationError
+
+
+if TYPE_CHECKING:
+    from rpcclient.core.client import CoreClient
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def default_cache_dir() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "rpcclient" / "content"
+
+
+class ContentCache:
+    """
+    Local store of remote files' content, addressed by SHA-256.
+
+    Remote digests are computed by the server, so a file whose content is already cached, e.g. a system library pulled
+    earlier from an identical device, is served locally instead of being transferred again.
+    """
+
+    def __init__(self, root: str | os.PathLike[str] | None = None) -> None:
+        """
+        :param root: directory holding the cached content. defaults to rpcclient/content under the user's cache dir
+        """
+        self.root = Path(root) if root is not None else default_cache_dir()
+        self.hits = 0
+        self.misses = 0
+        # concurrent pulls of the same content wait for a single transfer
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {str(self.root)!r} hits:{self.hits} misses:{self.misses}>"
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def get(self, digest: str) -> Path | None:
+        """local path of the content with the given hex digest, if cached"""
+        path = self.path(digest)
+        return path if path.exists() else None
+
+    def add(self, file: str | os.PathLike[str], digest: str | None = None) -> str:
+        """copy a local file into the cache and return its hex digest"""
+        with open(file, "rb") as f:
+            if digest is None:
+                sha256 = hashlib.sha256()
+                while chunk := f.read(CHUNK_SIZE):
+                    sha256.update(chunk)
+                digest = sha256.hexdigest()
+                f.seek(0)
+            if self.get(digest) is None:
+                with self._create(digest) as dest:
+                    while chunk := f.read(CHUNK_SIZE):
+                        dest.write(chunk)
+        return digest
+
+    async def pull(self, client: "CoreClient", remote: str, digest: str | None = None) -> Path:
+        """
+        Get the local path of a remote file's content, transferring it only if it isn't cached yet.
+
+        :param client: client to pull through
+        :param remote: remote file
+        :param digest: the file's hex digest, if already known
+        :return: path of the cached content. it is shared, and must not be modified
+        """
+        if digest is None:
+            digest = await client.fs.hash(remote)
+        lock = self._locks.setdefault(digest, asyncio.Lock())
+        try:
+            async with lock:
+                path = self.get(digest)
+                if path is not None:
+                    self.hits += 1
+                    return path
+
+                self.misses += 1
+                with self._create(digest) as dest:
+                    actual = hashlib.sha256()
+                    async for chunk in client.file_read_stream(remote):
+                        dest.write(chunk)
+                        actual.update(chunk)
+                    if actual.hexdigest() != digest:
+                        # the file changed since it was hashed
+                        raise TransferVerificationError(f"{remote} doesn't match its digest {digest}")
+                return self.path(digest)
+        finally:
+            if not lock.locked() and self._locks.get(digest) is lock:
+                del self._locks[digest]
+
+    def clear(self) -> None:
+        for path in self.root.glob("*/*"):
+            path.unlink()
+
+    @contextlib.contextmanager
+    def _create(self, digest: str) -> Iterator[IO[bytes]]:
+        """write an entry into a temporary file, moved into place only once complete"""
+        path = self.path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                yield f
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
@@ -0,0 +1,220 @@
+import io
+from collections import OrderedDict
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any, overload
+
+from construct import ConstructError, SizeofError
+
+from rpcclient.core._types import ClientT_co
+from rpcclient.core.allocated import Allocated
+
+
+if TYPE_CHECKING:
+    from construct import Construct, ParsedType
+
+    from rpcclient.core.subsystems.fs import File
+
+
+DEFAULT_MMAP_PAGE_SIZE = 16 * 1024
+DEFAULT_MMAP_READ_AHEAD = 2
+DEFAULT_MMAP_MAX_PAGES = 1024
+
+
+class _CachedStream(io.RawIOBase):
+    """
+    Synchronous, seekable stream over the pages of a MappedFile that are already cached.
+
+    Reads stop short at the first page that isn't cached, which is recorded as the stream's miss.
+    """
+
+    def __init__(self, mapped: "MappedFile", offset: int) -> None:
+        super().__init__()
+        self._mapped = mapped
+        self._offset = offset
+        self.miss: tuple[int, int] | None = None
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._offset
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._offset
+        elif whence == io.SEEK_END:
+            offset += len(self._mapped)
+        self._offset = offset
+        return offset
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self._mapped) - self._offset
+        data = self._mapped.read_cached(self._offset, size)
+        if len(data) < size and self._offset + len(data) < len(self._mapped) and self.miss is None:
+            self.miss = (self._offset + len(data), size - len(data))
+        self._offset += len(data)
+        return data
+
+
+class MappedFile(Allocated[ClientT_co]):
+    """
+    Read-only view of a remote file whose pages are fetched on demand.
+
+    Fetched pages are kept in a bounded LRU cache, and every miss also fetches the `read_ahead` pages following it, so
+    that parsing headers or tables out of a large binary costs a few roundtrips and kilobytes instead of the whole file.
+    Contiguous missing pages are fetched by a single pread().
+    """
+
+    def __init__(
+        self,
+        client: ClientT_co,
+        file: "File[ClientT_co]",
+        size: int,
+        page_size: int = DEFAULT_MMAP_PAGE_SIZE,
+        read_ahead: int = DEFAULT_MMAP_READ_AHEAD,
+        max_pages: int = DEFAULT_MMAP_MAX_PAGES,
+    ) -> None:
+        """
+        :param client: client the file is opened by
+        :param file: remote file to view, owned and closed by the view
+        :param size: size of the file
+        :param page_size: number of bytes fetched per page
+        :param read_ahead: number of pages fetched past every miss
+        :param max_pages: maximal number of pages cached, least recently used ones being evicted first
+        """
+        super().__init__()
+        self._client = client
+        self._file = file
+        self._size = size
+        self.page_size = page_size
+        self.read_ahead = read_ahead
+        self.max_pages = max_pages
+        self.fetched_bytes = 0
+        self._pages: OrderedDict[int, bytes] = OrderedDict()
+
+    def __repr__(self) -> str:
+        return (
+            f"<{type(self).__name__} fd:{self._file.fd} size:{self._size:#x} "
+            f"pages:{len(self._pages)}/{self.max_pages} fetched:{self.fetched_bytes:#x}>"
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    @overload
+    async def __getitem__(self, item: int) -> int: ...
+
+    @overload
+    async def __getitem__(self, item: slice) -> bytes: ...
+
+    async def __getitem__(self, item: int | slice) -> int | bytes:
+        if isinstance(item, slice):
+            start, stop, step = item.indices(self._size)
+            data = await self.read(start, max(stop - start, 0))
+            return data if step == 1 else data[::step]
+        if item < 0:
+            item += self._size
+        if not 0 <= item < self._size:
+            raise IndexError("mapped file index out of range")
+        return (await self.read(item, 1))[0]
+
+    async def _deallocate(self) -> None:
+        self._pages.clear()
+        await self._file.deallocate()
+
+    async def read(self, offset: int, size: int) -> bytes:
+        """read size bytes at offset, fewer if past the end of the file"""
+        size = max(min(size, self._size - offset), 0)
+        if size > (self.max_pages - self.read_ahead - 1) * self.page_size:
+            # the range doesn't fit the cache
+            data = await self._file.pread(size, offset)
+            self.fetched_bytes += len(data)
+            return data
+        await self.fetch(offset, size)
+        return self.read_cached(offset, size)
+
+    async def parse(self, struct: "Construct[ParsedType, Any]", offset: int = 0) -> "ParsedType":
+        """
+        Parse a construct at offset, fetching only the pages it reads.
+
+        Variably sized constructs are parsed with parse_stream() over the cached pages, fetching the first missing page
+        the parsing reaches and parsing again, which costs no roundtrip once the pages are cached. The pages a parsing
+        reaches aren't evicted until it's done.
+        """
+        try:
+            with suppress(SizeofError):
+                await self.fetch(offset, struct.sizeof(), evict=False)
+            while True:
+                stream = _CachedStream(self, offset)
+                try:
+                    parsed = struct.parse_stream(stream)
+                except ConstructError:
+                    if stream.miss is None:
+                        raise
+                # a miss may also be swallowed by constructs such as GreedyRange or Optional
+                if stream.miss is None:
+                    return parsed
+                await self.fetch(*stream.miss, evict=False)
+        finally:
+            self._evict()
+
+    async def fetch(self, offset: int, size: int, evict: bool = True) -> None:
+        """
+        Make sure the pages of a range are cached, along with the read-ahead pages following it.
+
+        :param offset: offset the range starts at
+        :param size: size of the range
+        :param evict: evict the least recently used pages beyond max_pages
+        """
+        if size <= 0 or offset >= self._size:
+            return
+        first = offset // self.page_size
+        last = min((offset + size - 1) // self.page_size + self.read_ahead, (self._size - 1) // self.page_size)
+        page = first
+        while page <= last:
+            if page in self._pages:
+                self._pages.move_to_end(page)
+                page += 1
+                continue
+            run = page
+            while run + 1 <= last and run + 1 not in self._pages:
+                run += 1
+            data = await self._file.pread((run - page + 1) * self.page_size, page * self.page_size)
+            self.fetched_bytes += len(data)
+            if len(data) < (run - page + 1) * self.page_size:
+                # the file shrank since it was mapped, reads past its new end would never be fulfilled
+                self._size = page * self.page_size + len(data)
+                run = page + (len(data) - 1) // self.page_size if data else page - 1
+                last = run
+            for index in range(page, run + 1):
+                start = (index - page) * self.page_size
+                self._pages[index] = data[start : start + self.page_size]
+            page = run + 1
+        if evict:
+            self._evict()
+
+    def _evict(self) -> None:
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def read_cached(self, offset: int, size: int) -> bytes:
+        """read a range out of the cached pages only, stopping short at the first page that isn't cached"""
+        size = max(min(size, self._size - offset), 0)
+        chunks = []
+        end = offset + size
+        while offset < end:
+            page, start = divmod(offset, self.page_size)
+            data = self._pages.get(page)
+            if data is None:
+                break
+            chunk = data[start : start + end - offset]
+            if not chunk:
+                # the file shrank since it was mapped
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b"".join(chunks)
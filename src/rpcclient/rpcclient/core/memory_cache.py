@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+
+from rpcclient.exceptions import ArgumentError
+
+
+# mappings are aligned to pages of at least 4KiB, so a cached page is readable as a whole if any of its bytes is
+DEFAULT_MEMORY_CACHE_PAGE_SIZE = 0x1000
+DEFAULT_MEMORY_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+class MemoryCache:
+    """
+    Read cache of remote memory, by page.
+
+    Peeks are served from the cached pages, the missing ones being fetched with a single peek per contiguous run. The
+    least recently used pages are evicted beyond max_bytes. Remote memory changing by other means than through the
+    client isn't noticed: pages are only invalidated by the client's own pokes, and every page by its calls when
+    invalidate_on_call is set.
+    """
+
+    def __init__(
+        self,
+        page_size: int = DEFAULT_MEMORY_CACHE_PAGE_SIZE,
+        max_bytes: int = DEFAULT_MEMORY_CACHE_MAX_BYTES,
+        invalidate_on_call: bool = True,
+    ) -> None:
+        """
+        :param page_size: number of bytes fetched per page, a power of 2 no larger than the remote page size
+        :param max_bytes: maximal number of bytes cached
+        :param invalidate_on_call: drop every page on every remote function call, which may write to memory
+        """
+        self.page_size = page_size
+        self.max_bytes = max_bytes
+        self.invalidate_on_call = invalidate_on_call
+        self.hits = 0
+        self.misses = 0
+        self._pages: OrderedDict[int, bytes] = OrderedDict()
+
+    def __repr__(self) -> str:
+        return (
+            f"<{type(self).__name__} pages:{len(self._pages)} bytes:{len(self._pages) * self.page_size:#x}/"
+            f"{self.max_bytes:#x} hits:{self.hits} misses:{self.misses}>"
+        )
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    async def peek(self, fetch: Callable[[int, int], Awaitable[bytes]], address: int, size: int) -> bytes:
+        """
+        Read a range through the cache.
+
+        :param fetch: coroutine function peeking remote memory, given an address and a size
+        :param address: address the range starts at
+        :param size: size of the range
+        """
+        first = address // self.page_size
+        last = (address + size - 1) // self.page_size
+        if size <= 0 or (last - first + 1) * self.page_size > self.max_bytes:
+            # the range doesn't fit the cache
+            return await fetch(address, size)
+
+        # pages may be dropped by other tasks while fetching the next ones, so those read are kept aside
+        pages: list[bytes] = []
+        page = first
+        while page <= last:
+            cached = self._pages.get(page)
+            if cached is not None:
+                self.hits += 1
+                self._pages.move_to_end(page)
+                pages.append(cached)
+                page += 1
+                continue
+            run = page
+            while run + 1 <= last and run + 1 not in self._pages:
+                run += 1
+            self.misses += run - page + 1
+            try:
+                data = await fetch(page * self.page_size, (run - page + 1) * self.page_size)
+            except ArgumentError:
+                # part of the pages isn't readable, though the range may be
+                return await fetch(address, size)
+            for index in range(page, run + 1):
+                start = (index - page) * self.page_size
+                self._pages[index] = data[start : start + self.page_size]
+                pages.append(self._pages[index])
+            page = run + 1
+
+        data = b"".join(pages)
+        self._evict()
+        offset = address - first * self.page_size
+        return data[offset : offset + size]
+
+    def invalidate(self, address: int, size: int) -> None:
+        """drop the cached pages overlapping a range"""
+        if size <= 0:
+            return
+        for page in range(address // self.page_size, (address + size - 1) // self.page_size + 1):
+            self._pages.pop(page, None)
+
+    def clear(self) -> None:
+        self._pages.clear()
+
+    def _evict(self) -> None:
+        while len(self._pages) * self.page_size > self.max_bytes:
+            self._pages.popitem(last=False)
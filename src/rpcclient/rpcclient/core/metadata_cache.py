@@ -0,0 +1,112 @@
+import posixpath
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from pathlib import PurePath
+from typing import Any
+
+
+DEFAULT_METADATA_CACHE_TTL = 2.0
+DEFAULT_METADATA_CACHE_MAX_ENTRIES = 4096
+
+_MISSING = object()
+
+
+def _key(path: str | PurePath) -> str:
+    return posixpath.normpath(str(path))
+
+
+class MetadataCache:
+    """
+    Bounded LRU cache of remote filesystem metadata, such as stat results and directory listings.
+
+    Entries expire after `ttl` seconds, bounding how stale they may get through changes made by other processes.
+    Changes made through the owning `Fs` invalidate the affected entries immediately. Paths are cached as given, so a
+    relative path and its absolute counterpart are cached separately, and relative entries are dropped on chdir.
+    """
+
+    def __init__(
+        self, ttl: float = DEFAULT_METADATA_CACHE_TTL, max_entries: int = DEFAULT_METADATA_CACHE_MAX_ENTRIES
+    ) -> None:
+        """
+        :param ttl: number of seconds an entry stays valid
+        :param max_entries: maximal number of paths cached, least recently used ones being evicted first
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # path -> {kind: (expiry, value)}
+        self._entries: OrderedDict[str, dict[Hashable, tuple[float, Any]]] = OrderedDict()
+        # bumped by every invalidation, so that values fetched concurrently with a change aren't cached
+        self._generation = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"<{type(self).__name__} ttl:{self.ttl} entries:{len(self._entries)}/{self.max_entries} "
+            f"hits:{self.hits} misses:{self.misses}>"
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, path: str | PurePath, kind: Hashable, default: Any = None) -> Any:
+        """cached value of the given kind for a path, or default if missing or expired"""
+        key = _key(path)
+        kinds = self._entries.get(key)
+        entry = kinds.get(kind) if kinds is not None else None
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del kinds[kind]
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, path: str | PurePath, kind: Hashable, value: Any) -> None:
+        key = _key(path)
+        kinds = self._entries.get(key)
+        if kinds is None:
+            kinds = self._entries[key] = {}
+        else:
+            self._entries.move_to_end(key)
+        kinds[kind] = (time.monotonic() + self.ttl, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, path: str | PurePath, recursive: bool = False) -> None:
+        """
+        Drop the entries of a changed path, and of its parent directory, whose listing and times change with it.
+
+        :param path: changed path
+        :param recursive: also drop the entries of everything under path, e.g. when a directory is moved or removed
+        """
+        self._generation += 1
+        key = _key(path)
+        self._entries.pop(key, None)
+        self._entries.pop(posixpath.dirname(key) or ".", None)
+        if recursive:
+            prefix = key.rstrip("/") + "/"
+            for cached in [cached for cached in self._entries if cached.startswith(prefix)]:
+                del self._entries[cached]
+
+    def invalidate_relative(self) -> None:
+        """drop the entries of all relative paths, e.g. once the working directory changes"""
+        self._generation += 1
+        for cached in [cached for cached in self._entries if not posixpath.isabs(cached)]:
+            del self._entries[cached]
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    async def get_or_fetch(self, path: str | PurePath, kind: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """cached value of the given kind for a path, calling fetch() to get and cache it when missing"""
+        value = self.get(path, kind, _MISSING)
+        if value is _MISSING:
+            generation = self._generation
+            value = await fetch()
+            if generation == self._generation:
+                self.put(path, kind, value)
+        return value
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING
+
+from rpcclient.protos.rpc_api_pb2 import Argument, MsgId, RequestCall
+
+
+if TYPE_CHECKING:
+    from rpcclient.core.client import CoreClient
+
+
+# releases queued beyond this number are flushed right away, bounding the resources held past their scope
+DEFAULT_RELEASE_QUEUE_MAX_LENGTH = 64
+# seconds a queued release waits for a request to piggy-back on before it's flushed on its own
+DEFAULT_RELEASE_QUEUE_IDLE_DELAY = 0.5
+
+REQ_CALL_MULTI = MsgId.REQ_CALL_MULTI
+NO_VA_LIST = 0xFFFF
+
+logger = logging.getLogger(__name__)
+
+
+class ReleaseQueue:
+    """
+    Calls releasing remote resources, e.g. free() or CFRelease(), deferred and then made in batches.
+
+    Queued calls are sent along with the next request of the client, in the same roundtrip, and served right before
+    it. They are flushed on their own once the client has been idle for idle_delay seconds, or once max_length of
+    them are queued. Their return values are discarded.
+    """
+
+    def __init__(
+        self,
+        client: "CoreClient",
+        max_length: int = DEFAULT_RELEASE_QUEUE_MAX_LENGTH,
+        idle_delay: float = DEFAULT_RELEASE_QUEUE_IDLE_DELAY,
+    ) -> None:
+        """
+        :param client: client the releases are made through
+        :param max_length: maximal number of queued releases, 1 to make every release right away
+        :param idle_delay: seconds to wait for another request before flushing the queued releases
+        """
+        self._client = client
+        self.max_length = max_length
+        self.idle_delay = idle_delay
+        self.flushes = 0
+        self._calls: list[RequestCall] = []
+        self._idle_task: asyncio.Task | None = None
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} queued:{len(self._calls)}/{self.max_length} flushes:{self.flushes}>"
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def defer(self, address: int, argv: list[Argument]) -> None:
+        """
+        Queue a call.
+
+        :param address: address of the function releasing the resource
+        :param argv: encoded arguments
+        """
+        self._calls.append(RequestCall(address=address, va_list_index=NO_VA_LIST, argv=argv))
+        if len(self._calls) >= self.max_length:
+            await self.flush()
+        elif self._idle_task is None:
+            self._idle_task = asyncio.get_running_loop().create_task(self._flush_when_idle())
+
+    async def flush(self) -> None:
+        """make the queued calls right away, in the order they were queued"""
+        calls = self.take()
+        if not calls:
+            return
+        try:
+            await self._client.rpc_call(REQ_CALL_MULTI, calls=calls)
+        finally:
+            self._client._invalidate_memory_caches_on_call()
+
+    def take(self) -> list[RequestCall]:
+        """dequeue the queued calls, to be sent along with another request"""
+        calls, self._calls = self._calls, []
+        self._cancel_idle_task()
+        if calls:
+            self.flushes += 1
+        return calls
+
+    def clear(self) -> None:
+        """drop the queued calls, e.g. once the resources they release are gone along with their worker"""
+        self._calls = []
+        self._cancel_idle_task()
+
+    def _cancel_idle_task(self) -> None:
+        task, self._idle_task = self._idle_task, None
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+
+    async def _flush_when_idle(self) -> None:
+        await asyncio.sleep(self.idle_delay)
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(f"failed to flush the deferred releases of client {self._client.id}")
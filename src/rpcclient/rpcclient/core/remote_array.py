@@ -0,0 +1,147 @@
+import array
+import sys
+from collections.abc import AsyncIterator
+from typing import TYPE_CHECKING, Any, Generic, TypeVar, overload
+
+
+if TYPE_CHECKING:
+    from rpcclient.core.symbol import AbstractSymbol
+
+
+SymbolT_co = TypeVar("SymbolT_co", bound="AbstractSymbol", covariant=True)
+
+DEFAULT_ARRAY_CHUNK_SIZE = 1024
+# items of a zero-terminated array are never fetched past the page holding the terminator, as the next one may be
+# unmapped. 4KiB is the smallest page size of the supported targets
+TERMINATED_ARRAY_FETCH_BOUNDARY = 0x1000
+
+# struct format characters of the items, by their array typecode. pointers are fetched as unsigned 64-bit integers
+DTYPE_TYPECODES = {
+    "b": "b",
+    "B": "B",
+    "h": "h",
+    "H": "H",
+    "i": "i",
+    "I": "I",
+    "q": "q",
+    "Q": "Q",
+    "f": "f",
+    "d": "d",
+    "P": "Q",
+}
+
+
+class RemoteArray(Generic[SymbolT_co]):
+    """
+    Lazy view of a remote array, whose items are fetched in bulk.
+
+    Every read peeks the whole range it covers at once and decodes it with `array.array`, instead of a roundtrip per
+    item. Pointer items are wrapped as symbols. The items are fetched again on every read.
+    """
+
+    def __init__(
+        self,
+        symbol: SymbolT_co,
+        dtype: str,
+        count: int | None = None,
+        chunk_size: int = DEFAULT_ARRAY_CHUNK_SIZE,
+    ) -> None:
+        """
+        :param symbol: address of the first item
+        :param dtype: struct format character of the items, one of bBhHiIqQfd, or P for pointers
+        :param count: number of items, None for an array terminated by a zero item
+        :param chunk_size: maximal number of items fetched per peek when iterating, or looking for the terminator
+        """
+        if dtype not in DTYPE_TYPECODES:
+            raise ValueError(f"unsupported dtype: {dtype!r}")
+        self._symbol = symbol
+        self.dtype = dtype
+        self.count = count
+        self.chunk_size = chunk_size
+        self.itemsize = array.array(DTYPE_TYPECODES[dtype]).itemsize
+
+    def __repr__(self) -> str:
+        count = "zero-terminated" if self.count is None else f"count:{self.count}"
+        return f"<{type(self).__name__} {self._symbol} dtype:{self.dtype} {count}>"
+
+    def __len__(self) -> int:
+        if self.count is None:
+            raise TypeError("a zero-terminated array has no length until read")
+        return self.count
+
+    @overload
+    async def __getitem__(self, item: int) -> Any: ...
+
+    @overload
+    async def __getitem__(self, item: slice) -> list[Any]: ...
+
+    async def __getitem__(self, item: int | slice) -> Any:
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            items = await self.read(start, max(stop - start, 0))
+            return items if step == 1 else items[::step]
+        if item < 0:
+            item += len(self)
+        if item < 0 or (self.count is not None and item >= self.count):
+            raise IndexError("remote array index out of range")
+        return (await self.read(item, 1))[0]
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        index = 0
+        done = False
+        while not done:
+            values, done = await self._fetch_chunk(index)
+            for value in self._wrap(values):
+                yield value
+            index += len(values)
+
+    async def read(self, start: int, count: int) -> list[Any]:
+        """read count items from index start in a single peek"""
+        return self._wrap(await self._fetch(start, count))
+
+    async def toarray(self) -> "array.array[Any]":
+        """read all the items in a single peek, or one chunk at a time for a zero-terminated array, undecorated"""
+        if self.count is not None:
+            return await self._fetch(0, self.count)
+        values = array.array(DTYPE_TYPECODES[self.dtype])
+        done = False
+        while not done:
+            chunk, done = await self._fetch_chunk(len(values))
+            values.extend(chunk)
+        return values
+
+    async def tolist(self) -> list[Any]:
+        """read all the items, pointers being wrapped as symbols"""
+        return self._wrap(await self.toarray())
+
+    async def _fetch(self, start: int, count: int) -> "array.array[Any]":
+        values = array.array(DTYPE_TYPECODES[self.dtype])
+        if count <= 0:
+            return values
+        values.frombytes(await self._symbol.peek(count * self.itemsize, offset=start * self.itemsize))
+        if (self._symbol.endianness == "<") != (sys.byteorder == "little"):
+            values.byteswap()
+        return values
+
+    async def _fetch_chunk(self, start: int) -> "tuple[array.array[Any], bool]":
+        """
+        Fetch the items of the chunk starting at index start, up to the terminator of a zero-terminated array.
+
+        :return: the items, and whether they're the last ones
+        """
+        if self.count is not None:
+            count = min(self.chunk_size, self.count - start)
+            return await self._fetch(start, count), start + count >= self.count
+        address = int(self._symbol) + start * self.itemsize
+        boundary = (address // TERMINATED_ARRAY_FETCH_BOUNDARY + 1) * TERMINATED_ARRAY_FETCH_BOUNDARY
+        count = min(self.chunk_size, max((boundary - address) // self.itemsize, 1))
+        values = await self._fetch(start, count)
+        if 0 in values:
+            del values[values.index(0) :]
+            return values, True
+        return values, False
+
+    def _wrap(self, values: "array.array[Any]") -> list[Any]:
+        if self.dtype != "P":
+            return values.tolist()
+        return [self._symbol._symbol_from_value(value) for value in values]
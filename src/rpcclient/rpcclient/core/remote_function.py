@@ -0,0 +1,155 @@
+import ctypes
+import operator
+from collections.abc import Callable, Sequence
+from pathlib import PurePath
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+from rpcclient.exceptions import ArgumentError
+from rpcclient.protos.rpc_api_pb2 import Argument
+
+
+if TYPE_CHECKING:
+    from rpcclient.core.client import RemoteCallArg
+    from rpcclient.core.symbol import Symbol
+
+
+SymbolT_co = TypeVar("SymbolT_co", bound="Symbol", covariant=True)
+
+CType = type[ctypes._SimpleCData] | None
+ArgumentEncoder = Callable[[Any], Argument]
+
+UINT64_MASK = 0xFFFFFFFFFFFFFFFF
+# ctypes codes of the integer types, by signedness
+SIGNED_TYPE_CODES = "bhilq"
+UNSIGNED_TYPE_CODES = "BHILQ?"
+POINTER_TYPE_CODES = "Pz"
+# pointer arguments passed as strings or buffers, by type
+_POINTER_ENCODERS: dict[type, ArgumentEncoder] = {
+    str: lambda arg: Argument(v_str=arg),
+    bytes: lambda arg: Argument(v_bytes=arg),
+}
+
+
+def _encode_int(arg: Any) -> Argument:
+    return Argument(v_int=operator.index(arg) & UINT64_MASK)
+
+
+def _encode_double(arg: Any) -> Argument:
+    return Argument(v_double=arg)
+
+
+def _encode_pointer(arg: Any) -> Argument:
+    encoder = _POINTER_ENCODERS.get(type(arg))
+    if encoder is not None:
+        return encoder(arg)
+    if isinstance(arg, PurePath):
+        return Argument(v_str=str(arg))
+    return _encode_int(arg)
+
+
+def argument_encoder(argtype: CType) -> ArgumentEncoder:
+    """encoder of the arguments of the given ctypes type"""
+    code = getattr(argtype, "_type_", None)
+    if not isinstance(code, str):
+        raise TypeError(f"unsupported argument type: {argtype!r}")
+    if code in SIGNED_TYPE_CODES or code in UNSIGNED_TYPE_CODES:
+        return _encode_int
+    if code in POINTER_TYPE_CODES:
+        return _encode_pointer
+    if code == "d":
+        return _encode_double
+    # a float is passed in the low half of a vector register, which the protocol has no way to set
+    raise TypeError(f"unsupported argument type: {argtype.__name__}")
+
+
+class RemoteFunction(Generic[SymbolT_co]):
+    """
+    A remote function of a known signature, called with almost no client-side overhead.
+
+    The argument encoders and the return decoder are picked once from the ctypes types of the signature, rather than
+    dispatched on each argument of every call. Arguments which don't fit the fast encoders, e.g. lazy symbols or enums,
+    are encoded as `CoreClient.call()` does.
+
+    Integer return values are truncated to the width of restype and sign-extended if it's signed, c_void_p and c_char_p
+    ones are returned as symbols, and None returns nothing.
+    """
+
+    def __init__(
+        self,
+        symbol: SymbolT_co,
+        argtypes: Sequence[CType] = (),
+        restype: CType = ctypes.c_void_p,
+        va_list_index: int | None = None,
+    ) -> None:
+        """
+        :param symbol: address of the function
+        :param argtypes: ctypes types of the fixed arguments: integers, c_void_p, c_char_p or c_double
+        :param restype: ctypes type of the return value: an integer, c_void_p, c_char_p, c_double, c_float, or None
+        :param va_list_index: index of the first variadic argument, the ones past argtypes being encoded as they are
+            by `CoreClient.call()`
+        """
+        self._symbol = symbol
+        self._client = symbol._client
+        self._address = int(symbol)
+        self.argtypes = tuple(argtypes)
+        self.restype = restype
+        self.va_list_index = va_list_index
+        self._encoders = tuple(argument_encoder(argtype) for argtype in self.argtypes)
+        self._decode = self._return_decoder(restype)
+
+    def __repr__(self) -> str:
+        argtypes = ", ".join(argtype.__name__ if argtype else "None" for argtype in self.argtypes)
+        restype = self.restype.__name__ if self.restype else "None"
+        return f"<{type(self).__name__} {self._symbol}({argtypes}) -> {restype}>"
+
+    async def __call__(self, *args: "RemoteCallArg") -> Any:
+        encoders = self._encoders
+        if len(args) != len(encoders):
+            return await self._call_variadic(args)
+        try:
+            argv = [encode(arg) for encode, arg in zip(encoders, args, strict=True)]
+        except TypeError:
+            argv = await self._client._encode_arguments(args, encoders)
+        return self._decode(await self._client._call(self._address, argv, self.va_list_index))
+
+    async def _call_variadic(self, args: "tuple[RemoteCallArg, ...]") -> Any:
+        count = len(self._encoders)
+        if self.va_list_index is None or len(args) < count:
+            raise TypeError(f"expected {count} arguments, got {len(args)}")
+        argv = await self._client._encode_arguments(args[:count], self._encoders)
+        argv += await self._client._encode_arguments(args[count:])
+        return self._decode(await self._client._call(self._address, argv, self.va_list_index))
+
+    def _return_decoder(self, restype: CType) -> Callable[[Any], Any]:
+        if restype is None:
+            return lambda reply: None
+        code = getattr(restype, "_type_", None)
+        if not isinstance(code, str):
+            raise TypeError(f"unsupported return type: {restype!r}")
+        if code in POINTER_TYPE_CODES:
+            symbol = self._client.symbol
+            return lambda reply: symbol(_integer_register(reply))
+        if code == "d":
+            return _double_register
+        if code == "f":
+            return lambda reply: ctypes.c_float(_double_register(reply)).value
+        if code == "?":
+            return lambda reply: bool(_integer_register(reply) & 0xFF)
+        if code not in SIGNED_TYPE_CODES and code not in UNSIGNED_TYPE_CODES:
+            raise TypeError(f"unsupported return type: {restype.__name__}")
+        bits = ctypes.sizeof(restype) * 8
+        mask = (1 << bits) - 1
+        if code in UNSIGNED_TYPE_CODES:
+            return lambda reply: _integer_register(reply) & mask
+        sign = 1 << (bits - 1)
+        return lambda reply: ((_integer_register(reply) & mask) ^ sign) - sign
+
+
+def _integer_register(reply: Any) -> int:
+    return reply.arm_registers.x0 if reply.HasField("arm_registers") else reply.return_value
+
+
+def _double_register(reply: Any) -> float:
+    if not reply.HasField("arm_registers"):
+        raise ArgumentError("floating point return values are only available on arm64")
+    return reply.arm_registers.d0
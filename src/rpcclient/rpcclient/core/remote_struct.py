@@ -0,0 +1,201 @@
+import dataclasses
+import weakref
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+from construct import Construct, Container, Renamed, SizeofError, Struct
+
+
+if TYPE_CHECKING:
+    from rpcclient.core.symbol import AbstractSymbol
+
+
+SymbolT_co = TypeVar("SymbolT_co", bound="AbstractSymbol", covariant=True)
+
+# the whole struct is fetched once accessing its missing fields would get more than this fraction of it fetched
+DEFAULT_STRUCT_PREFETCH_THRESHOLD = 0.5
+# ranges to fetch less than this number of bytes apart are fetched together, a roundtrip costing more than the gap
+DEFAULT_STRUCT_COALESCE_GAP = 128
+
+
+@dataclasses.dataclass(frozen=True)
+class StructField:
+    name: str
+    subcon: Construct
+    # None if following a variably sized field, or context dependent. such fields are parsed along the whole struct
+    offset: int | None
+    size: int | None
+
+    @property
+    def is_struct(self) -> bool:
+        return isinstance(self.subcon, Struct) and self.size is not None
+
+
+_layouts: "weakref.WeakKeyDictionary[Construct, dict[str, StructField]]" = weakref.WeakKeyDictionary()
+
+
+def struct_layout(struct: Construct) -> dict[str, StructField]:
+    """offsets and sizes of the named fields of a struct, computed once per struct"""
+    layout = _layouts.get(struct)
+    if layout is not None:
+        return layout
+    subcon = struct
+    while isinstance(subcon, Renamed):
+        subcon = subcon.subcon
+    if not isinstance(subcon, Struct):
+        raise TypeError(f"expected a Struct, got {type(subcon).__name__}")
+    layout = {}
+    offset: int | None = 0
+    for field in subcon.subcons:
+        try:
+            size: int | None = field.sizeof()
+        except SizeofError:
+            size = None
+        if field.name is not None:
+            inner = field.subcon if isinstance(field, Renamed) else field
+            # zero sized fields, e.g. Computed, may depend on the others
+            static = offset is not None and bool(size)
+            layout[field.name] = StructField(field.name, inner, offset if static else None, size if static else None)
+        offset = offset + size if offset is not None and size is not None else None
+    _layouts[struct] = layout
+    return layout
+
+
+class _Snapshot:
+    """Bytes of a remote struct fetched so far, shared by the proxies of its nested structs."""
+
+    def __init__(self, symbol: "AbstractSymbol", size: int, prefetch_threshold: float, coalesce_gap: int) -> None:
+        self.symbol = symbol
+        self.size = size
+        self.prefetch_threshold = prefetch_threshold
+        self.coalesce_gap = coalesce_gap
+        self.data = bytearray(size)
+        self.fetched = bytearray(size)
+        self.fetched_count = 0
+
+    def clear(self) -> None:
+        self.fetched = bytearray(self.size)
+        self.fetched_count = 0
+
+    async def load(self, ranges: Iterable[tuple[int, int]]) -> None:
+        """fetch the missing bytes of the given (offset, size) ranges"""
+        missing = sorted(
+            (start, start + size) for start, size in ranges if size and 0 in self.fetched[start : start + size]
+        )
+        if not missing:
+            return
+        if self.fetched_count + sum(end - start for start, end in missing) > self.size * self.prefetch_threshold:
+            missing = [(0, self.size)]
+
+        runs: list[list[int]] = []
+        for start, end in missing:
+            if runs and start - runs[-1][1] <= self.coalesce_gap:
+                runs[-1][1] = max(runs[-1][1], end)
+            else:
+                runs.append([start, end])
+        for start, end in runs:
+            self.data[start:end] = await self.symbol.peek(end - start, offset=start)
+            self.fetched_count += end - start - self.fetched.count(1, start, end)
+            self.fetched[start:end] = b"\x01" * (end - start)
+
+
+class RemoteStruct(Generic[SymbolT_co]):
+    """
+    Lazy proxy of a remote struct, fetching the fields accessed rather than all of them.
+
+    Field offsets are computed once per struct definition. The fields accessed together are fetched in as few peeks
+    as possible, and the whole struct at once when most of it would be fetched anyway. Fetched fields are kept until
+    refresh() is called.
+
+    Awaiting a field attribute reads it, and awaiting the proxy parses the whole struct. Nested struct attributes are
+    proxies themselves:
+
+        info = symbol.as_struct(proc_taskallinfo)
+        pid = await info.pbsd.pbi_pid
+    """
+
+    def __init__(
+        self,
+        symbol: SymbolT_co,
+        struct: Construct,
+        prefetch_threshold: float = DEFAULT_STRUCT_PREFETCH_THRESHOLD,
+        coalesce_gap: int = DEFAULT_STRUCT_COALESCE_GAP,
+    ) -> None:
+        """
+        :param symbol: address of the struct
+        :param struct: construct Struct of a fixed size
+        :param prefetch_threshold: fraction of the struct above which it's fetched whole
+        :param coalesce_gap: maximal number of unneeded bytes fetched to spare a peek
+        """
+        self._symbol = symbol
+        self._struct = struct
+        self._layout = struct_layout(struct)
+        self._offset = 0
+        self._size = struct.sizeof()
+        self._snapshot = _Snapshot(symbol, self._size, prefetch_threshold, coalesce_gap)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self._symbol + self._offset} fields:{list(self._layout)}>"
+
+    def __dir__(self) -> Iterable[str]:
+        return [*super().__dir__(), *self._layout]
+
+    def __await__(self):
+        return self.parse().__await__()
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        field = self._field(name)
+        if field.is_struct:
+            return self._nested(field)
+        return self.get(name)
+
+    async def get(self, name: str) -> Any:
+        """read a single field, nested structs being parsed whole"""
+        return (await self.fetch(name))[name]
+
+    async def fetch(self, *names: str) -> Container:
+        """read the given fields together"""
+        fields = [self._field(name) for name in names]
+        ranges = [
+            (self._offset + field.offset, field.size)
+            for field in fields
+            if field.offset is not None and field.size is not None
+        ]
+        if len(ranges) < len(fields):
+            parsed = await self.parse()
+            return Container({name: parsed[name] for name in names})
+        await self._snapshot.load(ranges)
+        return Container({field.name: self._parse_field(field) for field in fields})
+
+    async def parse(self) -> Container:
+        """read the whole struct"""
+        await self._snapshot.load([(self._offset, self._size)])
+        return self._struct.parse(bytes(self._snapshot.data[self._offset : self._offset + self._size]))
+
+    def refresh(self) -> None:
+        """drop the fetched fields, to read them again on next access"""
+        self._snapshot.clear()
+
+    def _field(self, name: str) -> StructField:
+        try:
+            return self._layout[name]
+        except KeyError:
+            raise AttributeError(f"{type(self._struct).__name__} has no field {name!r}") from None
+
+    def _parse_field(self, field: StructField) -> Any:
+        assert field.offset is not None and field.size is not None
+        start = self._offset + field.offset
+        return field.subcon.parse(bytes(self._snapshot.data[start : start + field.size]))
+
+    def _nested(self, field: StructField) -> "RemoteStruct[SymbolT_co]":
+        assert field.offset is not None and field.size is not None
+        nested = object.__new__(type(self))
+        nested._symbol = self._symbol
+        nested._struct = field.subcon
+        nested._layout = struct_layout(field.subcon)
+        nested._offset = self._offset + field.offset
+        nested._size = field.size
+        nested._snapshot = self._snapshot
+        return nested
@@ -1,8 +1,10 @@
-from typing import TYPE_CHECKING, Generic, TypeVar
+import functools
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
 from typing_extensions import Self
 
 from construct import (
     Bytes,
+    Construct,
     Container,
     CString,
     Default,
@@ -12,6 +14,7 @@ from construct import (
     Int16sl,
     Int16ub,
     Int16ul,
+    Int32sl,
     Int32ub,
     Int32ul,
     Int64sl,
@@ -27,6 +30,8 @@ from rpcclient.core.structs.consts import AF_INET, AF_INET6, AF_UNIX
 
 
 if TYPE_CHECKING:
+    from construct import ParsedType
+
     from rpcclient.core.client import CoreClient
     from rpcclient.core.symbols_jar import Symbol
 
@@ -49,6 +54,12 @@ mode_t = Int16ul
 in_addr = Bytes(4)
 in6_addr = Bytes(16)
 
+timeval = Struct(
+    "tv_sec" / long,
+    "tv_usec" / Int32sl,
+    Padding(4),
+)
+
 sockaddr_in = Struct(
     "sin_family" / Default(Int16sl, AF_INET),
     "sin_port" / Int16ub,
@@ -95,6 +106,46 @@ block_literal = Struct(
 )
 
 
+class CStringFrom(Construct):
+    """
+    A field computed from a bytes field parsed before it, decoded up to its first NUL.
+
+    Unlike a Computed lambda, it keeps the struct compilable.
+    """
+
+    def __init__(self, field: str, encoding: str = "utf-8") -> None:
+        super().__init__()
+        self.field = field
+        self.encoding = encoding
+        self.flagbuildnone = True
+
+    def _parse(self, stream, context, path) -> str:
+        return context[self.field].split(b"\x00", 1)[0].decode(self.encoding)
+
+    def _build(self, obj, stream, context, path) -> str:
+        return self._parse(stream, context, path)
+
+    def _sizeof(self, context, path) -> int:
+        return 0
+
+    def _emitparse(self, code) -> str:
+        return f"this[{self.field!r}].split(b'\\x00', 1)[0].decode({self.encoding!r})"
+
+
+@functools.cache
+def compiled(struct: "Construct[ParsedType, Any]") -> "Construct[ParsedType, Any]":
+    """
+    Get a struct compiled into Python code, parsing several times faster than the interpreted one. Meant for the
+    structs defined once and parsed on hot paths: each is compiled on first use and kept.
+
+    A struct which can't be compiled, e.g. holding a Computed lambda, is returned as is.
+    """
+    try:
+        return struct.compile()
+    except (SyntaxError, NotImplementedError):
+        return struct
+
+
 class SymbolFormatField(FormatField, Generic[SymbolT_co]):
     """
     A Symbol wrapper for construct
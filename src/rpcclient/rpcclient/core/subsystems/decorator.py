@@ -38,7 +38,12 @@ SelfT_co = TypeVar("SelfT_co", covariant=True)
 
 
 class subsystem(Generic[SelfT_co, SubsystemT_co]):
-    """Descriptor that lazily initializes a subsystem and caches the result."""
+    """
+    Descriptor that lazily initializes a subsystem and caches the result.
+
+    The symbols a subsystem lists in its `SYMBOLS` class attribute are declared to the client's symbols jar once it's
+    initialized, so that they're all resolved in the same roundtrip as the first symbol it uses.
+    """
 
     def __init__(self, fget: Callable[[SelfT_co], SubsystemT_co]) -> None:
         """Capture the factory callable and set cache metadata."""
@@ -70,5 +75,8 @@ class subsystem(Generic[SelfT_co, SubsystemT_co]):
                 raise
             logger.exception("Subsystem %s failed to initialize", self.name)
             value = SubsystemNotAvailable(self.name, e)
+        else:
+            if symbols := getattr(value, "SYMBOLS", ()):
+                instance.symbols.declare(symbols)
         d[self.cache_key] = value
         return value
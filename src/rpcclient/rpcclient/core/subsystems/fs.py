@@ -1,22 +1,37 @@
 import abc
 import contextlib
+import dataclasses
+import fnmatch
 import inspect
 import logging
+import math
 import os
 import posixpath
 import random
+import re
 import stat
 import sys
 import tempfile
 from collections.abc import AsyncGenerator, Callable, Collection
 from contextlib import asynccontextmanager
+from datetime import datetime
+from enum import Enum
 from pathlib import Path, PurePath, PurePosixPath
-from typing import TYPE_CHECKING, Any, Literal
+from typing import TYPE_CHECKING, Any, ClassVar, Literal
 from typing_extensions import Buffer, Self
 
 from rpcclient.clients.darwin.structs import MAXPATHLEN
 from rpcclient.core._types import ClientBound, ClientT_co
 from rpcclient.core.allocated import Allocated
+from rpcclient.core.archive import TarExtractor, open_archive
+from rpcclient.core.content_cache import ContentCache
+from rpcclient.core.mapped_file import (
+    DEFAULT_MMAP_MAX_PAGES,
+    DEFAULT_MMAP_PAGE_SIZE,
+    DEFAULT_MMAP_READ_AHEAD,
+    MappedFile,
+)
+from rpcclient.core.metadata_cache import MetadataCache
 from rpcclient.core.structs.consts import (
     DT_DIR,
     DT_LNK,
@@ -33,7 +48,11 @@ from rpcclient.core.structs.consts import (
     S_IFMT,
     S_IFREG,
     SEEK_CUR,
+    SEEK_END,
 )
+from rpcclient.core.structs.generic import timeval
+from rpcclient.core.sync import DEFAULT_SYNC_BLOCK_SIZE, Sync, SyncDirection, SyncReport
+from rpcclient.core.transfer import DEFAULT_TRANSFER_JOBS, ProgressCallback, Transfer, TransferProgress
 from rpcclient.exceptions import (
     ArgumentError,
     BadReturnValueError,
@@ -41,17 +60,76 @@ from rpcclient.exceptions import (
     RpcFileNotFoundError,
     RpcIsADirectoryError,
 )
+from rpcclient.protos.rpc_api_pb2 import ListDirStat, TreeOperation, WalkFilter, WatchEventType
 from rpcclient.utils import cached_async_method
 
 
 if TYPE_CHECKING:
     from construct import Construct, ParsedType
 
+    from rpcclient.core.client import DiskUsage
     from rpcclient.core.symbol import Symbol
 
 
 logger = logging.getLogger(__name__)
 
+FILE_CHUNK_SIZE = 1024 * 1024
+DEFAULT_WATCH_POLL_TIMEOUT = 0.5
+
+
+def _is_subpath(path: str, parent: str) -> bool:
+    return path == parent or path.startswith(parent.rstrip("/") + "/")
+
+
+# find(1) -type letters
+FIND_TYPES = {
+    "b": stat.S_IFBLK,
+    "c": stat.S_IFCHR,
+    "d": stat.S_IFDIR,
+    "f": stat.S_IFREG,
+    "l": stat.S_IFLNK,
+    "p": stat.S_IFIFO,
+    "s": stat.S_IFSOCK,
+}
+
+
+def _timestamp(value: float | datetime) -> float:
+    return value.timestamp() if isinstance(value, datetime) else value
+
+
+def _walk_filter_matches(walk_filter: WalkFilter, name: str, st: Any) -> bool:
+    """evaluate a walk filter client-side, as the server does for the walked entries"""
+    if walk_filter.name and not any(fnmatch.fnmatchcase(name, pattern) for pattern in walk_filter.name):
+        return False
+    if walk_filter.regex and re.search(walk_filter.regex, name) is None:
+        return False
+    if walk_filter.types and stat.S_IFMT(st.st_mode) not in walk_filter.types:
+        return False
+    if st.st_size < walk_filter.size_min or (walk_filter.size_max and st.st_size >= walk_filter.size_max):
+        return False
+    mtime = int(st.st_mtime)
+    if mtime < walk_filter.mtime_min or (walk_filter.mtime_max and mtime >= walk_filter.mtime_max):
+        return False
+    return not walk_filter.uids or st.st_uid in walk_filter.uids
+
+
+class FileEventType(Enum):
+    CREATE = WatchEventType.WATCH_EVENT_CREATE
+    MODIFY = WatchEventType.WATCH_EVENT_MODIFY
+    DELETE = WatchEventType.WATCH_EVENT_DELETE
+    RENAME = WatchEventType.WATCH_EVENT_RENAME
+    ATTRIB = WatchEventType.WATCH_EVENT_ATTRIB
+    # events were dropped, the watched paths should be rescanned
+    OVERFLOW = WatchEventType.WATCH_EVENT_OVERFLOW
+
+
+@dataclasses.dataclass
+class FileEvent:
+    kind: FileEventType
+    path: str
+    dest: str | None  # new path of a renamed entry, None if it left the watched paths
+    is_dir: bool
+
 
 class DirEntry(ClientBound[ClientT_co]):
     def __init__(self, path, entry, client: ClientT_co) -> None:
@@ -70,7 +148,7 @@ class DirEntry(ClientBound[ClientT_co]):
 
     def inode(self):
         """Return inode of the entry; cached per entry."""
-        return self._entry.d_ino
+        return self._entry.d_inode
 
     async def is_dir(self, *, follow_symlinks=True) -> bool:
         """Return True if the entry is a directory; cached per entry."""
@@ -119,6 +197,12 @@ class DirEntry(ClientBound[ClientT_co]):
         if not follow_symlinks:
             result = self._entry.lstat
 
+        if result is None:
+            # the listing was requested without this stat information
+            if follow_symlinks:
+                return await self._client.fs.stat(self.path)
+            return await self._client.fs.lstat(self.path)
+
         if result.errno != 0:
             await self._client.set_errno(result.errno)
             await self._client.raise_errno_exception(f"failed to stat: {self._entry.d_name}")
@@ -131,24 +215,33 @@ class DirEntry(ClientBound[ClientT_co]):
 class File(Allocated[ClientT_co]):
     CHUNK_SIZE = 1024 * 64
 
-    def __init__(self, client: ClientT_co, fd: int) -> None:
+    def __init__(self, client: ClientT_co, fd: int, path: str | PurePath | None = None) -> None:
         """
         :param rpcclient.client.client.Client client:
         :param fd:
+        :param path: path the file was opened by, whose cached metadata is invalidated by writes
         """
         super().__init__()
         self._client = client
         self.fd: int = fd
+        self.path = path
+
+    def _invalidate_metadata(self) -> None:
+        if self.path is not None:
+            self._client.fs.invalidate_metadata(self.path)
 
     async def _deallocate(self) -> None:
         """Close the remote file descriptor."""
-        fd = (await self._client.symbols.close(self.fd)).c_int32
+        try:
+            fd = (await self._client.symbols.close(self.fd)).c_int32
+        finally:
+            self._invalidate_metadata()
         if fd < 0:
             await self._client.raise_errno_exception(f"failed to close fd: {fd}")
 
     async def seek(self, offset: int, whence: int) -> int:
         """Seek the remote file descriptor and return the resulting offset."""
-        err = (await self._client.symbols.lseek(self.fd, offset, whence)).c_int32
+        err = (await self._client.symbols.lseek(self.fd, offset, whence)).c_int64
         if err < 0:
             await self._client.raise_errno_exception(f"failed to lseek fd: {self.fd}")
         return err
@@ -156,19 +249,15 @@ class File(Allocated[ClientT_co]):
     async def tell(self) -> int:
         return await self.seek(0, SEEK_CUR)
 
-    async def _write(self, buf: bytes) -> int:
-        """Write bytes to the remote file descriptor."""
-        n = (await self._client.symbols.write(self.fd, buf, len(buf))).c_int64
-        if n < 0:
-            await self._client.raise_errno_exception(f"failed to write on fd: {self.fd}")
-        return n
-
-    async def write(self, buf: bytes) -> int:
-        """Write the full buffer, retrying until all bytes are written."""
-        while buf:
-            err = await self._write(buf)
-            buf = buf[err:]
-        return len(buf)
+    async def write(self, buf: Buffer, chunk_size: int = FILE_CHUNK_SIZE) -> int:
+        """Write the full buffer, one roundtrip per chunk_size bytes."""
+        view = memoryview(buf).cast("B")
+        try:
+            for offset in range(0, len(view), chunk_size):
+                await self._client.file_write(self.fd, view[offset : offset + chunk_size])
+        finally:
+            self._invalidate_metadata()
+        return len(view)
 
     async def _read(self, buf: "Symbol", size: int) -> bytes:
         """read file at remote"""
@@ -187,30 +276,52 @@ class File(Allocated[ClientT_co]):
             buf += read_chunk
         return buf
 
-    async def read(self, size: int = -1, chunk_size: int = CHUNK_SIZE, chunk: "Symbol | None" = None) -> bytes:
-        """read file at remote"""
-        if size != -1 and size < chunk_size:
-            chunk_size = size
+    async def read(self, size: int = -1, chunk_size: int | None = None, chunk: "Symbol | None" = None) -> bytes:
+        """
+        read file at remote
 
+        :param size: number of bytes to read, or -1 to read until EOF
+        :param chunk_size: number of bytes read per roundtrip
+        :param chunk: remote buffer to read through using read() and peek(), instead of reading natively
+        """
         if chunk:
+            chunk_size = chunk_size or self.CHUNK_SIZE
+            if size != -1 and size < chunk_size:
+                chunk_size = size
             return await self.read_using_chunk(chunk, chunk_size, size)
-        else:
-            async with self._client.safe_malloc(chunk_size) as temp_chunk:
-                return await self.read_using_chunk(temp_chunk, chunk_size, size)
+
+        chunk_size = chunk_size or FILE_CHUNK_SIZE
+        chunks = []
+        remaining = size
+        while remaining != 0:
+            requested = chunk_size if remaining == -1 else min(chunk_size, remaining)
+            data, eof = await self._client.file_read_chunk(self.fd, requested)
+            chunks.append(data)
+            if eof:
+                break
+            if remaining != -1:
+                remaining -= len(data)
+        return b"".join(chunks)
 
     async def pread(self, length: int, offset: int) -> bytes:
         """call pread() at remote"""
-        async with self._client.safe_malloc(length) as buf:
-            err = (await self._client.symbols.pread(self.fd, buf, length, offset)).c_int64
-            if err < 0:
-                await self._client.raise_errno_exception(f"pread() failed for fd: {self.fd}")
-            return await buf.peek(err)
+        return await self._client.file_read(self.fd, length, offset=offset)
 
-    async def pwrite(self, buf: bytes, offset: int) -> None:
+    async def pwrite(self, buf: Buffer, offset: int) -> None:
         """call pwrite() at remote"""
-        err = (await self._client.symbols.pwrite(self.fd, buf, len(buf), offset)).c_int64
+        try:
+            await self._client.file_write(self.fd, buf, offset=offset)
+        finally:
+            self._invalidate_metadata()
+
+    async def truncate(self, size: int) -> None:
+        """call ftruncate() at remote"""
+        try:
+            err = (await self._client.symbols.ftruncate(self.fd, size)).c_int32
+        finally:
+            self._invalidate_metadata()
         if err < 0:
-            await self._client.raise_errno_exception(f"pwrite() failed for fd: {self.fd}")
+            await self._client.raise_errno_exception(f"ftruncate() failed for fd: {self.fd}")
 
     async def fdatasync(self) -> None:
         err = (await self._client.symbols.fdatasync(self.fd)).c_int64
@@ -289,8 +400,7 @@ class RemotePath(PurePosixPath, ClientBound[ClientT_co]):
         await self._client.fs.mkdir(self._path, mode, parents=parents, exist_ok=exist_ok)
 
     async def read_bytes(self) -> bytes:
-        async with await self._open("r") as f:
-            return await f.read()
+        return await self._client.fs.read_file(self._path)
 
     async def stat(self) -> Any:
         return await self._client.fs.stat(self._path)
@@ -299,8 +409,7 @@ class RemotePath(PurePosixPath, ClientBound[ClientT_co]):
         await self._client.fs.symlink(target, self._path)
 
     async def write_bytes(self, data: Buffer) -> int:
-        async with await self._open("w") as f:
-            return await f.write(bytes(data))
+        return await self._client.fs.write_file(self._path, data)
 
     async def _open(self, mode: str, access: int = 0o777) -> File[ClientT_co]:
         return await self._client.fs.open(self._path, mode, access)
@@ -357,8 +466,45 @@ async def _do_path_op(op: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
 class Fs(ClientBound[ClientT_co], abc.ABC):
     """filesystem utils"""
 
+    # when set, files are pulled through this cache. set it on the class to share it among all clients
+    content_cache: ContentCache | None = None
+    # resolved together along with the first symbol used
+    SYMBOLS: ClassVar[tuple[str, ...]] = (
+        "access",
+        "chdir",
+        "chmod",
+        "chown",
+        "close",
+        "dup",
+        "free",
+        "getcwd",
+        "lseek",
+        "mkdir",
+        "open",
+        "read",
+        "readlink",
+        "realpath",
+        "remove",
+        "rename",
+        "symlink",
+        "utimes",
+    )
+
     def __init__(self, client: ClientT_co) -> None:
         self._client = client
+        # when set, stat results and directory listings are served from this cache. changes made through this object
+        # invalidate the entries of the paths they affect
+        self.metadata_cache: MetadataCache | None = None
+
+    def invalidate_metadata(self, path: str | PurePath, recursive: bool = False) -> None:
+        """
+        Drop the cached metadata of a path changed on the remote side.
+
+        :param path: changed path
+        :param recursive: also drop the cached metadata of everything under path
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(path, recursive=recursive)
 
     async def _cp_dir(
         self,
@@ -437,9 +583,27 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
         """Return True if the entry is a file"""
         return bool((await self.stat(path)).st_mode & S_IFREG)
 
+    async def _tree_operation(
+        self, path: str | PurePath, operation: TreeOperation, name: str, force: bool = False, **kwargs
+    ) -> None:
+        """Apply an operation to a whole remote tree in a single roundtrip, raising on the first failure reported."""
+        try:
+            result = await self._client.tree_operation(path, operation, **kwargs)
+        finally:
+            self.invalidate_metadata(path, recursive=True)
+        if not result.failures or force:
+            return
+        failed_path, errno = result.failures[0]
+        more = f" and {result.failed - 1} more" if result.failed > 1 else ""
+        await self._client.raise_errno_exception(f"failed to {name}: {failed_path}{more}", errno)
+
     async def _chown(self, path: str | PurePath, uid: int, gid: int) -> None:
         """Change owner and group for a remote path."""
-        if (await self._client.symbols.chown(path, uid, gid)).c_int32 < 0:
+        try:
+            ret = await self._client.symbols.chown(path, uid, gid)
+        finally:
+            self.invalidate_metadata(path)
+        if ret.c_int32 < 0:
             await self._client.raise_errno_exception(f"failed to chown: {path}")
 
     async def chown(self, path: str | PurePath, uid: int, gid: int, recursive: bool = False) -> None:
@@ -448,12 +612,15 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
             await self._chown(path, uid, gid)
             return
 
-        async for file in self.find(path, topdown=False):
-            await self._chown(file, uid, gid)
+        await self._tree_operation(path, TreeOperation.TREE_OPERATION_CHOWN, "chown", uid=uid, gid=gid)
 
     async def _chmod(self, path: str | PurePath, mode: int) -> None:
         """Change mode bits for a remote path."""
-        if (await self._client.symbols.chmod(path, mode)).c_int32 < 0:
+        try:
+            ret = await self._client.symbols.chmod(path, mode)
+        finally:
+            self.invalidate_metadata(path)
+        if ret.c_int32 < 0:
             await self._client.raise_errno_exception(f"failed to chmod: {path}")
 
     async def chmod(self, path: str | PurePath, mode: int, recursive: bool = False) -> None:
@@ -462,31 +629,57 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
             await self._chmod(path, mode)
             return
 
-        async for file in self.find(path, topdown=False):
-            await self._chmod(file, mode)
+        await self._tree_operation(path, TreeOperation.TREE_OPERATION_CHMOD, "chmod", mode=mode)
+
+    async def utime(self, path: str | PurePath, times: tuple[float, float] | None = None) -> None:
+        """Set the access and modification times of a path, or both to the current time."""
+        if times is None:
+            timevals = 0
+        else:
+            timevals = b"".join(
+                timeval.build({"tv_sec": int(t), "tv_usec": int((t - int(t)) * 1_000_000)}) for t in times
+            )
+        try:
+            ret = await self._client.symbols.utimes(path, timevals)
+        finally:
+            self.invalidate_metadata(path)
+        if ret.c_int32 < 0:
+            await self._client.raise_errno_exception(f"failed to utime: {path}")
 
     async def _remove(self, path: str | PurePath, force=False) -> None:
         """Remove a file on the remote filesystem."""
-        if (await self._client.symbols.remove(path)).c_int32 < 0 and not force:
+        try:
+            ret = await self._client.symbols.remove(path)
+        finally:
+            self.invalidate_metadata(path, recursive=True)
+        if ret.c_int32 < 0 and not force:
             await self._client.raise_errno_exception(f"failed to remove: {path}")
 
     async def remove(self, path: str | PurePath, recursive: bool = False, force: bool = False) -> None:
         """Remove a file or directory tree on the remote filesystem."""
-        if not recursive or await self.is_file(path):
+        if not recursive:
             await self._remove(path, force=force)
             return
 
-        async for filename in self.find(path, topdown=False):
-            await self._remove(filename, force=force)
+        await self._tree_operation(path, TreeOperation.TREE_OPERATION_REMOVE, "remove", force=force)
 
     async def rename(self, old: str | PurePath, new: str | PurePath) -> None:
         """Rename or move a path on the remote filesystem."""
-        if (await self._client.symbols.rename(old, new)).c_int32 < 0:
+        try:
+            ret = await self._client.symbols.rename(old, new)
+        finally:
+            self.invalidate_metadata(old, recursive=True)
+            self.invalidate_metadata(new, recursive=True)
+        if ret.c_int32 < 0:
             await self._client.raise_errno_exception(f"failed to rename: {old} -> {new}")
 
     async def _mkdir(self, path: str | PurePath, mode: int = 0o777) -> None:
         """Create a directory on the remote filesystem."""
-        if (await self._client.symbols.mkdir(path, mode)).c_int64 < 0:
+        try:
+            ret = await self._client.symbols.mkdir(path, mode)
+        finally:
+            self.invalidate_metadata(path)
+        if ret.c_int64 < 0:
             await self._client.raise_errno_exception(f"failed to mkdir: {path}")
 
         # os may not always respect the permission given by the mode argument to mkdir
@@ -516,6 +709,8 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
 
     async def chdir(self, path: str | PurePath) -> None:
         """Change the remote process working directory."""
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate_relative()
         if (await self._client.symbols.chdir(path)).c_int64 < 0:
             await self._client.raise_errno_exception(f"failed to chdir: {path}")
 
@@ -567,19 +762,66 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
         if mode_int is None:
             raise ArgumentError(f"mode can be only one of: {available_modes.keys()}")
 
-        fd = (await self._client.symbols.open(file, mode_int, access, va_list_index=2)).c_int32
+        try:
+            fd = (await self._client.symbols.open(file, mode_int, access, va_list_index=2)).c_int32
+        finally:
+            if mode_int != O_RDONLY:
+                self.invalidate_metadata(file)
         if fd < 0:
             await self._client.raise_errno_exception(f"failed to open: {file}")
 
-        return File(self._client, fd)
+        return File(self._client, fd, path=None if mode_int == O_RDONLY else file)
+
+    async def mmap(
+        self,
+        file: str | PurePath,
+        page_size: int = DEFAULT_MMAP_PAGE_SIZE,
+        read_ahead: int = DEFAULT_MMAP_READ_AHEAD,
+        max_pages: int = DEFAULT_MMAP_MAX_PAGES,
+    ) -> MappedFile[ClientT_co]:
+        """
+        Get a read-only view of a remote file, fetching its pages on demand instead of reading it whole.
 
-    async def write_file(self, file: str | PurePath, buf: bytes, access: int = 0o777) -> None:
-        async with await self.open(file, "w", access=access) as f:
-            await f.write(buf)
+        :param file: file to view
+        :param page_size: number of bytes fetched per page
+        :param read_ahead: number of pages fetched past every miss
+        :param max_pages: maximal number of pages cached
+        :return: a context manager view, closing the file once done
+        """
+        f = await self.open(file, "r")
+        try:
+            size = await f.seek(0, SEEK_END)
+        except BaseException:
+            await f.deallocate()
+            raise
+        return MappedFile(self._client, f, size, page_size=page_size, read_ahead=read_ahead, max_pages=max_pages)
+
+    async def write_file(
+        self, file: str | PurePath, buf: Buffer, access: int = 0o777, chunk_size: int = FILE_CHUNK_SIZE
+    ) -> int:
+        """write a whole file, streamed in chunks. a buffer smaller than chunk_size costs a single roundtrip"""
+        view = memoryview(buf).cast("B")
+        try:
+            return await self._client.file_write_stream(
+                file, (view[offset : offset + chunk_size] for offset in range(0, len(view), chunk_size)), access=access
+            )
+        finally:
+            self.invalidate_metadata(file)
 
-    async def read_file(self, file: str | PurePath) -> bytes:
-        async with await self.open(file, "r") as f:
-            return await f.read()
+    async def read_file(self, file: str | PurePath, chunk_size: int = FILE_CHUNK_SIZE) -> bytes:
+        """read a whole file, streamed in chunks. a file smaller than chunk_size costs a single roundtrip"""
+        return b"".join([chunk async for chunk in self._client.file_read_stream(file, chunk_size)])
+
+    async def hash(self, file: str | PurePath, offset: int = 0, size: int = 0) -> str:
+        """
+        Compute the SHA-256 of a file, or of a range of it, on the remote side.
+
+        :param file: file to hash
+        :param offset: offset the range starts at
+        :param size: size of the range. 0 hashes up to EOF
+        :return: the hex digest
+        """
+        return (await self._client.file_hash(file, offset=offset, size=size))[0].hex()
 
     def remote_path(self, path: str | PurePath) -> RemotePath[ClientT_co]:
         return RemotePath(path, client=self._client)
@@ -590,12 +832,50 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
         local: str | PurePath,
         recursive: bool = False,
         force: bool = False,
-    ):
-        """pull complete directory tree"""
+        jobs: int = DEFAULT_TRANSFER_JOBS,
+        workers: int = 1,
+        progress: bool | ProgressCallback = False,
+        chunk_size: int = FILE_CHUNK_SIZE,
+        resumable: bool = False,
+        archive: bool = False,
+    ) -> TransferProgress:
+        """
+        pull complete directory tree
+
+        when `content_cache` is set, each file is hashed remotely first, and copied from the cache when its content is
+        already there. otherwise it is transferred through the cache.
+
+        :param remotes: remote files or directories to pull
+        :param local: local destination
+        :param recursive: pull directories
+        :param force: overwrite existing files
+        :param jobs: number of files transferred concurrently
+        :param workers: number of connections to transfer over, additional workers of the server being connected
+            when the client supports it
+        :param progress: True to display a progress bar, or a callable to report the progress to
+        :param chunk_size: number of bytes transferred per roundtrip
+        :param resumable: write each file into a `.part` file, resumed by a following transfer or after a lost
+            connection, and verified against a SHA-256 digest of its source before being renamed to its destination
+        :param archive: pull directories as tar streams generated server-side (see pull_archive()), costing a
+            roundtrip per chunk_size bytes regardless of their number of files. the fastest for trees of many small
+            files, it can't be resumable and bypasses the content cache
+        :return: the transfer statistics
+        """
         if not isinstance(remotes, list):
             remotes = [posixpath.expanduser(remotes)]
         remotes_str = [posixpath.expanduser(remote) for remote in remotes]
-        await self.cp([self.remote_path(remote) for remote in remotes_str], Path(str(local)), recursive, force)
+        transfer = Transfer(
+            self._client,
+            jobs=jobs,
+            workers=workers,
+            chunk_size=chunk_size,
+            progress=progress,
+            resumable=resumable,
+            content_cache=self.content_cache,
+            archive=archive,
+        )
+        await transfer.pull(remotes_str, Path(str(local)), recursive, force)
+        return transfer.progress
 
     async def push(
         self,
@@ -603,12 +883,132 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
         remote: str | PurePath,
         recursive: bool = False,
         force: bool = False,
-    ):
-        """push complete directory tree"""
+        jobs: int = DEFAULT_TRANSFER_JOBS,
+        workers: int = 1,
+        progress: bool | ProgressCallback = False,
+        chunk_size: int = FILE_CHUNK_SIZE,
+        resumable: bool = False,
+    ) -> TransferProgress:
+        """
+        push complete directory tree
+
+        :param local_files: local files or directories to push
+        :param remote: remote destination
+        :param recursive: push directories
+        :param force: overwrite existing files
+        :param jobs: number of files transferred concurrently
+        :param workers: number of connections to transfer over, additional workers of the server being connected
+            when the client supports it
+        :param progress: True to display a progress bar, or a callable to report the progress to
+        :param chunk_size: number of bytes transferred per roundtrip
+        :param resumable: write each file into a `.part` file, resumed by a following transfer or after a lost
+            connection, and verified against a SHA-256 digest of its source before being renamed to its destination
+        :return: the transfer statistics
+        """
         if not isinstance(local_files, list):
             local_files = [posixpath.expanduser(local_files)]
         locals_str = [posixpath.expanduser(local) for local in local_files]
-        await self.cp([Path(str(local)) for local in locals_str], self.remote_path(remote), recursive, force)
+        transfer = Transfer(
+            self._client, jobs=jobs, workers=workers, chunk_size=chunk_size, progress=progress, resumable=resumable
+        )
+        try:
+            await transfer.push([Path(str(local)) for local in locals_str], str(remote), recursive, force)
+        finally:
+            # files are written by the transfer's workers too
+            self.invalidate_metadata(remote, recursive=True)
+        return transfer.progress
+
+    async def pull_archive(
+        self,
+        remote: str | PurePath,
+        local: str | PurePath,
+        extract: bool = False,
+        force: bool = True,
+        chunk_size: int = FILE_CHUNK_SIZE,
+    ) -> None:
+        """
+        Pull a remote tree as a single tar stream generated server-side, costing a roundtrip per chunk_size bytes
+        instead of several per file. Modes, symlinks and modification times are preserved.
+
+        :param remote: root of the tree, the archive's top-level entry
+        :param local: tar file to write, or with extract, directory to extract the tree into
+        :param extract: extract the stream on the fly instead of writing it
+        :param force: overwrite existing files when extracting
+        :param chunk_size: number of bytes transferred per roundtrip
+        """
+        remote = posixpath.expanduser(str(remote))
+        local = os.path.expanduser(str(local))
+        # closed along with the stream on failure, to release the server-side archive at once
+        async with contextlib.aclosing(self._client.archive_read_stream(remote, chunk_size)) as chunks:
+            if not extract:
+                with open(local, "wb") as f:
+                    async for chunk in chunks:
+                        f.write(chunk)
+                return
+            extractor = TarExtractor(local, force=force)
+            try:
+                async for chunk in chunks:
+                    extractor.feed(chunk)
+            except BaseException:
+                extractor.abort()
+                raise
+            extractor.close()
+
+    async def push_archive(
+        self, local_tar: str | PurePath, remote: str | PurePath, chunk_size: int = FILE_CHUNK_SIZE
+    ) -> None:
+        """
+        Extract a local tar archive into a remote directory server-side, streaming it in a roundtrip per chunk_size
+        bytes instead of several per file. Modes, symlinks, hard links and modification times are preserved, and
+        existing files are overwritten.
+
+        :param local_tar: GNU or POSIX tar archive, possibly gzip, bzip2 or xz compressed
+        :param remote: directory to extract into, created if missing
+        :param chunk_size: number of bytes transferred per roundtrip
+        """
+        remote = posixpath.expanduser(str(remote))
+        try:
+            with open_archive(os.path.expanduser(str(local_tar))) as f:
+                await self._client.archive_write_stream(remote, iter(lambda: f.read(chunk_size), b""))
+        finally:
+            self.invalidate_metadata(remote, recursive=True)
+
+    async def sync(
+        self,
+        src: str | PurePath,
+        dst: str | PurePath,
+        direction: SyncDirection,
+        dry_run: bool = False,
+        checksum: bool = False,
+        block_size: int = DEFAULT_SYNC_BLOCK_SIZE,
+        chunk_size: int = FILE_CHUNK_SIZE,
+    ) -> SyncReport:
+        """
+        Bring dst up to date with src, transferring only what differs, rsync-style.
+
+        Files whose size and modification time match are skipped. Other files are compared block by block against
+        digests computed on each side, and only the differing blocks are transferred and patched in place. The
+        modification times of synced files are set to their source's, so that the next sync skips them.
+
+        :param src: file, or directory whose content is synced
+        :param dst: destination path. an existing directory receives a source file under its own name
+        :param direction: "push" to sync a local src into a remote dst, "pull" to sync a remote src into a local dst
+        :param dry_run: only report the changes to be made, without making them
+        :param checksum: compare the blocks of files even if their size and modification time match
+        :param block_size: size of the blocks compared
+        :param chunk_size: maximal number of bytes transferred per roundtrip
+        :return: the changes made, or to be made on a dry-run
+        """
+        sync = Sync(
+            self._client, direction, dry_run=dry_run, checksum=checksum, block_size=block_size, chunk_size=chunk_size
+        )
+        src = posixpath.expanduser(str(src)) if direction == "pull" else os.path.expanduser(str(src))
+        dst = os.path.expanduser(str(dst)) if direction == "pull" else posixpath.expanduser(str(dst))
+        try:
+            return await sync.sync(src, dst)
+        finally:
+            if direction == "push" and not dry_run:
+                self.invalidate_metadata(dst, recursive=True)
 
     async def touch(self, file: str | PurePath, mode: int = 0o666, exist_ok: bool = True) -> None:
         """simulate unix touch command for given file"""
@@ -623,14 +1023,20 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
 
     async def symlink(self, src: str | PurePath, dst: str | PurePath) -> int:
         """Create a symbolic link on the remote filesystem."""
-        err = (await self._client.symbols.symlink(src, dst)).c_int64
+        try:
+            err = (await self._client.symbols.symlink(src, dst)).c_int64
+        finally:
+            self.invalidate_metadata(dst)
         if err < 0:
             await self._client.raise_errno_exception(f"symlink failed to create link: {dst}->{src}")
         return err
 
     async def link(self, src: str | PurePath, dst: str | PurePath) -> int:
         """Create a hard link on the remote filesystem."""
-        err = (await self._client.symbols.link(src, dst)).c_int64
+        try:
+            err = (await self._client.symbols.link(src, dst)).c_int64
+        finally:
+            self.invalidate_metadata(dst)
         if err < 0:
             await self._client.raise_errno_exception(f"link failed to create link: {dst}->{src}")
         return err
@@ -644,94 +1050,291 @@ class Fs(ClientBound[ClientT_co], abc.ABC):
         try:
             return await chunk.peek_str()
         finally:
-            await self._client.symbols.free(chunk)
+            await self._client.defer_release(self._client.symbols.free, chunk)
 
     async def listdir(self, path: str | PurePath = ".") -> list[str]:
         """get directory listing for a given dirname"""
-        return [e.name for e in await self.scandir(path)]
+        return [e.name for e in await self.scandir(path, stat_mode=ListDirStat.LIST_DIR_STAT_NONE)]
 
-    async def scandir(self, path: str | PurePath = ".") -> list[DirEntry[ClientT_co]]:
-        """get directory listing for a given dirname"""
-        result = []
-        for entry in (await self._client.listdir(path))[2:]:
-            result.append(DirEntry(path, entry, self._client))
-        return result
+    async def scandir(
+        self, path: str | PurePath = ".", stat_mode: ListDirStat.ValueType = ListDirStat.LIST_DIR_STAT_BOTH
+    ) -> list[DirEntry[ClientT_co]]:
+        """
+        get directory listing for a given dirname
+
+        :param path: directory to list
+        :param stat_mode: which stat information to prefetch with the listing. entries listed without it stat
+            themselves on demand
+        """
+
+        async def _scandir() -> list[DirEntry[ClientT_co]]:
+            result = []
+            for entry in await self._client.listdir(path, stat_mode=stat_mode):
+                if entry.d_name in (".", ".."):
+                    continue
+                result.append(DirEntry(path, entry, self._client))
+            return result
+
+        if self.metadata_cache is None:
+            return await _scandir()
+        return list(await self.metadata_cache.get_or_fetch(path, ("scandir", stat_mode), _scandir))
 
-    @abc.abstractmethod
     async def stat(self, path: str | PurePath) -> Any:
+        """Return stat info for a remote path."""
+        if self.metadata_cache is None:
+            return await self._stat(path)
+        return await self.metadata_cache.get_or_fetch(path, "stat", lambda: self._stat(path))
+
+    async def lstat(self, path: str | PurePath) -> Any:
+        """Return lstat info for a remote path (does not follow symlinks)."""
+        if self.metadata_cache is None:
+            return await self._lstat(path)
+        return await self.metadata_cache.get_or_fetch(path, "lstat", lambda: self._lstat(path))
+
+    @abc.abstractmethod
+    async def _stat(self, path: str | PurePath) -> Any:
         """Return stat info for a remote path (platform-specific implementation)."""
 
     @abc.abstractmethod
-    async def lstat(self, path: str | PurePath) -> Any:
+    async def _lstat(self, path: str | PurePath) -> Any:
         """Return lstat info for a remote path (platform-specific implementation)."""
 
     async def accessible(self, path: str | PurePath, mode: int = R_OK) -> bool:
         """check if a given path can be accessed."""
-        err = await self._client.symbols.access(path, mode)
-        return err == 0
+
+        async def _accessible() -> bool:
+            err = await self._client.symbols.access(path, mode)
+            return err == 0
+
+        if self.metadata_cache is None:
+            return await _accessible()
+        return await self.metadata_cache.get_or_fetch(path, ("access", mode), _accessible)
 
     async def chflags(self, path: str | PurePath, flags: int = 0) -> None:
         """set file flags"""
-        err = await self._client.symbols.chflags(path, flags)
+        try:
+            err = await self._client.symbols.chflags(path, flags)
+        finally:
+            self.invalidate_metadata(path)
         if err < 0:
             await self._client.raise_errno_exception(f"failed to chflags on: {path}")
 
-    async def find(self, top: str | PurePath, topdown: bool = True) -> AsyncGenerator[str]:
-        """traverse a file tree top to down"""
+    async def find(
+        self,
+        top: str | PurePath,
+        topdown: bool = True,
+        name: str | Collection[str] = (),
+        regex: str | None = None,
+        type: str | Collection[str] = (),  # noqa: A002
+        size: tuple[int | None, int | None] | None = None,
+        newer: float | datetime | None = None,
+        older: float | datetime | None = None,
+        uid: int | Collection[int] = (),
+        max_depth: int | None = None,
+        followlinks: bool = False,
+        xdev: bool = False,
+    ) -> AsyncGenerator[str]:
+        """
+        Traverse a file tree, yielding the paths satisfying all the given predicates, as find(1) does.
+
+        The predicates are evaluated server-side during the walk, so that only the matching paths are transferred.
+        They are evaluated against the lstat() of the entries, and don't prevent descending into directories.
+
+        :param top: root of the traversal, itself yielded if it matches
+        :param topdown: yield directories before their content
+        :param name: fnmatch patterns, any of which the name must match
+        :param regex: POSIX extended regular expression searched in the name
+        :param type: find(1) -type letters ("f", "d", "l", "p", "s", "c" or "b"), any of which the type must be
+        :param size: inclusive (min, max) size range, either of which may be None
+        :param newer: yield only what was modified after this timestamp or datetime
+        :param older: yield only what was modified before this timestamp or datetime
+        :param uid: owners, any of which must own the path
+        :param max_depth: deepest level to descend to, the entries of top being at depth 1. None for unlimited
+        :param followlinks: descend into symlinks to directories
+        :param xdev: don't descend into directories on other devices than top
+        """
         top = str(top)
-        if topdown:
-            if await self.accessible(top):
-                yield top
-            else:
+        names = [name] if isinstance(name, str) else list(name)
+        types = [FIND_TYPES[letter] for letter in ([type] if isinstance(type, str) else type)]
+        uids = [uid] if isinstance(uid, int) else list(uid)
+        size_min, size_max = size or (None, None)
+        walk_filter = None
+        if names or regex or types or size or newer is not None or older is not None or uids:
+            walk_filter = WalkFilter(
+                name=names,
+                regex=regex or "",
+                types=types,
+                size_min=size_min or 0,
+                size_max=size_max + 1 if size_max is not None else 0,
+                mtime_min=math.floor(_timestamp(newer)) + 1 if newer is not None else 0,
+                mtime_max=math.ceil(_timestamp(older)) if older is not None else 0,
+                uids=uids,
+            )
+
+        if walk_filter is None:
+            if not await self.accessible(top):
                 raise RpcFileNotFoundError(f"cannot access: {top}")
+            top_matches = True
+        else:
+            top_matches = _walk_filter_matches(walk_filter, posixpath.basename(top.rstrip("/")), await self.lstat(top))
 
-        async for root, dirs, files in self.walk(top, topdown=topdown):
-            for name in files:
-                yield os.path.join(root, name)
-            for name in dirs:
-                yield os.path.join(root, name)
+        if topdown and top_matches:
+            yield top
 
-        if not topdown:
-            if await self.accessible(top):
-                yield top
-            else:
-                raise RpcFileNotFoundError(f"cannot access: {top}")
+        async for root, dirs, files in self._walk(
+            top, topdown=topdown, followlinks=followlinks, max_depth=max_depth, xdev=xdev, walk_filter=walk_filter
+        ):
+            for entry_name in files:
+                yield os.path.join(root, entry_name)
+            for entry_name in dirs:
+                yield os.path.join(root, entry_name)
+
+        if not topdown and top_matches:
+            yield top
+
+    async def du(self, path: str | PurePath, depth: int | None = 0, xdev: bool = False) -> list["DiskUsage"]:
+        """
+        Aggregate the disk usage of a tree, as du(1) does, in a single roundtrip.
+
+        :param path: root of the tree
+        :param depth: deepest level of the directories reported, the subdirectories of path being at depth 1. 0 reports
+            only path itself, and None every directory
+        :param xdev: skip directories on other devices than path
+        :return: the usage of the reported directories, every one after its subdirectories and path last
+        """
+        return await self._client.du(path, depth=depth, xdev=xdev)
+
+    async def watch(
+        self,
+        paths: str | PurePath | Collection[str | PurePath],
+        recursive: bool = False,
+        poll_timeout: float = DEFAULT_WATCH_POLL_TIMEOUT,
+    ) -> AsyncGenerator[FileEvent]:
+        """
+        Watch paths for changes, instead of polling their stat().
+
+        The changes are caught by inotify on Linux and kqueue on Darwin, and streamed as they happen. The cached
+        metadata of the changed paths is invalidated before their events are yielded.
+
+        :param paths: paths to watch
+        :param recursive: also watch the subdirectories of the directories, including those created later
+        :param poll_timeout: seconds each roundtrip waits for events. other calls of the client wait for it meanwhile
+        """
+        if isinstance(paths, (str, PurePath)):
+            paths = [paths]
+        # closed along with this generator, to stop watching at once
+        async with contextlib.aclosing(
+            self._client.watch(paths, recursive=recursive, poll_timeout=poll_timeout)
+        ) as events:
+            async for event in events:
+                if event.kind == FileEventType.OVERFLOW:
+                    if self.metadata_cache is not None:
+                        self.metadata_cache.clear()
+                else:
+                    self.invalidate_metadata(event.path, recursive=event.is_dir)
+                    if event.dest is not None:
+                        self.invalidate_metadata(event.dest, recursive=event.is_dir)
+                yield event
 
     async def walk(
         self,
         top: str | PurePath,
         topdown: bool = True,
         onerror: Callable[[Exception], object] | None = None,
+        followlinks: bool = False,
+        max_depth: int | None = None,
+        xdev: bool = False,
+        include: Collection[str] = (),
+        exclude: Collection[str] = (),
     ) -> AsyncGenerator[tuple[str, list[str], list[str]]]:
-        """provides the same results as os.walk(top)"""
+        """
+        provides the same results as os.walk(top)
+
+        The tree is walked server-side and streamed back in batches, rather than listed directory by directory.
+        As with os.walk(), when topdown is True, removing names from the yielded dirs prunes them from the walk.
+
+        :param top: root of the walk
+        :param topdown: yield directories before their subdirectories
+        :param onerror: called with the exception of every directory failing to be listed, instead of raising it
+        :param followlinks: descend into symlinks to directories
+        :param max_depth: deepest level to list, the entries of top being at depth 1. None for unlimited
+        :param xdev: don't descend into directories on other devices than top
+        :param include: fnmatch patterns a file name must match to be listed
+        :param exclude: fnmatch patterns of names to skip, and not to descend into
+        """
+        async for item in self._walk(top, topdown, onerror, followlinks, max_depth, xdev, include, exclude):
+            yield item
+
+    async def _walk(
+        self,
+        top: str | PurePath,
+        topdown: bool = True,
+        onerror: Callable[[Exception], object] | None = None,
+        followlinks: bool = False,
+        max_depth: int | None = None,
+        xdev: bool = False,
+        include: Collection[str] = (),
+        exclude: Collection[str] = (),
+        walk_filter: WalkFilter | None = None,
+    ) -> AsyncGenerator[tuple[str, list[str], list[str]]]:
+        """walk(), with the entries optionally filtered server-side, the directories holding none being omitted"""
         top = str(top)
-        dirs = []
-        files = []
+        prune: set[str] = set()
+        pruned: list[str] = []
+        # bottom-up: directories yet to be yielded, awaiting the rest of their subtree
+        ancestors: list[tuple[str, list[str], list[str]]] = []
         try:
-            for entry in await self.scandir(top):
-                try:
-                    if await entry.is_dir():
-                        dirs.append(entry.name)
+            async for walk_dir in self._client.walk(
+                top,
+                max_depth=max_depth,
+                follow_symlinks=followlinks,
+                xdev=xdev,
+                include=include,
+                exclude=exclude,
+                prune=prune,
+                walk_filter=walk_filter,
+            ):
+                if any(_is_subpath(walk_dir.path, path) for path in pruned):
+                    continue
+                if walk_dir.errno != 0:
+                    try:
+                        await self._client.set_errno(walk_dir.errno)
+                        await self._client.raise_errno_exception(f"failed to listdir: {walk_dir.path}")
+                    except Exception as e:
+                        if not onerror:
+                            raise
+                        onerror(e)
+                    continue
+
+                dirs = []
+                files = []
+                for entry in walk_dir.entries:
+                    if entry.stat is not None and entry.stat.errno == 0:
+                        is_dir = (entry.stat.st_mode & S_IFMT) == S_IFDIR
                     else:
-                        files.append(entry.name)
-                except Exception as e:
-                    if not onerror:
-                        raise
-                    onerror(e)
+                        is_dir = entry.d_type == DT_DIR
+                    (dirs if is_dir else files).append(entry.d_name)
+
+                if topdown:
+                    listed_dirs = list(dirs)
+                    yield walk_dir.path, dirs, files
+                    for name in set(listed_dirs) - set(dirs):
+                        path = posixpath.join(walk_dir.path, name)
+                        prune.add(path)
+                        pruned.append(path)
+                    continue
+
+                while ancestors and not _is_subpath(walk_dir.path, ancestors[-1][0]):
+                    yield ancestors.pop()
+                ancestors.append((walk_dir.path, dirs, files))
         except Exception as e:
             if not onerror:
                 raise
             onerror(e)
+            return
 
-        if topdown:
-            yield top, dirs, files
-
-        for d in dirs:
-            async for item in self.walk(posixpath.join(top, d), topdown=topdown, onerror=onerror):
-                yield item
-
-        if not topdown:
-            yield top, dirs, files
+        while ancestors:
+            yield ancestors.pop()
 
     @asynccontextmanager
     async def remote_file(self, remote: str | PurePath) -> AsyncGenerator[Path]:
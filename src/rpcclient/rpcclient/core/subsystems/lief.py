@@ -20,6 +20,9 @@ class Lief(ClientBound[ClientT_co]):
     async def parse(
         self, path: str | PurePath
     ) -> lief.COFF.Binary | lief.ELF.Binary | lief.MachO.Binary | lief.OAT.Binary | lief.PE.Binary | None:
+        content_cache = self._client.fs.content_cache
+        if content_cache is not None:
+            return lief.parse(str(await content_cache.pull(self._client, str(path))))
         async with await self._client.fs.open(path, "r") as f:
             return lief.parse(await f.read())
 
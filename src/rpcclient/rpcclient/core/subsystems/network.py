@@ -1,6 +1,6 @@
 import socket as pysock
 from collections import namedtuple
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, ClassVar
 
 from rpcclient.clients.darwin.structs import timeval
 from rpcclient.core._types import ClientBound, ClientT_co
@@ -22,6 +22,7 @@ from rpcclient.core.structs.consts import (
     SOL_SOCKET,
 )
 from rpcclient.core.structs.generic import (
+    compiled,
     parse_hostent,
     parse_ifaddrs,
     sockaddr,
@@ -160,6 +161,9 @@ class Socket(Allocated[ClientT_co]):
 
 
 class Network(ClientBound[ClientT_co]):
+    # resolved together along with the first symbol used
+    SYMBOLS: ClassVar[tuple[str, ...]] = ("close", "connect", "fcntl", "recv", "send", "setsockopt", "socket")
+
     def __init__(self, client: ClientT_co) -> None:
         """
         :param rpcclient.client.client.Client client:
@@ -184,7 +188,7 @@ class Network(ClientBound[ClientT_co]):
         await self._client.set_errno(0)
         error = (await self._client.symbols.connect(sockfd, servaddr, len(servaddr))).c_int64
         if error == -1:
-            await self._client.symbols.close(sockfd)
+            await self._client.defer_release(self._client.symbols.close, sockfd)
             await self._client.raise_errno_exception(f"failed connecting to: {address}:{port}")
         return Socket(self._client, sockfd)
 
@@ -195,34 +199,28 @@ class Network(ClientBound[ClientT_co]):
         await self._client.set_errno(0)
         error = (await self._client.symbols.connect(sockfd, servaddr, len(servaddr))).c_int64
         if error == -1:
-            await self._client.symbols.close(sockfd)
+            await self._client.defer_release(self._client.symbols.close, sockfd)
             await self._client.raise_errno_exception(f"failed connecting to: {filename}")
         return Socket(self._client, sockfd)
 
     async def gethostbyname(self, name: str) -> Hostentry | None:
         """Query DNS record. Returns None if not found."""
-        aliases = []
-        addresses = []
         result = await self._client.symbols.gethostbyname(name)
         if result == 0:
             return None
         result = await parse_hostent(self._client, result)
-        p_aliases = result.h_aliases
-
-        i = 0
-        while alias := await p_aliases.getindex(i):
-            aliases.append(await alias.peek_str())
-            i += 1
-
-        addr_list = result.h_addr_list
-
-        i = 0
-        while addr := await addr_list.getindex(i):
-            addresses.append(pysock.inet_ntoa(await addr.peek(4)))
-            i += 1
+        aliases = [await alias.peek_str() for alias in await result.h_aliases.as_array("P").tolist()]
+        addresses = [pysock.inet_ntoa(await addr.peek(4)) for addr in await result.h_addr_list.as_array("P").tolist()]
 
         return Hostentry(name=result.h_name, aliases=aliases, addresses=addresses)
 
+    @staticmethod
+    async def _inet_ntoa(address: Symbol) -> str | None:
+        """format the IPv4 address of a sockaddr_in pointer, None for a null one"""
+        if not address:
+            return None
+        return pysock.inet_ntoa((await address.parse(compiled(sockaddr_in))).sin_addr)
+
     async def interfaces(self) -> list[Interface]:
         """get current interfaces"""
         results = []
@@ -233,12 +231,12 @@ class Network(ClientBound[ClientT_co]):
             current = await parse_ifaddrs(self._client, await addresses.getindex(0))
 
             while current:
-                family = sockaddr.parse(current.ifa_addr.peek(sockaddr.sizeof())).sa_family
+                family = (await current.ifa_addr.parse(compiled(sockaddr))).sa_family if current.ifa_addr else None
 
                 if family == AF_INET:
-                    address = pysock.inet_ntoa(sockaddr_in.parse_stream(current.ifa_addr).sin_addr)
-                    netmask = pysock.inet_ntoa(sockaddr_in.parse_stream(current.ifa_netmask).sin_addr)
-                    broadcast = pysock.inet_ntoa(sockaddr_in.parse_stream(current.ifa_dstaddr).sin_addr)
+                    address = await self._inet_ntoa(current.ifa_addr)
+                    netmask = await self._inet_ntoa(current.ifa_netmask)
+                    broadcast = await self._inet_ntoa(current.ifa_dstaddr)
                     results.append(
                         Interface(name=current.ifa_name, address=address, netmask=netmask, broadcast=broadcast)
                     )
@@ -1,9 +1,14 @@
+from typing import ClassVar
+
 from rpcclient.core._types import ClientBound, ClientT_co
 from rpcclient.core.structs.consts import SIGTERM
 from rpcclient.exceptions import BadReturnValueError
 
 
 class Processes(ClientBound[ClientT_co]):
+    # resolved together along with the first symbol used
+    SYMBOLS: ClassVar[tuple[str, ...]] = ("kill", "waitpid")
+
     def __init__(self, client: ClientT_co) -> None:
         """
         process manager
@@ -2,16 +2,19 @@ import abc
 import ctypes
 import os
 import struct
-from collections.abc import Coroutine, Generator
+from collections.abc import Coroutine, Generator, Sequence
 from contextlib import contextmanager
 from typing import TYPE_CHECKING, Any, Literal, TypeVar, cast, final, overload
 from typing_extensions import Self
 
 from capstone import CS_ARCH_ARM64, CS_ARCH_X86, CS_MODE_64, CS_MODE_LITTLE_ENDIAN, Cs, CsInsn
 
+from rpcclient.core.remote_array import DEFAULT_ARRAY_CHUNK_SIZE, RemoteArray
+from rpcclient.core.remote_function import CType, RemoteFunction
+from rpcclient.core.remote_struct import DEFAULT_STRUCT_COALESCE_GAP, DEFAULT_STRUCT_PREFETCH_THRESHOLD, RemoteStruct
 from rpcclient.core.structs.generic import Dl_info
 from rpcclient.protos.rpc_pb2 import ARCH_ARM64
-from rpcclient.utils import readonly
+from rpcclient.utils import class_readonly, readonly
 
 
 if TYPE_CHECKING:
@@ -30,6 +33,10 @@ SymbolT_co = TypeVar("SymbolT_co", bound="Symbol", covariant=True)
 class AbstractSymbol(int, abc.ABC):
     """Abstract wrapper for a remote symbol object"""
 
+    # defaults shared at class level, an instance only holding the ones set on it
+    item_size: int = 8
+    _offset: int = 0
+
     @final
     def __new__(cls, value: int, *args, **kwargs) -> Self:
         if not isinstance(value, int):
@@ -56,12 +63,16 @@ class AbstractSymbol(int, abc.ABC):
         Temporarily change item size
         :param new_item_size: Temporary item size
         """
-        save_item_size = self.item_size
+        save_item_size = self.__dict__.get("item_size")
         self.item_size = new_item_size
         try:
             yield
         finally:
-            self.item_size = save_item_size
+            if save_item_size is None:
+                # back to the class default
+                del self.item_size
+            else:
+                self.item_size = save_item_size
 
     @abc.abstractmethod
     async def peek(self, count: int, offset: int = 0) -> bytes: ...
@@ -194,6 +205,33 @@ class AbstractSymbol(int, abc.ABC):
     async def parse(self, struct: "Construct[ParsedType, Any]") -> "ParsedType":
         return struct.parse(await self.peek(struct.sizeof()))
 
+    def as_array(
+        self, dtype: str, count: int | None = None, chunk_size: int = DEFAULT_ARRAY_CHUNK_SIZE
+    ) -> RemoteArray[Self]:
+        """
+        Get a lazy view of the array at this address, read in bulk rather than an item per roundtrip.
+
+        :param dtype: struct format character of the items, one of bBhHiIqQfd, or P for pointers wrapped as symbols
+        :param count: number of items, None for an array terminated by a zero item
+        :param chunk_size: maximal number of items fetched per peek when iterating, or looking for the terminator
+        """
+        return RemoteArray(self, dtype, count, chunk_size)
+
+    def as_struct(
+        self,
+        struct: "Construct",
+        prefetch_threshold: float = DEFAULT_STRUCT_PREFETCH_THRESHOLD,
+        coalesce_gap: int = DEFAULT_STRUCT_COALESCE_GAP,
+    ) -> RemoteStruct[Self]:
+        """
+        Get a lazy proxy of the struct at this address, fetching only the fields accessed, unlike parse().
+
+        :param struct: construct Struct of a fixed size
+        :param prefetch_threshold: fraction of the struct above which it's fetched whole
+        :param coalesce_gap: maximal number of unneeded bytes fetched to spare a peek
+        """
+        return RemoteStruct(self, struct, prefetch_threshold, coalesce_gap)
+
     def __add__(self, other) -> Self:
         try:
             return self._symbol_from_value(int(self) + other)
@@ -250,7 +288,16 @@ class AbstractSymbol(int, abc.ABC):
 
 
 class Symbol(AbstractSymbol):
-    """wrapper for a remote symbol object"""
+    """
+    wrapper for a remote symbol object
+
+    Symbols are created through a subclass bound to their client (see `bound_to()`), holding the client at class level
+    along with the attribute defaults. Such a symbol has no instance dict until an attribute is set on it, which
+    matters to the millions of symbols created by pointer-array and heap walks.
+    """
+
+    retval_bit_count: int = RETVAL_BIT_COUNT
+    is_retval_signed: bool = True
 
     @readonly
     def _client(self) -> "CoreClient[Self]": ...
@@ -263,13 +310,30 @@ class Symbol(AbstractSymbol):
         :return: Symbol object.
         :rtype: Symbol
         """
-        self.retval_bit_count: int = RETVAL_BIT_COUNT
-        self.is_retval_signed: bool = True
-        self.item_size: int = 8
+        if type(self)._client is not client:
+            # not created through a subclass bound to client
+            __class__._client.set(self, client)
 
-        # private members
-        __class__._client.set(self, client)
-        self._offset: int = 0
+    @classmethod
+    def bound_to(cls, client: "CoreClient[Any]") -> type[Self]:
+        """
+        Get the subclass of this class whose symbols belong to client.
+
+        :param client: client the symbols belong to
+        :return: subclass named as this class, created once per client
+        """
+        if cls._client is client:
+            return cls
+        bound = client._bound_symbol_types.get(cls)
+        if bound is None:
+            namespace = {
+                "__module__": cls.__module__,
+                "__qualname__": cls.__qualname__,
+                "_client": class_readonly(client),
+            }
+            bound = type(cls)(cls.__name__, (cls,), namespace)
+            client._bound_symbol_types[cls] = bound
+        return bound
 
     def _symbol_from_value(self, value: int) -> Self:
         """
@@ -280,7 +344,7 @@ class Symbol(AbstractSymbol):
         :return: Symbol object.
         :rtype: Symbol
         """
-        return type(self)(value, cast("CoreClient", self._client))
+        return self.bound_to(self._client)(value, cast("CoreClient", self._client))
 
     async def peek(self, count: int, offset: int = 0) -> bytes:
         return await self._client.peek(self + offset, count)
@@ -344,3 +408,15 @@ class Symbol(AbstractSymbol):
         return await self._client.call(self, args, **kwargs)
 
     __call__ = call
+
+    def bind(
+        self, argtypes: Sequence[CType] = (), restype: CType = ctypes.c_void_p, va_list_index: int | None = None
+    ) -> RemoteFunction[Self]:
+        """
+        Get this symbol as a function of a known signature, whose calls skip the per-argument dispatch of call().
+
+        :param argtypes: ctypes types of the fixed arguments: integers, c_void_p, c_char_p or c_double
+        :param restype: ctypes type of the return value: an integer, c_void_p, c_char_p, c_double, c_float, or None
+        :param va_list_index: index of the first variadic argument
+        """
+        return RemoteFunction(self, argtypes, restype, va_list_index)
@@ -0,0 +1,97 @@
+import contextlib
+import ctypes
+import dataclasses
+import os
+import sqlite3
+from collections.abc import Mapping
+from pathlib import Path
+from typing import NamedTuple
+
+
+# bumped whenever the table changes, dropping the addresses stored by older versions
+SCHEMA_VERSION = 1
+
+
+def default_cache_path() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "rpcclient" / "symbols.sqlite3"
+
+
+class CachedSymbol(NamedTuple):
+    address: int
+    image: int  # base address of the image the symbol is in
+
+
+@dataclasses.dataclass(frozen=True)
+class SymbolCacheScope:
+    """Images whose symbol addresses can be persisted, e.g. a shared cache at a given slide."""
+
+    key: str  # identity of the images and of the address they're loaded at
+    start: int
+    end: int
+
+    def __contains__(self, address: int) -> bool:
+        return self.start <= address < self.end
+
+
+class SymbolCache:
+    """
+    Local store of resolved symbol addresses, keyed by the identity of the images they're in.
+
+    The addresses of a shared cache's symbols only depend on its build and slide, so a client connecting to a device
+    already seen since its last boot gets them from here instead of resolving them again. Every symbol is stored along
+    with its image, as not every image of the shared cache is loaded by every process.
+    """
+
+    def __init__(self, path: str | os.PathLike[str] | None = None) -> None:
+        """
+        :param path: sqlite database holding the addresses. defaults to rpcclient/symbols.sqlite3 under the user's cache
+            dir
+        """
+        self.path = Path(path) if path is not None else default_cache_path()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {str(self.path)!r} hits:{self.hits} misses:{self.misses}>"
+
+    @contextlib.contextmanager
+    def _connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(sqlite3.connect(self.path)) as db, db:
+            if db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                db.execute("DROP TABLE IF EXISTS symbols")
+                db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS symbols "
+                "(key TEXT, name TEXT, address INTEGER, image INTEGER, PRIMARY KEY (key, name))"
+            )
+            yield db
+
+    def load(self, key: str) -> dict[str, CachedSymbol]:
+        """addresses and images of the symbols stored for the given scope key"""
+        with self._connect() as db:
+            rows = db.execute("SELECT name, address, image FROM symbols WHERE key = ?", (key,)).fetchall()
+        if rows:
+            self.hits += 1
+        else:
+            self.misses += 1
+        # sqlite integers are signed
+        return {
+            name: CachedSymbol(ctypes.c_uint64(address).value, ctypes.c_uint64(image).value)
+            for name, address, image in rows
+        }
+
+    def store(self, key: str, symbols: Mapping[str, CachedSymbol]) -> None:
+        """add symbol addresses and images to the given scope key"""
+        with self._connect() as db:
+            db.executemany(
+                "INSERT OR REPLACE INTO symbols (key, name, address, image) VALUES (?, ?, ?, ?)",
+                [
+                    (key, name, ctypes.c_int64(symbol.address).value, ctypes.c_int64(symbol.image).value)
+                    for name, symbol in symbols.items()
+                ],
+            )
+
+    def clear(self) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM symbols")
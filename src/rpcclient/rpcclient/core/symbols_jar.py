@@ -1,10 +1,12 @@
-from collections.abc import Iterator
+import asyncio
+from collections.abc import Iterable, Iterator
 from typing import TYPE_CHECKING, Any, Final, Generic, Literal, TypeVar, overload
 from typing_extensions import Self
 
 from rpcclient.core._types import ClientBound
 from rpcclient.core.symbol import Symbol
 from rpcclient.exceptions import SymbolAbsentError
+from rpcclient.utils import single_flight
 
 
 if TYPE_CHECKING:
@@ -16,22 +18,77 @@ SymbolT_co = TypeVar("SymbolT_co", bound=Symbol, covariant=True)
 
 
 class SymbolsJar(ClientBound["CoreClient[SymbolT_co]"], Generic[SymbolT_co]):
-    __slots__ = ("_client", "_dict")
+    __slots__ = ("_client", "_declared", "_dict", "_resolving")
 
     def __init__(self, client: "CoreClient[SymbolT_co]") -> None:
         self._client = client
         self._dict: dict[str, SymbolT_co] = {}
+        # names resolved along with the next symbol resolved lazily
+        self._declared: set[str] = set()
+        # resolutions in flight, by name, shared by the concurrent uses of a symbol
+        self._resolving: dict[str, asyncio.Future[SymbolT_co]] = {}
 
     def __repr__(self) -> str:
         return f"<{type(self).__name__} {self._dict!r}>"
 
     async def get_lazy(self, name: str) -> SymbolT_co:
+        if name in self._dict:
+            return self._dict[name]
+        return await single_flight(self._resolving, name, lambda: self._resolve(name))
+
+    async def _resolve(self, name: str) -> SymbolT_co:
+        if self._declared:
+            await self.prefetch([name, *self._declared])
+            if name not in self._dict:
+                raise SymbolAbsentError(f"no such loaded symbol: {name}")
+            return self._dict[name]
         sym = await self._client.dlsym(self._client._dlsym_global_handle, name)
         if sym == 0:
             raise SymbolAbsentError(f"no such loaded symbol: {name}")
         self._dict[name] = self._client.symbol(sym)
         return self._dict[name]
 
+    def declare(self, names: Iterable[str]) -> None:
+        """
+        Declare symbols about to be used, so that they're resolved in the same roundtrip as the next symbol resolved
+        lazily, instead of a roundtrip each.
+        """
+        self._declared.update(name for name in names if name not in self._dict)
+
+    async def prefetch(self, names: Iterable[str]) -> None:
+        """
+        Resolve several symbols in a single roundtrip, instead of a roundtrip each on their first use.
+
+        Absent symbols are skipped, and still raise SymbolAbsentError once used.
+        """
+        names = [name for name in dict.fromkeys(names) if name not in self._dict]
+        self._declared.difference_update(names)
+        addresses = await self._client.dlsym_multi(self._client._dlsym_global_handle, names)
+        for name, address in zip(names, addresses, strict=True):
+            if address != 0:
+                self._dict[name] = self._client.symbol(address)
+
+    async def revalidate(self) -> bool:
+        """
+        Check the cached addresses still hold, e.g. after reconnecting to a new worker.
+
+        The cached symbols are all re-resolved in a single roundtrip; if any address moved, the cache is replaced by
+        the new addresses, dropping the symbols which cannot be resolved by name.
+
+        :return: whether the cached addresses were kept
+        """
+        if not self._dict:
+            return True
+        names = list(self._dict)
+        addresses = await self._client.dlsym_multi(self._client._dlsym_global_handle, names)
+        resolved = {name: address for name, address in zip(names, addresses, strict=True) if address != 0}
+        if all(self._dict[name] == address for name, address in resolved.items()):
+            return True
+        self._dict.clear()
+        for name, address in resolved.items():
+            self._dict[name] = self._client.symbol(address)
+        return False
+
     def __iter__(self) -> Iterator[str]:
         return iter(self._dict)
 
@@ -0,0 +1,344 @@
+import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import os
+import posixpath
+import stat
+import time
+from collections.abc import AsyncIterator
+from typing import Generic, Literal
+
+from rpcclient.core._types import ClientT_co
+from rpcclient.exceptions import ArgumentError, RpcFileNotFoundError
+from rpcclient.protos.rpc_api_pb2 import ListDirStat
+
+
+DEFAULT_SYNC_BLOCK_SIZE = 128 * 1024
+
+SyncDirection = Literal["push", "pull"]
+
+
+@dataclasses.dataclass
+class SyncAction:
+    """A change made to the destination, or to be made on a dry-run."""
+
+    kind: Literal["mkdir", "create", "update", "symlink"]
+    source: str
+    dest: str
+    size: int = 0
+    # (offset, length) ranges copied from the source
+    ranges: list[tuple[int, int]] = dataclasses.field(default_factory=list)
+
+    @property
+    def transferred(self) -> int:
+        return sum(length for _, length in self.ranges)
+
+    def __str__(self) -> str:
+        if self.kind in ("create", "update"):
+            return f"{self.kind} {self.dest} ({self.transferred}/{self.size} bytes)"
+        return f"{self.kind} {self.dest}"
+
+
+@dataclasses.dataclass
+class SyncReport:
+    dry_run: bool
+    actions: list[SyncAction] = dataclasses.field(default_factory=list)
+    unchanged: list[str] = dataclasses.field(default_factory=list)
+
+    @property
+    def transferred_bytes(self) -> int:
+        return sum(action.transferred for action in self.actions)
+
+    @property
+    def matched_bytes(self) -> int:
+        """bytes of updated files already found identical in the destination"""
+        return sum(action.size - action.transferred for action in self.actions if action.kind == "update")
+
+    def __str__(self) -> str:
+        lines = [str(action) for action in self.actions]
+        lines.append(
+            f"{len(self.actions)} changes, {len(self.unchanged)} unchanged, {self.transferred_bytes} bytes "
+            f"{'to transfer' if self.dry_run else 'transferred'}, {self.matched_bytes} bytes matched"
+        )
+        return "\n".join(lines)
+
+
+@dataclasses.dataclass
+class _Entry:
+    mode: int
+    size: int
+    mtime: int
+
+
+def _delta_ranges(
+    source_digests: list[bytes], dest_digests: list[bytes], size: int, block_size: int
+) -> list[tuple[int, int]]:
+    """coalesced ranges of the blocks whose digests differ, the blocks past the destination's end included"""
+    ranges: list[tuple[int, int]] = []
+    for i, digest in enumerate(source_digests):
+        if i < len(dest_digests) and dest_digests[i] == digest:
+            continue
+        offset = i * block_size
+        length = min(block_size, size - offset)
+        if ranges and sum(ranges[-1]) == offset:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+        else:
+            ranges.append((offset, length))
+    return ranges
+
+
+def _chunked(ranges: list[tuple[int, int]], chunk_size: int) -> list[tuple[int, int]]:
+    return [
+        (offset + start, min(chunk_size, length - start))
+        for offset, length in ranges
+        for start in range(0, length, chunk_size)
+    ]
+
+
+class _LocalSide:
+    join = staticmethod(os.path.join)
+
+    async def stat(self, path: str) -> _Entry | None:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return _Entry(st.st_mode, st.st_size, int(st.st_mtime))
+
+    async def scan(self, root: str) -> dict[str, _Entry]:
+        entries = {}
+        for dirpath, dirs, files in os.walk(root):
+            for name in dirs + files:
+                path = os.path.join(dirpath, name)
+                st = os.lstat(path)
+                entries[os.path.relpath(path, root).replace(os.sep, "/")] = _Entry(
+                    st.st_mode, st.st_size, int(st.st_mtime)
+                )
+        return entries
+
+    async def digests(self, path: str, block_size: int) -> list[bytes]:
+        def _digests() -> list[bytes]:
+            with open(path, "rb") as f:
+                return [hashlib.sha256(block).digest() for block in iter(lambda: f.read(block_size), b"")]
+
+        return await asyncio.to_thread(_digests)
+
+    async def read(self, path: str, chunks: list[tuple[int, int]]) -> AsyncIterator[tuple[int, bytes]]:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            for offset, length in chunks:
+                yield offset, os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+    async def write(self, path: str, mode: int, size: int, chunks: AsyncIterator[tuple[int, bytes]]) -> None:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT, mode)
+        try:
+            async for offset, data in chunks:
+                os.pwrite(fd, data, offset)
+            os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+
+    async def readlink(self, path: str) -> str:
+        return os.readlink(path)
+
+    async def symlink(self, target: str, path: str) -> None:
+        os.symlink(target, path)
+
+    async def mkdir(self, path: str, mode: int) -> None:
+        os.mkdir(path, mode)
+
+    async def remove(self, path: str) -> None:
+        os.unlink(path)
+
+    async def set_mtime(self, path: str, mtime: int) -> None:
+        os.utime(path, (time.time(), mtime))
+
+
+class _RemoteSide(Generic[ClientT_co]):
+    join = staticmethod(posixpath.join)
+
+    def __init__(self, client: ClientT_co) -> None:
+        self._client = client
+
+    async def stat(self, path: str) -> _Entry | None:
+        try:
+            st = await self._client.fs.stat(path)
+        except RpcFileNotFoundError:
+            return None
+        return _Entry(st.st_mode, st.st_size, int(st.st_mtime))
+
+    async def scan(self, root: str) -> dict[str, _Entry]:
+        entries = {}
+        async for walk_dir in self._client.walk(root, stat_mode=ListDirStat.LIST_DIR_STAT_LSTAT):
+            if walk_dir.errno != 0:
+                await self._client.set_errno(walk_dir.errno)
+                await self._client.raise_errno_exception(f"failed to listdir: {walk_dir.path}")
+            relative_dir = posixpath.relpath(walk_dir.path, root)
+            for entry in walk_dir.entries:
+                relative = entry.d_name if relative_dir == "." else posixpath.join(relative_dir, entry.d_name)
+                entries[relative] = _Entry(entry.lstat.st_mode, entry.lstat.st_size, entry.lstat.st_mtime)
+        return entries
+
+    async def digests(self, path: str, block_size: int) -> list[bytes]:
+        return await self._client.file_hash(path, block_size=block_size)
+
+    async def read(self, path: str, chunks: list[tuple[int, int]]) -> AsyncIterator[tuple[int, bytes]]:
+        async with await self._client.fs.open(path, "r") as f:
+            for offset, length in chunks:
+                yield offset, await f.pread(length, offset)
+
+    async def write(self, path: str, mode: int, size: int, chunks: AsyncIterator[tuple[int, bytes]]) -> None:
+        async with await self._client.fs.open(path, "w+", access=mode) as f:
+            async for offset, data in chunks:
+                await f.pwrite(data, offset)
+            await f.truncate(size)
+
+    async def readlink(self, path: str) -> str:
+        return await self._client.fs.readlink(path, absolute=False)
+
+    async def symlink(self, target: str, path: str) -> None:
+        await self._client.fs.symlink(target, path)
+
+    async def mkdir(self, path: str, mode: int) -> None:
+        await self._client.fs.mkdir(path, mode)
+
+    async def remove(self, path: str) -> None:
+        await self._client.fs.remove(path)
+
+    async def set_mtime(self, path: str, mtime: int) -> None:
+        await self._client.fs.utime(path, (time.time(), mtime))
+
+
+class Sync(Generic[ClientT_co]):
+    """
+    Bring a destination tree up to date with a source one, rsync-style.
+
+    Files whose size and modification time match are skipped without reading them. Other files are compared block by
+    block using SHA-256 digests, computed by the server for the remote side, and only the blocks that differ are copied
+    and patched in place. Since blocks are compared at the same offsets, this suits files modified in place or grown
+    by appending, such as rebuilt artifacts and databases.
+    """
+
+    def __init__(
+        self,
+        client: ClientT_co,
+        direction: SyncDirection,
+        dry_run: bool = False,
+        checksum: bool = False,
+        block_size: int = DEFAULT_SYNC_BLOCK_SIZE,
+        chunk_size: int = 1024 * 1024,
+    ) -> None:
+        """
+        :param client: client whose filesystem is the remote side
+        :param direction: "push" to sync a local source into a remote destination, "pull" for the other way around
+        :param dry_run: only report the changes to be made
+        :param checksum: compare the blocks of files even if their size and modification time match
+        :param block_size: size of the blocks compared
+        :param chunk_size: maximal number of bytes copied per roundtrip
+        """
+        if direction not in ("push", "pull"):
+            raise ArgumentError(f"invalid sync direction: {direction}")
+        local, remote = _LocalSide(), _RemoteSide(client)
+        self._source, self._dest = (local, remote) if direction == "push" else (remote, local)
+        self._checksum = checksum
+        self._block_size = block_size
+        self._chunk_size = chunk_size
+        self.report = SyncReport(dry_run)
+
+    async def sync(self, source: str, dest: str) -> SyncReport:
+        """
+        Sync a file, or the content of a directory, into the destination.
+
+        :param source: file or directory to sync from
+        :param dest: path to sync into. an existing directory receives a source file under its own name
+        """
+        source_entry = await self._source.stat(source)
+        if source_entry is None:
+            raise ArgumentError(f"cannot stat {source}: No such file or directory")
+        dest_entry = await self._dest.stat(dest)
+
+        if not stat.S_ISDIR(source_entry.mode):
+            if dest_entry is not None and stat.S_ISDIR(dest_entry.mode):
+                dest = self._dest.join(dest, posixpath.basename(source))
+                dest_entry = await self._dest.stat(dest)
+            await self._sync_entry(source, dest, source_entry, dest_entry)
+            return self.report
+
+        if dest_entry is None:
+            await self._mkdir(source, dest, source_entry)
+            dest_entries = {}
+        elif not stat.S_ISDIR(dest_entry.mode):
+            raise ArgumentError(f"target {dest} is not a directory")
+        else:
+            dest_entries = await self._dest.scan(dest)
+
+        for relative, entry in sorted((await self._source.scan(source)).items()):
+            await self._sync_entry(
+                self._source.join(source, relative), self._dest.join(dest, relative), entry, dest_entries.get(relative)
+            )
+        return self.report
+
+    async def _sync_entry(self, source: str, dest: str, entry: _Entry, dest_entry: _Entry | None) -> None:
+        source_type = stat.S_IFMT(entry.mode)
+        if dest_entry is not None and stat.S_IFMT(dest_entry.mode) != source_type:
+            if stat.S_ISDIR(dest_entry.mode):
+                raise ArgumentError(f"cannot overwrite directory {dest} with non-directory {source}")
+            if not self.report.dry_run:
+                await self._dest.remove(dest)
+            dest_entry = None
+
+        if stat.S_ISDIR(entry.mode):
+            if dest_entry is None:
+                await self._mkdir(source, dest, entry)
+            else:
+                self.report.unchanged.append(dest)
+        elif stat.S_ISLNK(entry.mode):
+            await self._sync_symlink(source, dest, dest_entry)
+        elif stat.S_ISREG(entry.mode):
+            await self._sync_file(source, dest, entry, dest_entry)
+
+    async def _mkdir(self, source: str, dest: str, entry: _Entry) -> None:
+        self.report.actions.append(SyncAction("mkdir", source, dest))
+        if not self.report.dry_run:
+            await self._dest.mkdir(dest, stat.S_IMODE(entry.mode) | stat.S_IRWXU)
+
+    async def _sync_symlink(self, source: str, dest: str, dest_entry: _Entry | None) -> None:
+        target = await self._source.readlink(source)
+        if dest_entry is not None:
+            if await self._dest.readlink(dest) == target:
+                self.report.unchanged.append(dest)
+                return
+            if not self.report.dry_run:
+                await self._dest.remove(dest)
+        self.report.actions.append(SyncAction("symlink", source, dest))
+        if not self.report.dry_run:
+            await self._dest.symlink(target, dest)
+
+    async def _sync_file(self, source: str, dest: str, entry: _Entry, dest_entry: _Entry | None) -> None:
+        if dest_entry is None or (dest_entry.size == 0 and entry.size != 0):
+            action = SyncAction("create" if dest_entry is None else "update", source, dest, entry.size)
+            action.ranges = [(0, entry.size)] if entry.size else []
+        elif dest_entry.size == entry.size and dest_entry.mtime == entry.mtime and not self._checksum:
+            self.report.unchanged.append(dest)
+            return
+        else:
+            source_digests, dest_digests = await asyncio.gather(
+                self._source.digests(source, self._block_size), self._dest.digests(dest, self._block_size)
+            )
+            ranges = _delta_ranges(source_digests, dest_digests, entry.size, self._block_size)
+            if not ranges and dest_entry.size == entry.size:
+                self.report.unchanged.append(dest)
+                if not self.report.dry_run and dest_entry.mtime != entry.mtime:
+                    await self._dest.set_mtime(dest, entry.mtime)
+                return
+            action = SyncAction("update", source, dest, entry.size, ranges)
+
+        self.report.actions.append(action)
+        if self.report.dry_run:
+            return
+        async with contextlib.aclosing(self._source.read(source, _chunked(action.ranges, self._chunk_size))) as chunks:
+            await self._dest.write(dest, stat.S_IMODE(entry.mode), entry.size, chunks)
+        await self._dest.set_mtime(dest, entry.mtime)
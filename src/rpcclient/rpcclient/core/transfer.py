@@ -0,0 +1,480 @@
+import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import itertools
+import logging
+import os
+import posixpath
+import shutil
+import stat
+import time
+from collections.abc import Awaitable, Callable, Iterator
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Generic
+
+from tqdm import tqdm
+
+from rpcclient.core._types import ClientT_co
+from rpcclient.core.archive import TarExtractor
+from rpcclient.core.content_cache import ContentCache
+from rpcclient.core.structs.consts import SEEK_END, SEEK_SET
+from rpcclient.exceptions import (
+    ArgumentError,
+    FailedToConnectError,
+    RpcFileNotFoundError,
+    ServerDiedError,
+    TransferVerificationError,
+)
+from rpcclient.protos.rpc_api_pb2 import ListDirStat
+
+
+if TYPE_CHECKING:
+    from rpcclient.core.client import CoreClient
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRANSFER_JOBS = 8
+DEFAULT_TRANSFER_RETRIES = 3
+# resumable transfers write into this file next to their destination, renamed once verified
+PART_SUFFIX = ".part"
+# granularity at which a partial copy is checked against its source before resuming it
+RESUME_BLOCK_SIZE = 1024 * 1024
+# directories are created writable by their owner until their content is transferred
+OWNER_RWX = stat.S_IRWXU
+
+
+@dataclasses.dataclass
+class TransferProgress:
+    """Progress of a transfer, as reported to its progress callback and returned once it is done."""
+
+    total_files: int = 0
+    total_bytes: int = 0
+    done_files: int = 0
+    done_bytes: int = 0
+    skipped_files: int = 0
+    started: float = dataclasses.field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def throughput(self) -> float:
+        """bytes transferred per second"""
+        elapsed = self.elapsed
+        return self.done_bytes / elapsed if elapsed > 0 else 0.0
+
+
+ProgressCallback = Callable[[TransferProgress], object]
+
+
+@dataclasses.dataclass
+class _Job:
+    source: str
+    dest: str
+    size: int
+    dest_exists: bool
+    symlink: bool = False
+
+
+def _block_digests(fd: int, size: int, block_size: int) -> list[bytes]:
+    return [hashlib.sha256(os.pread(fd, block_size, offset)).digest() for offset in range(0, size, block_size)]
+
+
+def _file_digest(fd: int, chunk_size: int) -> bytes:
+    digest = hashlib.sha256()
+    offset = 0
+    while data := os.pread(fd, chunk_size, offset):
+        digest.update(data)
+        offset += len(data)
+    return digest.digest()
+
+
+class Transfer(Generic[ClientT_co]):
+    """
+    Copy trees between the local machine and a remote one.
+
+    The transfer is planned first, using a single server-side walk per remote tree. Directories are then created,
+    and files are copied by `jobs` concurrent tasks, each streaming its file chunk by chunk, so memory stays bounded
+    by `jobs * chunk_size` regardless of the file sizes.
+
+    A connection serves a single request at a time, so `workers` > 1 dials additional workers of the same server
+    (see CoreClient.connect_sibling()) to spread the tasks over, when the client supports it.
+
+    A resumable transfer writes each file into a `.part` file next to its destination. A `.part` file left by a
+    previous attempt is resumed from the longest prefix whose blocks match the source, and a transfer interrupted by a
+    lost connection reconnects and resumes from the last offset written. Once complete, the copy is verified against a
+    SHA-256 digest of the source, the remote one being computed by the server, and renamed to its destination.
+
+    An archive pull streams each remote tree as a single tar stream generated server-side instead, costing a roundtrip
+    per chunk_size bytes rather than several per file, and extracts it on the fly.
+    """
+
+    def __init__(
+        self,
+        client: ClientT_co,
+        jobs: int = DEFAULT_TRANSFER_JOBS,
+        workers: int = 1,
+        chunk_size: int = 1024 * 1024,
+        progress: bool | ProgressCallback = False,
+        resumable: bool = False,
+        retries: int = DEFAULT_TRANSFER_RETRIES,
+        content_cache: ContentCache | None = None,
+        archive: bool = False,
+    ) -> None:
+        """
+        :param client: client whose filesystem is the remote side
+        :param jobs: number of files transferred concurrently
+        :param workers: number of connections to transfer over, the client's included
+        :param chunk_size: number of bytes transferred per roundtrip
+        :param progress: True to display a progress bar, or a callable to report the progress to
+        :param resumable: transfer files through verified, resumable `.part` files
+        :param retries: number of times a resumable file transfer reconnects after losing its connection
+        :param content_cache: pull files through this cache, transferring only content that isn't cached yet
+        :param archive: pull trees as tar streams, bypassing the content cache
+        """
+        if jobs < 1 or workers < 1:
+            raise ArgumentError("jobs and workers must be positive")
+        if archive and resumable:
+            raise ArgumentError("archive transfers can't be resumable")
+        self._client = client
+        self._jobs = jobs
+        self._workers = workers
+        self._chunk_size = chunk_size
+        self._resumable = resumable
+        self._retries = retries
+        self._content_cache = content_cache
+        self._archive = archive
+        self._progress_callback = progress if callable(progress) else None
+        self._show_progress_bar = progress is True
+        self._progress_bar: tqdm | None = None
+        self._dirs: list[tuple[str, int]] = []
+        self._queue: list[_Job] = []
+        self.progress = TransferProgress()
+
+    async def pull(self, remotes: list[str], local: Path, recursive: bool = False, force: bool = False) -> None:
+        """copy remote files and trees into a local path, following the semantics of Fs.cp()"""
+        remotes = [await self._remote_abspath(remote) for remote in remotes]
+        local_exists = local.exists()
+        if (not local_exists or not local.is_dir()) and len(remotes) > 1:
+            raise ArgumentError(f"target {local} is not a directory")
+        if recursive and not local_exists:
+            local.mkdir(0o777)
+
+        archives = []
+        for remote in remotes:
+            try:
+                remote_stat = await self._client.fs.stat(remote)
+            except RpcFileNotFoundError as e:
+                raise ArgumentError(f"cannot stat {remote}: No such file or directory") from e
+
+            if stat.S_ISDIR(remote_stat.st_mode):
+                if not recursive:
+                    logger.info(f"omitting directory {remote}")
+                    continue
+                if self._archive:
+                    archives.append(remote)
+                    continue
+                dest = local / posixpath.basename(remote.rstrip("/"))
+                self._dirs.append((str(dest), stat.S_IMODE(remote_stat.st_mode)))
+                await self._plan_remote_tree(remote, dest, force)
+            else:
+                dest = local / posixpath.basename(remote) if local.is_dir() else local
+                self._plan_file(_Job(remote, str(dest), remote_stat.st_size, os.path.lexists(dest)), force)
+
+        for path, mode in self._dirs:
+            Path(path).mkdir(mode | OWNER_RWX, exist_ok=True)
+        await self._run(self._pull_file)
+        for path, mode in reversed(self._dirs):
+            if mode & OWNER_RWX != OWNER_RWX:
+                os.chmod(path, mode)
+        for remote in archives:
+            await self._pull_archive(remote, local, force)
+
+    async def push(self, local_files: list[Path], remote: str, recursive: bool = False, force: bool = False) -> None:
+        """copy local files and trees into a remote path, following the semantics of Fs.cp()"""
+        remote = await self._remote_abspath(remote)
+        remote_stat = await self._remote_stat(remote)
+        remote_is_dir = remote_stat is not None and stat.S_ISDIR(remote_stat.st_mode)
+        if not remote_is_dir and len(local_files) > 1:
+            raise ArgumentError(f"target {remote} is not a directory")
+        if recursive and remote_stat is None:
+            await self._client.fs.mkdir(remote, 0o777, exist_ok=True)
+            remote_is_dir = True
+
+        for local in local_files:
+            if not local.exists():
+                raise ArgumentError(f"cannot stat {local}: No such file or directory")
+
+            if local.is_dir():
+                if not recursive:
+                    logger.info(f"omitting directory {local}")
+                    continue
+                dest = posixpath.join(remote, local.name)
+                self._dirs.append((dest, stat.S_IMODE(local.stat().st_mode)))
+                await self._plan_local_tree(local, dest, force)
+            else:
+                dest = posixpath.join(remote, local.name) if remote_is_dir else remote
+                dest_exists = await self._remote_stat(dest) is not None
+                self._plan_file(_Job(str(local), dest, local.stat().st_size, dest_exists), force)
+
+        for path, mode in self._dirs:
+            await self._client.fs.mkdir(path, mode | OWNER_RWX, exist_ok=True)
+        await self._run(self._push_file)
+        for path, mode in reversed(self._dirs):
+            if mode & OWNER_RWX != OWNER_RWX:
+                await self._client.fs.chmod(path, mode)
+
+    async def _remote_abspath(self, path: str) -> str:
+        if posixpath.isabs(path):
+            return path
+        # additional workers don't share the client's working directory
+        return posixpath.join(await self._client.fs.pwd(), path)
+
+    async def _remote_stat(self, path: str):
+        try:
+            return await self._client.fs.lstat(path)
+        except RpcFileNotFoundError:
+            return None
+
+    def _plan_file(self, job: _Job, force: bool) -> None:
+        if job.dest_exists and not force:
+            self.progress.skipped_files += 1
+            return
+        self._queue.append(job)
+        self.progress.total_files += 1
+        self.progress.total_bytes += job.size
+
+    async def _plan_remote_tree(self, remote: str, local: Path, force: bool) -> None:
+        async for walk_dir in self._client.walk(remote, stat_mode=ListDirStat.LIST_DIR_STAT_LSTAT):
+            if walk_dir.errno != 0:
+                await self._client.set_errno(walk_dir.errno)
+                await self._client.raise_errno_exception(f"failed to listdir: {walk_dir.path}")
+            local_dir = local / posixpath.relpath(walk_dir.path, remote)
+            for entry in walk_dir.entries:
+                mode = entry.lstat.st_mode
+                source = posixpath.join(walk_dir.path, entry.d_name)
+                dest = local_dir / entry.d_name
+                if stat.S_ISDIR(mode):
+                    self._dirs.append((str(dest), stat.S_IMODE(mode)))
+                elif stat.S_ISLNK(mode) or stat.S_ISREG(mode):
+                    job = _Job(source, str(dest), entry.lstat.st_size, os.path.lexists(dest), stat.S_ISLNK(mode))
+                    self._plan_file(job, force)
+                else:
+                    logger.info(f"omitting special file {source}")
+
+    async def _plan_local_tree(self, local: Path, remote: str, force: bool) -> None:
+        existing: set[str] = set()
+        if await self._remote_stat(remote) is not None:
+            async for walk_dir in self._client.walk(remote, stat_mode=ListDirStat.LIST_DIR_STAT_NONE):
+                existing.update(posixpath.join(walk_dir.path, entry.d_name) for entry in walk_dir.entries)
+
+        for root, dirs, files in os.walk(local):
+            relative_root = Path(root).relative_to(local).as_posix()
+            remote_root = remote if relative_root == "." else posixpath.join(remote, relative_root)
+            for name in dirs + files:
+                source = os.path.join(root, name)
+                dest = posixpath.join(remote_root, name)
+                local_stat = os.lstat(source)
+                if stat.S_ISDIR(local_stat.st_mode):
+                    self._dirs.append((dest, stat.S_IMODE(local_stat.st_mode)))
+                elif stat.S_ISLNK(local_stat.st_mode) or stat.S_ISREG(local_stat.st_mode):
+                    job = _Job(source, dest, local_stat.st_size, dest in existing, stat.S_ISLNK(local_stat.st_mode))
+                    self._plan_file(job, force)
+                else:
+                    logger.info(f"omitting special file {source}")
+
+    async def _run(self, transfer_file: Callable[["CoreClient", _Job], Awaitable[None]]) -> None:
+        clients = [self._client, *await self._connect_workers()]
+        if self._show_progress_bar:
+            self._progress_bar = tqdm(total=self.progress.total_bytes, unit="B", unit_scale=True, unit_divisor=1024)
+        self.progress.started = time.monotonic()
+        queue = list(reversed(self._queue))
+
+        async def _task(client: "CoreClient") -> None:
+            while queue:
+                job = queue.pop()
+                await transfer_file(client, job)
+                self.progress.done_files += 1
+                self._report(0)
+
+        tasks = [asyncio.create_task(_task(clients[i % len(clients)])) for i in range(min(self._jobs, len(queue)))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            if self._progress_bar is not None:
+                self._progress_bar.close()
+            for client in clients[1:]:
+                try:
+                    await client.close()
+                except Exception:
+                    logger.exception(f"failed to close transfer worker {client.id}")
+
+    async def _connect_workers(self) -> list["CoreClient"]:
+        workers = []
+        for _ in range(min(self._workers, self._jobs) - 1):
+            try:
+                workers.append(await self._client.connect_sibling())
+            except FailedToConnectError as e:
+                logger.warning(f"transferring over {len(workers) + 1} connections: {e}")
+                break
+        return workers
+
+    def _report(self, size: int) -> None:
+        self.progress.done_bytes += size
+        if self._progress_bar is not None and size:
+            self._progress_bar.update(size)
+        if self._progress_callback is not None:
+            self._progress_callback(self.progress)
+
+    async def _pull_file(self, client: "CoreClient", job: _Job) -> None:
+        if job.symlink:
+            if job.dest_exists:
+                os.unlink(job.dest)
+            os.symlink(await client.fs.readlink(job.source, absolute=False), job.dest)
+            self._report(job.size)
+            return
+        if self._content_cache is not None:
+            cached = await self._content_cache.pull(client, job.source)
+            await asyncio.to_thread(shutil.copyfile, cached, job.dest)
+            self._report(job.size)
+            return
+        if self._resumable:
+            await self._pull_file_resumable(client, job)
+            return
+        with open(job.dest, "wb") as f:
+            async for chunk in client.file_read_stream(job.source, self._chunk_size):
+                f.write(chunk)
+                self._report(len(chunk))
+
+    async def _push_file(self, client: "CoreClient", job: _Job) -> None:
+        if job.symlink:
+            if job.dest_exists:
+                await client.fs.remove(job.dest)
+            await client.fs.symlink(os.readlink(job.source), job.dest)
+            self._report(job.size)
+            return
+        if self._resumable:
+            await self._push_file_resumable(client, job)
+            return
+        with open(job.source, "rb") as f:
+            await client.file_write_stream(job.dest, self._read_chunks(f), on_written=self._report)
+
+    async def _pull_archive(self, remote: str, local: Path, force: bool) -> None:
+        """extract a remote tree streamed as a tar archive, its size being unknown until it ends"""
+
+        def _on_data(size: int) -> None:
+            self.progress.total_bytes += size
+            self._report(size)
+
+        extractor = TarExtractor(local, force=force, on_data=_on_data)
+        if self._show_progress_bar:
+            self._progress_bar = tqdm(desc=remote, unit="B", unit_scale=True, unit_divisor=1024)
+        try:
+            async with contextlib.aclosing(self._client.archive_read_stream(remote, self._chunk_size)) as chunks:
+                try:
+                    async for chunk in chunks:
+                        extractor.feed(chunk)
+                except BaseException:
+                    extractor.abort()
+                    raise
+            extractor.close()
+        finally:
+            if self._progress_bar is not None:
+                self._progress_bar.close()
+                self._progress_bar = None
+        self.progress.total_files += extractor.files
+        self.progress.done_files += extractor.files
+        self.progress.skipped_files += extractor.skipped
+        self._report(0)
+
+    async def _pull_file_resumable(self, client: "CoreClient", job: _Job) -> None:
+        part = job.dest + PART_SUFFIX
+        fd = os.open(part, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            offset = await self._resume_offset(client, job.source, fd, os.fstat(fd).st_size)
+            os.ftruncate(fd, offset)
+            self._report(offset)
+            for attempt in itertools.count():
+                try:
+                    async with await client.fs.open(job.source, "r") as f:
+                        while data := await f.pread(self._chunk_size, offset):
+                            os.pwrite(fd, data, offset)
+                            offset += len(data)
+                            self._report(len(data))
+                    expected = (await client.file_hash(job.source))[0]
+                    break
+                except (ConnectionError, ServerDiedError) as e:
+                    if attempt >= self._retries:
+                        raise
+                    await self._recover(client, job, offset, e)
+            actual = await asyncio.to_thread(_file_digest, fd, self._chunk_size)
+        finally:
+            os.close(fd)
+        if actual != expected:
+            raise TransferVerificationError(f"SHA-256 of {part} doesn't match its source {job.source}")
+        os.replace(part, job.dest)
+
+    async def _push_file_resumable(self, client: "CoreClient", job: _Job) -> None:
+        part = job.dest + PART_SUFFIX
+        fd = os.open(job.source, os.O_RDONLY)
+        try:
+            offset: int | None = None
+            for attempt in itertools.count():
+                try:
+                    async with await client.fs.open(part, "w+") as f:
+                        if offset is None:
+                            offset = await self._resume_offset(client, part, fd, await f.seek(0, SEEK_END))
+                            self._report(offset)
+                        await f.truncate(offset)
+                        await f.seek(offset, SEEK_SET)
+                        while data := os.pread(fd, self._chunk_size, offset):
+                            await f.write(data)
+                            offset += len(data)
+                            self._report(len(data))
+                    actual = (await client.file_hash(part))[0]
+                    break
+                except (ConnectionError, ServerDiedError) as e:
+                    if attempt >= self._retries or offset is None:
+                        raise
+                    await self._recover(client, job, offset, e)
+            expected = await asyncio.to_thread(_file_digest, fd, self._chunk_size)
+        finally:
+            os.close(fd)
+        if actual != expected:
+            raise TransferVerificationError(f"SHA-256 of {part} doesn't match its source {job.source}")
+        await client.fs.rename(part, job.dest)
+
+    async def _resume_offset(self, client: "CoreClient", remote: str, local_fd: int, size: int) -> int:
+        """length of the prefix of a partial copy, of `size` bytes, whose blocks match its source"""
+        if size == 0:
+            return 0
+        remote_digests, local_digests = await asyncio.gather(
+            client.file_hash(remote, size=size, block_size=RESUME_BLOCK_SIZE),
+            asyncio.to_thread(_block_digests, local_fd, size, RESUME_BLOCK_SIZE),
+        )
+        matching = 0
+        for remote_digest, local_digest in zip(remote_digests, local_digests, strict=False):
+            if remote_digest != local_digest:
+                break
+            matching += 1
+        return min(matching * RESUME_BLOCK_SIZE, size)
+
+    async def _recover(self, client: "CoreClient", job: _Job, offset: int, error: Exception) -> None:
+        logger.warning(f"transfer of {job.source} interrupted at offset {offset}: {error!r}, resuming")
+        try:
+            # the connection may already have been replaced when the client reconnects automatically
+            await client.ping()
+        except (ConnectionError, ServerDiedError):
+            await client.reconnect()
+
+    def _read_chunks(self, f: IO[bytes]) -> Iterator[bytes]:
+        while chunk := f.read(self._chunk_size):
+            yield chunk
@@ -15,6 +15,7 @@ from uuid import UUID
 
 import plumbum
 from click.exceptions import Exit
+from humanfriendly import format_size
 from humanfriendly.prompts import prompt_for_choice
 from prompt_toolkit.keys import Keys
 from pygments import formatters, highlight, lexers
@@ -29,8 +30,10 @@ from rpcclient.clients.ios.client import IosClient
 from rpcclient.clients.linux.client import LinuxClient
 from rpcclient.clients.macos.client import MacosClient
 from rpcclient.core.client import CoreClient
+from rpcclient.core.metadata_cache import MetadataCache
 from rpcclient.core.structs.consts import SIGTERM
 from rpcclient.exceptions import RpcClientException
+from rpcclient.protos.rpc_api_pb2 import ListDirStat
 from rpcclient.utils import run_in_loop
 
 
@@ -81,7 +84,7 @@ def path_completer(xsh, action, completer, alias, command):
         if not await client.fs.accessible(dirpath):
             dirpath = dirpath.parent
         result = []
-        for f in await client.fs.scandir(dirpath):
+        for f in await client.fs.scandir(dirpath, stat_mode=ListDirStat.LIST_DIR_STAT_NONE):
             completion_option = str(dirpath / f.name) if is_absolute else str((dirpath / f.name).relative_to(pwd))
             try:
                 if await f.is_dir():
@@ -106,7 +109,7 @@ def dir_completer(xsh, action, completer, alias, command):
         if not await client.fs.accessible(dirpath):
             dirpath = dirpath.parent
         result = []
-        for f in await client.fs.scandir(dirpath):
+        for f in await client.fs.scandir(dirpath, stat_mode=ListDirStat.LIST_DIR_STAT_NONE):
             completion_option = str(dirpath / f.name) if is_absolute else str((dirpath / f.name).relative_to(pwd))
             try:
                 if await f.is_dir():
@@ -241,6 +244,8 @@ class XonshRc:
         connect to remote rpcserver
         """
         self.client = client_to_reuse
+        # completions and ls repeatedly stat the same paths
+        self.client.fs.metadata_cache = MetadataCache()
 
         # clear all host commands except for some useful ones
         XSH.env["PATH"].clear()
@@ -292,6 +297,7 @@ class XonshRc:
         self._register_arg_parse_alias("chmod", self._rpc_chmod)
         self._register_arg_parse_alias("chown", self._rpc_chown)
         self._register_arg_parse_alias("find", self._rpc_find)
+        self._register_arg_parse_alias("du", self._rpc_du)
         self._register_arg_parse_alias("xattr-get-dict", self._rpc_xattr_get_dict)
         self._register_arg_parse_alias("vim", self._rpc_vim)
         self._register_arg_parse_alias("entitlements", self._rpc_entitlements)
@@ -437,6 +443,9 @@ class XonshRc:
         if not stdin:
             stdin = sys.stdin
         result = run_in_loop(self.client.spawn(args.arg, raw_tty=True, stdin=stdin, stdout=stdout))
+        if self.client.fs.metadata_cache is not None:
+            # the program may have changed anything
+            self.client.fs.metadata_cache.clear()
         return result.error
 
     def _rpc_run_async(self, args, stdin, stdout, stderr):
@@ -669,15 +678,63 @@ class XonshRc:
         gid = int(gid)
         run_in_loop(self.client.fs.chown(filename, uid, gid, recursive=recursive))
 
-    def _rpc_find(self, filename: Annotated[str, Arg(completer=path_completer)], depth=True):
-        """find file recursively"""
+    def _rpc_find(
+        self,
+        filename: Annotated[str, Arg(completer=path_completer)],
+        depth=True,
+        name: str | None = None,
+        file_type: str | None = None,
+        maxdepth: int | None = None,
+    ):
+        """
+        find file recursively
+
+        Parameters
+        ----------
+        name : -n, --name
+            fnmatch pattern the file name must match
+        file_type : -t, --type
+            find(1) type letter the file must be
+        maxdepth : -m, --maxdepth
+            deepest level to descend to
+        """
 
         async def _run():
-            async for f in self.client.fs.find(filename, topdown=not depth):
+            async for f in self.client.fs.find(
+                filename,
+                topdown=not depth,
+                name=name or (),
+                type=file_type or (),
+                max_depth=int(maxdepth) if maxdepth is not None else None,
+            ):
                 print_color(f, file=sys.stdout, flush=True)
 
         run_in_loop(_run())
 
+    def _rpc_du(
+        self,
+        filename: Annotated[str, Arg(completer=path_completer, nargs="?")] = ".",
+        summarize=False,
+        max_depth: int | None = None,
+        human_readable=False,
+    ):
+        """
+        estimate file space usage, aggregated at remote
+
+        Parameters
+        ----------
+        summarize : -s, --summarize
+            display only a total
+        max_depth : -d, --max-depth
+            deepest level of the directories displayed
+        human_readable : -H, --human-readable
+            print sizes in human readable format
+        """
+        depth = 0 if summarize else int(max_depth) if max_depth is not None else None
+        for usage in run_in_loop(self.client.fs.du(filename, depth=depth)):
+            size = format_size(usage.disk_usage, binary=True) if human_readable else str(usage.disk_usage // 1024)
+            print_color(f"{size}\t{usage.path}", file=sys.stdout)
+
     def _rpc_plshow(self, filename: Annotated[str, Arg(completer=path_completer)]):
         """
         parse and show plist
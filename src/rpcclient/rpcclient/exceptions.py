@@ -82,6 +82,18 @@ class FailedToConnectError(RpcClientException):
     pass
 
 
+class TransferVerificationError(RpcClientException):
+    """a transferred file doesn't match the digest of its source"""
+
+    pass
+
+
+class ArchiveError(RpcClientException):
+    """a tar stream is malformed, or holds entries that can't be safely extracted"""
+
+    pass
+
+
 class UnrecognizedSelectorError(RpcClientException):
     """tried to access a non-existing objc object selector"""
 
@@ -1,6 +1,7 @@
 import logging
 import socket
 import subprocess
+from collections.abc import Sequence
 from typing import Any, final
 from typing_extensions import Self
 
@@ -57,18 +58,37 @@ class RpcBridge:
         """
         Resolve msg_id/reply class from request_msg's type, build RpcMessage, send and, parse reply.
         """
+        rep = self._parse_reply(await self.sock.rpc_msg_send_recv(self._request_message(msg_id, kwargs)))
+        if isinstance(rep, ServerResponseError):
+            raise rep
+        return rep
+
+    async def rpc_call_pipelined(self, requests: Sequence[tuple[int, dict[str, Any]]]) -> list[Any]:
+        """
+        Send several requests at once and parse their replies, in a single roundtrip. The server serves them in order.
+
+        :param requests: message ID and fields of every request
+        :return: the reply to every request, or the ServerResponseError it failed with
+        """
+        rep_msgs = await self.sock.rpc_msgs_send_recv([
+            self._request_message(msg_id, kwargs) for msg_id, kwargs in requests
+        ])
+        return [self._parse_reply(rep_msg) for rep_msg in rep_msgs]
+
+    def _request_message(self, msg_id: int, kwargs: dict[str, Any]) -> RpcMessage:
         req = self.messages.get(msg_id)(**kwargs)
-        msg = RpcMessage(
+        return RpcMessage(
             client_id=self.client_id,
             msg_id=msg_id,
             payload=req.SerializeToString(),
         )
-        rep_msg = await self.sock.rpc_msg_send_recv(msg)
+
+    def _parse_reply(self, rep_msg: RpcMessage) -> Any:
         rep = self.messages.get(rep_msg.msg_id)()
         rep.ParseFromString(rep_msg.payload)
         if rep_msg.msg_id == ProtocolConstants.REP_ERROR:
             logger.error(f"Server error: {rep.message}")
-            raise ServerResponseError(rep.message)
+            return ServerResponseError(rep.message)
         return rep
 
     def close(self) -> None:
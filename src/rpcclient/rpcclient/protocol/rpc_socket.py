@@ -2,7 +2,8 @@ import asyncio
 import logging
 import socket
 import struct
-from collections.abc import AsyncGenerator
+import time
+from collections.abc import AsyncGenerator, Sequence
 from contextlib import asynccontextmanager
 
 from rpcclient.exceptions import ServerDiedError
@@ -27,12 +28,19 @@ class RpcSocket:
 
     Attributes:
         raw_socket: The underlying socket used for communication with the remote server.
+        last_activity: Monotonic timestamp of the last message received from the remote server.
     """
 
     def __init__(self, sock: socket.socket) -> None:
         self.raw_socket: socket.socket = sock
+        self.last_activity: float = time.monotonic()
         self._protocol_lock: asyncio.Lock = asyncio.Lock()
 
+    @property
+    def busy(self) -> bool:
+        """Whether a request is currently awaiting its reply on this socket."""
+        return self._protocol_lock.locked()
+
     @asynccontextmanager
     async def _acquire_protocol_lock(self) -> AsyncGenerator[None]:
         async with self._protocol_lock:
@@ -44,6 +52,7 @@ class RpcSocket:
             buff = await self._recvall(size)
         except struct.error as e:
             raise ConnectionError() from e
+        self.last_activity = time.monotonic()
         return buff
 
     async def _msg_send(self, message: bytes) -> None:
@@ -91,3 +100,14 @@ class RpcSocket:
         async with self._acquire_protocol_lock():
             await self.rpc_msg_send(msg)
             return await self.rpc_msg_recv()
+
+    async def rpc_msgs_send_recv(self, msgs: Sequence[RpcMessage]) -> list[RpcMessage]:
+        """Send several messages at once, then receive the reply to each of them, in order."""
+        buff = b""
+        for msg in msgs:
+            msg.magic = ProtocolConstants.MESSAGE_MAGIC
+            rpc_msg = msg.SerializeToString()
+            buff += SIZE_HEADER_STRUCT.pack(len(rpc_msg)) + rpc_msg
+        async with self._acquire_protocol_lock():
+            await asyncio.get_running_loop().sock_sendall(self.raw_socket, buff)
+            return [await self.rpc_msg_recv() for _ in msgs]
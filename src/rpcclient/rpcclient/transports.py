@@ -16,6 +16,7 @@ logger = logging.getLogger(__name__)
 DEFAULT_PORT = 5910
 PROJECT_URL = "https://api.github.com/repos/doronz88/rpc-project/releases/latest"
 BINARY_NAME = "rpcserver_macosx"
+KEEPALIVE_PROBE_COUNT = 3
 
 
 def _has_process_exited(process: subprocess.Popen) -> bool:
@@ -32,18 +33,39 @@ def _terminate_process(process: subprocess.Popen) -> None:
         process.kill()
 
 
+def _enable_tcp_keepalive(sock: socket.socket, interval: int, count: int = KEEPALIVE_PROBE_COUNT) -> None:
+    """Let the kernel probe an idle connection every `interval` seconds and drop it after `count` misses."""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, interval)
+    elif hasattr(socket, "TCP_KEEPALIVE"):
+        # darwin names the idle time option differently
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, interval)
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval)
+    if hasattr(socket, "TCP_KEEPCNT"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count)
+
+
 async def create_tcp(
     *,
     hostname: str | None = None,
     host: str | None = None,
     port: int = DEFAULT_PORT,
     timeout: float | None = None,
+    keepalive_interval: int | None = None,
 ) -> RpcBridge:
-    """Connect via TCP and return an `RpcBridge`."""
+    """Connect via TCP and return an `RpcBridge`.
+
+    :param keepalive_interval: When set, enable TCP keepalive probes every this many seconds, so a dead peer is
+        detected by the kernel even while a request is blocked waiting for its reply.
+    """
     target = hostname or host
     if not target:
         raise TypeError('create_tcp(): provide "hostname" or "host"')
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if keepalive_interval is not None:
+        _enable_tcp_keepalive(s, keepalive_interval)
 
     try:
         s.setblocking(False)
@@ -1,5 +1,5 @@
 import asyncio
-from collections.abc import Callable, Coroutine
+from collections.abc import Awaitable, Callable, Coroutine, Hashable, MutableMapping
 from functools import wraps
 from typing import Any, TypeVar, cast
 
@@ -68,11 +68,69 @@ class readonly(property):
         instance.__dict__[self.__name__] = value
 
 
+class class_readonly(readonly):
+    """A `readonly` attribute holding a value shared by a whole class, also returned when accessed on the class.
+
+    An instance may still hold its own value, set through `set()`.
+    """
+
+    def __init__(self, value: Any) -> None:
+        super().__init__()
+        self.value = value
+
+    def __get__(self, instance: Any, owner: type | None = None) -> Any:
+        if instance is not None:
+            return instance.__dict__.get(self.__name__, self.value)
+        return self.value
+
+
 AsyncMethodT = TypeVar("AsyncMethodT", bound=Callable[[Any], Coroutine[Any, Any, Any]])
 
 
+async def single_flight(
+    in_flight: MutableMapping[Any, "asyncio.Future[Any]"], key: Hashable, factory: Callable[[], Awaitable[T]]
+) -> T:
+    """
+    Await factory(), unless a call for the same key is already in flight, whose outcome is shared instead.
+
+    The factory runs in the caller's task. If that caller is cancelled, one of the callers waiting for it calls
+    factory() again in its own task.
+
+    :param in_flight: futures of the calls in flight, by key
+    :param key: key identifying the call
+    :param factory: coroutine function making the call
+    """
+    while (future := in_flight.get(key)) is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                # this caller was cancelled, not the one it waited for
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    in_flight[key] = future
+    try:
+        value = await factory()
+    except Exception as e:
+        future.set_exception(e)
+        # the exception is raised here, it doesn't need to be logged when no other caller waited for it
+        future.exception()
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        del in_flight[key]
+
+
 def cached_async_method(func: AsyncMethodT) -> AsyncMethodT:
+    """Cache the result of an argument-less async method, concurrent first calls sharing a single computation."""
     cache_key = f"_{func.__name__}"
+    in_flight_key = f"_{func.__name__}_in_flight"
 
     @wraps(func)
     async def wrapper(self: Any) -> Any:
@@ -81,9 +139,13 @@ def cached_async_method(func: AsyncMethodT) -> AsyncMethodT:
         except AttributeError:
             pass
 
-        value = await func(self)
-        setattr(self, cache_key, value)
-        return value
+        async def compute() -> Any:
+            value = await func(self)
+            setattr(self, cache_key, value)
+            return value
+
+        # the instance's own attributes hold its computation in flight
+        return await single_flight(self.__dict__, in_flight_key, compute)
 
     return cast(AsyncMethodT, wrapper)
 
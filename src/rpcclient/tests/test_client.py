@@ -1,6 +1,10 @@
+import asyncio
+import ctypes
+import struct
 from collections.abc import Iterable
 
 import pytest
+from construct import Int32sl, Int64ul, Struct
 
 from rpcclient.clients.darwin.client import DarwinClient
 from rpcclient.core.client import RemoteCallArg
@@ -38,6 +42,32 @@ async def test_lazy_symbol_is_awaitable(client: Client) -> None:
     assert int(resolved) == int(await lazy.resolve())
 
 
+async def test_concurrent_lazy_symbol_resolution(client: Client) -> None:
+    # concurrent uses of an unresolved symbol share a single resolution
+    if "strlen" in client.symbols:
+        del client.symbols["strlen"]
+    resolved = await asyncio.gather(*(client.symbols.strlen.resolve() for _ in range(10)))
+    assert all(symbol is resolved[0] for symbol in resolved)
+
+
+async def test_symbols_prefetch(client: Client) -> None:
+    for name in ("strlen", "strcmp"):
+        if name in client.symbols:
+            del client.symbols[name]
+    await client.symbols.prefetch(["strlen", "strcmp", "no_such_symbol"])
+    assert isinstance(client.symbols.strlen, Symbol)
+    assert int(client.symbols.strcmp) == await client.dlsym(client._dlsym_global_handle, "strcmp")
+    assert "no_such_symbol" not in client.symbols
+
+
+async def test_symbol_client_is_readonly(client: Client) -> None:
+    symbol = client.symbol(0)
+    assert symbol._client is client
+    with pytest.raises(AttributeError):
+        symbol._client = None
+    assert symbol._client is client
+
+
 async def test_peek(client: Client) -> None:
     async with client.safe_malloc(0x100) as peekable:
         await client.peek(peekable, 0x100)
@@ -48,6 +78,76 @@ async def test_poke(client: Client) -> None:
         await client.poke(peekable, b"a" * 0x100)
 
 
+async def test_as_array(client: Client) -> None:
+    async with client.safe_malloc(0x100) as buf:
+        await buf.poke(struct.pack("<5i", -2, -1, 0, 1, 2))
+        ints = buf.as_array("i", 5)
+        assert await ints.tolist() == [-2, -1, 0, 1, 2]
+        assert await ints[1:4] == [-1, 0, 1]
+        assert await ints[-1] == 2
+        assert [value async for value in ints] == [-2, -1, 0, 1, 2]
+
+        await buf.poke(struct.pack("<3Q", int(buf), int(buf) + 8, 0))
+        pointers = await buf.as_array("P").tolist()
+        assert pointers == [buf, buf + 8]
+        assert all(isinstance(pointer, Symbol) for pointer in pointers)
+
+
+async def test_function(client: Client) -> None:
+    strlen = await client.function("strlen", [ctypes.c_char_p], ctypes.c_size_t)
+    assert await strlen("hello") == 5
+    assert await strlen(b"hi\x00there") == 2
+
+    abs_ = await client.function("abs", [ctypes.c_int], ctypes.c_int)
+    assert await abs_(-3) == 3
+
+    async with client.safe_calloc(0x10) as buf:
+        memset = (await client.symbols.memset.resolve()).bind([ctypes.c_void_p, ctypes.c_int, ctypes.c_size_t])
+        await memset(buf, ord("a"), 4)
+        assert await buf.peek(5) == b"aaaa\x00"
+
+
+async def test_as_struct(client: Client) -> None:
+    point = Struct("x" / Int32sl, "y" / Int32sl)
+    segment = Struct("id" / Int64ul, "start" / point, "end" / point)
+    async with client.safe_malloc(segment.sizeof()) as buf:
+        await buf.poke(segment.build({"id": 1, "start": {"x": -1, "y": 2}, "end": {"x": 3, "y": -4}}))
+        proxy = buf.as_struct(segment)
+        assert await proxy.id == 1
+        assert await proxy.end.y == -4
+        assert await proxy.start == {"x": -1, "y": 2}
+        assert (await proxy.fetch("id", "end")).end.x == 3
+        await buf.poke(segment.build({"id": 2, "start": {"x": 0, "y": 0}, "end": {"x": 0, "y": 0}}))
+        assert await proxy.id == 1
+        proxy.refresh()
+        assert (await proxy).id == 2
+
+
+async def test_memory_cache(client: Client) -> None:
+    async with client.safe_calloc(0x100) as buf:
+        with client.memory_cache() as cache:
+            assert await buf.peek(8) == b"\x00" * 8
+            assert await buf.peek(8, offset=8) == b"\x00" * 8
+            assert cache.hits >= 1
+            await buf.poke(b"a" * 8)
+            assert await buf.peek(8) == b"a" * 8
+            await client.symbols.memset(buf, ord("b"), 8)
+            assert await buf.peek(8) == b"b" * 8
+        assert len(cache) == 0
+
+
+async def test_defer_release(client: Client) -> None:
+    async with client.safe_calloc(0x10) as buf:
+        await client.defer_release(client.symbols.memset, buf, ord("a"), 4)
+        assert len(client.release_queue) == 1
+        # served right before the peek it's sent along with
+        assert await buf.peek(5) == b"aaaa\x00"
+        assert len(client.release_queue) == 0
+    assert len(client.release_queue) == 1
+    await client.release_queue.flush()
+    assert len(client.release_queue) == 0
+
+
 @pytest.mark.parametrize(
     "params", [([1, 2, 3, 4, 5, 6, 7, 8, 9, 10]), ([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15])]
 )
@@ -131,3 +231,20 @@ async def test_all_subsystems_initialize(client: Client) -> None:
             failures[name] = repr(value)
 
     assert not failures, f"Subsystems failed to initialize: {failures}"
+
+
+async def test_ping(client: Client) -> None:
+    assert await client.ping() >= 0
+
+
+async def test_reconnect_restores_symbols(client: Client) -> None:
+    old_id = client.id
+    await client.symbols.getpid.resolve()
+    await client.reconnect()
+    assert client.id != old_id
+    # the resolved symbol was revalidated against the new worker rather than dropped, checked before anything
+    # resolves it again
+    assert "getpid" in client.symbols
+    assert isinstance(client.symbols.getpid, Symbol)
+    assert await client.symbols.getpid() == client.id
+    assert await client.get_pid() == client.id
@@ -1,6 +1,10 @@
+import tempfile
+from pathlib import Path
+
 import pytest
 
 from rpcclient.clients.darwin.client import DarwinClient
+from rpcclient.core.symbol_cache import SymbolCache
 
 
 pytestmark = pytest.mark.darwin
@@ -69,3 +73,28 @@ async def test_autorelease_pool_object_retrival_refresh(client: DarwinClient) ->
         assert obj2 not in pool
         await pool.refresh()
         assert obj2 in pool
+
+
+async def test_symbol_cache(client: DarwinClient) -> None:
+    scope = await client.symbol_cache_scope()
+    assert scope is not None
+    strlen = await client.symbols.strlen.resolve()
+    assert int(strlen) in scope
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client.symbol_cache = SymbolCache(Path(cache_dir) / "symbols.sqlite3")
+        try:
+            await client.load_symbol_cache()
+            await client.save_symbol_cache()
+            cached = client.symbol_cache.load(scope.key)["strlen"]
+            assert cached.address == int(strlen)
+            assert cached.image == int((await strlen.get_dl_info()).dli_fbase)
+
+            # symbols of images which aren't loaded, e.g. by another process, are left out
+            client.symbol_cache.store(scope.key, {"not_loaded": cached._replace(image=cached.image + 1)})
+            del client.symbols["strlen"]
+            await client.load_symbol_cache()
+            assert "not_loaded" not in client.symbols
+            assert int(client.symbols["strlen"]) == int(strlen)
+        finally:
+            del client.symbol_cache
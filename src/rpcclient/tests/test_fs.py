@@ -1,14 +1,22 @@
+import asyncio
+import contextlib
+import hashlib
+import os
 import tempfile
 from pathlib import Path
 from stat import S_IMODE
 
 import pytest
+from construct import Bytes, GreedyRange, Int8ul, Int32ul, PascalString, StreamError
 
 from rpcclient.clients.darwin.client import DarwinClient
 from rpcclient.clients.darwin.consts import UF_IMMUTABLE
-from rpcclient.core.structs.consts import LOCK_EX, LOCK_NB, LOCK_UN
-from rpcclient.core.subsystems.fs import RemotePath
+from rpcclient.core.content_cache import ContentCache
+from rpcclient.core.metadata_cache import MetadataCache
+from rpcclient.core.structs.consts import LOCK_EX, LOCK_NB, LOCK_UN, SEEK_SET
+from rpcclient.core.subsystems.fs import FileEventType, RemotePath
 from rpcclient.exceptions import RpcFileNotFoundError, RpcPermissionError
+from rpcclient.protos.rpc_api_pb2 import ListDirStat
 from tests._types import SyncClient
 
 
@@ -37,6 +45,22 @@ async def test_chmod(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> No
     assert S_IMODE((await client.fs.stat(file)).st_mode) == 0o666
 
 
+async def test_chmod_remove_recursive(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    tree = tmp_path / "tree"
+    await client.fs.mkdir(tree / "sub", parents=True)
+    await client.fs.touch(tree / "sub" / "file", mode=0o600)
+    await client.fs.symlink("/nonexistent", tree / "link")
+    await client.fs.chmod(tree, 0o700, recursive=True)
+    for path in (tree, tree / "sub", tree / "sub" / "file"):
+        assert S_IMODE((await client.fs.stat(path)).st_mode) == 0o700
+
+    with pytest.raises(RpcFileNotFoundError):
+        await client.fs.remove(tmp_path / "nonexistent", recursive=True)
+    await client.fs.remove(tmp_path / "nonexistent", recursive=True, force=True)
+    await client.fs.remove(tree, recursive=True)
+    assert not await client.fs.accessible(tree)
+
+
 async def test_open(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
     file = tmp_path / "temp.txt"
     async with await client.fs.open(file, "rw", 0o666):
@@ -46,6 +70,24 @@ async def test_open(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> Non
     assert S_IMODE((await client.fs.stat(file)).st_mode) == 0o666 & ~umask
 
 
+@pytest.mark.parametrize("file_size", [0, 5, 0x100000, 0x280003])
+async def test_read_write_file(client: SyncClient, tmp_path: RemotePath[SyncClient], file_size: int) -> None:
+    file = tmp_path / "temp.bin"
+    data = os.urandom(file_size)
+    assert await client.fs.write_file(file, data, chunk_size=0x100000) == file_size
+    assert await client.fs.read_file(file, chunk_size=0x100000) == data
+
+
+async def test_file_pread_pwrite(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    async with await client.fs.open(tmp_path / "temp.txt", "rw") as f:
+        assert await f.write(b"hello world") == 11
+        await f.pwrite(b"W", 6)
+        assert await f.pread(5, 6) == b"World"
+        await f.seek(0, SEEK_SET)
+        assert await f.read(5) == b"hello"
+        assert await f.read() == b" World"
+
+
 async def test_flock(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
     file = tmp_path / "lock.txt"
     async with await client.fs.open(file, "w+") as f:
@@ -172,6 +214,245 @@ async def test_push_pull_dir(client: SyncClient, tmp_path: RemotePath[SyncClient
         assert a.exists()
 
 
+@pytest.mark.parametrize("workers", [1, 2])
+async def test_push_pull_dir_parallel(client: SyncClient, tmp_path: RemotePath[SyncClient], workers: int) -> None:
+    with tempfile.TemporaryDirectory() as local_dir:
+        local_dir = Path(local_dir)
+        (local_dir / "src" / "sub").mkdir(parents=True)
+        files = {f"sub/{i}.bin": os.urandom(i * 1000) for i in range(10)}
+        for name, data in files.items():
+            (local_dir / "src" / name).write_bytes(data)
+        (local_dir / "src" / "link").symlink_to("sub/1.bin")
+
+        reports = []
+        progress = await client.fs.push(
+            local_dir / "src", tmp_path, recursive=True, jobs=4, workers=workers, progress=reports.append
+        )
+        assert progress.done_files == len(files) + 1
+        assert progress.done_bytes == progress.total_bytes
+        assert reports
+
+        await client.fs.pull(tmp_path / "src", local_dir / "dst", recursive=True, jobs=4, workers=workers)
+        for name, data in files.items():
+            assert (local_dir / "dst" / "src" / name).read_bytes() == data
+        assert os.readlink(local_dir / "dst" / "src" / "link") == "sub/1.bin"
+
+
+async def test_hash(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    data = os.urandom(0x10003)
+    await client.fs.write_file(tmp_path / "file.bin", data)
+    assert await client.fs.hash(tmp_path / "file.bin") == hashlib.sha256(data).hexdigest()
+    assert (
+        await client.fs.hash(tmp_path / "file.bin", offset=3, size=0x100) == hashlib.sha256(data[3:0x103]).hexdigest()
+    )
+
+
+async def test_pull_content_cache(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    data = os.urandom(0x1000)
+    await client.fs.write_file(tmp_path / "a.bin", data)
+    await client.fs.write_file(tmp_path / "b.bin", data)
+    with tempfile.TemporaryDirectory() as local_dir:
+        cache = ContentCache(Path(local_dir) / "cache")
+        client.fs.content_cache = cache
+        try:
+            await client.fs.pull([tmp_path / "a.bin", tmp_path / "b.bin"], local_dir, jobs=1)
+        finally:
+            del client.fs.content_cache
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert (Path(local_dir) / "b.bin").read_bytes() == data
+
+
+async def test_metadata_cache(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    cache = MetadataCache()
+    client.fs.metadata_cache = cache
+    try:
+        await client.fs.write_file(tmp_path / "file", b"data")
+        assert await client.fs.listdir(tmp_path) == ["file"]
+        assert (await client.fs.stat(tmp_path / "file")).st_size == 4
+        assert await client.fs.listdir(tmp_path) == ["file"]
+        assert (await client.fs.stat(tmp_path / "file")).st_size == 4
+        assert cache.hits == 2
+
+        # changes made through the client invalidate the cached entries
+        await client.fs.write_file(tmp_path / "file", b"more data")
+        assert (await client.fs.stat(tmp_path / "file")).st_size == 9
+        await client.fs.chmod(tmp_path / "file", 0o600)
+        assert S_IMODE((await client.fs.stat(tmp_path / "file")).st_mode) == 0o600
+        await client.fs.rename(tmp_path / "file", tmp_path / "renamed")
+        assert await client.fs.listdir(tmp_path) == ["renamed"]
+        await client.fs.mkdir(tmp_path / "dir")
+        assert sorted(await client.fs.listdir(tmp_path)) == ["dir", "renamed"]
+        await client.fs.remove(tmp_path / "renamed")
+        assert await client.fs.listdir(tmp_path) == ["dir"]
+        assert not await (tmp_path / "renamed").exists()
+    finally:
+        client.fs.metadata_cache = None
+
+
+async def test_push_pull_resumable(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    data = os.urandom(0x280003)
+    with tempfile.TemporaryDirectory() as local_dir:
+        local = Path(local_dir) / "file.bin"
+        local.write_bytes(data)
+        remote = tmp_path / "file.bin"
+        # a partial copy left by an interrupted transfer, whose tail is corrupted
+        await client.fs.write_file(f"{remote}.part", data[:0x180000] + b"x" * 0x10)
+        await client.fs.push(local, remote, resumable=True)
+        assert await client.fs.read_file(remote) == data
+        assert not await client.fs.accessible(f"{remote}.part")
+
+        pulled = Path(local_dir) / "pulled.bin"
+        Path(f"{pulled}.part").write_bytes(data[:0x100000])
+        progress = await client.fs.pull(remote, pulled, resumable=True)
+        assert pulled.read_bytes() == data
+        assert not Path(f"{pulled}.part").exists()
+        assert progress.done_bytes == len(data)
+
+
+async def test_find_predicates(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    await client.fs.mkdir(tmp_path / "a" / "b", parents=True)
+    await client.fs.write_file(tmp_path / "a" / "x.sqlite", b"x")
+    await client.fs.write_file(tmp_path / "a" / "b" / "big.sqlite", b"x" * 0x1000)
+    await client.fs.write_file(tmp_path / "a" / "b" / "y.txt", b"")
+    await client.fs.utime(tmp_path / "a" / "b" / "y.txt", (1000000, 1000000))
+
+    async def find(**kwargs) -> list[str]:
+        return sorted([path async for path in client.fs.find(tmp_path, **kwargs)])
+
+    assert await find(name="*.sqlite") == [f"{tmp_path}/a/b/big.sqlite", f"{tmp_path}/a/x.sqlite"]
+    assert await find(type="d") == [str(tmp_path), f"{tmp_path}/a", f"{tmp_path}/a/b"]
+    assert await find(type="f", size=(0x100, None)) == [f"{tmp_path}/a/b/big.sqlite"]
+    assert await find(type="f", older=2000000) == [f"{tmp_path}/a/b/y.txt"]
+    assert await find(regex="^b.*e$") == [f"{tmp_path}/a/b/big.sqlite"]
+    assert await find(type="f", max_depth=2) == [f"{tmp_path}/a/x.sqlite"]
+
+
+async def test_du(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    await client.fs.mkdir(tmp_path / "a" / "b", parents=True)
+    await client.fs.write_file(tmp_path / "a" / "x", b"x" * 0x1000)
+    await client.fs.write_file(tmp_path / "a" / "b" / "y", b"y" * 0x100)
+    await client.fs.link(tmp_path / "a" / "x", tmp_path / "a" / "x2")
+
+    (root,) = await client.fs.du(tmp_path)
+    assert root.path == str(tmp_path)
+    assert (root.files, root.dirs, root.errors) == (2, 3, 0)
+    assert root.size >= 0x1100
+    assert root.disk_usage >= 0x1100
+
+    usages = await client.fs.du(tmp_path, depth=None)
+    assert [usage.path for usage in usages] == [f"{tmp_path}/a/b", f"{tmp_path}/a", str(tmp_path)]
+    assert [usage.files for usage in usages] == [1, 2, 2]
+    assert [len(await client.fs.du(tmp_path, depth=depth)) for depth in (1, 2)] == [2, 3]
+
+
+async def test_watch(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    await client.fs.mkdir(tmp_path / "dir")
+    async with contextlib.aclosing(client.fs.watch(tmp_path, recursive=True, poll_timeout=0.1)) as events:
+
+        async def next_event(kind: FileEventType, pending=None):
+            event = await asyncio.wait_for(pending or anext(events), 5)
+            while event.kind != kind:
+                event = await asyncio.wait_for(anext(events), 5)
+            return event
+
+        # the watch starts with the first iteration
+        pending = asyncio.ensure_future(anext(events))
+        await asyncio.sleep(0.5)
+        await client.fs.write_file(tmp_path / "dir" / "file", b"data")
+        assert (await next_event(FileEventType.CREATE, pending)).path == f"{tmp_path}/dir/file"
+        await client.fs.rename(tmp_path / "dir" / "file", tmp_path / "dir" / "renamed")
+        event = await next_event(FileEventType.RENAME)
+        assert (event.path, event.dest) == (f"{tmp_path}/dir/file", f"{tmp_path}/dir/renamed")
+        await client.fs.remove(tmp_path / "dir" / "renamed")
+        assert (await next_event(FileEventType.DELETE)).path == f"{tmp_path}/dir/renamed"
+
+
+async def test_mmap(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    data = os.urandom(0x100003)
+    await client.fs.write_file(tmp_path / "file.bin", data)
+    async with await client.fs.mmap(tmp_path / "file.bin", page_size=0x1000, read_ahead=1, max_pages=16) as mapped:
+        assert len(mapped) == len(data)
+        assert await mapped[0x10:0x1010] == data[0x10:0x1010]
+        assert await mapped[-1] == data[-1]
+        assert await mapped.read(len(data) - 2, 0x10) == data[-2:]
+        string = data[0x80001 : 0x80001 + data[0x80000]].decode("latin-1")
+        assert await mapped.parse(PascalString(Int8ul, "latin-1"), 0x80000) == string
+        assert mapped.fetched_bytes < 0x10000
+        assert len(await mapped.parse(GreedyRange(Int32ul), 0x80000)) == (len(data) - 0x80000) // 4
+
+
+async def test_mmap_truncated(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    data = os.urandom(0x3000)
+    await client.fs.write_file(tmp_path / "file.bin", data)
+    async with await client.fs.mmap(tmp_path / "file.bin", page_size=0x1000, read_ahead=0) as mapped:
+        assert await mapped[0] == data[0]
+        async with await client.fs.open(tmp_path / "file.bin", "r+") as f:
+            await f.truncate(0x1800)
+        with pytest.raises(StreamError):
+            await mapped.parse(Bytes(0x2000))
+        assert len(mapped) == 0x1800
+        assert await mapped[0x1000:0x3000] == data[0x1000:0x1800]
+        assert len(await mapped.parse(GreedyRange(Int32ul))) == 0x600
+
+
+async def test_pull_push_archive(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    files = {f"src/sub/{i}.bin": os.urandom(i * 1000) for i in range(10)}
+    files["src/" + "long" * 40] = b"long name"
+    await client.fs.mkdir(tmp_path / "src" / "sub", parents=True)
+    for name, data in files.items():
+        await client.fs.write_file(tmp_path / name, data)
+    await client.fs.chmod(tmp_path / "src/sub/1.bin", 0o751)
+    await client.fs.symlink("sub/1.bin", tmp_path / "src" / "link")
+
+    with tempfile.TemporaryDirectory() as local_dir:
+        local_dir = Path(local_dir)
+        await client.fs.pull_archive(tmp_path / "src", local_dir / "extracted", extract=True)
+        for name, data in files.items():
+            assert (local_dir / "extracted" / name).read_bytes() == data
+        assert S_IMODE((local_dir / "extracted/src/sub/1.bin").stat().st_mode) == 0o751
+        assert os.readlink(local_dir / "extracted/src/link") == "sub/1.bin"
+
+        await client.fs.pull_archive(tmp_path / "src", local_dir / "src.tar")
+        await client.fs.push_archive(local_dir / "src.tar", tmp_path / "pushed")
+        for name, data in files.items():
+            assert await client.fs.read_file(tmp_path / "pushed" / name) == data
+        assert await client.fs.readlink(tmp_path / "pushed/src/link", absolute=False) == "sub/1.bin"
+
+        progress = await client.fs.pull(tmp_path / "src", local_dir / "pulled", recursive=True, archive=True)
+        assert progress.done_files == len(files) + 1
+        for name, data in files.items():
+            assert (local_dir / "pulled" / name).read_bytes() == data
+
+
+@pytest.mark.parametrize("direction", ["push", "pull"])
+async def test_sync(client: SyncClient, tmp_path: RemotePath[SyncClient], direction: str) -> None:
+    block_size = 0x1000
+    data = os.urandom(block_size * 8)
+    with tempfile.TemporaryDirectory() as local_dir:
+        local = str(Path(local_dir) / "file.bin")
+        remote = str(tmp_path / "file.bin")
+        src, dst = (local, remote) if direction == "push" else (remote, local)
+        if direction == "push":
+            Path(local).write_bytes(data)
+        else:
+            await client.fs.write_file(remote, data)
+
+        report = await client.fs.sync(src, dst, direction, dry_run=True, block_size=block_size)
+        assert report.transferred_bytes == len(data)
+        assert report.actions[0].kind == "create"
+        await client.fs.sync(src, dst, direction, block_size=block_size)
+        assert len((await client.fs.sync(src, dst, direction, block_size=block_size)).unchanged) == 1
+
+        data = data[: block_size * 3] + b"x" * block_size + data[block_size * 4 :] + b"tail"
+        if direction == "push":
+            Path(local).write_bytes(data)
+        else:
+            await client.fs.write_file(remote, data)
+        report = await client.fs.sync(src, dst, direction, block_size=block_size)
+        assert report.transferred_bytes == block_size + len(b"tail")
+        assert Path(local).read_bytes() == await client.fs.read_file(remote) == data
+
+
 async def test_scandir_sanity(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
     entries = list(await client.fs.scandir(tmp_path))
     assert not entries
@@ -185,6 +466,22 @@ async def test_scandir_sanity(client: SyncClient, tmp_path: RemotePath[SyncClien
     assert not await entries[0].is_symlink()
 
 
+@pytest.mark.parametrize(
+    "stat_mode",
+    [ListDirStat.LIST_DIR_STAT_BOTH, ListDirStat.LIST_DIR_STAT_LSTAT, ListDirStat.LIST_DIR_STAT_NONE],
+)
+async def test_scandir_stat_mode(client: SyncClient, tmp_path: RemotePath[SyncClient], stat_mode: int) -> None:
+    await client.fs.write_file(tmp_path / "temp.txt", b"hello")
+    await client.fs.symlink(tmp_path / "temp.txt", tmp_path / "link")
+    entries = {e.name: e for e in await client.fs.scandir(tmp_path, stat_mode=stat_mode)}
+    assert sorted(entries) == ["link", "temp.txt"]
+    assert (await entries["temp.txt"].stat()).st_size == 5
+    assert (await entries["link"].stat()).st_size == 5
+    assert await entries["link"].is_symlink()
+    assert await entries["link"].is_file()
+    assert entries["temp.txt"].inode() == (await client.fs.stat(tmp_path / "temp.txt")).st_ino
+
+
 async def test_stat_sanity(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
     file = tmp_path / "temp.txt"
     await client.fs.write_file(file, b"h" * 0x10000)
@@ -222,6 +519,47 @@ async def test_walk(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> Non
     ]
 
 
+async def test_walk_options(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    await client.fs.mkdir(tmp_path / "dir_a")
+    await client.fs.mkdir(tmp_path / "dir_a" / "sub")
+    await client.fs.touch(tmp_path / "dir_a" / "sub" / "a.txt")
+    await client.fs.touch(tmp_path / "dir_a" / "a.log")
+    await client.fs.mkdir(tmp_path / "dir_b")
+    await client.fs.touch(tmp_path / "dir_b" / "b.txt")
+
+    bottom_up = [root async for root, _dirs, _files in client.fs.walk(tmp_path, topdown=False)]
+    assert bottom_up.index(f"{tmp_path}/dir_a/sub") < bottom_up.index(f"{tmp_path}/dir_a")
+    assert bottom_up[-1] == f"{tmp_path}"
+
+    assert [root async for root, _dirs, _files in client.fs.walk(tmp_path, max_depth=1)] == [f"{tmp_path}"]
+
+    files = [name async for _root, _dirs, files in client.fs.walk(tmp_path, include=["*.txt"]) for name in files]
+    assert sorted(files) == ["a.txt", "b.txt"]
+
+    roots = []
+    async for root, dirs, _files in client.fs.walk(tmp_path):
+        roots.append(root)
+        if "dir_a" in dirs:
+            dirs.remove("dir_a")
+    assert sorted(roots) == [f"{tmp_path}", f"{tmp_path}/dir_b"]
+
+
+async def test_walk_prune_listed(client: SyncClient, tmp_path: RemotePath[SyncClient]) -> None:
+    await client.fs.mkdir(tmp_path / "dir_a")
+    await client.fs.mkdir(tmp_path / "dir_a" / "sub")
+    await client.fs.mkdir(tmp_path / "dir_a" / "sub" / "deeper")
+    await client.fs.mkdir(tmp_path / "dir_b")
+
+    # the first batch ends with the root still being listed, dir_a being found but not yet queued
+    prune: set[str] = set()
+    paths = []
+    async for walk_dir in client.walk(tmp_path, batch_size=2, prune=prune):
+        paths.append(walk_dir.path)
+        prune.add(f"{tmp_path}/dir_a")
+    assert f"{tmp_path}/dir_b" in paths
+    assert not any(path.startswith(f"{tmp_path}/dir_a") for path in paths)
+
+
 @pytest.mark.darwin
 async def test_xattr(client: DarwinClient, tmp_path: RemotePath[DarwinClient]) -> None:
     await client.fs.setxattr(tmp_path, "KEY", b"VALUE")
@@ -2,34 +2,74 @@
 #include <mach/mach_init.h>
 #include <mach/message.h>
 #include <mach/vm_map.h>
+#include <sys/event.h>
+#else
+#include <poll.h>
+#include <sys/inotify.h>
 #endif// __APPLE__
 
 #include "routines.h"
 
 #include "protos/rpc_api.pb-c.h"
+#include "sha256.h"
 
 #include <dirent.h>
 #include <dlfcn.h>
+#include <fnmatch.h>
+#include <fts.h>
+#include <limits.h>
 #include <pthread.h>
+#include <regex.h>
 #include <stdlib.h>
 #include <sys/socket.h>
 #include <sys/stat.h>
+#include <sys/time.h>
 #include <unistd.h>
 
 #define MAX_ERROR_MSG_LEN 256
+#define WALK_DEFAULT_BATCH_SIZE (1024)
+#define FILE_HASH_BUFFER_SIZE (256 * 1024)
+#define ARCHIVE_BLOCK_SIZE (512)
+#define ARCHIVE_NAME_SIZE (100)
+#define ARCHIVE_DEFAULT_READ_SIZE (1024 * 1024)
+/** Largest GNU long name or pax header accepted by REQ_ARCHIVE_WRITE, as they are held in memory. */
+#define ARCHIVE_MAX_EXTENDED_SIZE (4 * 1024 * 1024)
+#define WATCH_EVENTS_PER_READ (64)
+#define TREE_OPERATION_DEFAULT_MAX_FAILURES (256)
 
 static routine_status_t routine_dlopen(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 static routine_status_t routine_dlclose(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 static routine_status_t routine_dlsym(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_dlsym_multi(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 static routine_status_t routine_peek(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 static routine_status_t routine_poke(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 static routine_status_t routine_call(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_call_multi(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 static routine_status_t routine_listdir(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 static routine_status_t routine_close_client(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 static routine_status_t routine_exec(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_ping(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_walk(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_file_read(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_file_write(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_file_hash(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_archive_read(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_archive_write(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_du(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_watch(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
+static routine_status_t routine_tree_operation(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg);
 
 static void cleanup_peek(ProtobufCMessage *reply);
 static void cleanup_listdir(ProtobufCMessage *reply);
+static void cleanup_walk(ProtobufCMessage *reply);
+static void cleanup_file_read(ProtobufCMessage *reply);
+static void cleanup_file_hash(ProtobufCMessage *reply);
+static void cleanup_archive_read(ProtobufCMessage *reply);
+static void cleanup_du(ProtobufCMessage *reply);
+static void cleanup_watch(ProtobufCMessage *reply);
+static void cleanup_tree_operation(ProtobufCMessage *reply);
+static void cleanup_dlsym_multi(ProtobufCMessage *reply);
+static void cleanup_call_multi(ProtobufCMessage *reply);
 
 // Darwin specific
 #if __APPLE__
@@ -123,6 +163,66 @@ const rpc_routine_entry_t rpc_routines[RPC__PROTOCOL_CONSTANTS__RPC_MAX_REQ_MSG_
             .name = "EXEC",
             .cleanup = NULL,
         },
+    [RPC__API__MSG_ID__REQ_PING] = {.routine = routine_ping,
+                                    .request_descriptor = &rpc__api__request_ping__descriptor,
+                                    .reply_descriptor = &rpc__api__reply_ping__descriptor,
+                                    .name = "PING",
+                                    .cleanup = NULL},
+    [RPC__API__MSG_ID__REQ_WALK] = {.routine = routine_walk,
+                                    .request_descriptor = &rpc__api__request_walk__descriptor,
+                                    .reply_descriptor = &rpc__api__reply_walk__descriptor,
+                                    .name = "WALK",
+                                    .cleanup = cleanup_walk},
+    [RPC__API__MSG_ID__REQ_FILE_READ] = {.routine = routine_file_read,
+                                         .request_descriptor = &rpc__api__request_file_read__descriptor,
+                                         .reply_descriptor = &rpc__api__reply_file_read__descriptor,
+                                         .name = "FILE_READ",
+                                         .cleanup = cleanup_file_read},
+    [RPC__API__MSG_ID__REQ_FILE_WRITE] = {.routine = routine_file_write,
+                                          .request_descriptor = &rpc__api__request_file_write__descriptor,
+                                          .reply_descriptor = &rpc__api__reply_file_write__descriptor,
+                                          .name = "FILE_WRITE",
+                                          .cleanup = NULL},
+    [RPC__API__MSG_ID__REQ_FILE_HASH] = {.routine = routine_file_hash,
+                                         .request_descriptor = &rpc__api__request_file_hash__descriptor,
+                                         .reply_descriptor = &rpc__api__reply_file_hash__descriptor,
+                                         .name = "FILE_HASH",
+                                         .cleanup = cleanup_file_hash},
+    [RPC__API__MSG_ID__REQ_ARCHIVE_READ] = {.routine = routine_archive_read,
+                                            .request_descriptor = &rpc__api__request_archive_read__descriptor,
+                                            .reply_descriptor = &rpc__api__reply_archive_read__descriptor,
+                                            .name = "ARCHIVE_READ",
+                                            .cleanup = cleanup_archive_read},
+    [RPC__API__MSG_ID__REQ_ARCHIVE_WRITE] = {.routine = routine_archive_write,
+                                             .request_descriptor = &rpc__api__request_archive_write__descriptor,
+                                             .reply_descriptor = &rpc__api__reply_archive_write__descriptor,
+                                             .name = "ARCHIVE_WRITE",
+                                             .cleanup = NULL},
+    [RPC__API__MSG_ID__REQ_DU] = {.routine = routine_du,
+                                  .request_descriptor = &rpc__api__request_du__descriptor,
+                                  .reply_descriptor = &rpc__api__reply_du__descriptor,
+                                  .name = "DU",
+                                  .cleanup = cleanup_du},
+    [RPC__API__MSG_ID__REQ_WATCH] = {.routine = routine_watch,
+                                     .request_descriptor = &rpc__api__request_watch__descriptor,
+                                     .reply_descriptor = &rpc__api__reply_watch__descriptor,
+                                     .name = "WATCH",
+                                     .cleanup = cleanup_watch},
+    [RPC__API__MSG_ID__REQ_TREE_OPERATION] = {.routine = routine_tree_operation,
+                                              .request_descriptor = &rpc__api__request_tree_operation__descriptor,
+                                              .reply_descriptor = &rpc__api__reply_tree_operation__descriptor,
+                                              .name = "TREE_OPERATION",
+                                              .cleanup = cleanup_tree_operation},
+    [RPC__API__MSG_ID__REQ_DLSYM_MULTI] = {.routine = routine_dlsym_multi,
+                                           .request_descriptor = &rpc__api__request_dlsym_multi__descriptor,
+                                           .reply_descriptor = &rpc__api__reply_dlsym_multi__descriptor,
+                                           .name = "DLSYM_MULTI",
+                                           .cleanup = cleanup_dlsym_multi},
+    [RPC__API__MSG_ID__REQ_CALL_MULTI] = {.routine = routine_call_multi,
+                                          .request_descriptor = &rpc__api__request_call_multi__descriptor,
+                                          .reply_descriptor = &rpc__api__reply_call_multi__descriptor,
+                                          .name = "CALL_MULTI",
+                                          .cleanup = cleanup_call_multi},
 
 /* Apple-specific routines */
 #if __APPLE__
@@ -387,6 +487,41 @@ error:
     return ROUTINE_SERVER_ERROR;
 }
 
+/**
+ * @brief Resolves several symbols of a handle at once, sparing the client a
+ * DLSYM roundtrip per symbol.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestDlsymMulti`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyDlsymMulti`
+ *                message holding the address of every name, in order, or 0 for the
+ *                absent ones.
+ *
+ * @return ROUTINE_SUCCESS on success, or ROUTINE_SERVER_ERROR if a memory
+ *         allocation error occurs.
+ */
+static routine_status_t routine_dlsym_multi(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestDlsymMulti *request = (const Rpc__Api__RequestDlsymMulti *) in_msg;
+    Rpc__Api__ReplyDlsymMulti *reply = malloc(sizeof *reply);
+    CHECK(reply != NULL);
+    rpc__api__reply_dlsym_multi__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    if (request->n_symbol_names == 0) {
+        return ROUTINE_SUCCESS;
+    }
+    reply->ptrs = calloc(request->n_symbol_names, sizeof(uint64_t));
+    CHECK(reply->ptrs != NULL);
+    reply->n_ptrs = request->n_symbol_names;
+
+    for (size_t i = 0; i < request->n_symbol_names; ++i) {
+        reply->ptrs[i] = (uint64_t) dlsym((void *) request->handle, request->symbol_names[i]);
+        TRACE("%s = %p", request->symbol_names[i], reply->ptrs[i]);
+    }
+    return ROUTINE_SUCCESS;
+error:
+    return ROUTINE_SERVER_ERROR;
+}
+
 /**
  * Handles a peek operation for a routine by processing an input ProtobufCMessage
  * and producing an output ProtobufCMessage containing the requested data.
@@ -528,6 +663,53 @@ error:
     return ROUTINE_SERVER_ERROR;
 }
 
+/**
+ * @brief Calls several functions in order, sparing the client a CALL roundtrip
+ * per call, e.g. to release the resources it deferred the release of.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestCallMulti`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyCallMulti`
+ *                message holding the integer return value of every call, in order.
+ *
+ * @return ROUTINE_SUCCESS on success, or ROUTINE_SERVER_ERROR if a memory
+ *         allocation error occurs.
+ */
+static routine_status_t routine_call_multi(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestCallMulti *request = (const Rpc__Api__RequestCallMulti *) in_msg;
+    Rpc__Api__ReplyCallMulti *reply = malloc(sizeof *reply);
+    CHECK(reply != NULL);
+    rpc__api__reply_call_multi__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    if (request->n_calls == 0) {
+        return ROUTINE_SUCCESS;
+    }
+    reply->return_values = calloc(request->n_calls, sizeof(uint64_t));
+    CHECK(reply->return_values != NULL);
+    reply->n_return_values = request->n_calls;
+
+    for (size_t i = 0; i < request->n_calls; ++i) {
+        const Rpc__Api__RequestCall *call = request->calls[i];
+        Rpc__Api__ReplyCall reply_call;
+        rpc__api__reply_call__init(&reply_call);
+#ifdef __ARM_ARCH_ISA_A64
+        Rpc__Api__ReturnRegistersArm regs;
+        rpc__api__return_registers_arm__init(&regs);
+        reply_call.arm_registers = &regs;
+#endif
+        TRACE("address: %p", (void *) (uintptr_t) call->address);
+        call_function(call->address, call->va_list_index, call->n_argv, call->argv, &reply_call);
+#ifdef __ARM_ARCH_ISA_A64
+        reply->return_values[i] = regs.x0;
+#else
+        reply->return_values[i] = reply_call.return_value;
+#endif
+    }
+    return ROUTINE_SUCCESS;
+error:
+    return ROUTINE_SERVER_ERROR;
+}
+
 /**
  * Closes a client session and prepares a reply message.
  *
@@ -549,11 +731,108 @@ error:
     return ROUTINE_SERVER_ERROR;
 }
 
+/**
+ * Answers a keepalive probe. Used by clients to detect a dead peer while the connection is idle.
+ *
+ * @param in_msg The input message. It carries no fields and is ignored.
+ * @param out_msg A pointer to a pointer that will be set to a newly allocated, empty reply message.
+ * @return Returns ROUTINE_SUCCESS if the operation is successful, and ROUTINE_SERVER_ERROR
+ *         if a memory allocation error occurs.
+ */
+static routine_status_t routine_ping(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    (void) in_msg;
+    Rpc__Api__ReplyPing *reply_ping = malloc(sizeof *reply_ping);
+    CHECK(reply_ping != NULL);
+    rpc__api__reply_ping__init(reply_ping);
+    *out_msg = (ProtobufCMessage *) reply_ping;
+
+    return ROUTINE_SUCCESS;
+error:
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Makes room for at least one more item in a growable array, doubling its capacity when full.
+ *
+ * @param array Pointer to the array, reallocated as needed. May point to NULL for an empty array.
+ * @param capacity Pointer to the number of items the array can hold, updated on reallocation.
+ * @param count The number of items currently in the array.
+ * @param item_size The size of a single item.
+ * @return true on success, false if a memory allocation error occurs (the array is left untouched).
+ */
+static bool array_reserve(void **array, size_t *capacity, size_t count, size_t item_size) {
+    if (count < *capacity) {
+        return true;
+    }
+    size_t new_capacity = *capacity ? *capacity * 2 : 64;
+    void *new_array = realloc(*array, new_capacity * item_size);
+    if (new_array == NULL) {
+        return false;
+    }
+    *array = new_array;
+    *capacity = new_capacity;
+    return true;
+}
+
+/**
+ * Frees a DirEntry message along with its name and stat messages.
+ *
+ * @param entry The entry to free. May be NULL or partially filled.
+ */
+static void free_dir_entry(Rpc__Api__DirEntry *entry) {
+    if (!entry) {
+        return;
+    }
+    safe_free(entry->d_name);
+    safe_free(entry->stat);
+    safe_free(entry->lstat);
+    free(entry);
+}
+
+/**
+ * Allocates a DirEntryStat message and fills it from a stat structure.
+ *
+ * @param st The stat structure to copy the fields from. Ignored when `err` is non-zero.
+ * @param err The errno of the failed stat call, or 0 on success.
+ * @return A newly allocated DirEntryStat message, or NULL if a memory allocation error occurs.
+ */
+static Rpc__Api__DirEntryStat *dir_entry_stat_new(const struct stat *st, int err) {
+    Rpc__Api__DirEntryStat *entry_stat = malloc(sizeof *entry_stat);
+    if (entry_stat == NULL) {
+        return NULL;
+    }
+    rpc__api__dir_entry_stat__init(entry_stat);
+
+    entry_stat->errno1 = (u64) err;
+    if (err != 0) {
+        return entry_stat;
+    }
+    entry_stat->st_dev = st->st_dev;
+    entry_stat->st_mode = st->st_mode;
+    entry_stat->st_nlink = st->st_nlink;
+    entry_stat->st_ino = st->st_ino;
+    entry_stat->st_uid = st->st_uid;
+    entry_stat->st_gid = st->st_gid;
+    entry_stat->st_rdev = st->st_rdev;
+    entry_stat->st_size = st->st_size;
+    entry_stat->st_blocks = st->st_blocks;
+    entry_stat->st_blksize = st->st_blksize;
+    entry_stat->st_atime1 = st->st_atime;
+    entry_stat->st_mtime1 = st->st_mtime;
+    entry_stat->st_ctime1 = st->st_ctime;
+    return entry_stat;
+}
+
 /**
  * This function processes a directory listing request encoded within a Protobuf message,
  * retrieves the directory entries from the specified path, and encodes the results
- * into the output Protobuf message, including file type, name, and additional metadata
- * such as stat and lstat information.
+ * into the output Protobuf message, including file type, name, inode and, depending on
+ * the requested `stat_mode`, stat and lstat information.
+ *
+ * The directory is read in a single pass and every entry is stat-ed relative to the
+ * directory descriptor using fstatat(), sparing the path resolution of the full path.
+ * In LIST_DIR_STAT_BOTH mode, `stat` is only filled for symlinks, as for any other
+ * entry it is identical to `lstat`.
  *
  * @param in_msg Input Protobuf message containing the path for the directory to list.
  *               Must be of type `Rpc__Api__RequestListDir` and include a valid `path`.
@@ -575,107 +854,62 @@ static routine_status_t routine_listdir(const ProtobufCMessage *in_msg, Protobuf
     *out_msg = (ProtobufCMessage *) reply_list_dir;
 
     struct dirent *entry = NULL;
-    size_t entry_count = 0, idx = 0;
+    size_t capacity = 0;
+    int dfd = -1;
+    Rpc__Api__ListDirStat stat_mode = request_list_dir->stat_mode;
 
-    TRACE("LISTDIR: path='%s'", request_list_dir->path ? request_list_dir->path : "(null)");
+    TRACE("LISTDIR: path='%s' stat_mode=%d", request_list_dir->path ? request_list_dir->path : "(null)",
+          (int) stat_mode);
     CHECK(request_list_dir->path && request_list_dir->path[0] != '\0');
 
-    // First pass: count entries
     dirp = opendir(request_list_dir->path);
     if (dirp == NULL) {
         return ROUTINE_PROTOCOL_ERROR;
     }
-    while ((entry = readdir(dirp)) != NULL) {
-        entry_count++;
-    }
-    CHECK(closedir(dirp) == 0);
-    dirp = NULL;
+    dfd = dirfd(dirp);
+    CHECK(dfd >= 0);
 
     reply_list_dir->dir_entries = NULL;
     reply_list_dir->n_dir_entries = 0;
 
-    if (entry_count == 0) {
-        return ROUTINE_SUCCESS;
-    }
+    while ((entry = readdir(dirp)) != NULL) {
+        CHECK(array_reserve((void **) &reply_list_dir->dir_entries, &capacity, reply_list_dir->n_dir_entries,
+                            sizeof(Rpc__Api__DirEntry *)));
 
-    reply_list_dir->dir_entries = (Rpc__Api__DirEntry **) calloc(entry_count, sizeof(Rpc__Api__DirEntry *));
-    CHECK(reply_list_dir->dir_entries != NULL);
+        Rpc__Api__DirEntry *d_entry = (Rpc__Api__DirEntry *) malloc(sizeof *d_entry);
+        CHECK(d_entry != NULL);
+        rpc__api__dir_entry__init(d_entry);
+        reply_list_dir->dir_entries[reply_list_dir->n_dir_entries++] = d_entry;// progressive for cleanup safety
 
-    // Second pass: populate entries
-    dirp = opendir(request_list_dir->path);
-    CHECK(dirp != NULL);
+        d_entry->d_type = entry->d_type;
+        d_entry->d_ino = entry->d_ino;
+        d_entry->d_name = strdup(entry->d_name);
+        CHECK(d_entry->d_name != NULL);
 
-    while ((entry = readdir(dirp)) != NULL && idx < entry_count) {
-        Rpc__Api__DirEntry *d_entry = NULL;
-        Rpc__Api__DirEntryStat *s_stat = NULL;
-        Rpc__Api__DirEntryStat *l_stat = NULL;
+        if (stat_mode == RPC__API__LIST_DIR_STAT__LIST_DIR_STAT_NONE) {
+            continue;
+        }
 
-        struct stat system_stat;
         struct stat system_lstat;
-        memset(&system_stat, 0, sizeof(system_stat));
-        memset(&system_lstat, 0, sizeof(system_lstat));
-
-        char fullpath[FILENAME_MAX];
-        int n = snprintf(fullpath, sizeof(fullpath), "%s/%s", request_list_dir->path, entry->d_name);
-        CHECK(n > 0 && (size_t) n < sizeof(fullpath));
-
-        u64 stat_err = 0, lstat_err = 0;
-        if (lstat(fullpath, &system_lstat) != 0) {
-            lstat_err = (u64) errno;
-        }
-        if (stat(fullpath, &system_stat) != 0) {
-            stat_err = (u64) errno;
+        int lstat_err = 0;
+        if (fstatat(dfd, entry->d_name, &system_lstat, AT_SYMLINK_NOFOLLOW) != 0) {
+            lstat_err = errno;
         }
+        d_entry->lstat = dir_entry_stat_new(&system_lstat, lstat_err);
+        CHECK(d_entry->lstat != NULL);
 
-        d_entry = (Rpc__Api__DirEntry *) malloc(sizeof *d_entry);
-        s_stat = (Rpc__Api__DirEntryStat *) malloc(sizeof *s_stat);
-        l_stat = (Rpc__Api__DirEntryStat *) malloc(sizeof *l_stat);
-        CHECK(d_entry && s_stat && l_stat);
-
-        rpc__api__dir_entry__init(d_entry);
-        rpc__api__dir_entry_stat__init(s_stat);
-        rpc__api__dir_entry_stat__init(l_stat);
-
-        // Fill 'stat'
-        s_stat->errno1 = stat_err;
-        s_stat->st_dev = system_stat.st_dev;
-        s_stat->st_mode = system_stat.st_mode;
-        s_stat->st_nlink = system_stat.st_nlink;
-        s_stat->st_ino = system_stat.st_ino;
-        s_stat->st_uid = system_stat.st_uid;
-        s_stat->st_gid = system_stat.st_gid;
-        s_stat->st_rdev = system_stat.st_rdev;
-        s_stat->st_size = system_stat.st_size;
-        s_stat->st_blocks = system_stat.st_blocks;
-        s_stat->st_blksize = system_stat.st_blksize;
-        s_stat->st_atime1 = system_stat.st_atime;
-        s_stat->st_mtime1 = system_stat.st_mtime;
-        s_stat->st_ctime1 = system_stat.st_ctime;
-
-        // Fill 'lstat'
-        l_stat->errno1 = lstat_err;
-        l_stat->st_dev = system_lstat.st_dev;
-        l_stat->st_mode = system_lstat.st_mode;
-        l_stat->st_nlink = system_lstat.st_nlink;
-        l_stat->st_ino = system_lstat.st_ino;
-        l_stat->st_uid = system_lstat.st_uid;
-        l_stat->st_gid = system_lstat.st_gid;
-        l_stat->st_rdev = system_lstat.st_rdev;
-        l_stat->st_size = system_lstat.st_size;
-        l_stat->st_blocks = system_lstat.st_blocks;
-        l_stat->st_blksize = system_lstat.st_blksize;
-        l_stat->st_atime1 = system_lstat.st_atime;
-        l_stat->st_mtime1 = system_lstat.st_mtime;
-        l_stat->st_ctime1 = system_lstat.st_ctime;
-
-        d_entry->d_type = entry->d_type;
-        d_entry->d_name = strdup(entry->d_name);
-        CHECK(d_entry->d_name != NULL);
-        d_entry->stat = s_stat;
-        d_entry->lstat = l_stat;
+        if (stat_mode != RPC__API__LIST_DIR_STAT__LIST_DIR_STAT_BOTH || lstat_err != 0 ||
+            !S_ISLNK(system_lstat.st_mode)) {
+            continue;
+        }
 
-        reply_list_dir->dir_entries[idx++] = d_entry;
-        reply_list_dir->n_dir_entries = idx;// progressive for cleanup safety
+        struct stat system_stat;
+        int stat_err = 0;
+        if (fstatat(dfd, entry->d_name, &system_stat, 0) != 0) {
+            stat_err = errno;
+        }
+        d_entry->stat = dir_entry_stat_new(&system_stat, stat_err);
+        CHECK(d_entry->stat != NULL);
     }
 
     CHECK(closedir(dirp) == 0);
@@ -684,141 +918,3647 @@ static routine_status_t routine_listdir(const ProtobufCMessage *in_msg, Protobuf
     return ROUTINE_SUCCESS;
 
 error:
-    safe_free(dirp);
+    if (dirp != NULL) {
+        closedir(dirp);
+    }
     cleanup_listdir((ProtobufCMessage *) reply_list_dir);
     return ROUTINE_SERVER_ERROR;
 }
 
 /**
- * Waits for a specific thread process to terminate and captures its exit status.
- *
- * @param pid The process ID of the thread to wait for. This must be a valid PID.
+ * @brief A directory a walk is yet to list.
  */
-static void thread_waitpid(pid_t pid) {
-    TRACE("enter");
-    s32 err;
-    waitpid(pid, &err, 0);
-}
-
-typedef struct {
-    int sockfd;
-    pid_t pid;
-} thread_notify_client_spawn_error_t;
+typedef struct walk_dir {
+    char *path;
+    u64 depth;
+} walk_dir_t;
 
 /**
- * Executes a routine based on the provided input message, spawns a process if necessary,
- * and prepares an output message with the results.
- *
- * This function handles both background and foreground process execution. If running
- * in the background, a monitoring thread is created for the process. If running in the
- * foreground, process-related information is stored in a global structure.
+ * @brief Identifies a directory a walk already descended into, to break symlink loops.
  *
- * @param in_msg The input Protocol Buffer message containing the execution request details.
- *               This should be a message of type Rpc__Api__RequestExec.
- * @param out_msg A pointer to a pointer that will be set to the output Protocol Buffer
- *                message containing the execution result. This will be a message
- *                of type Rpc__Api__ReplyExec.
- * @return A status code indicating the result of the routine execution. Possible values
- *         include:
- *         - ROUTINE_SUCCESS: The routine completed successfully.
- *         - ROUTINE_PROTOCOL_ERROR: There was an error in the protocol or input processing.
- *         - ROUTINE_SERVER_ERROR: A server-side error occurred during execution.
+ * Held in an open-addressing hash set, `used` telling the occupied slots apart.
  */
-static routine_status_t routine_exec(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
-    const Rpc__Api__RequestExec *request_exec = (const Rpc__Api__RequestExec *) in_msg;
-    Rpc__Api__ReplyExec *reply_exec = malloc(sizeof *reply_exec);
-    pid_t pid = INVALID_PID;
+typedef struct walk_visited {
+    dev_t dev;
+    ino_t ino;
+    bool used;
+} walk_visited_t;
 
-    CHECK(reply_exec != NULL);
-
-    rpc__api__reply_exec__init(reply_exec);
-    *out_msg = (ProtobufCMessage *) reply_exec;
+/**
+ * @brief State of a walk started by REQ_WALK, kept between the batches it is read in.
+ *
+ * Directories are listed one at a time. The subdirectories found in the listed directory
+ * are collected in `found` and pushed to `pending` in reverse once it is done, so that
+ * popping `pending` descends in os.walk() topdown order.
+ */
+typedef struct walk {
+    u64 handle;
+    struct walk *next;
 
-    pthread_t thread = 0;
-    thread_notify_client_spawn_error_t *thread_params = NULL;
+    u64 max_depth;
+    bool follow_symlinks;
+    bool xdev;
+    dev_t root_dev;
+    Rpc__Api__ListDirStat stat_mode;
+    char **include;
+    size_t n_include;
+    char **exclude;
+    size_t n_exclude;
 
-    int master = -1;
+    bool has_filter;
+    bool filter_needs_stat;
+    char **filter_names;
+    size_t n_filter_names;
+    bool has_filter_regex;
+    regex_t filter_regex;
+    uint32_t *filter_types;
+    size_t n_filter_types;
+    u64 size_min;
+    u64 size_max;
+    u64 mtime_min;
+    u64 mtime_max;
+    uint32_t *filter_uids;
+    size_t n_filter_uids;
 
-    // Prepare argv/envp arrays (null-terminated)
-    char **argv = NULL;
-    char **envp = NULL;
+    DIR *dirp;
+    walk_dir_t current;
+    walk_dir_t *pending;
+    size_t n_pending;
+    size_t pending_capacity;
+    walk_dir_t *found;
+    size_t n_found;
+    size_t found_capacity;
+    walk_visited_t *visited;
+    size_t n_visited;
+    size_t visited_capacity;
+} walk_t;
 
-    CHECK(request_exec->n_argv > 0);
+/** Walks that are still open, looked up by their handle. */
+static walk_t *g_walks = NULL;
+static u64 g_next_walk_handle = 1;
 
-    CHECK(copy_arr_with_null(&argv, request_exec->argv, request_exec->n_argv));
-    CHECK(copy_arr_with_null(&envp, request_exec->envp, request_exec->n_envp));
+/**
+ * Duplicates an array of strings.
+ *
+ * @param strings The strings to duplicate.
+ * @param count The number of strings.
+ * @param out Set to the newly allocated array, or NULL when `count` is 0.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool strings_dup(char *const *strings, size_t count, char ***out) {
+    *out = NULL;
+    if (count == 0) {
+        return true;
+    }
+    char **copy = calloc(count, sizeof(char *));
+    if (copy == NULL) {
+        return false;
+    }
+    *out = copy;
+    for (size_t i = 0; i < count; ++i) {
+        copy[i] = strdup(strings[i]);
+        if (copy[i] == NULL) {
+            return false;
+        }
+    }
+    return true;
+}
 
-    // Spawn
-    CHECK(internal_spawn(request_exec->background, argv, request_exec->n_envp ? envp : environ, &pid, &master));
+/**
+ * Duplicates an array of integers.
+ *
+ * @param values The integers to duplicate.
+ * @param count The number of integers.
+ * @param out Set to the newly allocated array, or NULL when `count` is 0.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool u32s_dup(const uint32_t *values, size_t count, uint32_t **out) {
+    *out = NULL;
+    if (count == 0) {
+        return true;
+    }
+    *out = malloc(count * sizeof(uint32_t));
+    if (*out == NULL) {
+        return false;
+    }
+    memcpy(*out, values, count * sizeof(uint32_t));
+    return true;
+}
 
-    reply_exec->pid = pid;
+/**
+ * Checks whether an integer is one of the given values.
+ */
+static bool u32s_contain(const uint32_t *values, size_t count, uint32_t value) {
+    for (size_t i = 0; i < count; ++i) {
+        if (values[i] == value) {
+            return true;
+        }
+    }
+    return false;
+}
 
-    if (request_exec->background) {
-        if (master >= 0) {
-            close(master);
+/**
+ * Checks whether a name matches any of the given fnmatch() patterns.
+ */
+static bool walk_name_matches(const char *name, char *const *patterns, size_t n_patterns) {
+    for (size_t i = 0; i < n_patterns; ++i) {
+        if (fnmatch(patterns[i], name, 0) == 0) {
+            return true;
         }
-        CHECK(0 == pthread_create(&thread, NULL, (void *(*) (void *) ) thread_waitpid, (void *) (intptr_t) pid));
-    } else {
-        g_pending_pty.pid = pid;
-        g_pending_pty.master = master;
-        g_pending_pty.valid = true;
     }
-error:
-    safe_free(argv);
-    safe_free(envp);
-    safe_free(thread_params);
+    return false;
+}
 
-    if (INVALID_PID == pid) {
-        TRACE("invalid pid");
-        return ROUTINE_PROTOCOL_ERROR;
+/**
+ * Releases a walk and everything it holds, unlinking it from the open walks first.
+ *
+ * @param walk The walk to release. May be partially initialized.
+ */
+static void walk_free(walk_t *walk) {
+    for (walk_t **it = &g_walks; *it != NULL; it = &(*it)->next) {
+        if (*it == walk) {
+            *it = walk->next;
+            break;
+        }
     }
+    if (walk->dirp != NULL) {
+        closedir(walk->dirp);
+    }
+    safe_free(walk->current.path);
+    for (size_t i = 0; i < walk->n_pending; ++i) {
+        safe_free(walk->pending[i].path);
+    }
+    for (size_t i = 0; i < walk->n_found; ++i) {
+        safe_free(walk->found[i].path);
+    }
+    for (size_t i = 0; walk->include && i < walk->n_include; ++i) {
+        safe_free(walk->include[i]);
+    }
+    for (size_t i = 0; walk->exclude && i < walk->n_exclude; ++i) {
+        safe_free(walk->exclude[i]);
+    }
+    for (size_t i = 0; walk->filter_names && i < walk->n_filter_names; ++i) {
+        safe_free(walk->filter_names[i]);
+    }
+    if (walk->has_filter_regex) {
+        regfree(&walk->filter_regex);
+    }
+    safe_free(walk->filter_names);
+    safe_free(walk->filter_types);
+    safe_free(walk->filter_uids);
+    safe_free(walk->pending);
+    safe_free(walk->found);
+    safe_free(walk->visited);
+    safe_free(walk->include);
+    safe_free(walk->exclude);
+    free(walk);
+}
 
-    return ROUTINE_SUCCESS;
+/**
+ * Hashes a directory identity into the visited set.
+ */
+static size_t walk_visited_hash(dev_t dev, ino_t ino) {
+    u64 h = ((u64) dev * 0x9e3779b97f4a7c15ULL) ^ (u64) ino;
+    h ^= h >> 33;
+    h *= 0xff51afd7ed558ccdULL;
+    h ^= h >> 33;
+    return (size_t) h;
 }
 
 /**
- * Frees resources associated with a ProtobufCMessage of type Rpc__Api__ReplyPeek.
+ * Finds the slot of a directory in the visited set, or the empty slot it belongs in.
  *
- * Depending on the platform and configuration, it either deallocates memory
- * using `vm_deallocate` (for macOS with SAFE_READ_WRITES defined) or `safe_free`.
+ * @param visited The set, whose capacity is a power of two and which has an empty slot.
+ * @param capacity The number of slots of the set.
+ */
+static walk_visited_t *walk_visited_slot(walk_visited_t *visited, size_t capacity, dev_t dev, ino_t ino) {
+    size_t i = walk_visited_hash(dev, ino) & (capacity - 1);
+    while (visited[i].used && (visited[i].dev != dev || visited[i].ino != ino)) {
+        i = (i + 1) & (capacity - 1);
+    }
+    return &visited[i];
+}
+
+/**
+ * Doubles the capacity of the visited set, rehashing its directories.
  *
- * @param reply Pointer to the ProtobufCMessage to be cleaned up.
- *              Expected to be of type Rpc__Api__ReplyPeek.
+ * @return true on success, false if a memory allocation error occurs (the set is left untouched).
  */
-static void cleanup_peek(ProtobufCMessage *reply) {
-    Rpc__Api__ReplyPeek *reply_peek = (Rpc__Api__ReplyPeek *) reply;
+static bool walk_visited_grow(walk_t *walk) {
+    size_t capacity = walk->visited_capacity ? walk->visited_capacity * 2 : 64;
+    walk_visited_t *visited = calloc(capacity, sizeof(walk_visited_t));
+    if (visited == NULL) {
+        return false;
+    }
+    for (size_t i = 0; i < walk->visited_capacity; ++i) {
+        if (walk->visited[i].used) {
+            *walk_visited_slot(visited, capacity, walk->visited[i].dev, walk->visited[i].ino) = walk->visited[i];
+        }
+    }
+    free(walk->visited);
+    walk->visited = visited;
+    walk->visited_capacity = capacity;
+    return true;
+}
 
-#if defined(__APPLE__) && defined(SAFE_READ_WRITES)
-    vm_deallocate(mach_task_self(), (vm_address_t) reply_peek->data.data, reply_peek->data.len);
-#else
-    safe_free(reply_peek->data.data);
-#endif
+/**
+ * Records a directory as visited, unless it already was.
+ *
+ * @return true if the directory is visited for the first time, false if it was visited
+ *         already or a memory allocation error occurs.
+ */
+static bool walk_visit(walk_t *walk, dev_t dev, ino_t ino) {
+    // keep the load factor under 3/4
+    if ((walk->n_visited + 1) * 4 > walk->visited_capacity * 3 && !walk_visited_grow(walk)) {
+        return false;
+    }
+    walk_visited_t *slot = walk_visited_slot(walk->visited, walk->visited_capacity, dev, ino);
+    if (slot->used) {
+        return false;
+    }
+    *slot = (walk_visited_t) {.dev = dev, .ino = ino, .used = true};
+    walk->n_visited++;
+    return true;
 }
 
 /**
- * Cleans up the dynamically allocated memory associated with a directory listing reply.
- * This function ensures that all allocated memory for directory entries,
- * their associated stat and lstat structures, and names are properly freed.
+ * Copies the predicates of a walk filter into the walk.
  *
- * @param reply A pointer to a ProtobufCMessage structure cast to Rpc__Api__ReplyListDir.
- *              The function deallocates memory associated with this structure's
- *              directory entries and their components. If the reply or its directory
- *              entries are null, the function exits without performing any action.
+ * @param walk The walk to filter.
+ * @param filter The filter carried by the request.
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if the regular expression
+ *         is invalid (errno is set to EINVAL), or ROUTINE_SERVER_ERROR on allocation failure.
  */
-static void cleanup_listdir(ProtobufCMessage *reply) {
-    Rpc__Api__ReplyListDir *reply_list_dir = (Rpc__Api__ReplyListDir *) reply;
-    if (!reply_list_dir || !reply_list_dir->dir_entries) {
-        return;
+static routine_status_t walk_set_filter(walk_t *walk, const Rpc__Api__WalkFilter *filter) {
+    walk->has_filter = true;
+    walk->n_filter_names = filter->n_name;
+    walk->n_filter_types = filter->n_types;
+    walk->n_filter_uids = filter->n_uids;
+    walk->size_min = filter->size_min;
+    walk->size_max = filter->size_max;
+    walk->mtime_min = filter->mtime_min;
+    walk->mtime_max = filter->mtime_max;
+    walk->filter_needs_stat = filter->size_min || filter->size_max || filter->mtime_min || filter->mtime_max ||
+                              filter->n_uids > 0;
+    if (!strings_dup(filter->name, filter->n_name, &walk->filter_names) ||
+        !u32s_dup(filter->types, filter->n_types, &walk->filter_types) ||
+        !u32s_dup(filter->uids, filter->n_uids, &walk->filter_uids)) {
+        return ROUTINE_SERVER_ERROR;
     }
-    for (size_t i = 0; i < reply_list_dir->n_dir_entries; ++i) {
-        Rpc__Api__DirEntry *e = reply_list_dir->dir_entries[i];
-        if (!e) {
-            continue;
+    if (filter->regex && filter->regex[0] != '\0') {
+        if (regcomp(&walk->filter_regex, filter->regex, REG_EXTENDED | REG_NOSUB) != 0) {
+            errno = EINVAL;
+            return ROUTINE_PROTOCOL_ERROR;
         }
-        safe_free(e->d_name);
-        safe_free(e->stat);
-        safe_free(e->lstat);
-        safe_free(e);
+        walk->has_filter_regex = true;
     }
-    safe_free(reply_list_dir->dir_entries);
+    return ROUTINE_SUCCESS;
+}
+
+/**
+ * Checks whether an entry satisfies all the predicates of the walk's filter.
+ *
+ * @param walk The walk whose filter to evaluate.
+ * @param name The entry name.
+ * @param type The entry S_IFMT file type, 0 if unknown.
+ * @param st The entry lstat(), or NULL if it failed.
+ */
+static bool walk_filter_matches(const walk_t *walk, const char *name, mode_t type, const struct stat *st) {
+    if (walk->n_filter_names > 0 && !walk_name_matches(name, walk->filter_names, walk->n_filter_names)) {
+        return false;
+    }
+    if (walk->has_filter_regex && regexec(&walk->filter_regex, name, 0, NULL, 0) != 0) {
+        return false;
+    }
+    if (walk->n_filter_types > 0 && !u32s_contain(walk->filter_types, walk->n_filter_types, type & S_IFMT)) {
+        return false;
+    }
+    if (!walk->filter_needs_stat) {
+        return true;
+    }
+    if (st == NULL) {
+        return false;
+    }
+    u64 size = (u64) st->st_size, mtime = (u64) st->st_mtime;
+    if (size < walk->size_min || (walk->size_max != 0 && size >= walk->size_max)) {
+        return false;
+    }
+    if (mtime < walk->mtime_min || (walk->mtime_max != 0 && mtime >= walk->mtime_max)) {
+        return false;
+    }
+    return walk->n_filter_uids == 0 || u32s_contain(walk->filter_uids, walk->n_filter_uids, st->st_uid);
+}
+
+/**
+ * Creates a walk from the first request of a REQ_WALK sequence and opens its root directory.
+ *
+ * @param request The request carrying the walk parameters.
+ * @param out_walk Set to the new walk, registered in the open walks.
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if the root cannot be listed or
+ *         the filter is invalid (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t walk_create(const Rpc__Api__RequestWalk *request, walk_t **out_walk) {
+    walk_t *walk = calloc(1, sizeof *walk);
+    struct stat root_stat;
+    CHECK(walk != NULL);
+
+    walk->max_depth = request->max_depth;
+    walk->follow_symlinks = request->follow_symlinks;
+    walk->xdev = request->xdev;
+    walk->stat_mode = request->stat_mode;
+    walk->n_include = request->n_include;
+    walk->n_exclude = request->n_exclude;
+    CHECK(strings_dup(request->include, request->n_include, &walk->include));
+    CHECK(strings_dup(request->exclude, request->n_exclude, &walk->exclude));
+    if (request->filter != NULL) {
+        routine_status_t status = walk_set_filter(walk, request->filter);
+        if (status == ROUTINE_PROTOCOL_ERROR) {
+            walk_free(walk);
+            errno = EINVAL;
+            return status;
+        }
+        CHECK(status == ROUTINE_SUCCESS);
+    }
+
+    walk->current.path = strdup(request->path);
+    CHECK(walk->current.path != NULL);
+    walk->dirp = opendir(request->path);
+    if (walk->dirp == NULL) {
+        int err = errno;
+        walk_free(walk);
+        errno = err;
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+    CHECK(fstat(dirfd(walk->dirp), &root_stat) == 0);
+    walk->root_dev = root_stat.st_dev;
+    if (walk->follow_symlinks) {
+        CHECK(walk_visit(walk, root_stat.st_dev, root_stat.st_ino));
+    }
+
+    walk->handle = g_next_walk_handle++;
+    walk->next = g_walks;
+    g_walks = walk;
+    *out_walk = walk;
+    return ROUTINE_SUCCESS;
+
+error:
+    if (walk != NULL) {
+        walk_free(walk);
+    }
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Finishes listing the current directory: queues the subdirectories found in it for
+ * listing, in reverse so they are popped in the order they were found.
+ */
+static bool walk_finish_dir(walk_t *walk) {
+    closedir(walk->dirp);
+    walk->dirp = NULL;
+    safe_free(walk->current.path);
+
+    while (walk->n_found > 0) {
+        if (!array_reserve((void **) &walk->pending, &walk->pending_capacity, walk->n_pending, sizeof(walk_dir_t))) {
+            return false;
+        }
+        walk->pending[walk->n_pending++] = walk->found[--walk->n_found];
+    }
+    return true;
+}
+
+/**
+ * Checks whether a path is the given directory or lies under it.
+ */
+static bool walk_path_within(const char *path, const char *dir) {
+    size_t len = strlen(dir);
+    while (len > 1 && dir[len - 1] == '/') {
+        len--;
+    }
+    if (strncmp(path, dir, len) != 0) {
+        return false;
+    }
+    return path[len] == '\0' || path[len] == '/' || dir[len - 1] == '/';
+}
+
+/**
+ * Removes the directories lying within any of the given paths from a list of directories.
+ */
+static void walk_dirs_prune(walk_dir_t *dirs, size_t *n_dirs, char *const *paths, size_t n_paths) {
+    size_t kept = 0;
+    for (size_t i = 0; i < *n_dirs; ++i) {
+        bool pruned = false;
+        for (size_t j = 0; j < n_paths && !pruned; ++j) {
+            pruned = walk_path_within(dirs[i].path, paths[j]);
+        }
+        if (pruned) {
+            free(dirs[i].path);
+        } else {
+            dirs[kept++] = dirs[i];
+        }
+    }
+    *n_dirs = kept;
+}
+
+/**
+ * Stops the walk from descending into the directories the client asked to skip, along with
+ * everything under them.
+ *
+ * A pruned directory may already have been reported, or be partially listed, by the time the
+ * client asks to skip it: its listing is then abandoned, and neither it nor any of its
+ * subdirectories, whether pending or just found, is listed any further.
+ */
+static void walk_prune(walk_t *walk, char *const *paths, size_t n_paths) {
+    if (n_paths == 0) {
+        return;
+    }
+    if (walk->dirp != NULL) {
+        for (size_t i = 0; i < n_paths; ++i) {
+            if (walk_path_within(walk->current.path, paths[i])) {
+                closedir(walk->dirp);
+                walk->dirp = NULL;
+                safe_free(walk->current.path);
+                break;
+            }
+        }
+    }
+    walk_dirs_prune(walk->found, &walk->n_found, paths, n_paths);
+    walk_dirs_prune(walk->pending, &walk->n_pending, paths, n_paths);
+}
+
+/**
+ * Appends a new WalkDir message for the given path to the reply.
+ *
+ * @return The new message, or NULL if a memory allocation error occurs.
+ */
+static Rpc__Api__WalkDir *walk_reply_add_dir(Rpc__Api__ReplyWalk *reply, size_t *capacity, const char *path) {
+    if (!array_reserve((void **) &reply->dirs, capacity, reply->n_dirs, sizeof(Rpc__Api__WalkDir *))) {
+        return NULL;
+    }
+    Rpc__Api__WalkDir *walk_dir = malloc(sizeof *walk_dir);
+    if (walk_dir == NULL) {
+        return NULL;
+    }
+    rpc__api__walk_dir__init(walk_dir);
+    reply->dirs[reply->n_dirs++] = walk_dir;// progressive for cleanup safety
+    walk_dir->path = strdup(path);
+    return walk_dir->path != NULL ? walk_dir : NULL;
+}
+
+/**
+ * Handles a single directory entry met by a walk: stats it as needed, queues it for
+ * descending if it is a directory, and reports it unless it is filtered out.
+ *
+ * @param walk The walk the entry belongs to.
+ * @param entry The entry read from the current directory.
+ * @param out_entry Set to the DirEntry message to report, or NULL if the entry is filtered out.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool walk_handle_entry(walk_t *walk, const struct dirent *entry, Rpc__Api__DirEntry **out_entry) {
+    int dfd = dirfd(walk->dirp);
+    Rpc__Api__DirEntry *d_entry = NULL;
+    struct stat system_lstat, system_stat;
+    int lstat_err = ENODATA, stat_err = ENODATA;
+    mode_t type = DTTOIF(entry->d_type);
+    bool is_dir = false, descend = false;
+
+    *out_entry = NULL;
+
+    if (walk_name_matches(entry->d_name, walk->exclude, walk->n_exclude)) {
+        return true;
+    }
+
+    if (walk->stat_mode != RPC__API__LIST_DIR_STAT__LIST_DIR_STAT_NONE || entry->d_type == DT_UNKNOWN ||
+        walk->filter_needs_stat || (entry->d_type == DT_DIR && (walk->xdev || walk->follow_symlinks))) {
+        lstat_err = fstatat(dfd, entry->d_name, &system_lstat, AT_SYMLINK_NOFOLLOW) == 0 ? 0 : errno;
+        if (lstat_err == 0) {
+            type = system_lstat.st_mode & S_IFMT;
+        }
+    }
+    if (S_ISLNK(type) &&
+        (walk->follow_symlinks || walk->stat_mode == RPC__API__LIST_DIR_STAT__LIST_DIR_STAT_BOTH)) {
+        stat_err = fstatat(dfd, entry->d_name, &system_stat, 0) == 0 ? 0 : errno;
+    }
+
+    const struct stat *dir_stat = NULL;
+    if (S_ISDIR(type)) {
+        is_dir = descend = true;
+        dir_stat = lstat_err == 0 ? &system_lstat : NULL;
+    } else if (S_ISLNK(type) && stat_err == 0 && S_ISDIR(system_stat.st_mode)) {
+        is_dir = true;
+        descend = walk->follow_symlinks;
+        dir_stat = &system_stat;
+    }
+    if (walk->max_depth != 0 && walk->current.depth + 2 > walk->max_depth) {
+        descend = false;
+    }
+    if (descend && dir_stat != NULL) {
+        if (walk->xdev && dir_stat->st_dev != walk->root_dev) {
+            descend = false;
+        } else if (walk->follow_symlinks && !walk_visit(walk, dir_stat->st_dev, dir_stat->st_ino)) {
+            descend = false;
+        }
+    }
+
+    if (descend) {
+        size_t len = strlen(walk->current.path);
+        const char *sep = (len > 0 && walk->current.path[len - 1] == '/') ? "" : "/";
+        size_t path_len = len + strlen(sep) + strlen(entry->d_name) + 1;
+        char *path = malloc(path_len);
+        if (path == NULL) {
+            return false;
+        }
+        snprintf(path, path_len, "%s%s%s", walk->current.path, sep, entry->d_name);
+        if (!array_reserve((void **) &walk->found, &walk->found_capacity, walk->n_found, sizeof(walk_dir_t))) {
+            free(path);
+            return false;
+        }
+        walk->found[walk->n_found++] = (walk_dir_t) {.path = path, .depth = walk->current.depth + 1};
+    }
+
+    if (!is_dir && walk->n_include > 0 && !walk_name_matches(entry->d_name, walk->include, walk->n_include)) {
+        return true;
+    }
+    if (walk->has_filter &&
+        !walk_filter_matches(walk, entry->d_name, type, lstat_err == 0 ? &system_lstat : NULL)) {
+        return true;
+    }
+
+    d_entry = malloc(sizeof *d_entry);
+    if (d_entry == NULL) {
+        return false;
+    }
+    rpc__api__dir_entry__init(d_entry);
+    *out_entry = d_entry;
+    d_entry->d_type = entry->d_type;
+    d_entry->d_ino = entry->d_ino;
+    d_entry->d_name = strdup(entry->d_name);
+    if (d_entry->d_name == NULL) {
+        return false;
+    }
+    if (walk->stat_mode == RPC__API__LIST_DIR_STAT__LIST_DIR_STAT_NONE) {
+        return true;
+    }
+    d_entry->lstat = dir_entry_stat_new(&system_lstat, lstat_err);
+    if (d_entry->lstat == NULL) {
+        return false;
+    }
+    if (walk->stat_mode == RPC__API__LIST_DIR_STAT__LIST_DIR_STAT_BOTH && S_ISLNK(type)) {
+        d_entry->stat = dir_entry_stat_new(&system_stat, stat_err);
+        if (d_entry->stat == NULL) {
+            return false;
+        }
+    }
+    return true;
+}
+
+/**
+ * Reads the next batch of a walk into the reply.
+ *
+ * @param walk The walk to read from.
+ * @param reply The reply to fill. A directory spanning the batch boundary is continued by
+ *              a WalkDir of the same path in the next reply.
+ * @param batch_size The maximal number of entries to read.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool walk_read_batch(walk_t *walk, Rpc__Api__ReplyWalk *reply, size_t batch_size) {
+    size_t dirs_capacity = 0, entries_capacity = 0, count = 0;
+    Rpc__Api__WalkDir *walk_dir = NULL;
+
+    while (count < batch_size) {
+        if (walk->dirp == NULL) {
+            if (walk->n_pending == 0) {
+                reply->done = true;
+                break;
+            }
+            walk->current = walk->pending[--walk->n_pending];
+            walk->dirp = opendir(walk->current.path);
+            walk_dir = walk_reply_add_dir(reply, &dirs_capacity, walk->current.path);
+            entries_capacity = 0;
+            if (walk_dir == NULL) {
+                return false;
+            }
+            if (walk->dirp == NULL) {
+                walk_dir->errno1 = errno;
+                safe_free(walk->current.path);
+                continue;
+            }
+        } else if (walk_dir == NULL) {
+            // continue the directory left unfinished by the previous batch
+            walk_dir = walk_reply_add_dir(reply, &dirs_capacity, walk->current.path);
+            if (walk_dir == NULL) {
+                return false;
+            }
+        }
+
+        errno = 0;
+        struct dirent *entry = readdir(walk->dirp);
+        if (entry == NULL) {
+            walk_dir->errno1 = errno;
+            if (!walk_finish_dir(walk)) {
+                return false;
+            }
+            if (walk->has_filter && walk_dir->n_entries == 0 && walk_dir->errno1 == 0) {
+                // report only the directories holding matches
+                free(walk_dir->path);
+                free(walk_dir);
+                reply->dirs[--reply->n_dirs] = NULL;
+            }
+            walk_dir = NULL;
+            continue;
+        }
+        if (strcmp(entry->d_name, ".") == 0 || strcmp(entry->d_name, "..") == 0) {
+            continue;
+        }
+
+        Rpc__Api__DirEntry *d_entry = NULL;
+        bool ok = walk_handle_entry(walk, entry, &d_entry);
+        if (d_entry != NULL) {
+            if (!array_reserve((void **) &walk_dir->entries, &entries_capacity, walk_dir->n_entries,
+                               sizeof(Rpc__Api__DirEntry *))) {
+                free_dir_entry(d_entry);
+                return false;
+            }
+            walk_dir->entries[walk_dir->n_entries++] = d_entry;
+            count++;
+        }
+        if (!ok) {
+            return false;
+        }
+    }
+    return true;
+}
+
+/**
+ * Walks a directory tree server-side, in os.walk() topdown order, and returns its entries
+ * in batches of up to `batch_size` entries, grouped by directory.
+ *
+ * The first request (with `handle` 0) starts the walk from `path`; the reply carries a handle
+ * which subsequent requests pass back to read the next batches, until the reply is marked
+ * `done` and the walk is released. A request with `close` set releases the walk early.
+ * Directories may be skipped by listing them in `prune`, which stops the walk from listing them
+ * or anything under them any further, even when they were already reported or are being listed.
+ *
+ * Entries whose name matches an `exclude` pattern are neither reported nor descended into.
+ * Non-directory entries must match one of the `include` patterns, if any, to be reported.
+ * When a `filter` is set, only the entries satisfying it are reported, and directories holding
+ * none of them are left out of the reply altogether.
+ * Subdirectories which cannot be listed are reported with their errno.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestWalk`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyWalk` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful.
+ *         - `ROUTINE_PROTOCOL_ERROR` if the root cannot be listed or the handle is unknown.
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_walk(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestWalk *request_walk = (const Rpc__Api__RequestWalk *) in_msg;
+    Rpc__Api__ReplyWalk *reply_walk = malloc(sizeof *reply_walk);
+    walk_t *walk = NULL;
+    CHECK(reply_walk != NULL);
+    rpc__api__reply_walk__init(reply_walk);
+    *out_msg = (ProtobufCMessage *) reply_walk;
+
+    TRACE("WALK: path='%s' handle=%lu", request_walk->path ? request_walk->path : "(null)",
+          (u64) request_walk->handle);
+
+    if (request_walk->handle == 0) {
+        CHECK(request_walk->path && request_walk->path[0] != '\0');
+        routine_status_t status = walk_create(request_walk, &walk);
+        if (status != ROUTINE_SUCCESS) {
+            return status;
+        }
+    } else {
+        for (walk = g_walks; walk != NULL && walk->handle != request_walk->handle; walk = walk->next) {}
+        if (walk == NULL) {
+            errno = EBADF;
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+    }
+
+    reply_walk->handle = walk->handle;
+    if (request_walk->close) {
+        walk_free(walk);
+        reply_walk->done = true;
+        return ROUTINE_SUCCESS;
+    }
+
+    walk_prune(walk, request_walk->prune, request_walk->n_prune);
+    CHECK(walk_read_batch(walk, reply_walk,
+                          request_walk->batch_size ? request_walk->batch_size : WALK_DEFAULT_BATCH_SIZE));
+    if (reply_walk->done) {
+        walk_free(walk);
+    }
+    return ROUTINE_SUCCESS;
+
+error:
+    if (walk != NULL) {
+        walk_free(walk);
+    }
+    cleanup_walk((ProtobufCMessage *) reply_walk);
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Reads from a file descriptor directly into the reply, sparing the client a remote buffer
+ * allocation and a separate peek for every chunk.
+ *
+ * When `path` is set, it is opened read-only and read instead of `fd`, and the opened fd is
+ * returned so that following requests may carry on reading it. This allows reading a whole
+ * file as a stream of requests, the first one opening it and the last one (with `close`
+ * set) closing it once EOF is reached.
+ *
+ * For regular files, the read is retried until `size` bytes were read or EOF is reached. Other
+ * files (pipes, sockets, ttys) return after the first successful read, so as not to block the
+ * server waiting for more data, and `eof` is set only once a read returns no data.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestFileRead`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyFileRead` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful.
+ *         - `ROUTINE_PROTOCOL_ERROR` if opening or reading the file fails (errno is preserved).
+ *           The fd is closed if it was opened by this request or `close` is set.
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_file_read(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestFileRead *request = (const Rpc__Api__RequestFileRead *) in_msg;
+    Rpc__Api__ReplyFileRead *reply = malloc(sizeof *reply);
+    bool opened = false;
+    int fd = request->fd;
+    size_t total = 0;
+    struct stat st;
+    CHECK(reply != NULL);
+    rpc__api__reply_file_read__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    TRACE("FILE_READ: fd=%d path='%s' size=%lu", request->fd, request->path ? request->path : "(null)",
+          (u64) request->size);
+
+    if (request->path && request->path[0] != '\0') {
+        fd = open(request->path, O_RDONLY);
+        if (fd < 0) {
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+        opened = true;
+    }
+    reply->fd = fd;
+    if (fstat(fd, &st) < 0) {
+        int err = errno;
+        if (opened || request->close) {
+            close(fd);
+        }
+        errno = err;
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+
+    if (request->size > 0) {
+        reply->data.data = malloc(request->size);
+        CHECK(reply->data.data != NULL);
+    }
+    while (total < request->size) {
+        ssize_t n = request->use_offset ? pread(fd, reply->data.data + total, request->size - total,
+                                                (off_t) (request->offset + total))
+                                        : read(fd, reply->data.data + total, request->size - total);
+        if (n < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            int err = errno;
+            if (opened || request->close) {
+                close(fd);
+            }
+            safe_free(reply->data.data);
+            errno = err;
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+        if (n == 0) {
+            reply->eof = true;
+            break;
+        }
+        total += (size_t) n;
+        if (!S_ISREG(st.st_mode)) {
+            break;
+        }
+    }
+    reply->data.len = total;
+
+    if (request->close && reply->eof) {
+        close(fd);
+    }
+    return ROUTINE_SUCCESS;
+
+error:
+    if (opened) {
+        close(fd);
+    }
+    if (reply != NULL) {
+        safe_free(reply->data.data);
+    }
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Writes the whole data carried by the request to a file descriptor, retrying on short writes.
+ *
+ * When `path` is set, it is opened for writing (created with `access` and truncated) and
+ * written instead of `fd`, and the opened fd is returned so that following requests may
+ * carry on writing it. This allows writing a whole file as a stream of requests, the first
+ * one opening it and the last one (with `close` set) closing it.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestFileWrite`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyFileWrite` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful.
+ *         - `ROUTINE_PROTOCOL_ERROR` if opening or writing the file fails (errno is preserved).
+ *           The fd is closed if it was opened by this request or `close` is set.
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_file_write(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestFileWrite *request = (const Rpc__Api__RequestFileWrite *) in_msg;
+    Rpc__Api__ReplyFileWrite *reply = malloc(sizeof *reply);
+    bool opened = false;
+    int fd = request->fd;
+    size_t total = 0;
+    CHECK(reply != NULL);
+    rpc__api__reply_file_write__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    TRACE("FILE_WRITE: fd=%d path='%s' size=%lu", request->fd, request->path ? request->path : "(null)",
+          (u64) request->data.len);
+
+    if (request->path && request->path[0] != '\0') {
+        fd = open(request->path, O_WRONLY | O_CREAT | O_TRUNC, (mode_t) request->access);
+        if (fd < 0) {
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+        opened = true;
+    }
+    reply->fd = fd;
+
+    while (total < request->data.len) {
+        ssize_t n = request->use_offset ? pwrite(fd, request->data.data + total, request->data.len - total,
+                                                 (off_t) (request->offset + total))
+                                        : write(fd, request->data.data + total, request->data.len - total);
+        if (n < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            int err = errno;
+            if (opened || request->close) {
+                close(fd);
+            }
+            errno = err;
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+        total += (size_t) n;
+    }
+    reply->size = total;
+
+    if (request->close && close(fd) != 0) {
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+    return ROUTINE_SUCCESS;
+
+error:
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Finalizes the digest of the current block into a file hash reply, and starts a new one.
+ *
+ * @param reply The reply to append the digest to.
+ * @param capacity The allocated capacity of the reply's digests array.
+ * @param ctx The hash context of the current block, initialized again once finalized.
+ *
+ * @return true on success, false if a memory allocation fails.
+ */
+static bool file_hash_add_digest(Rpc__Api__ReplyFileHash *reply, size_t *capacity, sha256_ctx_t *ctx) {
+    if (!array_reserve((void **) &reply->digests, capacity, reply->n_digests, sizeof(ProtobufCBinaryData))) {
+        return false;
+    }
+    u8 *digest = malloc(SHA256_DIGEST_LENGTH);
+    if (digest == NULL) {
+        return false;
+    }
+    sha256_final(ctx, digest);
+    reply->digests[reply->n_digests].data = digest;
+    reply->digests[reply->n_digests].len = SHA256_DIGEST_LENGTH;
+    reply->n_digests++;
+    sha256_init(ctx);
+    return true;
+}
+
+/**
+ * Computes SHA-256 digests over a range of a file, so it can be compared with another copy
+ * without transferring its content.
+ *
+ * When `path` is set, it is opened read-only and hashed instead of `fd`. The range is read
+ * with pread(), leaving the fd's position untouched. With `block_size` set, a digest is
+ * computed for every block of the range, otherwise a single digest covers it.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestFileHash`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyFileHash` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful.
+ *         - `ROUTINE_PROTOCOL_ERROR` if opening or reading the file fails (errno is preserved).
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_file_hash(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestFileHash *request = (const Rpc__Api__RequestFileHash *) in_msg;
+    Rpc__Api__ReplyFileHash *reply = malloc(sizeof *reply);
+    routine_status_t status = ROUTINE_SERVER_ERROR;
+    u8 *buffer = NULL;
+    bool opened = false;
+    int fd = request->fd;
+    int err = 0;
+    size_t capacity = 0;
+    u64 block_len = 0;
+    sha256_ctx_t ctx;
+    CHECK(reply != NULL);
+    rpc__api__reply_file_hash__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    TRACE("FILE_HASH: fd=%d path='%s' offset=%lu size=%lu block_size=%lu", request->fd,
+          request->path ? request->path : "(null)", (u64) request->offset, (u64) request->size,
+          (u64) request->block_size);
+
+    if (request->path && request->path[0] != '\0') {
+        fd = open(request->path, O_RDONLY);
+        if (fd < 0) {
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+        opened = true;
+    }
+
+    buffer = malloc(FILE_HASH_BUFFER_SIZE);
+    CHECK(buffer != NULL);
+    sha256_init(&ctx);
+    while (request->size == 0 || reply->size < request->size) {
+        size_t len = FILE_HASH_BUFFER_SIZE;
+        if (request->size != 0 && request->size - reply->size < len) {
+            len = request->size - reply->size;
+        }
+        if (request->block_size != 0 && request->block_size - block_len < len) {
+            len = request->block_size - block_len;
+        }
+        ssize_t n = pread(fd, buffer, len, (off_t) (request->offset + reply->size));
+        if (n < 0) {
+            if (errno == EINTR) {
+                continue;
+            }
+            status = ROUTINE_PROTOCOL_ERROR;
+            goto error;
+        }
+        if (n == 0) {
+            break;
+        }
+        sha256_update(&ctx, buffer, (size_t) n);
+        reply->size += (u64) n;
+        block_len += (u64) n;
+        if (request->block_size != 0 && block_len == request->block_size) {
+            CHECK(file_hash_add_digest(reply, &capacity, &ctx));
+            block_len = 0;
+        }
+    }
+    // a single digest is always returned for the whole range, even an empty one
+    if (request->block_size == 0 || block_len > 0) {
+        CHECK(file_hash_add_digest(reply, &capacity, &ctx));
+    }
+
+    safe_free(buffer);
+    if (opened) {
+        close(fd);
+    }
+    return ROUTINE_SUCCESS;
+
+error:
+    err = errno;
+    safe_free(buffer);
+    if (opened) {
+        close(fd);
+    }
+    if (reply != NULL) {
+        cleanup_file_hash((ProtobufCMessage *) reply);
+    }
+    errno = err;
+    return status;
+}
+
+/**
+ * @brief A regular file with several links emitted by REQ_ARCHIVE_READ, whose other links are
+ *        emitted as hard links to it.
+ */
+typedef struct archive_link {
+    dev_t dev;
+    ino_t ino;
+    char *name;
+} archive_link_t;
+
+/**
+ * @brief State of a tar stream generated by REQ_ARCHIVE_READ, kept between the chunks it is read in.
+ *
+ * Entries are emitted depth-first, every directory before its content. `pending` is a stack of
+ * the paths yet to be emitted, and `header` holds the header blocks of the current entry which
+ * were not read yet, followed by the content of `fd` and its padding. `links` holds the files
+ * with several links emitted so far.
+ */
+typedef struct archive_reader {
+    u64 handle;
+    struct archive_reader *next;
+
+    /** Length of the path prefix stripped off the entries' names. */
+    size_t base_len;
+    bool root_done;
+    char **pending;
+    size_t n_pending;
+    size_t pending_capacity;
+
+    u8 *header;
+    size_t header_len;
+    size_t header_pos;
+    int fd;
+    u64 file_remaining;
+    u64 padding;
+    bool trailer;
+
+    archive_link_t *links;
+    size_t n_links;
+    size_t links_capacity;
+} archive_reader_t;
+
+/**
+ * @brief A directory extracted by REQ_ARCHIVE_WRITE, whose mode and time are applied once the
+ *        whole archive is, as extracting its content changes them.
+ */
+typedef struct archive_dir {
+    char *path;
+    mode_t mode;
+    time_t mtime;
+} archive_dir_t;
+
+/**
+ * @brief State of a tar stream extracted by REQ_ARCHIVE_WRITE, kept between the chunks it is fed in.
+ *
+ * Header blocks are collected into `block`. The data following a header is written to `fd` for
+ * a regular file, collected into `extended` for a GNU long name or a pax header, or skipped.
+ */
+typedef struct archive_writer {
+    u64 handle;
+    struct archive_writer *next;
+
+    char *root;
+    bool end;
+    u8 block[ARCHIVE_BLOCK_SIZE];
+    size_t block_len;
+
+    char extended_type;
+    char *extended;
+    size_t extended_len;
+    u64 data_remaining;
+    u64 padding;
+    int fd;
+    mode_t mode;
+    time_t mtime;
+
+    /** Overrides of the next entry's fields, set by GNU long name headers or pax headers. */
+    char *long_name;
+    char *long_link;
+    bool has_size;
+    u64 size;
+    bool has_mtime;
+    time_t pax_mtime;
+
+    archive_dir_t *dirs;
+    size_t n_dirs;
+    size_t dirs_capacity;
+} archive_writer_t;
+
+/** Archives that are still open, looked up by their handle. */
+static archive_reader_t *g_archive_readers = NULL;
+static archive_writer_t *g_archive_writers = NULL;
+static u64 g_next_archive_handle = 1;
+
+/**
+ * Writes a number into a tar header field: in octal followed by a NUL when it fits, in big-endian
+ * base-256 (a GNU extension) otherwise.
+ */
+static void tar_put_number(u8 *field, size_t size, u64 value) {
+    if (value >> (3 * (size - 1)) != 0) {
+        for (size_t i = size - 1; i > 0; --i) {
+            field[i] = (u8) (value & 0xff);
+            value >>= 8;
+        }
+        field[0] = 0x80;
+        return;
+    }
+    snprintf((char *) field, size, "%0*lo", (int) (size - 1), value);
+}
+
+/**
+ * Reads a number from a tar header field, in octal or in base-256.
+ */
+static u64 tar_get_number(const u8 *field, size_t size) {
+    u64 value = 0;
+    size_t i = 0;
+    if (field[0] & 0x80) {
+        for (i = 1; i < size; ++i) {
+            value = (value << 8) | field[i];
+        }
+        return value;
+    }
+    while (i < size && field[i] == ' ') {
+        ++i;
+    }
+    for (; i < size && field[i] >= '0' && field[i] <= '7'; ++i) {
+        value = value * 8 + (u64) (field[i] - '0');
+    }
+    return value;
+}
+
+/**
+ * Computes the checksum of a tar header, its checksum field counted as spaces.
+ *
+ * @param is_signed Sum the bytes as signed chars, as some old implementations do.
+ */
+static u64 tar_checksum(const u8 *block, bool is_signed) {
+    long sum = 0;
+    for (size_t i = 0; i < ARCHIVE_BLOCK_SIZE; ++i) {
+        u8 c = (i >= 148 && i < 156) ? ' ' : block[i];
+        sum += is_signed ? (long) (signed char) c : (long) c;
+    }
+    return (u64) sum;
+}
+
+/**
+ * Fills a GNU tar header block.
+ *
+ * @param block The block to fill.
+ * @param name The entry's name, truncated to the header's field (see archive_reader_add_header()).
+ * @param st The entry's metadata, or NULL for zeros.
+ * @param type The entry's tar type flag.
+ * @param size The size of the data following the header.
+ * @param linkname The symlink target, or NULL.
+ */
+static void tar_header_fill(u8 *block, const char *name, const struct stat *st, char type, u64 size,
+                            const char *linkname) {
+    memset(block, 0, ARCHIVE_BLOCK_SIZE);
+    memcpy(block, name, strnlen(name, ARCHIVE_NAME_SIZE));
+    tar_put_number(block + 100, 8, st ? (u64) (st->st_mode & 07777) : 0);
+    tar_put_number(block + 108, 8, st ? (u64) st->st_uid : 0);
+    tar_put_number(block + 116, 8, st ? (u64) st->st_gid : 0);
+    tar_put_number(block + 124, 12, size);
+    tar_put_number(block + 136, 12, (st && st->st_mtime > 0) ? (u64) st->st_mtime : 0);
+    block[156] = (u8) type;
+    if (linkname != NULL) {
+        memcpy(block + 157, linkname, strnlen(linkname, ARCHIVE_NAME_SIZE));
+    }
+    // GNU magic and version
+    memcpy(block + 257, "ustar  ", 8);
+    snprintf((char *) block + 148, 8, "%06lo", tar_checksum(block, false));
+    block[155] = ' ';
+}
+
+/**
+ * Releases an archive reader and everything it holds, unlinking it from the open readers first.
+ *
+ * @param reader The reader to release. May be partially initialized.
+ */
+static void archive_reader_free(archive_reader_t *reader) {
+    for (archive_reader_t **it = &g_archive_readers; *it != NULL; it = &(*it)->next) {
+        if (*it == reader) {
+            *it = reader->next;
+            break;
+        }
+    }
+    if (reader->fd >= 0) {
+        close(reader->fd);
+    }
+    for (size_t i = 0; i < reader->n_pending; ++i) {
+        safe_free(reader->pending[i]);
+    }
+    safe_free(reader->pending);
+    safe_free(reader->header);
+    for (size_t i = 0; i < reader->n_links; ++i) {
+        safe_free(reader->links[i].name);
+    }
+    safe_free(reader->links);
+    free(reader);
+}
+
+/**
+ * Looks up the name a file with several links was first emitted under.
+ *
+ * @return The entry's name, or NULL if none of the file's links was emitted yet.
+ */
+static const char *archive_reader_find_link(const archive_reader_t *reader, const struct stat *st) {
+    for (size_t i = 0; i < reader->n_links; ++i) {
+        if (reader->links[i].dev == st->st_dev && reader->links[i].ino == st->st_ino) {
+            return reader->links[i].name;
+        }
+    }
+    return NULL;
+}
+
+/**
+ * Records the name a file with several links is emitted under, for its other links to refer to.
+ *
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool archive_reader_add_link(archive_reader_t *reader, const struct stat *st, const char *name) {
+    if (!array_reserve((void **) &reader->links, &reader->links_capacity, reader->n_links, sizeof(archive_link_t))) {
+        return false;
+    }
+    char *copy = strdup(name);
+    if (copy == NULL) {
+        return false;
+    }
+    reader->links[reader->n_links++] = (archive_link_t) {.dev = st->st_dev, .ino = st->st_ino, .name = copy};
+    return true;
+}
+
+/**
+ * Pushes a path to be emitted by an archive reader.
+ *
+ * @param path The path to push. Owned by the reader on success.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool archive_reader_push(archive_reader_t *reader, char *path) {
+    if (!array_reserve((void **) &reader->pending, &reader->pending_capacity, reader->n_pending, sizeof(char *))) {
+        return false;
+    }
+    reader->pending[reader->n_pending++] = path;
+    return true;
+}
+
+/**
+ * Creates an archive reader for the tree rooted at `path` and registers it in the open readers.
+ *
+ * The entries are named relative to the root's parent, so that the root itself is the archive's
+ * top-level entry, as with `tar -C dirname(path) -c basename(path)`.
+ *
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if the root cannot be stat-ed
+ *         (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t archive_reader_create(const char *path, archive_reader_t **out_reader) {
+    archive_reader_t *reader = calloc(1, sizeof *reader);
+    char *root = NULL;
+    struct stat root_stat;
+    CHECK(reader != NULL);
+    reader->fd = -1;
+
+    if (stat(path, &root_stat) != 0) {
+        int err = errno;
+        archive_reader_free(reader);
+        errno = err;
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+
+    root = strdup(path);
+    CHECK(root != NULL);
+    size_t len = strlen(root);
+    while (len > 1 && root[len - 1] == '/') {
+        root[--len] = '\0';
+    }
+    char *last_sep = strrchr(root, '/');
+    reader->base_len = last_sep != NULL ? (size_t) (last_sep - root) + 1 : 0;
+    CHECK(archive_reader_push(reader, root));
+    root = NULL;
+
+    reader->handle = g_next_archive_handle++;
+    reader->next = g_archive_readers;
+    g_archive_readers = reader;
+    *out_reader = reader;
+    return ROUTINE_SUCCESS;
+
+error:
+    safe_free(root);
+    if (reader != NULL) {
+        archive_reader_free(reader);
+    }
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Appends the header blocks of an entry to the reader's pending header data, preceded by GNU
+ * long name and long link headers when its name or symlink target don't fit the header.
+ *
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool archive_reader_add_header(archive_reader_t *reader, const char *name, const struct stat *st, char type,
+                                      u64 size, const char *linkname) {
+    size_t name_len = strlen(name);
+    size_t link_len = linkname != NULL ? strlen(linkname) : 0;
+    size_t name_blocks = name_len > ARCHIVE_NAME_SIZE ? 2 + name_len / ARCHIVE_BLOCK_SIZE : 0;
+    size_t link_blocks = link_len > ARCHIVE_NAME_SIZE ? 2 + link_len / ARCHIVE_BLOCK_SIZE : 0;
+    size_t total = (name_blocks + link_blocks + 1) * ARCHIVE_BLOCK_SIZE;
+
+    u8 *header = calloc(1, total);
+    if (header == NULL) {
+        return false;
+    }
+    u8 *block = header;
+    if (name_blocks > 0) {
+        tar_header_fill(block, "././@LongLink", NULL, 'L', name_len + 1, NULL);
+        memcpy(block + ARCHIVE_BLOCK_SIZE, name, name_len);
+        block += name_blocks * ARCHIVE_BLOCK_SIZE;
+    }
+    if (link_blocks > 0) {
+        tar_header_fill(block, "././@LongLink", NULL, 'K', link_len + 1, NULL);
+        memcpy(block + ARCHIVE_BLOCK_SIZE, linkname, link_len);
+        block += link_blocks * ARCHIVE_BLOCK_SIZE;
+    }
+    tar_header_fill(block, name, st, type, size, linkname);
+
+    safe_free(reader->header);
+    reader->header = header;
+    reader->header_len = total;
+    reader->header_pos = 0;
+    return true;
+}
+
+/**
+ * Queues the content of a directory for emitting.
+ *
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if the directory cannot be listed
+ *         (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t archive_reader_push_dir(archive_reader_t *reader, const char *path) {
+    DIR *dirp = opendir(path);
+    if (dirp == NULL) {
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+    size_t len = strlen(path);
+    const char *sep = (len > 0 && path[len - 1] == '/') ? "" : "/";
+    struct dirent *entry;
+    while ((entry = readdir(dirp)) != NULL) {
+        if (strcmp(entry->d_name, ".") == 0 || strcmp(entry->d_name, "..") == 0) {
+            continue;
+        }
+        size_t path_len = len + strlen(sep) + strlen(entry->d_name) + 1;
+        char *child = malloc(path_len);
+        if (child == NULL) {
+            closedir(dirp);
+            return ROUTINE_SERVER_ERROR;
+        }
+        snprintf(child, path_len, "%s%s%s", path, sep, entry->d_name);
+        if (!archive_reader_push(reader, child)) {
+            free(child);
+            closedir(dirp);
+            return ROUTINE_SERVER_ERROR;
+        }
+    }
+    closedir(dirp);
+    return ROUTINE_SUCCESS;
+}
+
+/**
+ * Pops the next pending path and prepares its header, and its content for a regular file.
+ * The links of a file after its first one are emitted as hard links to it, without content.
+ * Entries which vanished since their directory was listed, and special files, are skipped.
+ *
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if the entry cannot be read
+ *         (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t archive_reader_next_entry(archive_reader_t *reader) {
+    routine_status_t status = ROUTINE_SERVER_ERROR;
+    char *path = reader->pending[--reader->n_pending];
+    char *name = NULL;
+    char *linkname = NULL;
+    struct stat st;
+
+    // the root is followed if it's a symlink
+    int err = (reader->root_done ? lstat(path, &st) : stat(path, &st)) == 0 ? 0 : errno;
+    reader->root_done = true;
+    if (err == ENOENT) {
+        free(path);
+        return ROUTINE_SUCCESS;
+    }
+    if (err != 0) {
+        status = ROUTINE_PROTOCOL_ERROR;
+        goto error;
+    }
+
+    const char *relative = strlen(path) > reader->base_len ? path + reader->base_len : "";
+    if (S_ISDIR(st.st_mode)) {
+        if (relative[0] != '\0') {
+            size_t name_len = strlen(relative) + 2;
+            name = malloc(name_len);
+            CHECK(name != NULL);
+            snprintf(name, name_len, "%s/", relative);
+            CHECK(archive_reader_add_header(reader, name, &st, '5', 0, NULL));
+        }
+        status = archive_reader_push_dir(reader, path);
+        if (status != ROUTINE_SUCCESS) {
+            goto error;
+        }
+    } else if (S_ISREG(st.st_mode)) {
+        const char *first_link = st.st_nlink > 1 ? archive_reader_find_link(reader, &st) : NULL;
+        if (first_link != NULL) {
+            CHECK(archive_reader_add_header(reader, relative, &st, '1', 0, first_link));
+        } else {
+            reader->fd = open(path, O_RDONLY);
+            if (reader->fd < 0) {
+                status = errno == ENOENT ? ROUTINE_SUCCESS : ROUTINE_PROTOCOL_ERROR;
+                goto error;
+            }
+            CHECK(archive_reader_add_header(reader, relative, &st, '0', (u64) st.st_size, NULL));
+            if (st.st_nlink > 1) {
+                CHECK(archive_reader_add_link(reader, &st, relative));
+            }
+            reader->file_remaining = (u64) st.st_size;
+            reader->padding = (ARCHIVE_BLOCK_SIZE - (u64) st.st_size % ARCHIVE_BLOCK_SIZE) % ARCHIVE_BLOCK_SIZE;
+        }
+    } else if (S_ISLNK(st.st_mode)) {
+        size_t link_size = st.st_size > 0 ? (size_t) st.st_size + 1 : PATH_MAX;
+        linkname = malloc(link_size);
+        CHECK(linkname != NULL);
+        ssize_t link_len = readlink(path, linkname, link_size - 1);
+        if (link_len < 0) {
+            status = errno == ENOENT ? ROUTINE_SUCCESS : ROUTINE_PROTOCOL_ERROR;
+            goto error;
+        }
+        linkname[link_len] = '\0';
+        CHECK(archive_reader_add_header(reader, relative, &st, '2', 0, linkname));
+    }
+
+    safe_free(linkname);
+    safe_free(name);
+    free(path);
+    return ROUTINE_SUCCESS;
+
+error:
+    err = errno;
+    safe_free(linkname);
+    safe_free(name);
+    free(path);
+    errno = err;
+    return status;
+}
+
+/**
+ * Reads the next chunk of an archive.
+ *
+ * A file is read up to the size recorded in its header: if it shrank meanwhile, the rest is
+ * filled with zeros, and if it grew, the excess is left out.
+ *
+ * @param reader The archive to read.
+ * @param buffer The buffer to read into.
+ * @param size The number of bytes to read. less are read only once the archive ends.
+ * @param out_len Set to the number of bytes read.
+ * @param out_eof Set once the archive ends.
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if an entry cannot be read
+ *         (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t archive_reader_read(archive_reader_t *reader, u8 *buffer, size_t size, size_t *out_len,
+                                            bool *out_eof) {
+    size_t len = 0;
+    *out_eof = false;
+    while (len < size) {
+        size_t available = size - len;
+        if (reader->header_pos < reader->header_len) {
+            size_t n = reader->header_len - reader->header_pos;
+            n = n < available ? n : available;
+            memcpy(buffer + len, reader->header + reader->header_pos, n);
+            reader->header_pos += n;
+            len += n;
+        } else if (reader->file_remaining > 0) {
+            size_t n = reader->file_remaining < available ? (size_t) reader->file_remaining : available;
+            ssize_t n_read = read(reader->fd, buffer + len, n);
+            if (n_read < 0) {
+                if (errno == EINTR) {
+                    continue;
+                }
+                return ROUTINE_PROTOCOL_ERROR;
+            }
+            if (n_read == 0) {
+                // the file shrank since its size was recorded
+                memset(buffer + len, 0, n);
+                n_read = (ssize_t) n;
+            }
+            reader->file_remaining -= (u64) n_read;
+            len += (size_t) n_read;
+        } else if (reader->padding > 0) {
+            size_t n = reader->padding < available ? (size_t) reader->padding : available;
+            memset(buffer + len, 0, n);
+            reader->padding -= n;
+            len += n;
+        } else if (reader->fd >= 0) {
+            close(reader->fd);
+            reader->fd = -1;
+        } else if (reader->n_pending > 0) {
+            routine_status_t status = archive_reader_next_entry(reader);
+            if (status != ROUTINE_SUCCESS) {
+                return status;
+            }
+        } else if (!reader->trailer) {
+            // the end of an archive is marked by two zero blocks
+            safe_free(reader->header);
+            reader->header = calloc(2, ARCHIVE_BLOCK_SIZE);
+            if (reader->header == NULL) {
+                return ROUTINE_SERVER_ERROR;
+            }
+            reader->header_len = 2 * ARCHIVE_BLOCK_SIZE;
+            reader->header_pos = 0;
+            reader->trailer = true;
+        } else {
+            *out_eof = true;
+            break;
+        }
+    }
+    *out_len = len;
+    return ROUTINE_SUCCESS;
+}
+
+/**
+ * Generates a tar archive of a tree server-side, and returns it in chunks of `size` bytes, sparing
+ * the client the requests of listing the tree and opening, reading and closing every file.
+ *
+ * The first request (with `handle` 0) starts the archive of `path`; the reply carries a handle
+ * which subsequent requests pass back to read the next chunks, until the reply is marked `eof`
+ * and the archive is released. A request with `close` set releases it early.
+ *
+ * The archive is in GNU tar format. It holds directories, regular files and symlinks along with
+ * their modes, owners and modification times. The root is followed if it's a symlink.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestArchiveRead`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyArchiveRead` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful.
+ *         - `ROUTINE_PROTOCOL_ERROR` if the handle is unknown or an entry cannot be read (errno is
+ *           preserved). The archive is released.
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_archive_read(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestArchiveRead *request = (const Rpc__Api__RequestArchiveRead *) in_msg;
+    Rpc__Api__ReplyArchiveRead *reply = malloc(sizeof *reply);
+    archive_reader_t *reader = NULL;
+    CHECK(reply != NULL);
+    rpc__api__reply_archive_read__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    TRACE("ARCHIVE_READ: path='%s' handle=%lu size=%lu", request->path ? request->path : "(null)",
+          (u64) request->handle, (u64) request->size);
+
+    if (request->handle == 0) {
+        CHECK(request->path && request->path[0] != '\0');
+        routine_status_t status = archive_reader_create(request->path, &reader);
+        if (status != ROUTINE_SUCCESS) {
+            return status;
+        }
+    } else {
+        for (reader = g_archive_readers; reader != NULL && reader->handle != request->handle; reader = reader->next) {}
+        if (reader == NULL) {
+            errno = EBADF;
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+    }
+
+    reply->handle = reader->handle;
+    if (request->close) {
+        archive_reader_free(reader);
+        reply->eof = true;
+        return ROUTINE_SUCCESS;
+    }
+
+    size_t size = request->size ? request->size : ARCHIVE_DEFAULT_READ_SIZE;
+    reply->data.data = malloc(size);
+    CHECK(reply->data.data != NULL);
+    routine_status_t status = archive_reader_read(reader, reply->data.data, size, &reply->data.len, &reply->eof);
+    if (status != ROUTINE_SUCCESS) {
+        int err = errno;
+        archive_reader_free(reader);
+        safe_free(reply->data.data);
+        errno = err;
+        return status;
+    }
+    if (reply->eof) {
+        archive_reader_free(reader);
+    }
+    return ROUTINE_SUCCESS;
+
+error:
+    if (reader != NULL) {
+        archive_reader_free(reader);
+    }
+    if (reply != NULL) {
+        safe_free(reply->data.data);
+    }
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Releases an archive writer and everything it holds, unlinking it from the open writers first.
+ *
+ * @param writer The writer to release. May be partially initialized.
+ */
+static void archive_writer_free(archive_writer_t *writer) {
+    for (archive_writer_t **it = &g_archive_writers; *it != NULL; it = &(*it)->next) {
+        if (*it == writer) {
+            *it = writer->next;
+            break;
+        }
+    }
+    if (writer->fd >= 0) {
+        close(writer->fd);
+    }
+    for (size_t i = 0; i < writer->n_dirs; ++i) {
+        safe_free(writer->dirs[i].path);
+    }
+    safe_free(writer->dirs);
+    safe_free(writer->extended);
+    safe_free(writer->long_name);
+    safe_free(writer->long_link);
+    safe_free(writer->root);
+    free(writer);
+}
+
+/**
+ * Creates an archive writer extracting into `path`, created if missing, and registers it in the
+ * open writers.
+ *
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if `path` isn't a directory and
+ *         cannot be created (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t archive_writer_create(const char *path, archive_writer_t **out_writer) {
+    archive_writer_t *writer = calloc(1, sizeof *writer);
+    struct stat root_stat;
+    CHECK(writer != NULL);
+    writer->fd = -1;
+
+    if (mkdir(path, 0777) != 0 && errno != EEXIST) {
+        int err = errno;
+        archive_writer_free(writer);
+        errno = err;
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+    if (stat(path, &root_stat) != 0 || !S_ISDIR(root_stat.st_mode)) {
+        int err = errno ? errno : ENOTDIR;
+        archive_writer_free(writer);
+        errno = err;
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+    writer->root = strdup(path);
+    CHECK(writer->root != NULL);
+
+    writer->handle = g_next_archive_handle++;
+    writer->next = g_archive_writers;
+    g_archive_writers = writer;
+    *out_writer = writer;
+    return ROUTINE_SUCCESS;
+
+error:
+    if (writer != NULL) {
+        archive_writer_free(writer);
+    }
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Joins an entry name to the extraction root. Leading slashes and `.` components are dropped,
+ * and names escaping the root through `..` or through a symlink are refused: earlier entries may
+ * have created symlinks, which creating the entry would otherwise follow out of the root.
+ *
+ * @param out_path Set to the newly allocated path, or NULL if the name refers to the root itself.
+ * @return true on success, false with errno set to EINVAL for a name escaping the root through
+ *         `..`, to ELOOP for one whose parent components include a symlink, or to ENOMEM if a
+ *         memory allocation error occurs.
+ */
+static bool archive_writer_path(const archive_writer_t *writer, const char *name, char **out_path) {
+    size_t root_len = strlen(writer->root);
+    char *path = malloc(root_len + strlen(name) + 2);
+    *out_path = NULL;
+    if (path == NULL) {
+        errno = ENOMEM;
+        return false;
+    }
+    memcpy(path, writer->root, root_len + 1);
+    size_t len = root_len;
+    while (len > 1 && path[len - 1] == '/') {
+        path[--len] = '\0';
+    }
+    size_t root_end = len;
+
+    bool empty = true;
+    const char *component = name;
+    while (*component != '\0') {
+        const char *end = strchr(component, '/');
+        size_t component_len = end != NULL ? (size_t) (end - component) : strlen(component);
+        if (component_len == 2 && component[0] == '.' && component[1] == '.') {
+            free(path);
+            errno = EINVAL;
+            return false;
+        }
+        if (component_len > 0 && !(component_len == 1 && component[0] == '.')) {
+            if (len == 0 || path[len - 1] != '/') {
+                path[len++] = '/';
+            }
+            memcpy(path + len, component, component_len);
+            len += component_len;
+            path[len] = '\0';
+            empty = false;
+        }
+        component += component_len;
+        if (*component == '/') {
+            ++component;
+        }
+    }
+    if (empty) {
+        free(path);
+        return true;
+    }
+    for (char *sep = strchr(path + root_end + 1, '/'); sep != NULL; sep = strchr(sep + 1, '/')) {
+        struct stat st;
+        *sep = '\0';
+        bool is_link = lstat(path, &st) == 0 && S_ISLNK(st.st_mode);
+        *sep = '/';
+        if (is_link) {
+            free(path);
+            errno = ELOOP;
+            return false;
+        }
+    }
+    *out_path = path;
+    return true;
+}
+
+/**
+ * Creates the missing parent directories of a path.
+ */
+static void archive_writer_make_parents(char *path) {
+    for (char *sep = strchr(path + 1, '/'); sep != NULL; sep = strchr(sep + 1, '/')) {
+        *sep = '\0';
+        mkdir(path, 0777);
+        *sep = '/';
+    }
+}
+
+/**
+ * Parses the decimal number a pax record value starts with, without reading past the value.
+ *
+ * @param value The value, which isn't NUL-terminated.
+ * @param value_len The value length.
+ * @param out The parsed number, a fractional part being ignored.
+ * @return true on success, false if the value doesn't start with a number (errno is set).
+ */
+static bool archive_pax_number(const char *value, size_t value_len, long long *out) {
+    char buf[32];
+    char *end = NULL;
+    if (value_len >= sizeof(buf)) {
+        errno = EINVAL;
+        return false;
+    }
+    memcpy(buf, value, value_len);
+    buf[value_len] = '\0';
+    *out = strtoll(buf, &end, 10);
+    if (end == buf) {
+        errno = EINVAL;
+        return false;
+    }
+    return true;
+}
+
+/**
+ * Applies the pax records collected into the writer's extended buffer to the next entry.
+ *
+ * Every record is `"<length> <key>=<value>\n"`, and is parsed within its length only.
+ */
+static bool archive_writer_apply_pax(archive_writer_t *writer) {
+    size_t pos = 0;
+    while (pos < writer->extended_len) {
+        char *record = writer->extended + pos;
+        size_t remaining = writer->extended_len - pos;
+        size_t record_len = 0;
+        size_t digits = 0;
+        while (digits < remaining && record[digits] >= '0' && record[digits] <= '9') {
+            record_len = record_len * 10 + (size_t) (record[digits++] - '0');
+            if (record_len > remaining) {
+                errno = EINVAL;
+                return false;
+            }
+        }
+        // the length, a space, a key, an '=' and a newline
+        if (digits == 0 || record_len < digits + 3 || record[digits] != ' ' || record[record_len - 1] != '\n') {
+            errno = EINVAL;
+            return false;
+        }
+        char *key = record + digits + 1;
+        char *last = record + record_len - 1;
+        char *value = memchr(key, '=', (size_t) (last - key));
+        if (value == NULL) {
+            errno = EINVAL;
+            return false;
+        }
+        size_t key_len = (size_t) (value - key);
+        ++value;
+        size_t value_len = (size_t) (last - value);
+
+        char **target = NULL;
+        long long number;
+        if (key_len == 4 && memcmp(key, "path", 4) == 0) {
+            target = &writer->long_name;
+        } else if (key_len == 8 && memcmp(key, "linkpath", 8) == 0) {
+            target = &writer->long_link;
+        } else if (key_len == 4 && memcmp(key, "size", 4) == 0) {
+            if (!archive_pax_number(value, value_len, &number) || number < 0) {
+                errno = EINVAL;
+                return false;
+            }
+            writer->has_size = true;
+            writer->size = (u64) number;
+        } else if (key_len == 5 && memcmp(key, "mtime", 5) == 0) {
+            if (!archive_pax_number(value, value_len, &number)) {
+                return false;
+            }
+            writer->has_mtime = true;
+            writer->pax_mtime = (time_t) number;
+        }
+        if (target != NULL) {
+            safe_free(*target);
+            *target = strndup(value, value_len);
+            if (*target == NULL) {
+                return false;
+            }
+        }
+        pos += record_len;
+    }
+    return true;
+}
+
+/**
+ * Completes the entry whose data was just consumed: a regular file gets its mode and time and
+ * is closed, and an extended header is applied to the next entry.
+ *
+ * @return true on success, false on failure (errno is set).
+ */
+static bool archive_writer_end_entry(archive_writer_t *writer) {
+    if (writer->fd >= 0) {
+        struct timeval times[2] = {{.tv_sec = writer->mtime}, {.tv_sec = writer->mtime}};
+        bool ok = fchmod(writer->fd, writer->mode) == 0 && futimes(writer->fd, times) == 0;
+        int err = errno;
+        ok = close(writer->fd) == 0 && ok;
+        writer->fd = -1;
+        if (!ok) {
+            errno = err;
+            return false;
+        }
+        return true;
+    }
+    if (writer->extended == NULL) {
+        return true;
+    }
+
+    bool ok = true;
+    writer->extended[writer->extended_len] = '\0';
+    if (writer->extended_type == 'L' || writer->extended_type == 'K') {
+        char **target = writer->extended_type == 'L' ? &writer->long_name : &writer->long_link;
+        safe_free(*target);
+        *target = strdup(writer->extended);
+        ok = *target != NULL;
+    } else if (writer->extended_type == 'x') {
+        ok = archive_writer_apply_pax(writer);
+    }
+    safe_free(writer->extended);
+    writer->extended_len = 0;
+    return ok;
+}
+
+/**
+ * Creates the entry described by a header block, and prepares for consuming its data.
+ *
+ * @return true on success, false on failure (errno is set).
+ */
+static bool archive_writer_header(archive_writer_t *writer) {
+    const u8 *block = writer->block;
+    char *name = NULL;
+    char *linkname = NULL;
+    char *path = NULL;
+    char *target = NULL;
+    bool ok = false;
+
+    bool zero = true;
+    for (size_t i = 0; i < ARCHIVE_BLOCK_SIZE && zero; ++i) {
+        zero = block[i] == 0;
+    }
+    if (zero) {
+        writer->end = true;
+        return true;
+    }
+    u64 checksum = tar_get_number(block + 148, 8);
+    if (checksum != tar_checksum(block, false) && checksum != tar_checksum(block, true)) {
+        errno = EINVAL;
+        return false;
+    }
+
+    char type = (char) block[156];
+    u64 size = writer->has_size ? writer->size : tar_get_number(block + 124, 12);
+    writer->mode = (mode_t) (tar_get_number(block + 100, 8) & 07777);
+    writer->mtime = writer->has_mtime ? writer->pax_mtime : (time_t) tar_get_number(block + 136, 12);
+    writer->has_size = false;
+    writer->has_mtime = false;
+    writer->data_remaining = size;
+    writer->padding = (ARCHIVE_BLOCK_SIZE - size % ARCHIVE_BLOCK_SIZE) % ARCHIVE_BLOCK_SIZE;
+
+    if (type == 'L' || type == 'K' || type == 'x') {
+        if (size > ARCHIVE_MAX_EXTENDED_SIZE) {
+            errno = EFBIG;
+            return false;
+        }
+        writer->extended_type = type;
+        writer->extended = malloc(size + 1);
+        writer->extended_len = 0;
+        return writer->extended != NULL;
+    }
+    if (type == 'g') {
+        return true;
+    }
+
+    if (writer->long_name != NULL) {
+        name = writer->long_name;
+        writer->long_name = NULL;
+    } else if (memcmp(block + 257, "ustar\0", 6) == 0 && block[345] != '\0') {
+        // POSIX ustar splits long names into a prefix and a name
+        name = malloc(155 + 1 + ARCHIVE_NAME_SIZE + 1);
+        CHECK(name != NULL);
+        snprintf(name, 155 + 1 + ARCHIVE_NAME_SIZE + 1, "%.155s/%.100s", (const char *) block + 345,
+                 (const char *) block);
+    } else {
+        name = strndup((const char *) block, ARCHIVE_NAME_SIZE);
+        CHECK(name != NULL);
+    }
+    if (writer->long_link != NULL) {
+        linkname = writer->long_link;
+        writer->long_link = NULL;
+    } else {
+        linkname = strndup((const char *) block + 157, ARCHIVE_NAME_SIZE);
+        CHECK(linkname != NULL);
+    }
+
+    if (!archive_writer_path(writer, name, &path)) {
+        goto error;
+    }
+    if (path == NULL) {
+        if (type != '5') {
+            errno = EINVAL;
+            goto error;
+        }
+        // the root itself
+        path = strdup(writer->root);
+        CHECK(path != NULL);
+    }
+
+    if (type == '5') {
+        struct stat st;
+        if (mkdir(path, 0700) != 0) {
+            bool created = false;
+            if (errno == ENOENT) {
+                archive_writer_make_parents(path);
+                created = mkdir(path, 0700) == 0;
+            }
+            if (!created && (lstat(path, &st) != 0 || !S_ISDIR(st.st_mode))) {
+                errno = EEXIST;
+                goto error;
+            }
+        }
+        CHECK(array_reserve((void **) &writer->dirs, &writer->dirs_capacity, writer->n_dirs, sizeof(archive_dir_t)));
+        writer->dirs[writer->n_dirs++] = (archive_dir_t) {.path = path, .mode = writer->mode, .mtime = writer->mtime};
+        path = NULL;
+    } else if (type == '0' || type == '\0' || type == '7') {
+        // created anew rather than opened, never through a symlink
+        unlink(path);
+        writer->fd = open(path, O_WRONLY | O_CREAT | O_EXCL | O_NOFOLLOW, 0600);
+        if (writer->fd < 0 && errno == ENOENT) {
+            archive_writer_make_parents(path);
+            writer->fd = open(path, O_WRONLY | O_CREAT | O_EXCL | O_NOFOLLOW, 0600);
+        }
+        if (writer->fd < 0) {
+            goto error;
+        }
+    } else if (type == '2') {
+        unlink(path);
+        if (symlink(linkname, path) != 0) {
+            if (errno != ENOENT) {
+                goto error;
+            }
+            archive_writer_make_parents(path);
+            if (symlink(linkname, path) != 0) {
+                goto error;
+            }
+        }
+    } else if (type == '1') {
+        if (!archive_writer_path(writer, linkname, &target)) {
+            goto error;
+        }
+        if (target == NULL) {
+            errno = EINVAL;
+            goto error;
+        }
+        unlink(path);
+        // a symlink target is linked itself rather than followed
+        if (linkat(AT_FDCWD, target, AT_FDCWD, path, 0) != 0) {
+            goto error;
+        }
+    }
+    // other types, such as devices and fifos, are skipped along with their data
+
+    ok = true;
+
+error:
+    if (!ok) {
+        int err = errno;
+        safe_free(name);
+        safe_free(linkname);
+        safe_free(path);
+        safe_free(target);
+        errno = err;
+        return false;
+    }
+    safe_free(name);
+    safe_free(linkname);
+    safe_free(path);
+    safe_free(target);
+    return true;
+}
+
+/**
+ * Feeds the next chunk of a tar stream to an archive writer.
+ *
+ * @return true on success, false on failure (errno is set).
+ */
+static bool archive_writer_feed(archive_writer_t *writer, const u8 *data, size_t len) {
+    while (len > 0) {
+        if (writer->end) {
+            // the zeros padding the archive after its end
+            return true;
+        }
+        if (writer->data_remaining > 0) {
+            size_t n = writer->data_remaining < len ? (size_t) writer->data_remaining : len;
+            if (writer->fd >= 0) {
+                if (!writeall(writer->fd, (const char *) data, n)) {
+                    return false;
+                }
+            } else if (writer->extended != NULL) {
+                memcpy(writer->extended + writer->extended_len, data, n);
+                writer->extended_len += n;
+            }
+            writer->data_remaining -= n;
+            data += n;
+            len -= n;
+        } else if (writer->padding > 0) {
+            size_t n = writer->padding < len ? (size_t) writer->padding : len;
+            writer->padding -= n;
+            data += n;
+            len -= n;
+        } else {
+            size_t n = ARCHIVE_BLOCK_SIZE - writer->block_len;
+            n = n < len ? n : len;
+            memcpy(writer->block + writer->block_len, data, n);
+            writer->block_len += n;
+            data += n;
+            len -= n;
+            if (writer->block_len < ARCHIVE_BLOCK_SIZE) {
+                break;
+            }
+            writer->block_len = 0;
+            if (!archive_writer_header(writer)) {
+                return false;
+            }
+        }
+        if (writer->data_remaining == 0 && writer->padding == 0 && !archive_writer_end_entry(writer)) {
+            return false;
+        }
+    }
+    return true;
+}
+
+/**
+ * Applies the modes and times of the extracted directories, deepest first.
+ *
+ * @return true on success, false if the stream ended in the middle of an entry, or if a
+ *         directory cannot be updated (errno is set).
+ */
+static bool archive_writer_finish(archive_writer_t *writer) {
+    bool ok = true;
+    int err = 0;
+    if (writer->block_len != 0 || writer->data_remaining != 0 || writer->padding != 0) {
+        ok = false;
+        err = EINVAL;
+    }
+    for (size_t i = writer->n_dirs; i > 0; --i) {
+        const archive_dir_t *dir = &writer->dirs[i - 1];
+        struct timeval times[2] = {{.tv_sec = dir->mtime}, {.tv_sec = dir->mtime}};
+        if (chmod(dir->path, dir->mode) != 0 || utimes(dir->path, times) != 0) {
+            if (ok) {
+                err = errno;
+            }
+            ok = false;
+        }
+    }
+    errno = err;
+    return ok;
+}
+
+/**
+ * Extracts a tar stream server-side into a directory, sparing the client the requests of creating
+ * and writing every file.
+ *
+ * The first request (with `handle` 0) starts extracting into `path`, created if missing; the reply
+ * carries a handle which subsequent requests pass back along with the next chunks of the stream.
+ * The last request sets `close`, applying the extracted directories' modes and times, and
+ * releasing the writer.
+ *
+ * GNU and POSIX (ustar and pax) tar formats are supported. Directories, regular files, symlinks
+ * and hard links are extracted along with their modes and modification times, while other
+ * entries are skipped. Entries are extracted over existing ones, and entries whose name escapes
+ * `path` through `..` are refused.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestArchiveWrite`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyArchiveWrite` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful.
+ *         - `ROUTINE_PROTOCOL_ERROR` if the handle is unknown, or the stream is malformed or cannot
+ *           be extracted (errno is preserved). The writer is released.
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_archive_write(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestArchiveWrite *request = (const Rpc__Api__RequestArchiveWrite *) in_msg;
+    Rpc__Api__ReplyArchiveWrite *reply = malloc(sizeof *reply);
+    archive_writer_t *writer = NULL;
+    CHECK(reply != NULL);
+    rpc__api__reply_archive_write__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    TRACE("ARCHIVE_WRITE: path='%s' handle=%lu size=%lu", request->path ? request->path : "(null)",
+          (u64) request->handle, (u64) request->data.len);
+
+    if (request->handle == 0) {
+        CHECK(request->path && request->path[0] != '\0');
+        routine_status_t status = archive_writer_create(request->path, &writer);
+        if (status != ROUTINE_SUCCESS) {
+            return status;
+        }
+    } else {
+        for (writer = g_archive_writers; writer != NULL && writer->handle != request->handle; writer = writer->next) {}
+        if (writer == NULL) {
+            errno = EBADF;
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+    }
+    reply->handle = writer->handle;
+
+    bool ok = archive_writer_feed(writer, request->data.data, request->data.len);
+    if (ok && request->close) {
+        ok = archive_writer_finish(writer);
+    }
+    if (!ok || request->close) {
+        int err = errno;
+        archive_writer_free(writer);
+        errno = err;
+    }
+    return ok ? ROUTINE_SUCCESS : ROUTINE_PROTOCOL_ERROR;
+
+error:
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * @brief Totals of a subtree aggregated by REQ_DU.
+ */
+typedef struct du_totals {
+    u64 size;
+    u64 blocks;
+    u64 files;
+    u64 dirs;
+    u64 errors;
+} du_totals_t;
+
+/**
+ * @brief State of a REQ_DU aggregation.
+ */
+typedef struct du {
+    u64 depth;
+    bool all;
+    bool xdev;
+    dev_t root_dev;
+    /** Files with several links already counted, so that each is counted once. */
+    walk_visited_t *links;
+    size_t n_links;
+    size_t links_capacity;
+    Rpc__Api__ReplyDu *reply;
+    size_t entries_capacity;
+} du_t;
+
+/**
+ * Records a file with several links as counted, unless it already was.
+ *
+ * @param du The aggregation the file is met by.
+ * @param st The file's lstat().
+ * @param first Set to whether the file is met for the first time.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool du_count_link(du_t *du, const struct stat *st, bool *first) {
+    *first = false;
+    for (size_t i = 0; i < du->n_links; ++i) {
+        if (du->links[i].dev == st->st_dev && du->links[i].ino == st->st_ino) {
+            return true;
+        }
+    }
+    if (!array_reserve((void **) &du->links, &du->links_capacity, du->n_links, sizeof(walk_visited_t))) {
+        return false;
+    }
+    du->links[du->n_links++] = (walk_visited_t) {.dev = st->st_dev, .ino = st->st_ino};
+    *first = true;
+    return true;
+}
+
+/**
+ * Appends the totals of a directory to the reply.
+ *
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool du_report(du_t *du, const char *path, const du_totals_t *totals) {
+    Rpc__Api__ReplyDu *reply = du->reply;
+    if (!array_reserve((void **) &reply->entries, &du->entries_capacity, reply->n_entries,
+                       sizeof(Rpc__Api__DuEntry *))) {
+        return false;
+    }
+    Rpc__Api__DuEntry *entry = malloc(sizeof *entry);
+    if (entry == NULL) {
+        return false;
+    }
+    rpc__api__du_entry__init(entry);
+    reply->entries[reply->n_entries++] = entry;// progressive for cleanup safety
+    entry->path = strdup(path);
+    entry->size = totals->size;
+    entry->blocks = totals->blocks;
+    entry->files = totals->files;
+    entry->dirs = totals->dirs;
+    entry->errors = totals->errors;
+    return entry->path != NULL;
+}
+
+/**
+ * Aggregates the content of a directory into its totals, reporting its subdirectories
+ * which are shallow enough.
+ *
+ * @param du The aggregation.
+ * @param fd The directory, opened for reading. Closed by this function.
+ * @param path The directory path, or NULL if it's too deep for its subdirectories to be reported.
+ * @param depth The directory depth, the root being at depth 0.
+ * @param totals The directory totals, to which its content is added.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool du_dir(du_t *du, int fd, const char *path, u64 depth, du_totals_t *totals) {
+    DIR *dirp = fdopendir(fd);
+    struct dirent *entry;
+    bool ok = true;
+    if (dirp == NULL) {
+        close(fd);
+        totals->errors++;
+        return true;
+    }
+
+    while (ok && (errno = 0, entry = readdir(dirp)) != NULL) {
+        struct stat st;
+        if (strcmp(entry->d_name, ".") == 0 || strcmp(entry->d_name, "..") == 0) {
+            continue;
+        }
+        if (fstatat(dirfd(dirp), entry->d_name, &st, AT_SYMLINK_NOFOLLOW) != 0) {
+            totals->errors++;
+            continue;
+        }
+        if (!S_ISDIR(st.st_mode)) {
+            bool first = true;
+            if (st.st_nlink > 1) {
+                ok = du_count_link(du, &st, &first);
+            }
+            if (first) {
+                totals->files++;
+                totals->size += st.st_size;
+                totals->blocks += st.st_blocks;
+            }
+            continue;
+        }
+        if (du->xdev && st.st_dev != du->root_dev) {
+            continue;
+        }
+
+        du_totals_t sub = {.size = st.st_size, .blocks = st.st_blocks, .dirs = 1};
+        char *sub_path = NULL;
+        if (path != NULL && (du->all || depth + 1 <= du->depth)) {
+            size_t len = strlen(path);
+            const char *sep = (len > 0 && path[len - 1] == '/') ? "" : "/";
+            size_t path_len = len + strlen(sep) + strlen(entry->d_name) + 1;
+            sub_path = malloc(path_len);
+            if (sub_path == NULL) {
+                ok = false;
+                break;
+            }
+            snprintf(sub_path, path_len, "%s%s%s", path, sep, entry->d_name);
+        }
+        int sub_fd = openat(dirfd(dirp), entry->d_name, O_RDONLY | O_DIRECTORY | O_NOFOLLOW);
+        if (sub_fd < 0) {
+            sub.errors++;
+        } else {
+            ok = du_dir(du, sub_fd, sub_path, depth + 1, &sub);
+        }
+        if (ok && sub_path != NULL) {
+            ok = du_report(du, sub_path, &sub);
+        }
+        safe_free(sub_path);
+        totals->size += sub.size;
+        totals->blocks += sub.blocks;
+        totals->files += sub.files;
+        totals->dirs += sub.dirs;
+        totals->errors += sub.errors;
+    }
+    if (ok && entry == NULL && errno != 0) {
+        totals->errors++;
+    }
+    closedir(dirp);
+    return ok;
+}
+
+/**
+ * Aggregates the disk usage of a tree in a single pass, as du(1) does: the apparent sizes,
+ * allocated blocks and numbers of files and directories of every directory, its subtree
+ * included.
+ *
+ * Directories up to `depth` (or all of them, if `all` is set) are reported, every one after
+ * its subdirectories and the root last. Files with several links are counted once, symlinks
+ * aren't followed below the root, and entries which cannot be read are counted as errors.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestDu`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyDu` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful.
+ *         - `ROUTINE_PROTOCOL_ERROR` if the root cannot be opened (errno is preserved).
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_du(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestDu *request = (const Rpc__Api__RequestDu *) in_msg;
+    Rpc__Api__ReplyDu *reply = malloc(sizeof *reply);
+    du_t du = {0};
+    struct stat st;
+    CHECK(reply != NULL);
+    rpc__api__reply_du__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    TRACE("DU: path='%s' depth=%lu", request->path ? request->path : "(null)", (u64) request->depth);
+
+    CHECK(request->path && request->path[0] != '\0');
+    // only directories are opened, as opening e.g. a FIFO would block
+    if (stat(request->path, &st) != 0) {
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+    int fd = -1;
+    if (S_ISDIR(st.st_mode)) {
+        fd = open(request->path, O_RDONLY | O_NONBLOCK | O_DIRECTORY);
+        if (fd < 0) {
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+        if (fstat(fd, &st) != 0) {
+            int err = errno;
+            close(fd);
+            errno = err;
+            return ROUTINE_PROTOCOL_ERROR;
+        }
+    }
+
+    du_totals_t totals = {.size = st.st_size, .blocks = st.st_blocks};
+    if (S_ISDIR(st.st_mode)) {
+        du.depth = request->depth;
+        du.all = request->all;
+        du.xdev = request->xdev;
+        du.root_dev = st.st_dev;
+        du.reply = reply;
+        totals.dirs = 1;
+        CHECK(du_dir(&du, fd, request->path, 0, &totals));
+    } else {
+        totals.files = 1;
+    }
+    du.reply = reply;
+    CHECK(du_report(&du, request->path, &totals));
+    safe_free(du.links);
+    return ROUTINE_SUCCESS;
+
+error:
+    safe_free(du.links);
+    cleanup_du((ProtobufCMessage *) reply);
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * @brief An entry of a directory watched by REQ_WATCH, as listed when it was last looked at.
+ */
+typedef struct watch_entry {
+    char *name;
+    ino_t ino;
+    bool is_dir;
+} watch_entry_t;
+
+/**
+ * @brief A path watched by REQ_WATCH.
+ *
+ * `id` is the inotify watch descriptor on Linux, and the fd registered to the kqueue on Darwin.
+ * On Darwin, the entries of a directory are kept to tell what changed when it is written to,
+ * as kqueue doesn't say.
+ */
+typedef struct watch_node {
+    int id;
+    char *path;
+    bool is_dir;
+    bool root;
+#ifdef __APPLE__
+    watch_entry_t *entries;
+    size_t n_entries;
+#endif
+} watch_node_t;
+
+/**
+ * @brief State of a REQ_WATCH watcher, kept between the requests waiting for its events.
+ */
+typedef struct watcher {
+    u64 handle;
+    struct watcher *next;
+
+    /** The inotify fd on Linux, the kqueue on Darwin. */
+    int fd;
+    bool recursive;
+    watch_node_t *nodes;
+    size_t n_nodes;
+    size_t nodes_capacity;
+
+    /** The reply events are reported to, while a request is served. */
+    Rpc__Api__ReplyWatch *reply;
+    size_t events_capacity;
+} watcher_t;
+
+/** Watchers that are still open, looked up by their handle. */
+static watcher_t *g_watchers = NULL;
+static u64 g_next_watch_handle = 1;
+
+static void watch_entries_free(watch_entry_t *entries, size_t n_entries) {
+    for (size_t i = 0; i < n_entries; ++i) {
+        safe_free(entries[i].name);
+    }
+    safe_free(entries);
+}
+
+static int watch_entry_compare(const void *a, const void *b) {
+    return strcmp(((const watch_entry_t *) a)->name, ((const watch_entry_t *) b)->name);
+}
+
+/**
+ * Lists a directory, sorted by name.
+ *
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if the directory cannot be listed
+ *         (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t watch_list_dir(const char *path, watch_entry_t **out_entries, size_t *out_n_entries) {
+    watch_entry_t *entries = NULL;
+    size_t n_entries = 0;
+    size_t capacity = 0;
+    struct dirent *entry;
+    DIR *dirp = opendir(path);
+    if (dirp == NULL) {
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+    while ((entry = readdir(dirp)) != NULL) {
+        if (strcmp(entry->d_name, ".") == 0 || strcmp(entry->d_name, "..") == 0) {
+            continue;
+        }
+        bool is_dir = entry->d_type == DT_DIR;
+        if (entry->d_type == DT_UNKNOWN) {
+            struct stat st;
+            is_dir = fstatat(dirfd(dirp), entry->d_name, &st, AT_SYMLINK_NOFOLLOW) == 0 && S_ISDIR(st.st_mode);
+        }
+        if (!array_reserve((void **) &entries, &capacity, n_entries, sizeof(watch_entry_t))) {
+            goto error;
+        }
+        entries[n_entries] = (watch_entry_t) {.name = strdup(entry->d_name), .ino = entry->d_ino, .is_dir = is_dir};
+        if (entries[n_entries++].name == NULL) {
+            goto error;
+        }
+    }
+    closedir(dirp);
+    if (n_entries > 0) {
+        qsort(entries, n_entries, sizeof(watch_entry_t), watch_entry_compare);
+    }
+    *out_entries = entries;
+    *out_n_entries = n_entries;
+    return ROUTINE_SUCCESS;
+
+error:
+    closedir(dirp);
+    watch_entries_free(entries, n_entries);
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * @return The path of an entry of a directory, to be freed by the caller, or NULL if a memory
+ *         allocation error occurs.
+ */
+static char *watch_path_join(const char *dir, const char *name) {
+    size_t len = strlen(dir);
+    const char *sep = (len > 0 && dir[len - 1] == '/') ? "" : "/";
+    size_t path_len = len + strlen(sep) + strlen(name) + 1;
+    char *path = malloc(path_len);
+    if (path != NULL) {
+        snprintf(path, path_len, "%s%s%s", dir, sep, name);
+    }
+    return path;
+}
+
+/**
+ * @return Whether a path is `root`, or below it.
+ */
+static bool watch_path_within(const char *path, const char *root) {
+    size_t len = strlen(root);
+    return strncmp(path, root, len) == 0 && (path[len] == '\0' || path[len] == '/');
+}
+
+/**
+ * Appends an event to the reply of the request being served. An event identical to the previous
+ * one, such as a modification of a file written to repeatedly or an event of a path watched both
+ * as a root and through its parent, is reported once.
+ *
+ * @param dest The new path of a renamed entry, or NULL.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool watch_report(watcher_t *watcher, Rpc__Api__WatchEventType type, const char *path, const char *dest,
+                         bool is_dir) {
+    Rpc__Api__ReplyWatch *reply = watcher->reply;
+    dest = dest != NULL ? dest : "";
+    if (reply->n_events > 0) {
+        const Rpc__Api__WatchEvent *last = reply->events[reply->n_events - 1];
+        if (last->type == type && strcmp(last->path, path) == 0 && strcmp(last->dest, dest) == 0) {
+            return true;
+        }
+    }
+    if (!array_reserve((void **) &reply->events, &watcher->events_capacity, reply->n_events,
+                       sizeof(Rpc__Api__WatchEvent *))) {
+        return false;
+    }
+    Rpc__Api__WatchEvent *event = malloc(sizeof *event);
+    if (event == NULL) {
+        return false;
+    }
+    rpc__api__watch_event__init(event);
+    reply->events[reply->n_events++] = event;// progressive for cleanup safety
+    event->type = type;
+    event->is_dir = is_dir;
+    event->path = strdup(path);
+    event->dest = strdup(dest);
+    return event->path != NULL && event->dest != NULL;
+}
+
+static ssize_t watch_node_find(const watcher_t *watcher, int id) {
+    for (size_t i = 0; i < watcher->n_nodes; ++i) {
+        if (watcher->nodes[i].id == id) {
+            return (ssize_t) i;
+        }
+    }
+    return -1;
+}
+
+/**
+ * Stops watching a node. The last node takes its place.
+ */
+static void watch_node_release(watcher_t *watcher, size_t index) {
+    watch_node_t *node = &watcher->nodes[index];
+#ifdef __APPLE__
+    close(node->id);
+    watch_entries_free(node->entries, node->n_entries);
+#else
+    inotify_rm_watch(watcher->fd, node->id);
+#endif
+    safe_free(node->path);
+    watcher->nodes[index] = watcher->nodes[--watcher->n_nodes];
+}
+
+/**
+ * Stops watching a path and everything below it.
+ *
+ * @param path The path, which must not be owned by a node.
+ */
+static void watch_release_tree(watcher_t *watcher, const char *path) {
+    for (size_t i = watcher->n_nodes; i > 0; --i) {
+        if (watch_path_within(watcher->nodes[i - 1].path, path)) {
+            watch_node_release(watcher, i - 1);
+        }
+    }
+}
+
+/**
+ * Updates the paths of the nodes of a renamed tree.
+ *
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool watch_rename_tree(watcher_t *watcher, const char *from, const char *to) {
+    size_t from_len = strlen(from);
+    for (size_t i = 0; i < watcher->n_nodes; ++i) {
+        watch_node_t *node = &watcher->nodes[i];
+        if (!watch_path_within(node->path, from)) {
+            continue;
+        }
+        size_t path_len = strlen(to) + strlen(node->path + from_len) + 1;
+        char *path = malloc(path_len);
+        if (path == NULL) {
+            return false;
+        }
+        snprintf(path, path_len, "%s%s", to, node->path + from_len);
+        free(node->path);
+        node->path = path;
+    }
+    return true;
+}
+
+static routine_status_t watch_add(watcher_t *watcher, const char *path, bool root, bool report);
+
+/**
+ * Watches the content of a newly watched directory: its subdirectories if the watch is recursive,
+ * and on Darwin its files too, as kqueue reports the changes of a file only to its own fd.
+ *
+ * @param index The directory's node.
+ * @param report Report the content as created.
+ */
+static routine_status_t watch_add_dir_content(watcher_t *watcher, size_t index, const char *path, bool report) {
+    watch_entry_t *entries = NULL;
+    size_t n_entries = 0;
+    routine_status_t status = watch_list_dir(path, &entries, &n_entries);
+    if (status != ROUTINE_SUCCESS) {
+        // the directory vanished already
+        return status == ROUTINE_PROTOCOL_ERROR ? ROUTINE_SUCCESS : status;
+    }
+#ifdef __APPLE__
+    watcher->nodes[index].entries = entries;
+    watcher->nodes[index].n_entries = n_entries;
+#else
+    (void) index;
+#endif
+
+    for (size_t i = 0; i < n_entries && status == ROUTINE_SUCCESS; ++i) {
+        char *child = watch_path_join(path, entries[i].name);
+        if (child == NULL) {
+            status = ROUTINE_SERVER_ERROR;
+            break;
+        }
+        if (report && !watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_CREATE, child, NULL,
+                                    entries[i].is_dir)) {
+            status = ROUTINE_SERVER_ERROR;
+        }
+#ifdef __APPLE__
+        bool watched = !entries[i].is_dir || watcher->recursive;
+#else
+        bool watched = entries[i].is_dir;
+#endif
+        if (status == ROUTINE_SUCCESS && watched) {
+            status = watch_add(watcher, child, false, report);
+        }
+        free(child);
+    }
+#ifndef __APPLE__
+    watch_entries_free(entries, n_entries);
+#endif
+    return status;
+}
+
+/**
+ * Starts watching a path, along with its content if it's a directory.
+ *
+ * Paths other than the roots are only watched if they're directories of a recursive watch, or on
+ * Darwin files of a watched directory. They aren't followed if they're symlinks, and are skipped
+ * if they vanished already.
+ *
+ * @param root Whether the path is one of the watched paths.
+ * @param report Report the content of a directory as created.
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if a root cannot be watched
+ *         (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t watch_add(watcher_t *watcher, const char *path, bool root, bool report) {
+    routine_status_t failure = root ? ROUTINE_PROTOCOL_ERROR : ROUTINE_SUCCESS;
+    struct stat st;
+#ifdef __APPLE__
+    struct kevent change;
+    int id = open(path, O_EVTONLY | (root ? 0 : O_NOFOLLOW));
+    if (id < 0) {
+        return failure;
+    }
+    EV_SET(&change, id, EVFILT_VNODE, EV_ADD | EV_CLEAR,
+           NOTE_WRITE | NOTE_EXTEND | NOTE_ATTRIB | NOTE_DELETE | NOTE_RENAME, 0, NULL);
+    if (fstat(id, &st) != 0 || kevent(watcher->fd, &change, 1, NULL, 0, NULL) != 0) {
+        int err = errno;
+        close(id);
+        errno = err;
+        return failure;
+    }
+#else
+    if ((root ? stat(path, &st) : lstat(path, &st)) != 0) {
+        return failure;
+    }
+    int id = inotify_add_watch(watcher->fd, path,
+                               IN_CREATE | IN_MODIFY | IN_ATTRIB | IN_DELETE | IN_DELETE_SELF | IN_MOVED_FROM |
+                                   IN_MOVED_TO | IN_MOVE_SELF | (root ? 0 : IN_DONT_FOLLOW | IN_ONLYDIR));
+    if (id < 0) {
+        return failure;
+    }
+#endif
+
+    bool is_dir = S_ISDIR(st.st_mode);
+    char *node_path = strdup(path);
+    ssize_t index = watch_node_find(watcher, id);
+    if (node_path == NULL ||
+        (index < 0 && !array_reserve((void **) &watcher->nodes, &watcher->nodes_capacity, watcher->n_nodes,
+                                     sizeof(watch_node_t)))) {
+        safe_free(node_path);
+#ifdef __APPLE__
+        close(id);
+#endif
+        return ROUTINE_SERVER_ERROR;
+    }
+    if (index >= 0) {
+        // the same directory was reached through another path
+        free(watcher->nodes[index].path);
+        watcher->nodes[index].path = node_path;
+        watcher->nodes[index].root |= root;
+        return ROUTINE_SUCCESS;
+    }
+    index = (ssize_t) watcher->n_nodes++;
+    watcher->nodes[index] = (watch_node_t) {.id = id, .path = node_path, .is_dir = is_dir, .root = root};
+
+#ifdef __APPLE__
+    if (!is_dir || !(root || watcher->recursive)) {
+        return ROUTINE_SUCCESS;
+    }
+#else
+    if (!is_dir || !watcher->recursive) {
+        return ROUTINE_SUCCESS;
+    }
+#endif
+    return watch_add_dir_content(watcher, (size_t) index, path, report);
+}
+
+/**
+ * Releases a watcher and everything it holds, unlinking it from the open watchers first.
+ *
+ * @param watcher The watcher to release. May be partially initialized.
+ */
+static void watcher_free(watcher_t *watcher) {
+    for (watcher_t **it = &g_watchers; *it != NULL; it = &(*it)->next) {
+        if (*it == watcher) {
+            *it = watcher->next;
+            break;
+        }
+    }
+    while (watcher->n_nodes > 0) {
+        watch_node_release(watcher, watcher->n_nodes - 1);
+    }
+    if (watcher->fd >= 0) {
+        close(watcher->fd);
+    }
+    safe_free(watcher->nodes);
+    free(watcher);
+}
+
+/**
+ * Creates a watcher of the requested paths.
+ *
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if a path cannot be watched (errno
+ *         is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t watcher_create(const Rpc__Api__RequestWatch *request, watcher_t **out_watcher) {
+    watcher_t *watcher = calloc(1, sizeof *watcher);
+    routine_status_t status = ROUTINE_PROTOCOL_ERROR;
+    if (watcher == NULL) {
+        return ROUTINE_SERVER_ERROR;
+    }
+#ifdef __APPLE__
+    watcher->fd = kqueue();
+#else
+    watcher->fd = inotify_init1(IN_NONBLOCK | IN_CLOEXEC);
+#endif
+    watcher->recursive = request->recursive;
+    if (watcher->fd < 0) {
+        goto error;
+    }
+    for (size_t i = 0; i < request->n_paths; ++i) {
+        status = watch_add(watcher, request->paths[i], true, false);
+        if (status != ROUTINE_SUCCESS) {
+            goto error;
+        }
+    }
+
+    watcher->handle = g_next_watch_handle++;
+    watcher->next = g_watchers;
+    g_watchers = watcher;
+    *out_watcher = watcher;
+    return ROUTINE_SUCCESS;
+
+error: {
+    int err = errno;
+    watcher_free(watcher);
+    errno = err;
+    return status;
+}
+}
+
+#ifdef __APPLE__
+/**
+ * Tells what changed in a directory written to, by diffing its entries against the ones it had.
+ * An entry replaced by another one of the same inode is reported as renamed.
+ *
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool watch_diff_dir(watcher_t *watcher, size_t index) {
+    watch_node_t *node = &watcher->nodes[index];
+    watch_entry_t *old = node->entries;
+    size_t n_old = node->n_entries;
+    watch_entry_t *new = NULL;
+    size_t n_new = 0;
+    bool *removed = NULL;
+    bool *added = NULL;
+    char *dir = strdup(node->path);
+    bool ok = false;
+    if (dir == NULL) {
+        return false;
+    }
+    routine_status_t status = watch_list_dir(dir, &new, &n_new);
+    if (status != ROUTINE_SUCCESS) {
+        // a vanished directory is reported by its parent
+        free(dir);
+        return status == ROUTINE_PROTOCOL_ERROR;
+    }
+    node->entries = new;
+    node->n_entries = n_new;
+
+    removed = calloc(n_old + 1, sizeof(bool));
+    added = calloc(n_new + 1, sizeof(bool));
+    if (removed == NULL || added == NULL) {
+        goto cleanup;
+    }
+    for (size_t i = 0, j = 0; i < n_old || j < n_new;) {
+        int cmp = i == n_old ? 1 : j == n_new ? -1 : strcmp(old[i].name, new[j].name);
+        if (cmp == 0 && old[i].ino != new[j].ino) {
+            removed[i++] = true;
+            added[j++] = true;
+        } else if (cmp == 0) {
+            ++i;
+            ++j;
+        } else if (cmp < 0) {
+            removed[i++] = true;
+        } else {
+            added[j++] = true;
+        }
+    }
+
+    for (size_t i = 0; i < n_old; ++i) {
+        if (!removed[i]) {
+            continue;
+        }
+        char *path = watch_path_join(dir, old[i].name);
+        char *dest = NULL;
+        if (path == NULL) {
+            goto cleanup;
+        }
+        for (size_t j = 0; j < n_new && dest == NULL; ++j) {
+            if (added[j] && new[j].ino == old[i].ino) {
+                added[j] = false;
+                dest = watch_path_join(dir, new[j].name);
+                if (dest == NULL) {
+                    free(path);
+                    goto cleanup;
+                }
+            }
+        }
+        bool reported = dest != NULL ? watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_RENAME, path, dest,
+                                                    old[i].is_dir) &&
+                                           watch_rename_tree(watcher, path, dest)
+                                     : watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_DELETE, path, NULL,
+                                                    old[i].is_dir);
+        if (dest == NULL) {
+            watch_release_tree(watcher, path);
+        }
+        free(path);
+        safe_free(dest);
+        if (!reported) {
+            goto cleanup;
+        }
+    }
+
+    for (size_t j = 0; j < n_new; ++j) {
+        if (!added[j]) {
+            continue;
+        }
+        char *path = watch_path_join(dir, new[j].name);
+        if (path == NULL || !watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_CREATE, path, NULL,
+                                          new[j].is_dir)) {
+            safe_free(path);
+            goto cleanup;
+        }
+        status = ROUTINE_SUCCESS;
+        if (!new[j].is_dir || watcher->recursive) {
+            status = watch_add(watcher, path, false, true);
+        }
+        free(path);
+        if (status != ROUTINE_SUCCESS) {
+            goto cleanup;
+        }
+    }
+    ok = true;
+
+cleanup:
+    watch_entries_free(old, n_old);
+    safe_free(removed);
+    safe_free(added);
+    free(dir);
+    return ok;
+}
+
+/**
+ * Waits for kqueue events and reports them.
+ *
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if the kqueue cannot be waited for
+ *         (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t watch_read_events(watcher_t *watcher, u64 timeout_ms) {
+    struct kevent events[WATCH_EVENTS_PER_READ];
+    struct timespec timeout = {.tv_sec = (time_t) (timeout_ms / 1000), .tv_nsec = (long) (timeout_ms % 1000) * 1000000};
+    int count = kevent(watcher->fd, NULL, 0, events, WATCH_EVENTS_PER_READ, &timeout);
+    if (count < 0) {
+        return errno == EINTR ? ROUTINE_SUCCESS : ROUTINE_PROTOCOL_ERROR;
+    }
+    for (int i = 0; i < count; ++i) {
+        int id = (int) events[i].ident;
+        u32 fflags = events[i].fflags;
+        ssize_t index = watch_node_find(watcher, id);
+        if (index < 0) {
+            continue;
+        }
+        watch_node_t *node = &watcher->nodes[index];
+        if (fflags & (NOTE_DELETE | NOTE_RENAME)) {
+            if (!node->root) {
+                // reported by its parent directory
+                continue;
+            }
+            char dest[PATH_MAX] = "";
+            char *path = strdup(node->path);
+            bool is_dir = node->is_dir;
+            if (fflags & NOTE_RENAME && fcntl(id, F_GETPATH, dest) != 0) {
+                dest[0] = '\0';
+            }
+            if (path == NULL ||
+                !watch_report(watcher,
+                              fflags & NOTE_DELETE ? RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_DELETE
+                                                   : RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_RENAME,
+                              path, dest, is_dir)) {
+                safe_free(path);
+                return ROUTINE_SERVER_ERROR;
+            }
+            // a root which is deleted or moved away stops being watched
+            watch_release_tree(watcher, path);
+            free(path);
+            continue;
+        }
+        if (node->is_dir && fflags & NOTE_WRITE) {
+            if (!watch_diff_dir(watcher, (size_t) index)) {
+                return ROUTINE_SERVER_ERROR;
+            }
+            // the diff may have moved the node
+            index = watch_node_find(watcher, id);
+            if (index < 0) {
+                continue;
+            }
+            node = &watcher->nodes[index];
+        } else if (fflags & (NOTE_WRITE | NOTE_EXTEND)) {
+            if (!watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_MODIFY, node->path, NULL,
+                              node->is_dir)) {
+                return ROUTINE_SERVER_ERROR;
+            }
+        }
+        if (fflags & NOTE_ATTRIB &&
+            !watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_ATTRIB, node->path, NULL, node->is_dir)) {
+            return ROUTINE_SERVER_ERROR;
+        }
+    }
+    return ROUTINE_SUCCESS;
+}
+#else
+/**
+ * Reports an inotify event. The destination of a rename is looked for among the events read
+ * along with it, and consumed.
+ *
+ * @param end The end of the events read.
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool watch_inotify_event(watcher_t *watcher, struct inotify_event *event, char *end) {
+    if (event->mask & IN_Q_OVERFLOW) {
+        return watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_OVERFLOW, "", NULL, false);
+    }
+    ssize_t index = watch_node_find(watcher, event->wd);
+    if (index < 0) {
+        return true;
+    }
+    watch_node_t *node = &watcher->nodes[index];
+    bool is_dir = (event->mask & IN_ISDIR) != 0;
+    bool ok = true;
+
+    if (event->mask & IN_IGNORED) {
+        // the watched directory is gone
+        watch_node_release(watcher, (size_t) index);
+        return true;
+    }
+    if (event->len == 0) {
+        // an event of the watched path itself, reported by its parent directory unless it's a root
+        if (!node->root) {
+            return true;
+        }
+        if (event->mask & (IN_DELETE_SELF | IN_MOVE_SELF)) {
+            char *path = strdup(node->path);
+            ok = path != NULL && watch_report(watcher,
+                                              event->mask & IN_DELETE_SELF
+                                                  ? RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_DELETE
+                                                  : RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_RENAME,
+                                              path, NULL, node->is_dir);
+            // a root which is deleted or moved away stops being watched
+            if (path != NULL) {
+                watch_release_tree(watcher, path);
+            }
+            safe_free(path);
+            return ok;
+        }
+        if (event->mask & IN_MODIFY) {
+            ok = watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_MODIFY, node->path, NULL, node->is_dir);
+        }
+        if (ok && event->mask & IN_ATTRIB) {
+            ok = watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_ATTRIB, node->path, NULL, node->is_dir);
+        }
+        return ok;
+    }
+
+    char *path = watch_path_join(node->path, event->name);
+    char *dest = NULL;
+    if (path == NULL) {
+        return false;
+    }
+    if (event->mask & IN_MOVED_FROM) {
+        for (char *p = (char *) event + sizeof(struct inotify_event) + event->len; p < end;
+             p += sizeof(struct inotify_event) + ((struct inotify_event *) p)->len) {
+            struct inotify_event *to = (struct inotify_event *) p;
+            ssize_t to_index = to->mask & IN_MOVED_TO && to->cookie == event->cookie ? watch_node_find(watcher, to->wd)
+                                                                                    : -1;
+            if (to_index >= 0) {
+                dest = watch_path_join(watcher->nodes[to_index].path, to->name);
+                ok = dest != NULL;
+                to->mask = 0;
+                break;
+            }
+        }
+        ok = ok && watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_RENAME, path, dest, is_dir);
+        if (ok && is_dir && dest != NULL) {
+            ok = watch_rename_tree(watcher, path, dest);
+        } else if (is_dir) {
+            // moved out of the watched paths
+            watch_release_tree(watcher, path);
+        }
+    } else if (event->mask & (IN_CREATE | IN_MOVED_TO)) {
+        ok = watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_CREATE, path, NULL, is_dir);
+        if (ok && is_dir && watcher->recursive) {
+            ok = watch_add(watcher, path, false, true) == ROUTINE_SUCCESS;
+        }
+    } else if (event->mask & IN_DELETE) {
+        ok = watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_DELETE, path, NULL, is_dir);
+    } else {
+        if (event->mask & IN_MODIFY) {
+            ok = watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_MODIFY, path, NULL, is_dir);
+        }
+        if (ok && event->mask & IN_ATTRIB) {
+            ok = watch_report(watcher, RPC__API__WATCH_EVENT_TYPE__WATCH_EVENT_ATTRIB, path, NULL, is_dir);
+        }
+    }
+    free(path);
+    safe_free(dest);
+    return ok;
+}
+
+/**
+ * Waits for inotify events and reports them.
+ *
+ * @return ROUTINE_SUCCESS on success, ROUTINE_PROTOCOL_ERROR if the inotify fd cannot be read
+ *         (errno is preserved), or ROUTINE_SERVER_ERROR on allocation failure.
+ */
+static routine_status_t watch_read_events(watcher_t *watcher, u64 timeout_ms) {
+    char buf[WATCH_EVENTS_PER_READ * (sizeof(struct inotify_event) + NAME_MAX + 1)]
+        __attribute__((aligned(__alignof__(struct inotify_event))));
+    struct pollfd pfd = {.fd = watcher->fd, .events = POLLIN};
+    int ready = poll(&pfd, 1, timeout_ms > INT_MAX ? INT_MAX : (int) timeout_ms);
+    if (ready <= 0) {
+        return ready == 0 || errno == EINTR ? ROUTINE_SUCCESS : ROUTINE_PROTOCOL_ERROR;
+    }
+    ssize_t len = read(watcher->fd, buf, sizeof buf);
+    if (len < 0) {
+        return errno == EAGAIN || errno == EINTR ? ROUTINE_SUCCESS : ROUTINE_PROTOCOL_ERROR;
+    }
+    for (char *p = buf; p < buf + len; p += sizeof(struct inotify_event) + ((struct inotify_event *) p)->len) {
+        if (!watch_inotify_event(watcher, (struct inotify_event *) p, buf + len)) {
+            return ROUTINE_SERVER_ERROR;
+        }
+    }
+    return ROUTINE_SUCCESS;
+}
+#endif// __APPLE__
+
+/**
+ * Watches paths for changes, reporting their creations, modifications, deletions, renames and
+ * attribute changes, backed by inotify on Linux and kqueue on Darwin.
+ *
+ * The first request (with `handle` 0) starts watching `paths`, and returns the watcher's handle at
+ * once. The next requests pass it back, and wait up to `timeout_ms` for events, returning as soon
+ * as there are some. Events keep being queued by the kernel in between. A request with `close` set
+ * stops watching.
+ *
+ * A recursive watch also watches the subdirectories, including the ones created later, whose
+ * content is reported as created. A root which is deleted or moved away stops being watched.
+ * On Darwin, every watched file holds an fd, as kqueue reports the changes of a file only to it.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestWatch`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyWatch` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful.
+ *         - `ROUTINE_PROTOCOL_ERROR` if the handle is unknown, or a path cannot be watched (errno is
+ *           preserved).
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_watch(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestWatch *request = (const Rpc__Api__RequestWatch *) in_msg;
+    Rpc__Api__ReplyWatch *reply = malloc(sizeof *reply);
+    watcher_t *watcher = NULL;
+    CHECK(reply != NULL);
+    rpc__api__reply_watch__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    TRACE("WATCH: n_paths=%zu handle=%lu timeout_ms=%lu", request->n_paths, (u64) request->handle,
+          (u64) request->timeout_ms);
+
+    if (request->handle == 0) {
+        CHECK(request->n_paths > 0);
+        routine_status_t status = watcher_create(request, &watcher);
+        if (status == ROUTINE_SUCCESS) {
+            reply->handle = watcher->handle;
+        }
+        return status;
+    }
+    for (watcher = g_watchers; watcher != NULL && watcher->handle != request->handle; watcher = watcher->next) {}
+    if (watcher == NULL) {
+        errno = EBADF;
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+
+    reply->handle = watcher->handle;
+    if (request->close) {
+        watcher_free(watcher);
+        return ROUTINE_SUCCESS;
+    }
+
+    watcher->reply = reply;
+    watcher->events_capacity = 0;
+    routine_status_t status = watch_read_events(watcher, request->timeout_ms);
+    watcher->reply = NULL;
+    if (status != ROUTINE_SUCCESS) {
+        int err = errno;
+        cleanup_watch((ProtobufCMessage *) reply);
+        errno = err;
+    }
+    return status;
+
+error:
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Records a path a tree operation failed on. Only the first `max_failures` ones are listed, the
+ * others are only counted.
+ *
+ * @return true on success, false if a memory allocation error occurs.
+ */
+static bool tree_operation_fail(Rpc__Api__ReplyTreeOperation *reply, size_t *capacity, u64 max_failures,
+                                const char *path, int err) {
+    reply->failed++;
+    if (reply->n_failures >= max_failures) {
+        return true;
+    }
+    if (!array_reserve((void **) &reply->failures, capacity, reply->n_failures,
+                       sizeof(Rpc__Api__TreeOperationFailure *))) {
+        return false;
+    }
+    Rpc__Api__TreeOperationFailure *failure = malloc(sizeof *failure);
+    if (failure == NULL) {
+        return false;
+    }
+    rpc__api__tree_operation_failure__init(failure);
+    reply->failures[reply->n_failures++] = failure;// progressive for cleanup safety
+    failure->path = strdup(path);
+    failure->errno1 = (u64) err;
+    return failure->path != NULL;
+}
+
+/**
+ * Applies a tree operation to a single path.
+ *
+ * @return 0 on success, -1 on failure (errno is set).
+ */
+static int tree_operation_apply(const Rpc__Api__RequestTreeOperation *request, const FTSENT *entry) {
+    switch (request->operation) {
+    case RPC__API__TREE_OPERATION__TREE_OPERATION_CHMOD:
+        return chmod(entry->fts_accpath, (mode_t) request->mode);
+    case RPC__API__TREE_OPERATION__TREE_OPERATION_CHOWN:
+        // a root symlink is followed, as it is to traverse it
+        return (entry->fts_level == FTS_ROOTLEVEL ? chown : lchown)(entry->fts_accpath, (uid_t) request->uid,
+                                                                   (gid_t) request->gid);
+    case RPC__API__TREE_OPERATION__TREE_OPERATION_REMOVE:
+        return entry->fts_info == FTS_DP || entry->fts_info == FTS_DNR ? rmdir(entry->fts_accpath)
+                                                                       : unlink(entry->fts_accpath);
+    default:
+        errno = EINVAL;
+        return -1;
+    }
+}
+
+/**
+ * Applies an operation to every path of a tree in a single pass over it with fts, sparing the
+ * client a request per path: chmod, chown, or removal.
+ *
+ * Directories are operated on after their content, so that a tree can be made unreadable or be
+ * removed. Symlinks aren't followed, except for a root which is chmod-ed or chown-ed, and aren't
+ * chmod-ed. The paths which cannot be read or operated on don't stop the operation; they're
+ * counted in `failed`, and the first `max_failures` ones are listed along with their errno.
+ *
+ * @param in_msg Input Protobuf message of type `Rpc__Api__RequestTreeOperation`.
+ * @param out_msg Output Protobuf message, populated as a `Rpc__Api__ReplyTreeOperation` message.
+ *
+ * @return A `routine_status_t` status code:
+ *         - `ROUTINE_SUCCESS` if successful, even if some paths failed.
+ *         - `ROUTINE_PROTOCOL_ERROR` if the operation is unknown, or the traversal cannot start
+ *           (errno is preserved).
+ *         - `ROUTINE_SERVER_ERROR` if a memory allocation error occurs.
+ */
+static routine_status_t routine_tree_operation(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestTreeOperation *request = (const Rpc__Api__RequestTreeOperation *) in_msg;
+    Rpc__Api__ReplyTreeOperation *reply = malloc(sizeof *reply);
+    size_t failures_capacity = 0;
+    FTS *fts = NULL;
+    FTSENT *entry;
+    CHECK(reply != NULL);
+    rpc__api__reply_tree_operation__init(reply);
+    *out_msg = (ProtobufCMessage *) reply;
+
+    TRACE("TREE_OPERATION: path='%s' operation=%d", request->path ? request->path : "(null)", request->operation);
+
+    CHECK(request->path && request->path[0] != '\0');
+    if (request->operation != RPC__API__TREE_OPERATION__TREE_OPERATION_CHMOD &&
+        request->operation != RPC__API__TREE_OPERATION__TREE_OPERATION_CHOWN &&
+        request->operation != RPC__API__TREE_OPERATION__TREE_OPERATION_REMOVE) {
+        errno = EINVAL;
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+    u64 max_failures = request->max_failures ? request->max_failures : TREE_OPERATION_DEFAULT_MAX_FAILURES;
+
+    char *const paths[] = {request->path, NULL};
+    int options = FTS_PHYSICAL | FTS_NOCHDIR;
+    if (request->operation != RPC__API__TREE_OPERATION__TREE_OPERATION_REMOVE) {
+        options |= FTS_COMFOLLOW;
+    }
+    fts = fts_open(paths, options, NULL);
+    if (fts == NULL) {
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+
+    while ((errno = 0, entry = fts_read(fts)) != NULL) {
+        switch (entry->fts_info) {
+        case FTS_D:
+        case FTS_DC:
+        case FTS_DOT:
+            // directories are operated on once their content is
+            continue;
+        case FTS_DNR:
+        case FTS_ERR:
+        case FTS_NS:
+            CHECK(tree_operation_fail(reply, &failures_capacity, max_failures, entry->fts_path, entry->fts_errno));
+            if (entry->fts_info != FTS_DNR) {
+                continue;
+            }
+            // an unreadable directory is still operated on itself
+            break;
+        case FTS_SL:
+        case FTS_SLNONE:
+            if (request->operation == RPC__API__TREE_OPERATION__TREE_OPERATION_CHMOD) {
+                // chmod() would follow it
+                continue;
+            }
+            break;
+        default: break;
+        }
+        if (tree_operation_apply(request, entry) != 0) {
+            CHECK(tree_operation_fail(reply, &failures_capacity, max_failures, entry->fts_path, errno));
+        } else {
+            reply->count++;
+        }
+    }
+    if (errno != 0) {
+        // the traversal stopped short
+        CHECK(tree_operation_fail(reply, &failures_capacity, max_failures, request->path, errno));
+    }
+    fts_close(fts);
+    return ROUTINE_SUCCESS;
+
+error:
+    if (fts != NULL) {
+        fts_close(fts);
+    }
+    cleanup_tree_operation((ProtobufCMessage *) reply);
+    return ROUTINE_SERVER_ERROR;
+}
+
+/**
+ * Waits for a specific thread process to terminate and captures its exit status.
+ *
+ * @param pid The process ID of the thread to wait for. This must be a valid PID.
+ */
+static void thread_waitpid(pid_t pid) {
+    TRACE("enter");
+    s32 err;
+    waitpid(pid, &err, 0);
+}
+
+typedef struct {
+    int sockfd;
+    pid_t pid;
+} thread_notify_client_spawn_error_t;
+
+/**
+ * Executes a routine based on the provided input message, spawns a process if necessary,
+ * and prepares an output message with the results.
+ *
+ * This function handles both background and foreground process execution. If running
+ * in the background, a monitoring thread is created for the process. If running in the
+ * foreground, process-related information is stored in a global structure.
+ *
+ * @param in_msg The input Protocol Buffer message containing the execution request details.
+ *               This should be a message of type Rpc__Api__RequestExec.
+ * @param out_msg A pointer to a pointer that will be set to the output Protocol Buffer
+ *                message containing the execution result. This will be a message
+ *                of type Rpc__Api__ReplyExec.
+ * @return A status code indicating the result of the routine execution. Possible values
+ *         include:
+ *         - ROUTINE_SUCCESS: The routine completed successfully.
+ *         - ROUTINE_PROTOCOL_ERROR: There was an error in the protocol or input processing.
+ *         - ROUTINE_SERVER_ERROR: A server-side error occurred during execution.
+ */
+static routine_status_t routine_exec(const ProtobufCMessage *in_msg, ProtobufCMessage **out_msg) {
+    const Rpc__Api__RequestExec *request_exec = (const Rpc__Api__RequestExec *) in_msg;
+    Rpc__Api__ReplyExec *reply_exec = malloc(sizeof *reply_exec);
+    pid_t pid = INVALID_PID;
+
+    CHECK(reply_exec != NULL);
+
+    rpc__api__reply_exec__init(reply_exec);
+    *out_msg = (ProtobufCMessage *) reply_exec;
+
+    pthread_t thread = 0;
+    thread_notify_client_spawn_error_t *thread_params = NULL;
+
+    int master = -1;
+
+    // Prepare argv/envp arrays (null-terminated)
+    char **argv = NULL;
+    char **envp = NULL;
+
+    CHECK(request_exec->n_argv > 0);
+
+    CHECK(copy_arr_with_null(&argv, request_exec->argv, request_exec->n_argv));
+    CHECK(copy_arr_with_null(&envp, request_exec->envp, request_exec->n_envp));
+
+    // Spawn
+    CHECK(internal_spawn(request_exec->background, argv, request_exec->n_envp ? envp : environ, &pid, &master));
+
+    reply_exec->pid = pid;
+
+    if (request_exec->background) {
+        if (master >= 0) {
+            close(master);
+        }
+        CHECK(0 == pthread_create(&thread, NULL, (void *(*) (void *) ) thread_waitpid, (void *) (intptr_t) pid));
+    } else {
+        g_pending_pty.pid = pid;
+        g_pending_pty.master = master;
+        g_pending_pty.valid = true;
+    }
+error:
+    safe_free(argv);
+    safe_free(envp);
+    safe_free(thread_params);
+
+    if (INVALID_PID == pid) {
+        TRACE("invalid pid");
+        return ROUTINE_PROTOCOL_ERROR;
+    }
+
+    return ROUTINE_SUCCESS;
+}
+
+/**
+ * Frees resources associated with a ProtobufCMessage of type Rpc__Api__ReplyPeek.
+ *
+ * Depending on the platform and configuration, it either deallocates memory
+ * using `vm_deallocate` (for macOS with SAFE_READ_WRITES defined) or `safe_free`.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyPeek.
+ */
+static void cleanup_peek(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyPeek *reply_peek = (Rpc__Api__ReplyPeek *) reply;
+
+#if defined(__APPLE__) && defined(SAFE_READ_WRITES)
+    vm_deallocate(mach_task_self(), (vm_address_t) reply_peek->data.data, reply_peek->data.len);
+#else
+    safe_free(reply_peek->data.data);
+#endif
+}
+
+/**
+ * Cleans up the dynamically allocated memory associated with a directory listing reply.
+ * This function ensures that all allocated memory for directory entries,
+ * their associated stat and lstat structures, and names are properly freed.
+ *
+ * @param reply A pointer to a ProtobufCMessage structure cast to Rpc__Api__ReplyListDir.
+ *              The function deallocates memory associated with this structure's
+ *              directory entries and their components. If the reply or its directory
+ *              entries are null, the function exits without performing any action.
+ */
+static void cleanup_listdir(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyListDir *reply_list_dir = (Rpc__Api__ReplyListDir *) reply;
+    if (!reply_list_dir || !reply_list_dir->dir_entries) {
+        return;
+    }
+    for (size_t i = 0; i < reply_list_dir->n_dir_entries; ++i) {
+        free_dir_entry(reply_list_dir->dir_entries[i]);
+    }
+    safe_free(reply_list_dir->dir_entries);
+}
+
+/**
+ * Frees the data read into a file read reply.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyFileRead.
+ */
+static void cleanup_file_read(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyFileRead *reply_file_read = (Rpc__Api__ReplyFileRead *) reply;
+    safe_free(reply_file_read->data.data);
+}
+
+/**
+ * Frees the data read into an archive read reply.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyArchiveRead.
+ */
+static void cleanup_archive_read(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyArchiveRead *reply_archive_read = (Rpc__Api__ReplyArchiveRead *) reply;
+    safe_free(reply_archive_read->data.data);
+}
+
+/**
+ * Frees the addresses of a dlsym multi reply.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyDlsymMulti.
+ */
+static void cleanup_dlsym_multi(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyDlsymMulti *reply_dlsym_multi = (Rpc__Api__ReplyDlsymMulti *) reply;
+    safe_free(reply_dlsym_multi->ptrs);
+}
+
+/**
+ * Frees the return values of a call multi reply.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyCallMulti.
+ */
+static void cleanup_call_multi(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyCallMulti *reply_call_multi = (Rpc__Api__ReplyCallMulti *) reply;
+    safe_free(reply_call_multi->return_values);
+}
+
+/**
+ * Frees the failures of a tree operation reply.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyTreeOperation.
+ */
+static void cleanup_tree_operation(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyTreeOperation *reply_tree_operation = (Rpc__Api__ReplyTreeOperation *) reply;
+    if (!reply_tree_operation || !reply_tree_operation->failures) {
+        return;
+    }
+    for (size_t i = 0; i < reply_tree_operation->n_failures; ++i) {
+        if (reply_tree_operation->failures[i]) {
+            safe_free(reply_tree_operation->failures[i]->path);
+            free(reply_tree_operation->failures[i]);
+        }
+    }
+    safe_free(reply_tree_operation->failures);
+}
+
+/**
+ * Frees the events of a watch reply.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyWatch.
+ */
+static void cleanup_watch(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyWatch *reply_watch = (Rpc__Api__ReplyWatch *) reply;
+    if (!reply_watch || !reply_watch->events) {
+        return;
+    }
+    for (size_t i = 0; i < reply_watch->n_events; ++i) {
+        if (reply_watch->events[i]) {
+            safe_free(reply_watch->events[i]->path);
+            safe_free(reply_watch->events[i]->dest);
+            free(reply_watch->events[i]);
+        }
+    }
+    safe_free(reply_watch->events);
+    reply_watch->n_events = 0;
+}
+
+/**
+ * Frees the entries of a disk usage reply.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyDu.
+ */
+static void cleanup_du(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyDu *reply_du = (Rpc__Api__ReplyDu *) reply;
+    if (!reply_du || !reply_du->entries) {
+        return;
+    }
+    for (size_t i = 0; i < reply_du->n_entries; ++i) {
+        if (reply_du->entries[i]) {
+            safe_free(reply_du->entries[i]->path);
+            free(reply_du->entries[i]);
+        }
+    }
+    safe_free(reply_du->entries);
+}
+
+/**
+ * Frees the digests of a file hash reply.
+ *
+ * @param reply Pointer to the ProtobufCMessage to be cleaned up.
+ *              Expected to be of type Rpc__Api__ReplyFileHash.
+ */
+static void cleanup_file_hash(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyFileHash *reply_file_hash = (Rpc__Api__ReplyFileHash *) reply;
+    if (!reply_file_hash || !reply_file_hash->digests) {
+        return;
+    }
+    for (size_t i = 0; i < reply_file_hash->n_digests; ++i) {
+        safe_free(reply_file_hash->digests[i].data);
+    }
+    safe_free(reply_file_hash->digests);
+    reply_file_hash->n_digests = 0;
+}
+
+/**
+ * Cleans up the dynamically allocated memory associated with a walk reply: the directories
+ * it holds, along with their paths and entries.
+ *
+ * @param reply A pointer to a ProtobufCMessage structure cast to Rpc__Api__ReplyWalk.
+ */
+static void cleanup_walk(ProtobufCMessage *reply) {
+    Rpc__Api__ReplyWalk *reply_walk = (Rpc__Api__ReplyWalk *) reply;
+    if (!reply_walk || !reply_walk->dirs) {
+        return;
+    }
+    for (size_t i = 0; i < reply_walk->n_dirs; ++i) {
+        Rpc__Api__WalkDir *walk_dir = reply_walk->dirs[i];
+        if (!walk_dir) {
+            continue;
+        }
+        for (size_t j = 0; j < walk_dir->n_entries; ++j) {
+            free_dir_entry(walk_dir->entries[j]);
+        }
+        safe_free(walk_dir->entries);
+        safe_free(walk_dir->path);
+        free(walk_dir);
+    }
+    safe_free(reply_walk->dirs);
 }
\ No newline at end of file
@@ -0,0 +1,26 @@
+#ifndef RPCSERVER_SHA256_H
+#define RPCSERVER_SHA256_H
+#include <stddef.h>
+#include <stdint.h>
+
+#define SHA256_DIGEST_LENGTH (32)
+#define SHA256_BLOCK_LENGTH (64)
+
+/**
+ * @brief Incremental SHA-256 (FIPS 180-4) context.
+ *
+ * The server is linked without any crypto library, so file digests are computed with this
+ * self-contained implementation on every platform.
+ */
+typedef struct {
+    uint32_t state[8];
+    uint64_t length;
+    uint8_t buffer[SHA256_BLOCK_LENGTH];
+    size_t buffer_len;
+} sha256_ctx_t;
+
+void sha256_init(sha256_ctx_t *ctx);
+void sha256_update(sha256_ctx_t *ctx, const void *data, size_t len);
+void sha256_final(sha256_ctx_t *ctx, uint8_t digest[SHA256_DIGEST_LENGTH]);
+
+#endif// RPCSERVER_SHA256_H